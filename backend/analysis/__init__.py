@@ -0,0 +1,36 @@
+"""
+Server-side analysis of Movella DOT recordings.
+
+All stages operate on whole NumPy arrays (one per channel) so recordings can
+be processed without per-sample Python loops.
+"""
+
+from .movella_csv import (
+    DEVICE_TAG_MAPPING,
+    MovellaCsvError,
+    parse_movella_csv,
+    sample_times_seconds,
+    unwrap_sample_time_fine,
+)
+from .alignment import align_sensors, estimate_offsets, slerp
+from .filters import butter_sos, derivative, savgol_filter, smooth_derivative, sosfiltfilt
+from .ingest import decode_movella_zip
+from .quality import RecordingQualityError, assess_sensor, assess_sensors
+from .pipeline import ANALYSIS_VERSION, analyze_recording, analyze_sensors, calibrate_recording
+from .recordings import (
+    archive_movement_zip,
+    delete_recording,
+    get_recordings_dir,
+    is_valid_recording_id,
+    iter_manifests,
+    list_recordings,
+    load_manifest,
+    load_sensor_header,
+    load_sensor_window,
+    open_sensor,
+    rebuild_patient_index,
+    recording_content_hash,
+    slice_sensor,
+    update_manifest,
+    write_recording,
+)
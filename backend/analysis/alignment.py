@@ -0,0 +1,203 @@
+"""
+Timestamp alignment and resampling across DOT sensors.
+
+Every sensor reports its own ``SampleTimeFine`` clock (32-bit microseconds
+that roll over every ~71.6 minutes) and may drop packets. Knee and hip angles
+combine two sensors, so all channels are resampled onto one uniform grid:
+scalar channels with linear interpolation, orientations with quaternion
+slerp. Every step is a whole-array NumPy operation.
+"""
+
+from typing import Any, Optional
+
+import numpy as np
+
+from .kinematics import quat_from_euler_zyx
+from .movella_csv import unwrap_sample_time_fine
+from .quality import valid_mask
+
+DEFAULT_OUTPUT_RATE = 60
+EULER_CHANNELS = ("Euler_X", "Euler_Y", "Euler_Z")
+SKIPPED_CHANNELS = {"PacketCounter", "SampleTimeFine", "Status", *EULER_CHANNELS}
+MAX_XCORR_LAG_SECONDS = 0.5
+
+
+def sensor_seconds(sample_time_fine: np.ndarray) -> np.ndarray:
+    """Absolute sensor time in seconds with 32-bit rollovers removed."""
+    return unwrap_sample_time_fine(sample_time_fine) / 1e6
+
+
+def _is_synced(header: Optional[dict[str, Any]]) -> bool:
+    metadata = (header or {}).get("metadata") or header or {}
+    return str(metadata.get("SyncStatus") or "").strip().lower() == "synced"
+
+
+def _resample_uniform(seconds: np.ndarray, values: np.ndarray, rate: float) -> tuple[float, np.ndarray]:
+    start = seconds[0]
+    grid = start + np.arange(int((seconds[-1] - start) * rate) + 1) / rate
+    return start, np.interp(grid, seconds, values)
+
+
+def _xcorr_lag(reference: np.ndarray, other: np.ndarray, rate: float) -> float:
+    """Delay (seconds) of ``other`` behind ``reference`` from their FFT cross-correlation."""
+    n = min(len(reference), len(other))
+    if n < 4:
+        return 0.0
+    a = reference[:n] - np.mean(reference[:n])
+    b = other[:n] - np.mean(other[:n])
+    if not np.any(a) or not np.any(b):
+        return 0.0
+
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    spectrum = np.fft.rfft(a, size) * np.conj(np.fft.rfft(b, size))
+    correlation = np.fft.irfft(spectrum, size)
+    max_lag = min(n - 1, int(MAX_XCORR_LAG_SECONDS * rate))
+    lags = np.concatenate([np.arange(0, max_lag + 1), np.arange(-max_lag, 0)])
+    window = np.concatenate([correlation[: max_lag + 1], correlation[size - max_lag:]])
+    return -float(lags[int(np.argmax(window))]) / rate
+
+
+def estimate_offsets(
+    channels_by_tag: dict[int, dict[str, np.ndarray]],
+    headers: Optional[dict[int, dict[str, Any]]] = None,
+    refine: bool = False,
+    rate: float = DEFAULT_OUTPUT_RATE,
+) -> dict[int, float]:
+    """
+    Per-sensor clock offset in seconds (subtract it to get the common timebase).
+
+    Synced sensors share one clock and get a zero offset. Sensors that are
+    unsynced, or whose sync status is unknown, are aligned on their first
+    sample. With ``refine`` their residual lag against a reference sensor (the
+    first synced one, else the first one) is estimated by cross-correlating
+    ``FreeAcc`` magnitude; synced sensors are never shifted.
+    """
+    headers = headers or {}
+    synced = {tag: _is_synced(headers.get(tag)) for tag in channels_by_tag}
+    offsets = {}
+    for tag, channels in channels_by_tag.items():
+        seconds = sensor_seconds(channels["SampleTimeFine"])
+        offsets[tag] = 0.0 if synced[tag] else float(seconds[0]) if len(seconds) else 0.0
+
+    if not refine or len(channels_by_tag) < 2 or all(synced.values()):
+        return offsets
+
+    magnitudes = {}
+    for tag, channels in channels_by_tag.items():
+        if not all(f"FreeAcc_{axis}" in channels for axis in "XYZ") or len(channels["SampleTimeFine"]) < 4:
+            continue
+        acc = np.stack([np.asarray(channels[f"FreeAcc_{axis}"], dtype=np.float64) for axis in "XYZ"], axis=1)
+        seconds = sensor_seconds(channels["SampleTimeFine"]) - offsets[tag]
+        magnitudes[tag] = _resample_uniform(seconds, np.linalg.norm(acc, axis=1), rate)
+
+    if len(magnitudes) < 2:
+        return offsets
+    reference_tag = min(magnitudes, key=lambda tag: (not synced[tag], tag))
+    ref_start, reference = magnitudes[reference_tag]
+    for tag, (start, magnitude) in magnitudes.items():
+        if tag == reference_tag or synced[tag]:
+            continue
+        # Put both signals on the same absolute grid before correlating
+        shift = int(round((start - ref_start) * rate))
+        aligned = np.concatenate([np.zeros(max(shift, 0)), magnitude[max(-shift, 0):]])
+        offsets[tag] += _xcorr_lag(reference, aligned, rate)
+    return offsets
+
+
+def slerp(q0: np.ndarray, q1: np.ndarray, fraction: np.ndarray) -> np.ndarray:
+    """Row-wise spherical interpolation between ``(N, 4)`` quaternion arrays."""
+    dot = np.einsum("ij,ij->i", q0, q1)
+    q1 = np.where(dot[:, None] < 0.0, -q1, q1)  # take the short arc
+    dot = np.abs(dot)
+
+    fraction = fraction[:, None]
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))[:, None]
+    sin_theta = np.sin(theta)
+    nearly_parallel = sin_theta < 1e-6
+    safe_sin = np.where(nearly_parallel, 1.0, sin_theta)
+    w0 = np.where(nearly_parallel, 1.0 - fraction, np.sin((1.0 - fraction) * theta) / safe_sin)
+    w1 = np.where(nearly_parallel, fraction, np.sin(fraction * theta) / safe_sin)
+
+    out = w0 * q0 + w1 * q1
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+def bracket(seconds: np.ndarray, grid: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Left neighbour index, right neighbour index and fraction for every grid point."""
+    right = np.clip(np.searchsorted(seconds, grid, side="right"), 1, len(seconds) - 1)
+    left = right - 1
+    span = seconds[right] - seconds[left]
+    fraction = np.where(span > 0, (grid - seconds[left]) / np.where(span > 0, span, 1.0), 0.0)
+    return left, right, np.clip(fraction, 0.0, 1.0)
+
+
+def common_grid(timebases: dict[int, np.ndarray], rate: float) -> np.ndarray:
+    """Uniform grid covering the interval every sensor has data for."""
+    start = max(float(seconds[0]) for seconds in timebases.values())
+    end = min(float(seconds[-1]) for seconds in timebases.values())
+    if end <= start:
+        return np.empty(0, dtype=np.float64)
+    return start + np.arange(int(np.floor((end - start) * rate)) + 1) / rate
+
+
+def output_rate(headers: Optional[dict[int, dict[str, Any]]], timebases: dict[int, np.ndarray]) -> float:
+    rates = [int(h["OutputRate"]) for h in (headers or {}).values() if h and h.get("OutputRate")]
+    if rates:
+        return float(max(rates))
+    steps = [np.median(np.diff(seconds)) for seconds in timebases.values() if len(seconds) > 1]
+    positive = [step for step in steps if step > 0]
+    return float(round(1.0 / min(positive))) if positive else float(DEFAULT_OUTPUT_RATE)
+
+
+def align_sensors(
+    channels_by_tag: dict[int, dict[str, np.ndarray]],
+    headers: Optional[dict[int, dict[str, Any]]] = None,
+    rate: Optional[float] = None,
+    refine_offsets: bool = False,
+) -> dict[str, Any]:
+    """
+    Resample every sensor onto one uniform timebase.
+
+    Returns ``{"t", "rate", "offsets", "sensors"}`` where ``t`` starts at 0 s
+    and ``sensors[tag]`` holds ``quat`` (``(M, 4)``, slerped from the Euler
+    channels), every other float channel linearly interpolated, ``Status``
+    as the OR of the two bracketing samples so flags survive, and ``valid``
+    (False inside long packet-loss gaps or around clipped samples).
+    """
+    usable = {
+        tag: channels
+        for tag, channels in channels_by_tag.items()
+        if "SampleTimeFine" in channels and len(channels["SampleTimeFine"]) >= 2
+    }
+    if not usable:
+        return {"t": np.empty(0), "rate": float(rate or DEFAULT_OUTPUT_RATE), "offsets": {}, "sensors": {}}
+
+    rate = float(rate or output_rate(headers, {t: sensor_seconds(c["SampleTimeFine"]) for t, c in usable.items()}))
+    offsets = estimate_offsets(usable, headers, refine=refine_offsets, rate=rate)
+    timebases = {tag: sensor_seconds(c["SampleTimeFine"]) - offsets[tag] for tag, c in usable.items()}
+    grid = common_grid(timebases, rate)
+
+    sensors = {}
+    for tag, channels in usable.items():
+        seconds = timebases[tag]
+        left, right, fraction = bracket(seconds, grid)
+        resampled: dict[str, np.ndarray] = {}
+
+        if all(name in channels for name in EULER_CHANNELS):
+            quats = quat_from_euler_zyx(*(channels[name] for name in EULER_CHANNELS))
+            resampled["quat"] = slerp(quats[left], quats[right], fraction)
+
+        status = np.asarray(channels["Status"]) if "Status" in channels else None
+        if status is not None:
+            resampled["Status"] = status[left] | status[right]
+        resampled["valid"] = valid_mask(seconds, left, right, status)
+
+        for name, values in channels.items():
+            if name in SKIPPED_CHANNELS:
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            resampled[name] = values[left] + fraction * (values[right] - values[left])
+        sensors[tag] = resampled
+
+    origin = grid[0] if len(grid) else 0.0
+    return {"t": grid - origin, "rate": rate, "offsets": offsets, "sensors": sensors}
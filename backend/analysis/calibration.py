@@ -0,0 +1,319 @@
+"""
+Static-pose sensor-to-segment calibration with a per-patient cache.
+
+While the patient stands still in the neutral pose every segment's bone axis
+(sensor -Y, see ``kinematics.BONE_AXIS``) should point straight down. The
+calibration stores, per sensor, the body-frame rotation that makes this true
+for the measured static orientation; segment orientations are then
+``q_sensor * q_offset``. Only the mounting tilt is corrected, the sensor's
+heading is left alone.
+
+Calibrations are cached per patient and sensor set next to the recording
+archive:
+
+    <RECORDINGS_DIR>/calibrations/<patient_id>/<sensor_set>.json
+
+and reused for recordings made within ``CALIBRATION_VALIDITY_HOURS`` of the
+calibration. A cheap drift check on the opening static pose of each new
+recording triggers recalibration only when the cached offsets no longer
+bring the bone axes to vertical.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+from .kinematics import BONE_AXIS, quat_conjugate, quat_multiply, rotate_vectors
+from .recordings import get_recordings_dir
+
+CALIBRATIONS_DIRNAME = "calibrations"
+CALIBRATION_EXERCISE_TYPE = "calibration"
+DEFAULT_VALIDITY_HOURS = 12.0
+MAX_CACHED_CALIBRATIONS = 20
+
+STATIC_WINDOW_SECONDS = 1.0
+# Mean angular speed (deg/s) below which a window counts as standing still
+MAX_STATIC_MOTION = 5.0
+# Residual bone-axis tilt (deg) that triggers recalibration
+DRIFT_THRESHOLD_DEG = 5.0
+# Only the opening seconds are searched, where the protocol asks for a still pose
+STATIC_SEARCH_SECONDS = 5.0
+
+WORLD_DOWN = np.array([0.0, 0.0, -1.0])  # DOT world frame is Z-up
+PATIENT_ID_PATTERN = re.compile(r"^[\w-]{1,64}$")
+
+
+def get_validity_window() -> timedelta:
+    configured = (os.getenv("CALIBRATION_VALIDITY_HOURS") or "").strip()
+    try:
+        hours = float(configured) if configured else DEFAULT_VALIDITY_HOURS
+    except ValueError:
+        hours = DEFAULT_VALIDITY_HOURS
+    return timedelta(hours=hours)
+
+
+def sensor_set_key(tags) -> str:
+    return "-".join(str(int(tag)) for tag in sorted(tags))
+
+
+def find_static_window(
+    quats: np.ndarray,
+    seconds: np.ndarray,
+    window_seconds: float = STATIC_WINDOW_SECONDS,
+    search_seconds: Optional[float] = STATIC_SEARCH_SECONDS,
+) -> Optional[tuple[int, int]]:
+    """
+    ``(start, end)`` sample range of the stillest window, or None when even
+    that window moves faster than ``MAX_STATIC_MOTION`` on average.
+    """
+    n = len(quats)
+    if search_seconds is not None:
+        n = min(n, int(np.searchsorted(seconds, seconds[0] + search_seconds, side="right")) if n else 0)
+    if n < 3:
+        return None
+    step = float(np.median(np.diff(seconds[:n])))
+    width = int(round(window_seconds / step)) if step > 0 else 0
+    if width < 2 or width > n:
+        return None
+
+    dot = np.abs(np.einsum("ij,ij->i", quats[1:n], quats[: n - 1]))
+    motion = np.degrees(2.0 * np.arccos(np.clip(dot, -1.0, 1.0)))  # per step
+    cumulative = np.concatenate([[0.0], np.cumsum(motion)])
+    window_motion = cumulative[width - 1 :] - cumulative[: n - width + 1]
+    start = int(np.argmin(window_motion))
+    speed = window_motion[start] / (window_seconds or 1.0)
+    if speed > MAX_STATIC_MOTION:
+        return None
+    return start, start + width
+
+
+def mean_quaternion(quats: np.ndarray) -> np.ndarray:
+    """Average orientation (principal eigenvector of ``sum(q q^T)``), sign-invariant."""
+    accumulator = np.einsum("ni,nj->ij", quats, quats)
+    _, vectors = np.linalg.eigh(accumulator)
+    mean = vectors[:, -1]
+    return mean if mean[0] >= 0 else -mean
+
+
+def shortest_arc(source: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Quaternion rotating unit vector ``source`` onto ``target``."""
+    source = source / np.linalg.norm(source)
+    target = target / np.linalg.norm(target)
+    cosine = float(np.dot(source, target))
+    if cosine < -1.0 + 1e-9:
+        # Opposite vectors: rotate 180 deg about any perpendicular axis
+        axis = np.cross(source, [1.0, 0.0, 0.0])
+        if np.linalg.norm(axis) < 1e-6:
+            axis = np.cross(source, [0.0, 1.0, 0.0])
+        axis /= np.linalg.norm(axis)
+        return np.array([0.0, *axis])
+    q = np.array([1.0 + cosine, *np.cross(source, target)])
+    return q / np.linalg.norm(q)
+
+
+def bone_tilt(quats: np.ndarray) -> np.ndarray:
+    """Angle in degrees between each bone axis and world down."""
+    bone = rotate_vectors(quats, BONE_AXIS)
+    cosine = bone @ WORLD_DOWN / np.linalg.norm(bone, axis=-1)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def compute_calibration(quats_by_tag: dict[int, np.ndarray], window: tuple[int, int]) -> dict[int, dict[str, Any]]:
+    """Sensor-to-segment offsets from the static pose in ``window``."""
+    start, end = window
+    sensors = {}
+    for tag, quats in quats_by_tag.items():
+        static = mean_quaternion(np.asarray(quats[start:end], dtype=np.float64))
+        world_fix = shortest_arc(rotate_vectors(static, BONE_AXIS), WORLD_DOWN)
+        # Express the world-frame correction in the sensor's body frame
+        offset = quat_multiply(quat_multiply(quat_conjugate(static), world_fix), static)
+        sensors[int(tag)] = {
+            "offset": offset.tolist(),
+            "static_tilt_deg": round(float(bone_tilt(static[None, :])[0]), 3),
+        }
+    return sensors
+
+
+def apply_calibration(quats: np.ndarray, offset) -> np.ndarray:
+    """Segment orientations ``q_sensor * q_offset`` for ``(N, 4)`` sensor quaternions."""
+    return quat_multiply(quats, np.asarray(offset, dtype=np.float64)[None, :])
+
+
+def drift_deg(quats_by_tag: dict[int, np.ndarray], window: tuple[int, int], calibration: dict[str, Any]) -> float:
+    """Largest residual bone tilt of the static pose after applying a cached calibration."""
+    start, end = window
+    worst = 0.0
+    for tag, quats in quats_by_tag.items():
+        sensor = calibration["sensors"].get(str(tag))
+        if sensor is None:
+            return float("inf")
+        static = mean_quaternion(np.asarray(quats[start:end], dtype=np.float64))
+        corrected = apply_calibration(static[None, :], sensor["offset"])
+        worst = max(worst, float(bone_tilt(corrected)[0]))
+    return worst
+
+
+def _patient_dir(patient_id: str) -> Path:
+    if not PATIENT_ID_PATTERN.match(str(patient_id or "")):
+        raise ValueError("Invalid patient id")
+    return get_recordings_dir() / CALIBRATIONS_DIRNAME / str(patient_id)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def load_calibrations(patient_id: str, sensor_set: str) -> list[dict[str, Any]]:
+    try:
+        with open(_patient_dir(patient_id) / f"{sensor_set}.json", "r", encoding="utf-8") as handle:
+            return json.load(handle).get("calibrations") or []
+    except FileNotFoundError:
+        return []
+
+
+@contextmanager
+def _cache_lock(directory: Path, sensor_set: str):
+    """Serialize read-modify-write of one cache file across processes and threads."""
+    with open(directory / f".{sensor_set}.lock", "w") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def save_calibration(patient_id: str, sensor_set: str, calibration: dict[str, Any]) -> None:
+    """Add a calibration to the cache (atomic rewrite, newest kept first)."""
+    directory = _patient_dir(patient_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    with _cache_lock(directory, sensor_set):
+        calibrations = [calibration] + [
+            entry for entry in load_calibrations(patient_id, sensor_set)
+            if entry.get("source_recording_id") != calibration.get("source_recording_id")
+        ]
+        calibrations.sort(key=lambda entry: entry.get("recorded_at") or "", reverse=True)
+        payload = {
+            "patient_id": patient_id,
+            "sensor_set": sensor_set,
+            "calibrations": calibrations[:MAX_CACHED_CALIBRATIONS],
+        }
+        path = directory / f"{sensor_set}.json"
+        staging = directory / f".{sensor_set}.json.tmp-{uuid.uuid4().hex}"
+        with open(staging, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, indent=2)
+        os.replace(staging, path)
+
+
+def calibration_cache_digest(patient_id: Optional[str]) -> Optional[str]:
+    """
+    SHA-256 over a patient's cached calibrations (creation times left out),
+    or None when nothing is cached. Changes whenever a lookup could.
+    """
+    if not patient_id or not PATIENT_ID_PATTERN.match(str(patient_id)):
+        return None
+    directory = _patient_dir(patient_id)
+    if not directory.is_dir():
+        return None
+    digest = hashlib.sha256()
+    for path in sorted(directory.glob("*.json")):
+        if path.name.startswith("."):
+            continue
+        entries = load_calibrations(patient_id, path.stem)
+        digest.update(path.stem.encode())
+        digest.update(json.dumps(
+            [{key: value for key, value in entry.items() if key != "created_at"} for entry in entries],
+            sort_keys=True,
+        ).encode())
+    return digest.hexdigest()
+
+
+def find_calibration(patient_id: str, sensor_set: str, at: datetime) -> Optional[dict[str, Any]]:
+    """Most recent cached calibration whose validity window contains ``at``."""
+    for entry in load_calibrations(patient_id, sensor_set):
+        recorded_at = _parse_time(entry.get("recorded_at"))
+        valid_until = _parse_time(entry.get("valid_until"))
+        if recorded_at and valid_until and recorded_at <= at < valid_until:
+            return entry
+    return None
+
+
+def resolve_calibration(
+    patient_id: Optional[str],
+    quats_by_tag: dict[int, np.ndarray],
+    seconds: np.ndarray,
+    recorded_at: Optional[str] = None,
+    recording_id: Optional[str] = None,
+    force: bool = False,
+    persist: bool = True,
+) -> dict[str, Any]:
+    """
+    Calibration for one recording: cached when still valid and drift-free,
+    otherwise recomputed from the recording's opening static pose. A new
+    calibration is only added to the cache when ``persist`` is set.
+
+    Returns ``{"status", "offsets", ...}`` where ``status`` is ``cached``,
+    ``recalibrated`` or ``uncalibrated`` and ``offsets`` maps tag to the
+    ``[w, x, y, z]`` offset (empty when uncalibrated).
+    """
+    at = _parse_time(recorded_at) or datetime.now(timezone.utc)
+    sensor_set = sensor_set_key(quats_by_tag)
+    reference = quats_by_tag.get(min(quats_by_tag)) if quats_by_tag else None
+    window = find_static_window(reference, seconds) if reference is not None else None
+    if window is not None:
+        # Every sensor has to be still, not just the first one
+        for quats in quats_by_tag.values():
+            if find_static_window(quats[window[0] : window[1]], seconds[window[0] : window[1]], search_seconds=None) is None:
+                window = None
+                break
+
+    cached = None if force or not patient_id else find_calibration(patient_id, sensor_set, at)
+    drift = None
+    if cached is not None:
+        if window is None:
+            return _result("cached", cached, None)
+        drift = drift_deg(quats_by_tag, window, cached)
+        if drift <= DRIFT_THRESHOLD_DEG:
+            return _result("cached", cached, drift)
+
+    if window is None:
+        return {"status": "uncalibrated", "offsets": {}, "drift_deg": drift, "sensor_set": sensor_set}
+
+    calibration = {
+        "sensor_set": sensor_set,
+        "source_recording_id": recording_id,
+        "recorded_at": at.isoformat(),
+        "valid_until": (at + get_validity_window()).isoformat(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "static_window": [float(seconds[window[0]]), float(seconds[window[1] - 1])],
+        "sensors": {str(tag): sensor for tag, sensor in compute_calibration(quats_by_tag, window).items()},
+    }
+    if patient_id and persist:
+        save_calibration(patient_id, sensor_set, calibration)
+    return _result("recalibrated", calibration, drift)
+
+
+def _result(status: str, calibration: dict[str, Any], drift: Optional[float]) -> dict[str, Any]:
+    return {
+        "status": status,
+        "offsets": {int(tag): sensor["offset"] for tag, sensor in calibration["sensors"].items()},
+        "drift_deg": None if drift is None else round(drift, 3),
+        "sensor_set": calibration["sensor_set"],
+        "source_recording_id": calibration.get("source_recording_id"),
+        "recorded_at": calibration.get("recorded_at"),
+        "valid_until": calibration.get("valid_until"),
+    }
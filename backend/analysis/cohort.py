@@ -0,0 +1,216 @@
+"""
+Cohort analytics over all metrics of a doctor's active patients.
+
+The metrics are loaded once into flat NumPy arrays (one entry per metrics
+row, patients/joints/sides as integer codes) and every statistic is a
+whole-array group operation (``bincount``, ``searchsorted``), so the cost
+does not grow with per-patient Python loops or queries.
+
+There is no surgery date in the schema, so "week N" is the patient's
+program week: week 1 starts at their first session with metrics.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Hashable, Iterable, Optional
+
+import numpy as np
+
+JOINTS = ("knee", "hip")
+SIDES = ("left", "right")
+WEEK_SECONDS = 7 * 24 * 3600.0
+COHORT_PERCENTILES = (10, 25, 50, 75, 90)
+MAX_CACHED_COHORTS = 256
+
+
+def _code(value: Optional[str], names: tuple[str, ...]) -> int:
+    value = (value or "").lower()
+    return names.index(value) if value in names else -1
+
+
+def _timestamp(moment: datetime) -> float:
+    # DATETIME columns come back naive and hold UTC
+    return (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def build_cohort(rows: Iterable[tuple], columns: tuple[str, ...]) -> dict[str, Any]:
+    """
+    Arrays for ``rows`` of ``(patient_id, joint, side, time, *values)`` where
+    ``values`` follow ``columns``.
+
+    Returns ``{"patient_ids", "patient", "joint", "side", "seconds",
+    "program_week", "values": {column: array}}``.
+    """
+    patient_ids: list[str] = []
+    index_of: dict[str, int] = {}
+    patient, joint, side, seconds, values = [], [], [], [], []
+    for row in rows:
+        patient_id = str(row[0])
+        if patient_id not in index_of:
+            index_of[patient_id] = len(patient_ids)
+            patient_ids.append(patient_id)
+        patient.append(index_of[patient_id])
+        joint.append(_code(row[1], JOINTS))
+        side.append(_code(row[2], SIDES))
+        seconds.append(_timestamp(row[3]))
+        values.append(row[4:])
+
+    patient_array = np.asarray(patient, dtype=np.int64)
+    seconds_array = np.asarray(seconds, dtype=np.float64)
+    first = np.full(len(patient_ids), np.inf)
+    np.minimum.at(first, patient_array, seconds_array)
+    program_week = (
+        np.floor((seconds_array - first[patient_array]) / WEEK_SECONDS).astype(np.int64) + 1
+        if len(patient_array) else np.zeros(0, dtype=np.int64)
+    )
+    table = np.asarray(values, dtype=np.float64).reshape(len(values), len(columns))
+    return {
+        "patient_ids": patient_ids,
+        "patient": patient_array,
+        "joint": np.asarray(joint, dtype=np.int64),
+        "side": np.asarray(side, dtype=np.int64),
+        "seconds": seconds_array,
+        "program_week": program_week,
+        "values": {column: table[:, i] for i, column in enumerate(columns)},
+    }
+
+
+def _group_means(groups: np.ndarray, values: np.ndarray, size: int) -> tuple[np.ndarray, np.ndarray]:
+    counts = np.bincount(groups, minlength=size)
+    sums = np.bincount(groups, weights=values, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan), counts
+
+
+def percentile_ranks(values: np.ndarray) -> np.ndarray:
+    """Percent of ``values`` below each value, counting ties as half."""
+    ordered = np.sort(values)
+    below = np.searchsorted(ordered, values, side="left")
+    at_or_below = np.searchsorted(ordered, values, side="right")
+    return 100.0 * (below + at_or_below) / (2.0 * len(values)) if len(values) else np.zeros(0)
+
+
+def z_scores(values: np.ndarray) -> np.ndarray:
+    std = float(np.std(values)) if len(values) else 0.0
+    return (values - np.mean(values)) / std if std > 0 else np.zeros(len(values))
+
+
+def asymmetry_index(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Symmetry index ``100 * (right - left) / mean(right, left)``; NaN when undefined."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        index = 100.0 * (right - left) / ((right + left) / 2.0)
+    return np.where(np.isfinite(index), index, np.nan)
+
+
+def _optional(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+
+def cohort_analytics(
+    cohort: dict[str, Any],
+    column: str,
+    joint: str = "knee",
+    side: Optional[str] = None,
+    week: Optional[int] = None,
+) -> dict[str, Any]:
+    """
+    Where every patient sits in the cohort for one metric.
+
+    Each patient's value is the mean of their entries for ``joint`` (and
+    ``side``, and program ``week`` when given). Patients get a percentile
+    rank and z-score against the others and a left/right asymmetry index
+    from their per-side means of the same entries (ignoring ``side``).
+    """
+    patients = len(cohort["patient_ids"])
+    values = cohort["values"][column]
+    selected = (cohort["joint"] == _code(joint, JOINTS)) & np.isfinite(values)
+    if week is not None:
+        selected &= cohort["program_week"] == week
+    in_side = selected & (cohort["side"] == _code(side, SIDES)) if side else selected
+
+    means, counts = _group_means(cohort["patient"][in_side], values[in_side], patients)
+    sided = selected & (cohort["side"] >= 0)
+    side_means, _ = _group_means(
+        cohort["patient"][sided] * len(SIDES) + cohort["side"][sided], values[sided], patients * len(SIDES)
+    )
+    side_means = side_means.reshape(patients, len(SIDES))
+    left, right = side_means[:, SIDES.index("left")], side_means[:, SIDES.index("right")]
+    asymmetry = asymmetry_index(left, right)
+
+    present = np.flatnonzero(counts > 0)
+    cohort_values = means[present]
+    ranks = percentile_ranks(cohort_values)
+    scores = z_scores(cohort_values)
+
+    rows = [
+        {
+            "patientId": cohort["patient_ids"][patient],
+            "entries": int(counts[patient]),
+            "value": float(means[patient]),
+            "percentile": float(rank),
+            "zScore": float(score),
+            "left": _optional(left[patient]),
+            "right": _optional(right[patient]),
+            "asymmetryIndex": _optional(asymmetry[patient]),
+        }
+        for patient, rank, score in zip(present, ranks, scores)
+    ]
+    rows.sort(key=lambda row: row["value"], reverse=True)
+
+    summary: dict[str, Any] = {"patients": len(present)}
+    if len(present):
+        summary.update({"mean": float(np.mean(cohort_values)), "std": float(np.std(cohort_values))})
+        summary.update({
+            f"p{q}": float(value)
+            for q, value in zip(COHORT_PERCENTILES, np.percentile(cohort_values, COHORT_PERCENTILES))
+        })
+    return {
+        "metric": column,
+        "joint": joint,
+        "side": side,
+        "week": week,
+        "cohort": summary,
+        "patients": rows,
+    }
+
+
+class CohortCache:
+    """
+    Loaded cohorts of this process, per doctor, kept while their fingerprint
+    (a cheap summary of the doctor's metrics, see ``db``) is unchanged.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_COHORTS):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[Hashable, dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doctor_id: str, fingerprint: Hashable) -> Optional[dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(doctor_id)
+            if entry is None or entry[0] != fingerprint:
+                return None
+            self._entries.move_to_end(doctor_id)
+            return entry[1]
+
+    def put(self, doctor_id: str, fingerprint: Hashable, cohort: dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[doctor_id] = (fingerprint, cohort)
+            self._entries.move_to_end(doctor_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doctor_id: Optional[str] = None) -> None:
+        """Drop one doctor's cohort, or every cohort when ``doctor_id`` is None."""
+        with self._lock:
+            if doctor_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(doctor_id, None)
+
+    def invalidate_many(self, doctor_ids: Iterable[str]) -> None:
+        """Drop the cohorts of several doctors under one lock."""
+        with self._lock:
+            for doctor_id in doctor_ids:
+                self._entries.pop(doctor_id, None)
@@ -0,0 +1,101 @@
+"""
+Center-of-mass displacement from the pelvis sensor's acceleration.
+
+The pelvis sensor sits close to the body's center of mass. Its gravity-free
+acceleration is integrated twice over every repetition. Each repetition
+starts and ends at rest in the same posture, so velocity and position are
+detrended linearly to zero at both ends (the zero-velocity update that
+keeps integration drift from accumulating). All repetitions are processed
+together with segment-wise cumulative sums, without a loop over reps.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from .kinematics import rotate_vectors
+
+GRAVITY = 9.81  # m/s^2, DOT world frame is Z-up
+FREE_ACC_CHANNELS = ("FreeAcc_X", "FreeAcc_Y", "FreeAcc_Z")
+SENSOR_ACC_CHANNELS = ("Acc_X", "Acc_Y", "Acc_Z")
+VERTICAL_AXIS = 2
+
+
+def world_acceleration(sensor: dict[str, np.ndarray]) -> Optional[np.ndarray]:
+    """
+    ``(N, 3)`` gravity-free acceleration in the world frame, or None.
+
+    DOT ``FreeAcc_*`` is already expressed in the world frame with gravity
+    removed. Exports that only carry sensor-frame ``Acc_*`` are rotated with
+    the orientation quaternions and gravity is subtracted.
+    """
+    if all(name in sensor for name in FREE_ACC_CHANNELS):
+        return np.column_stack([np.asarray(sensor[name], dtype=np.float64) for name in FREE_ACC_CHANNELS])
+    if all(name in sensor for name in SENSOR_ACC_CHANNELS) and "quat" in sensor:
+        acc = np.column_stack([np.asarray(sensor[name], dtype=np.float64) for name in SENSOR_ACC_CHANNELS])
+        world = rotate_vectors(sensor["quat"], acc)
+        world[:, VERTICAL_AXIS] -= GRAVITY
+        return world
+    return None
+
+
+def _integrate_segments(values: np.ndarray, seconds: np.ndarray, starts: np.ndarray, segment_of: np.ndarray) -> np.ndarray:
+    """Trapezoidal running integral that restarts from zero at every segment start."""
+    increments = np.zeros_like(values)
+    increments[1:] = 0.5 * (values[1:] + values[:-1]) * np.diff(seconds)[:, None]
+    increments[starts] = 0.0
+    running = np.cumsum(increments, axis=0)
+    return running - running[starts][segment_of]
+
+
+def _detrend_segments(values: np.ndarray, seconds: np.ndarray, starts: np.ndarray, ends: np.ndarray, segment_of: np.ndarray) -> np.ndarray:
+    """Remove the straight line joining each segment's first and last sample."""
+    last = ends - 1
+    span = seconds[last] - seconds[starts]
+    fraction = (seconds - seconds[starts][segment_of]) / np.where(span > 0, span, 1.0)[segment_of]
+    first_value = values[starts][segment_of]
+    drift = values[last][segment_of] - first_value
+    return values - first_value - fraction[:, None] * drift
+
+
+def displacement_per_rep(
+    acceleration: np.ndarray,
+    seconds: np.ndarray,
+    boundaries: np.ndarray,
+    valid: Optional[np.ndarray] = None,
+    axis: int = VERTICAL_AXIS,
+) -> np.ndarray:
+    """
+    Peak-to-peak COM displacement in cm along ``axis`` for each repetition.
+
+    ``boundaries`` are the rep start indices followed by the series length,
+    as returned by ``repetitions.detect_repetitions``. Reps containing
+    invalid samples (long packet-loss gaps) get NaN.
+    """
+    boundaries = np.asarray(boundaries, dtype=np.intp)
+    starts, ends = boundaries[:-1], boundaries[1:]
+    keep = ends - starts >= 2
+    result = np.full(len(starts), np.nan)
+    if not keep.any():
+        return result
+
+    first, last = int(starts[0]), int(ends[-1])
+    acc = np.asarray(acceleration, dtype=np.float64)[first:last]
+    t = np.asarray(seconds, dtype=np.float64)[first:last]
+    local_starts, local_ends = starts - first, ends - first
+    segment_of = np.repeat(np.arange(len(starts)), ends - starts)
+
+    velocity = _detrend_segments(
+        _integrate_segments(acc, t, local_starts, segment_of), t, local_starts, local_ends, segment_of
+    )
+    position = _detrend_segments(
+        _integrate_segments(velocity, t, local_starts, segment_of), t, local_starts, local_ends, segment_of
+    )
+    along = position[:, axis]
+    result = (np.maximum.reduceat(along, local_starts) - np.minimum.reduceat(along, local_starts)) * 100.0
+
+    result[~keep] = np.nan
+    if valid is not None:
+        invalid = np.add.reduceat((~np.asarray(valid, dtype=bool)[first:last]).astype(np.int64), local_starts)
+        result[invalid > 0] = np.nan
+    return result
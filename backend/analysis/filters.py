@@ -0,0 +1,235 @@
+"""
+Pure-NumPy smoothing, zero-phase filtering and differentiation.
+
+Every function takes arrays shaped ``(N,)`` or ``(N, C)`` (samples along
+axis 0, one column per channel) and processes all channels at once.
+
+IIR filtering is done in the frequency domain: the response of the
+second-order sections is evaluated on the FFT grid, and zero-phase
+forward-backward filtering becomes a multiplication by ``|H|**2``. With
+enough zero padding this equals running the recursion forwards then
+backwards from rest, without a per-sample Python loop.
+"""
+
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Low-pass applied to joint angles before differentiation (common
+# biomechanics choice for walking/sit-to-stand style movements)
+VELOCITY_CUTOFF_HZ = 6.0
+VELOCITY_FILTER_ORDER = 4
+
+
+def _as_columns(values: np.ndarray) -> tuple[np.ndarray, bool]:
+    array = np.asarray(values, dtype=np.float64)
+    if array.ndim == 1:
+        return array[:, None], True
+    if array.ndim != 2:
+        raise ValueError("Expected a 1-D or 2-D (samples, channels) array")
+    return array, False
+
+
+def _restore(array: np.ndarray, was_1d: bool) -> np.ndarray:
+    return array[:, 0] if was_1d else array
+
+
+def savgol_matrix(window: int, polyorder: int, deriv: int = 0, delta: float = 1.0) -> np.ndarray:
+    """
+    ``(window, window)`` matrix whose row ``i`` evaluates the ``deriv``-th
+    derivative of the least-squares polynomial at position ``i`` of a window.
+    The middle row holds the classic Savitzky–Golay coefficients.
+    """
+    if window % 2 == 0 or window < 1:
+        raise ValueError("window must be a positive odd number")
+    if polyorder >= window:
+        raise ValueError("polyorder must be less than window")
+    positions = np.arange(window, dtype=np.float64) - window // 2
+    vandermonde = positions[:, None] ** np.arange(polyorder + 1)
+    fit = np.linalg.pinv(vandermonde)  # polynomial coefficients from samples
+
+    powers = np.arange(polyorder + 1)
+    factor = np.ones(polyorder + 1)
+    for k in range(deriv):
+        factor *= np.maximum(powers - k, 0)
+    shifted = np.maximum(powers - deriv, 0)
+    evaluate = np.where(powers >= deriv, factor * positions[:, None] ** shifted, 0.0)
+    return evaluate @ fit / delta**deriv
+
+
+def savgol_filter(
+    values: np.ndarray,
+    window: int,
+    polyorder: int,
+    deriv: int = 0,
+    delta: float = 1.0,
+) -> np.ndarray:
+    """
+    Savitzky–Golay smoothing (or derivative) of uniformly sampled channels.
+
+    Interior samples use the centered coefficients; the first and last
+    ``window // 2`` samples evaluate the polynomial fitted to the first/last
+    full window, so edges are not biased by padding.
+    """
+    columns, was_1d = _as_columns(values)
+    n = len(columns)
+    if n < window:
+        raise ValueError("Series is shorter than the filter window")
+    matrix = savgol_matrix(window, polyorder, deriv, delta)
+    half = window // 2
+
+    out = np.empty_like(columns)
+    windows = sliding_window_view(columns, window, axis=0)  # (n - window + 1, C, window)
+    out[half : n - half] = windows @ matrix[half]
+    out[:half] = matrix[:half] @ columns[:window]
+    out[n - half :] = matrix[half + 1 :] @ columns[n - window :]
+    return _restore(out, was_1d)
+
+
+def butter_sos(order: int, cutoff: float, fs: float, btype: str = "low") -> np.ndarray:
+    """
+    Digital Butterworth filter as ``(sections, 6)`` second-order sections
+    ``[b0, b1, b2, 1, a1, a2]`` (bilinear transform with pre-warping).
+    """
+    if btype not in ("low", "high"):
+        raise ValueError("btype must be 'low' or 'high'")
+    if not 0 < cutoff < fs / 2:
+        raise ValueError("cutoff must be between 0 and the Nyquist frequency")
+
+    warped = 2.0 * fs * np.tan(np.pi * cutoff / fs)
+    k = np.arange(1, order + 1)
+    prototype = np.exp(1j * np.pi * (2 * k + order - 1) / (2 * order))
+    analog = prototype * warped if btype == "low" else warped / prototype
+    poles = (2.0 * fs + analog) / (2.0 * fs - analog)
+    zero = -1.0 if btype == "low" else 1.0
+
+    # One section per conjugate pair, plus a first-order section for odd orders
+    pairs = poles[poles.imag > 1e-12]
+    real = poles[np.abs(poles.imag) <= 1e-12].real
+    sections = [[1.0, -2.0 * zero, 1.0, 1.0, -2.0 * p.real, abs(p) ** 2] for p in pairs]
+    sections += [[1.0, -zero, 0.0, 1.0, -p, 0.0] for p in real]
+    sos = np.array(sections, dtype=np.float64)
+
+    # Unity gain at DC (low-pass) or Nyquist (high-pass), per section
+    z = 1.0 if btype == "low" else -1.0
+    numerator = sos[:, 0] + sos[:, 1] / z + sos[:, 2] / z**2
+    denominator = sos[:, 3] + sos[:, 4] / z + sos[:, 5] / z**2
+    sos[:, :3] *= (denominator / numerator)[:, None]
+    return sos
+
+
+def sos_response(sos: np.ndarray, n_fft: int) -> np.ndarray:
+    """Complex response of the cascade at the ``rfft`` frequencies of ``n_fft``."""
+    z_inv = np.exp(-2j * np.pi * np.fft.rfftfreq(n_fft))
+    z_inv2 = z_inv * z_inv
+    response = np.ones_like(z_inv)
+    for b0, b1, b2, a0, a1, a2 in sos:
+        response *= (b0 + b1 * z_inv + b2 * z_inv2) / (a0 + a1 * z_inv + a2 * z_inv2)
+    return response
+
+
+def _impulse_length(sos: np.ndarray, tolerance: float = 1e-10) -> int:
+    """Samples until the slowest pole has decayed below ``tolerance``."""
+    radii = []
+    for _, _, _, _, a1, a2 in sos:
+        roots = np.roots([1.0, a1, a2]) if a2 else np.array([-a1])
+        radii.append(np.max(np.abs(roots)))
+    radius = max(radii)
+    return int(np.ceil(np.log(tolerance) / np.log(radius))) if radius > 0 else 1
+
+
+def _fft_size(n: int) -> int:
+    return 1 << int(np.ceil(np.log2(max(n, 2))))
+
+
+def sosfilt(sos: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Causal filtering from rest (equivalent to running the recursion forwards)."""
+    columns, was_1d = _as_columns(values)
+    n = len(columns)
+    n_fft = _fft_size(n + _impulse_length(sos))
+    spectrum = np.fft.rfft(columns, n_fft, axis=0) * sos_response(sos, n_fft)[:, None]
+    return _restore(np.fft.irfft(spectrum, n_fft, axis=0)[:n], was_1d)
+
+
+def sosfiltfilt(sos: np.ndarray, values: np.ndarray, padlen: Optional[int] = None) -> np.ndarray:
+    """
+    Zero-phase forward-backward filtering.
+
+    Each end is extended by an odd reflection of ``padlen`` samples (default
+    ``3 * (2 * sections + 1)``, as in SciPy) so the filter starts in a state
+    close to the signal instead of ringing up from zero.
+    """
+    columns, was_1d = _as_columns(values)
+    n = len(columns)
+    if padlen is None:
+        padlen = 3 * (2 * len(sos) + 1)
+    padlen = min(padlen, n - 1)
+    if padlen > 0:
+        head = 2 * columns[0] - columns[padlen:0:-1]
+        tail = 2 * columns[-1] - columns[-2 : -padlen - 2 : -1]
+        extended = np.concatenate([head, columns, tail])
+    else:
+        extended = columns
+
+    m = len(extended)
+    tail_length = _impulse_length(sos)
+    n_fft = _fft_size(m + 2 * tail_length)
+    gain = np.abs(sos_response(sos, n_fft)) ** 2
+    filtered = np.fft.irfft(np.fft.rfft(extended, n_fft, axis=0) * gain[:, None], n_fft, axis=0)
+    return _restore(filtered[padlen : padlen + n], was_1d)
+
+
+def derivative(values: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+    """
+    Time derivative by central differences on (possibly non-uniform) timestamps.
+
+    Interior points use the second-order accurate three-point formula for
+    unequal spacing, the ends one-sided differences. Repeated timestamps
+    yield NaN rather than infinities.
+    """
+    columns, was_1d = _as_columns(values)
+    seconds = np.asarray(seconds, dtype=np.float64)
+    n = len(columns)
+    if n < 2:
+        return _restore(np.zeros_like(columns), was_1d)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        h = np.diff(seconds)[:, None]
+        out = np.empty_like(columns)
+        out[0] = (columns[1] - columns[0]) / h[0]
+        out[-1] = (columns[-1] - columns[-2]) / h[-1]
+        if n > 2:
+            h0, h1 = h[:-1], h[1:]
+            out[1:-1] = (
+                h0**2 * columns[2:] - h1**2 * columns[:-2] + (h1**2 - h0**2) * columns[1:-1]
+            ) / (h0 * h1 * (h0 + h1))
+    out[~np.isfinite(out)] = np.nan
+    return _restore(out, was_1d)
+
+
+def sample_rate(seconds: np.ndarray) -> float:
+    """Sampling rate from the median timestamp step (0 when unknown)."""
+    if len(seconds) < 2:
+        return 0.0
+    step = float(np.median(np.diff(np.asarray(seconds, dtype=np.float64))))
+    return 1.0 / step if step > 0 else 0.0
+
+
+def smooth_derivative(
+    values: np.ndarray,
+    seconds: np.ndarray,
+    cutoff: float = VELOCITY_CUTOFF_HZ,
+    order: int = VELOCITY_FILTER_ORDER,
+) -> np.ndarray:
+    """
+    Zero-phase Butterworth low-pass followed by a central-difference derivative.
+
+    Falls back to the raw derivative when the series is too short to filter
+    or the cutoff is above the Nyquist frequency.
+    """
+    fs = sample_rate(seconds)
+    columns = np.asarray(values, dtype=np.float64)
+    if fs > 2 * cutoff and len(columns) > 3 * (order + 1):
+        columns = sosfiltfilt(butter_sos(order, cutoff, fs), columns)
+    return derivative(columns, seconds)
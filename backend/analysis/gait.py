@@ -0,0 +1,162 @@
+"""
+Step and cadence detection for walking recordings from the shank sensors.
+
+The shank swings forward once per stride, producing the largest angular
+rate of the gait cycle (mid-swing). The heel strike that ends the swing is
+the sharp acceleration spike shortly after that peak. Mid-swing peaks are
+found on the low-passed angular speed with the same peak helpers as the
+repetition stage, and every heel strike is located inside a short window
+after its peak with one ``sliding_window_view`` lookup, so a recording of
+any length is processed without a per-sample or per-step Python loop.
+
+Angular speed comes from ``Gyr_*`` when the export has it and otherwise from
+consecutive orientation quaternions; both are independent of the
+sensor-to-segment calibration.
+"""
+
+from typing import Any, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .com import FREE_ACC_CHANNELS
+from .filters import butter_sos, sample_rate, sosfiltfilt
+from .repetitions import local_maxima, suppress_close_peaks
+
+GAIT_EXERCISE_TYPE = "general_walking"
+GYRO_CHANNELS = ("Gyr_X", "Gyr_Y", "Gyr_Z")
+
+SWING_CUTOFF_HZ = 4.0
+# Mid-swing peaks must exceed both limits (deg/s)
+MIN_SWING_SPEED = 100.0
+SWING_PEAK_FRAC = 0.4
+# Heel strike follows mid-swing within this window
+HEEL_STRIKE_WINDOW_SECONDS = 0.35
+# Stride times outside this range are pauses, turns or missed steps
+MIN_STRIDE_SECONDS = 0.7
+MAX_STRIDE_SECONDS = 2.5
+
+
+def angular_speed(sensor: dict[str, np.ndarray], seconds: np.ndarray) -> Optional[np.ndarray]:
+    """Magnitude of the angular rate in deg/s, or None without gyro or orientation data."""
+    if all(name in sensor for name in GYRO_CHANNELS):
+        gyro = np.column_stack([np.asarray(sensor[name], dtype=np.float64) for name in GYRO_CHANNELS])
+        return np.linalg.norm(gyro, axis=1)
+    if "quat" not in sensor or len(seconds) < 2:
+        return None
+    quats = np.asarray(sensor["quat"], dtype=np.float64)
+    dot = np.abs(np.einsum("ij,ij->i", quats[1:], quats[:-1]))
+    step = np.degrees(2.0 * np.arccos(np.clip(dot, -1.0, 1.0)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = step / np.diff(seconds)
+    rate = np.nan_to_num(rate, nan=0.0, posinf=0.0)
+    # Rate between samples i and i+1, assigned to both neighbours
+    speed = np.empty(len(quats))
+    speed[0], speed[-1] = rate[0], rate[-1]
+    speed[1:-1] = 0.5 * (rate[1:] + rate[:-1])
+    return speed
+
+
+def _window_argmax(values: np.ndarray, starts: np.ndarray, width: int) -> np.ndarray:
+    """Index of the maximum of ``values[s:s + width]`` for every start ``s``."""
+    padded = np.concatenate([values, np.full(width - 1, -np.inf)])
+    return starts + sliding_window_view(padded, width)[starts].argmax(axis=1)
+
+
+def detect_heel_strikes(
+    speed: np.ndarray,
+    seconds: np.ndarray,
+    acceleration: Optional[np.ndarray] = None,
+    valid: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Sample indices of heel strikes of one leg.
+
+    Heel strike is the largest acceleration magnitude within
+    ``HEEL_STRIKE_WINDOW_SECONDS`` after each mid-swing peak, or the end of
+    the swing (lowest angular speed in that window) when no acceleration is
+    available. Strikes on invalid samples are dropped.
+    """
+    speed = np.asarray(speed, dtype=np.float64)
+    seconds = np.asarray(seconds, dtype=np.float64)
+    fs = sample_rate(seconds)
+    if fs <= 0 or len(speed) < 3:
+        return np.zeros(0, dtype=np.intp)
+
+    smoothed = speed
+    if fs > 2 * SWING_CUTOFF_HZ and len(speed) > 15:
+        smoothed = sosfiltfilt(butter_sos(4, SWING_CUTOFF_HZ, fs), speed)
+
+    peaks = local_maxima(smoothed)
+    threshold = max(MIN_SWING_SPEED, SWING_PEAK_FRAC * float(np.percentile(smoothed, 99)))
+    peaks = peaks[smoothed[peaks] >= threshold]
+    peaks = suppress_close_peaks(smoothed, peaks, int(np.ceil(MIN_STRIDE_SECONDS * fs)))
+    if len(peaks) == 0:
+        return peaks
+
+    width = max(2, int(round(HEEL_STRIKE_WINDOW_SECONDS * fs)))
+    if acceleration is not None:
+        magnitude = np.linalg.norm(np.asarray(acceleration, dtype=np.float64).reshape(len(speed), -1), axis=1)
+        strikes = _window_argmax(magnitude, peaks, width)
+    else:
+        strikes = _window_argmax(-smoothed, peaks, width)
+    strikes = np.minimum(strikes, len(speed) - 1)
+    if valid is not None:
+        strikes = strikes[np.asarray(valid, dtype=bool)[strikes]]
+    return strikes
+
+
+def stride_times(strike_seconds: np.ndarray) -> np.ndarray:
+    """Durations between consecutive heel strikes of one leg, pauses excluded."""
+    strides = np.diff(np.asarray(strike_seconds, dtype=np.float64))
+    return strides[(strides >= MIN_STRIDE_SECONDS) & (strides <= MAX_STRIDE_SECONDS)]
+
+
+def _variation(values: np.ndarray) -> Optional[float]:
+    if len(values) < 2:
+        return None
+    return float(np.std(values, ddof=1) / np.mean(values) * 100.0)
+
+
+def summarize_gait(sensors_by_side: dict[str, dict[str, np.ndarray]], seconds: np.ndarray) -> Optional[dict[str, Any]]:
+    """
+    Step count, cadence and stride-time variability from shank sensors.
+
+    ``sensors_by_side`` maps ``left``/``right`` to aligned sensor dicts (see
+    ``alignment.align_sensors``). Returns None when no side has enough data.
+    ``cadence`` is steps per minute while walking (two steps per stride, so
+    pauses do not lower it), ``stride_time_cv`` the coefficient of variation
+    of stride time in percent, averaged over the sides.
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    sides = {}
+    all_strides = []
+    for side, sensor in sensors_by_side.items():
+        speed = angular_speed(sensor, seconds)
+        if speed is None:
+            continue
+        acceleration = None
+        if all(name in sensor for name in FREE_ACC_CHANNELS):
+            acceleration = np.column_stack([np.asarray(sensor[name], dtype=np.float64) for name in FREE_ACC_CHANNELS])
+        strikes = detect_heel_strikes(speed, seconds, acceleration, sensor.get("valid"))
+        strides = stride_times(seconds[strikes])
+        all_strides.append(strides)
+        sides[side] = {
+            "heel_strikes": int(len(strikes)),
+            "strides": int(len(strides)),
+            "stride_time": float(np.mean(strides)) if len(strides) else None,
+            "stride_time_cv": _variation(strides),
+        }
+    if not sides:
+        return None
+
+    strides = np.concatenate(all_strides)
+    side_cvs = [report["stride_time_cv"] for report in sides.values() if report["stride_time_cv"] is not None]
+    stride_time = float(np.mean(strides)) if len(strides) else None
+    return {
+        "steps": sum(report["heel_strikes"] for report in sides.values()),
+        "cadence": 120.0 / stride_time if stride_time else None,
+        "stride_time": stride_time,
+        "stride_time_cv": float(np.mean(side_cvs)) if side_cvs else None,
+        "sides": sides,
+    }
@@ -0,0 +1,86 @@
+"""
+Hip flexion and abduction from pelvis and thigh orientations.
+
+Vectorized port of ``hipFlexSeries`` / ``hipAbductionSeries`` from
+``frontend/app/analysis/kinematics.ts``: the thigh orientation is expressed
+in the pelvis frame (``R_rel = Rp^T Rt``, pelvis axes x=right, y=up,
+z=forward), the sagittal angle of each thigh axis is unwrapped, and the
+axis whose range of motion is physiologically plausible is kept.
+"""
+
+from typing import Any
+
+import numpy as np
+
+from .kinematics import quat_to_matrix, relative_rotation, unwrap_degrees
+
+# Hip flexion ROM considered plausible when choosing the thigh axis
+PLAUSIBLE_FLEXION_ROM = (40.0, 140.0)
+MIN_SAGITTAL_PROJECTION = 0.5
+
+
+def _baseline_count(seconds: np.ndarray, baseline_seconds: float) -> int:
+    end = int(np.searchsorted(seconds, baseline_seconds, side="left"))
+    return end if end > 0 else min(60, len(seconds))
+
+
+def _wrap180(angles: np.ndarray) -> np.ndarray:
+    return (angles + 180.0) % 360.0 - 180.0
+
+
+def hip_flexion_series(
+    pelvis_quats: np.ndarray,
+    thigh_quats: np.ndarray,
+    seconds: np.ndarray,
+    baseline_seconds: float = 1.0,
+) -> dict[str, Any]:
+    """
+    Hip flexion in degrees (flexion positive), relative to the static pose.
+
+    The sagittal angle ``atan2(R[2, k], -R[1, k])`` is computed for all three
+    thigh axes ``k`` at once; the axis with the largest circular ROM inside
+    ``PLAUSIBLE_FLEXION_ROM`` wins, otherwise the one with the most sagittal
+    motion; axes lying mostly outside the sagittal plane are skipped. Returns ``{"angles", "axis", "rom"}``.
+    """
+    n = min(len(pelvis_quats), len(thigh_quats), len(seconds))
+    if n == 0:
+        return {"angles": np.empty(0, dtype=np.float64), "axis": None, "rom": 0.0}
+
+    rel = quat_to_matrix(relative_rotation(pelvis_quats[:n], thigh_quats[:n]))  # (n, 3, 3)
+    theta = unwrap_degrees(np.degrees(np.arctan2(rel[:, 2, :], -rel[:, 1, :])), axis=0)  # (n, 3)
+    baseline = _baseline_count(seconds[:n], baseline_seconds)
+    theta -= theta[:baseline].mean(axis=0)
+
+    wrapped = _wrap180(theta)
+    span = wrapped.max(axis=0) - wrapped.min(axis=0)
+    rom = np.where(span > 180.0, 360.0 - span, span)
+
+    # An axis pointing sideways has no meaningful sagittal angle
+    in_plane = np.hypot(rel[:, 1, :], rel[:, 2, :]).mean(axis=0) >= MIN_SAGITTAL_PROJECTION
+    if not in_plane.any():
+        in_plane[:] = True
+
+    low, high = PLAUSIBLE_FLEXION_ROM
+    plausible = in_plane & (rom >= low) & (rom <= high)
+    if plausible.any():
+        axis = int(np.argmax(np.where(plausible, rom, -np.inf)))
+    else:
+        sagittal = rel[baseline:, 2, :] if n > baseline else rel[:, 2, :]
+        axis = int(np.argmax(np.where(in_plane, sagittal.std(axis=0), -np.inf)))
+    return {"angles": theta[:, axis], "axis": axis, "rom": float(rom[axis])}
+
+
+def hip_abduction_series(
+    pelvis_quats: np.ndarray,
+    thigh_quats: np.ndarray,
+    seconds: np.ndarray,
+    baseline_seconds: float = 1.0,
+) -> np.ndarray:
+    """Hip abduction (positive) / adduction in degrees in the pelvis frontal plane."""
+    n = min(len(pelvis_quats), len(thigh_quats), len(seconds))
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+    rel = quat_to_matrix(relative_rotation(pelvis_quats[:n], thigh_quats[:n]))
+    bone = rel[:, :, 1]  # thigh Y axis in the pelvis frame
+    angles = np.degrees(np.arctan2(bone[:, 0], np.hypot(bone[:, 1], bone[:, 2])))
+    return angles - angles[: _baseline_count(seconds[:n], baseline_seconds)].mean()
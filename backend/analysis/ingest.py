@@ -0,0 +1,228 @@
+"""
+Parallel ingestion of the per-sensor CSVs inside one Movella ZIP.
+
+Each sensor's CSV is decoded and preprocessed in its own worker process. The
+worker copies the resulting channels into a ``multiprocessing.shared_memory``
+block and returns only a small descriptor, so the (large) arrays are never
+pickled back to the parent. The parent maps every block as NumPy views and
+joins the sensors into one ``{tag: {"header", "channels"}}`` structure, the
+same one the in-process path (``workers=1``) yields.
+
+Uploads use ``ANALYSIS_WORKERS`` processes (default: one per core, never
+more than the archive has sensors). Each gunicorn worker starts its pool on
+its first upload and reuses it. The pool uses the spawn start method, so no
+child inherits the locks of a running web worker.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, BinaryIO, Iterator, Optional
+
+import numpy as np
+
+from .movella_csv import (
+    DEVICE_TAG_MAPPING,
+    MovellaCsvError,
+    parse_movella_csv,
+    unwrap_sample_time_fine,
+)
+from .recordings import CSV_MEMBER_SUFFIXES
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def default_workers() -> int:
+    configured = (os.getenv("ANALYSIS_WORKERS") or "").strip()
+    if configured.isdigit() and int(configured) > 0:
+        return int(configured)
+    return os.cpu_count() or 1
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Reuse one pool per process; starting workers per recording costs more than decoding."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn, not fork: a forked child inherits whatever locks other threads held
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def preprocess_channels(channels: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Order samples by time and drop repeated packets.
+
+    BLE retransmissions can repeat a ``PacketCounter``; rows are sorted by the
+    unwrapped ``SampleTimeFine`` and only the first copy of each counter kept.
+    """
+    time_axis = channels.get("SampleTimeFine")
+    if time_axis is None or len(time_axis) < 2:
+        return channels
+
+    order = np.argsort(unwrap_sample_time_fine(time_axis), kind="stable")
+    keep = order
+    counter = channels.get("PacketCounter")
+    if counter is not None:
+        ordered_counter = np.asarray(counter)[order]
+        duplicate = np.zeros(len(order), dtype=bool)
+        duplicate[1:] = ordered_counter[1:] == ordered_counter[:-1]
+        keep = order[~duplicate]
+
+    if len(keep) == len(time_axis) and np.all(keep[1:] > keep[:-1]):
+        return channels
+    return {name: np.asarray(values)[keep] for name, values in channels.items()}
+
+
+def decode_sensor_csv(content: bytes) -> dict[str, Any]:
+    parsed = parse_movella_csv(content)
+    parsed["channels"] = preprocess_channels(parsed["channels"])
+    return parsed
+
+
+def _untrack(block: shared_memory.SharedMemory) -> None:
+    # The parent owns the block's lifetime; stop this process' resource
+    # tracker from unlinking it when the worker exits.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(block._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _decode_to_shared_memory(content: bytes, source_name: str) -> Optional[dict[str, Any]]:
+    """Worker entry point: decode one CSV into a shared memory block."""
+    try:
+        parsed = decode_sensor_csv(content)
+    except MovellaCsvError:
+        return None
+
+    channels = parsed["channels"]
+    layout = []
+    offset = 0
+    for name, values in channels.items():
+        layout.append((name, values.dtype.str, len(values), offset))
+        offset += values.nbytes
+        offset += (-offset) % 8  # keep every channel 8-byte aligned
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for name, dtype, length, start in layout:
+            np.ndarray((length,), dtype=dtype, buffer=block.buf, offset=start)[:] = channels[name]
+        _untrack(block)
+        return {
+            "shm": block.name,
+            "layout": layout,
+            "header": {**parsed["header"], "SourceFile": os.path.basename(source_name), "SourceBytes": len(content)},
+        }
+    finally:
+        block.close()
+
+
+def _read_csv_members(stream: BinaryIO) -> list[tuple[str, bytes]]:
+    members = []
+    with zipfile.ZipFile(stream) as archive:
+        for member in archive.infolist():
+            name = member.filename
+            if member.is_dir() or name.startswith("__MACOSX/"):
+                continue
+            if name.lower().endswith(CSV_MEMBER_SUFFIXES):
+                members.append((name, archive.read(member)))
+    return members
+
+
+@contextmanager
+def decode_movella_zip(stream: BinaryIO, workers: Optional[int] = None) -> Iterator[dict[int, dict[str, Any]]]:
+    """
+    Decode every sensor CSV of a ZIP, in parallel unless ``workers``
+    (default: ``default_workers()``) is 1.
+
+    Yields ``{tag: {"header", "channels"}}``. Channel arrays are views on
+    shared memory that is released when the ``with`` block exits, so copy
+    anything that must outlive it.
+    """
+    members = _read_csv_members(stream)
+    workers = min(workers or default_workers(), max(1, len(members)))
+
+    if workers <= 1:
+        sensors = {}
+        for name, content in members:
+            try:
+                parsed = decode_sensor_csv(content)
+            except MovellaCsvError:
+                continue
+            tag = parsed["header"].get("DeviceTag")
+            if tag in DEVICE_TAG_MAPPING and tag not in sensors:
+                parsed["header"].update({"SourceFile": os.path.basename(name), "SourceBytes": len(content)})
+                sensors[tag] = parsed
+        if not sensors:
+            raise MovellaCsvError("No Movella DOT sensor files found in archive")
+        yield sensors
+        return
+
+    pool = _get_pool(workers)
+    futures = [pool.submit(_decode_to_shared_memory, content, name) for name, content in members]
+    blocks = []
+    sensors = {}
+    try:
+        for future in futures:
+            result = future.result()
+            if result is None:
+                continue
+            block = shared_memory.SharedMemory(name=result["shm"])
+            blocks.append(block)
+            tag = result["header"].get("DeviceTag")
+            if tag not in DEVICE_TAG_MAPPING or tag in sensors:
+                continue
+            sensors[tag] = {
+                "header": result["header"],
+                "channels": {
+                    name: np.ndarray((length,), dtype=dtype, buffer=block.buf, offset=start)
+                    for name, dtype, length, start in result["layout"]
+                },
+            }
+        if not sensors:
+            raise MovellaCsvError("No Movella DOT sensor files found in archive")
+        yield sensors
+    finally:
+        sensors.clear()
+        attached = {block.name for block in blocks}
+        for future in futures:
+            # Wait for every worker so no block is created after cleanup
+            try:
+                result = future.result()
+            except Exception:
+                continue
+            if result is not None and result["shm"] not in attached:
+                try:
+                    blocks.append(shared_memory.SharedMemory(name=result["shm"]))
+                except FileNotFoundError:
+                    pass
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass  # a caller still holds a view; unlinking below is still safe
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
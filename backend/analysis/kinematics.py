@@ -0,0 +1,121 @@
+"""
+Vectorized joint kinematics for Movella DOT orientations.
+
+Quaternions are held as ``(N, 4)`` float64 arrays in ``[w, x, y, z]`` order
+(Hamilton convention), matching ``frontend/app/analysis/kinematics.ts``.
+"""
+
+import numpy as np
+
+# Sensor -Y is the bone long axis
+BONE_AXIS = np.array([0.0, -1.0, 0.0])
+
+
+def quat_from_euler_zyx(ex, ey, ez) -> np.ndarray:
+    """Convert Euler angles in degrees (ZYX intrinsic) to ``(N, 4)`` quaternions."""
+    rx = np.radians(np.asarray(ex, dtype=np.float64)) * 0.5
+    ry = np.radians(np.asarray(ey, dtype=np.float64)) * 0.5
+    rz = np.radians(np.asarray(ez, dtype=np.float64)) * 0.5
+
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+
+    return np.stack(
+        [
+            cz * cy * cx + sz * sy * sx,
+            cz * cy * sx - sz * sy * cx,
+            cz * sy * cx + sz * cy * sx,
+            sz * cy * cx - cz * sy * sx,
+        ],
+        axis=-1,
+    )
+
+
+def quat_to_euler_zyx(quats: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Inverse of ``quat_from_euler_zyx``: ``(Euler_X, Euler_Y, Euler_Z)`` in degrees."""
+    q = np.asarray(quats, dtype=np.float64)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    ex = np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    ey = np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0))
+    ez = np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+    return np.degrees(ex), np.degrees(ey), np.degrees(ez)
+
+
+def quat_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Row-wise Hamilton product ``a * b`` of ``(N, 4)`` (or broadcastable) arrays."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack(
+        [
+            aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+        ],
+        axis=-1,
+    )
+
+
+def quat_conjugate(quats: np.ndarray) -> np.ndarray:
+    return np.asarray(quats, dtype=np.float64) * np.array([1.0, -1.0, -1.0, -1.0])
+
+
+def quat_to_matrix(quats: np.ndarray) -> np.ndarray:
+    """``(N, 3, 3)`` rotation matrices (same layout as ``mat3FromQuat``)."""
+    w, x, y, z = np.moveaxis(np.asarray(quats, dtype=np.float64), -1, 0)
+    return np.stack(
+        [
+            np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+            np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+            np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1),
+        ],
+        axis=-2,
+    )
+
+
+def relative_rotation(parent_quats: np.ndarray, child_quats: np.ndarray) -> np.ndarray:
+    """Child orientation in the parent frame, ``conj(parent) * child`` (i.e. ``Rp^T · Rc``)."""
+    n = min(len(parent_quats), len(child_quats))
+    return quat_multiply(quat_conjugate(parent_quats[:n]), child_quats[:n])
+
+
+def unwrap_degrees(angles: np.ndarray, axis: int = 0) -> np.ndarray:
+    """Remove ±360° jumps so the series is continuous (``unwrapDegrees`` in the app)."""
+    return np.degrees(np.unwrap(np.radians(np.asarray(angles, dtype=np.float64)), axis=axis))
+
+
+def rotate_vectors(quats: np.ndarray, vector) -> np.ndarray:
+    """Rotate a vector (or ``(N, 3)`` vectors) by each quaternion in ``quats``."""
+    q = np.asarray(quats, dtype=np.float64)
+    v = np.broadcast_to(np.asarray(vector, dtype=np.float64), q.shape[:-1] + (3,))
+    w = q[..., :1]
+    u = q[..., 1:]
+    t = 2.0 * np.cross(u, v)
+    return v + w * t + np.cross(u, t)
+
+
+def knee_angle_series(thigh_quats: np.ndarray, shank_quats: np.ndarray) -> np.ndarray:
+    """Knee angle in degrees from the angle between thigh and shank bone axes."""
+    n = min(len(thigh_quats), len(shank_quats))
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+
+    vt = rotate_vectors(thigh_quats[:n], BONE_AXIS)
+    vs = rotate_vectors(shank_quats[:n], BONE_AXIS)
+    cosine = np.einsum("ij,ij->i", vt, vs) / (
+        np.linalg.norm(vt, axis=1) * np.linalg.norm(vs, axis=1)
+    )
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def baseline_subtract(angles: np.ndarray, seconds: np.ndarray, baseline_seconds: float = 1.0) -> np.ndarray:
+    """Subtract the mean of the first ``baseline_seconds`` (static pose) from a series."""
+    if len(angles) == 0:
+        return np.empty(0, dtype=np.float64)
+    end = int(np.searchsorted(seconds, baseline_seconds, side="left"))
+    if end <= 0:
+        end = min(60, len(angles))
+    return angles - float(np.mean(angles[:end]))
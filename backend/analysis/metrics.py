@@ -0,0 +1,91 @@
+"""
+ROM, velocity and repetition metrics for joint angle series.
+
+Output dictionaries use the keys accepted by ``db.insert_session_metrics``.
+"""
+
+from typing import Any, Optional
+
+import numpy as np
+
+from .com import displacement_per_rep
+from .filters import smooth_derivative
+from .repetitions import detect_repetitions
+
+
+def angular_velocity(angles: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+    """
+    Angular velocity in deg/s: zero-phase low-pass, then central differences
+    on the real timestamps (a raw gradient amplifies sensor noise).
+    """
+    if len(angles) < 2:
+        return np.zeros(len(angles), dtype=np.float64)
+    return np.nan_to_num(smooth_derivative(angles, seconds))
+
+
+def _rep_rows(reps: dict[str, np.ndarray]) -> list[dict[str, Optional[float]]]:
+    columns = {name: [None if np.isnan(v) else float(v) for v in values] for name, values in reps.items()}
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def summarize_joint(
+    joint: str,
+    side: str,
+    angles: np.ndarray,
+    seconds: np.ndarray,
+    valid: Optional[np.ndarray] = None,
+    com_acceleration: Optional[np.ndarray] = None,
+    com_valid: Optional[np.ndarray] = None,
+) -> dict[str, Any]:
+    """
+    Build one metrics row (``insert_session_metrics`` format) for a joint series.
+
+    Samples where ``valid`` is False (long gaps, clipping) are left out of the
+    ROM and velocity statistics; velocities next to them are dropped too since
+    the central difference reaches across. ``reps`` lists the per-repetition
+    ROM and velocity from ``repetitions.detect_repetitions``. When the pelvis
+    ``com_acceleration`` (world frame, ``(N, 3)``) is given, the per-rep COM
+    displacement is computed over the same rep boundaries and its mean is
+    stored as ``center_mass_displacement`` (cm); reps with samples outside
+    ``com_valid`` are left out.
+    """
+    velocity = angular_velocity(angles, seconds)
+    speed = np.abs(velocity)
+    if valid is not None and len(angles):
+        speed_valid = valid.copy()
+        speed_valid[1:] &= valid[:-1]
+        speed_valid[:-1] &= valid[1:]
+        speed = speed[speed_valid]
+        rom = angles[valid]
+    else:
+        rom = angles
+
+    if len(rom) == 0 or len(speed) == 0:
+        return {
+            "joint": joint, "side": side, "repetition": 0,
+            "min_velocity": 0.0, "max_velocity": 0.0, "avg_velocity": 0.0, "p95_velocity": 0.0,
+            "min_rom": 0.0, "max_rom": 0.0, "avg_rom": 0.0, "reps": [],
+        }
+
+    repetitions = detect_repetitions(angles, seconds, valid, velocity=velocity)
+    center_mass_displacement = 0.0
+    if com_acceleration is not None and repetitions["count"]:
+        per_rep = displacement_per_rep(com_acceleration, seconds, repetitions["boundaries"], com_valid)
+        repetitions["reps"]["com_displacement_cm"] = per_rep
+        if np.isfinite(per_rep).any():
+            center_mass_displacement = float(np.nanmean(per_rep))
+
+    return {
+        "joint": joint,
+        "side": side,
+        "repetition": repetitions["count"],
+        "min_velocity": float(np.min(speed)),
+        "max_velocity": float(np.max(speed)),
+        "avg_velocity": float(np.mean(speed)),
+        "p95_velocity": float(np.percentile(speed, 95)),
+        "min_rom": float(np.min(rom)),
+        "max_rom": float(np.max(rom)),
+        "avg_rom": float(np.mean(rom)),
+        "center_mass_displacement": center_mass_displacement,
+        "reps": _rep_rows(repetitions["reps"]),
+    }
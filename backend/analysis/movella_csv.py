@@ -0,0 +1,155 @@
+"""
+Parser for Movella DOT CSV exports.
+
+Each export starts with a block of ``Key:,value`` metadata lines (DeviceTag,
+OutputRate, StartTime, ...) followed by the ``PacketCounter,...`` header row
+and the sample rows. Sample columns are returned as NumPy arrays so the rest
+of the analysis code never iterates over rows in Python.
+"""
+
+import io
+import re
+from typing import Any, Optional, Union
+
+import numpy as np
+
+# DeviceTag mapping used by the capture protocol (docs/MOVELLA_SENSOR_MAPPING.md)
+DEVICE_TAG_MAPPING = {
+    1: {"side": "right", "segment": "thigh"},
+    2: {"side": "right", "segment": "shank"},
+    3: {"side": "left", "segment": "thigh"},
+    4: {"side": "left", "segment": "shank"},
+    5: {"side": None, "segment": "pelvis"},
+}
+
+# Counters and flags are stored losslessly; every other channel is float32.
+INTEGER_CHANNELS = {
+    "PacketCounter": "uint32",
+    "SampleTimeFine": "uint32",
+    "Status": "uint16",
+}
+DEFAULT_CHANNEL_DTYPE = "float32"
+
+DATA_HEADER_MARKER = "PacketCounter"
+METADATA_PATTERN = re.compile(r"^\s*([A-Za-z][\w .]*?)\s*:\s*,?\s*(.*?)\s*,*\s*$")
+
+
+class MovellaCsvError(ValueError):
+    """Raised when a file does not look like a Movella DOT CSV export."""
+
+
+def channel_dtype(name: str) -> str:
+    return INTEGER_CHANNELS.get(name, DEFAULT_CHANNEL_DTYPE)
+
+
+def _parse_output_rate(value: Optional[str]) -> Optional[int]:
+    match = re.search(r"\d+", str(value or ""))
+    return int(match.group(0)) if match else None
+
+
+def _parse_header_value(key: str, value: str) -> Any:
+    if key == "DeviceTag":
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    if key == "OutputRate":
+        return _parse_output_rate(value)
+    return value
+
+
+def _decode(content: Union[str, bytes]) -> str:
+    if isinstance(content, bytes):
+        return content.decode("utf-8-sig", errors="replace")
+    return content.lstrip("\ufeff")
+
+
+def _parse_rows_fallback(lines: list[str], column_count: int) -> np.ndarray:
+    """Row-by-row parsing that skips malformed rows (same policy as the app)."""
+    rows = []
+    for line in lines:
+        parts = line.split(",")
+        if len(parts) < column_count:
+            continue
+        try:
+            rows.append([float(part) for part in parts[:column_count]])
+        except ValueError:
+            continue
+    if not rows:
+        return np.empty((0, column_count), dtype=np.float64)
+    return np.asarray(rows, dtype=np.float64)
+
+
+def parse_movella_csv(content: Union[str, bytes]) -> dict[str, Any]:
+    """
+    Parse a Movella DOT CSV export.
+
+    Returns ``{"header": {...}, "channels": {name: ndarray}}`` where the header
+    always contains ``DeviceTag``, ``OutputRate`` and ``StartTime`` (``None``
+    when missing) and every channel array has the dtype from ``channel_dtype``.
+    """
+    lines = _decode(content).splitlines()
+
+    header: dict[str, Any] = {"DeviceTag": None, "OutputRate": None, "StartTime": None}
+    data_start = None
+    for index, line in enumerate(lines):
+        if line.lstrip().startswith(DATA_HEADER_MARKER):
+            data_start = index
+            break
+        match = METADATA_PATTERN.match(line)
+        if match:
+            key = match.group(1).strip()
+            header[key] = _parse_header_value(key, match.group(2))
+
+    if data_start is None:
+        raise MovellaCsvError("Could not find data header in CSV")
+
+    names = [name.strip() for name in lines[data_start].split(",")]
+    while names and not names[-1]:
+        names.pop()
+
+    data_lines = [line for line in lines[data_start + 1:] if line.strip()]
+    if not data_lines:
+        table = np.empty((0, len(names)), dtype=np.float64)
+    else:
+        try:
+            table = np.loadtxt(
+                io.StringIO("\n".join(data_lines)),
+                delimiter=",",
+                usecols=range(len(names)),
+                dtype=np.float64,
+                ndmin=2,
+            )
+        except ValueError:
+            table = _parse_rows_fallback(data_lines, len(names))
+
+    channels = {
+        name: table[:, column].astype(channel_dtype(name))
+        for column, name in enumerate(names)
+    }
+    return {"header": header, "channels": channels}
+
+
+SAMPLE_TIME_FINE_MODULUS = 2 ** 32
+
+
+def unwrap_sample_time_fine(sample_time_fine: np.ndarray) -> np.ndarray:
+    """Return ``SampleTimeFine`` as int64 microseconds with 32-bit rollovers removed."""
+    raw = np.asarray(sample_time_fine, dtype=np.int64)
+    if len(raw) < 2:
+        return raw.copy()
+    steps = np.diff(raw)
+    steps[steps < -(SAMPLE_TIME_FINE_MODULUS // 2)] += SAMPLE_TIME_FINE_MODULUS
+    unwrapped = np.empty_like(raw)
+    unwrapped[0] = raw[0]
+    np.cumsum(steps, out=unwrapped[1:])
+    unwrapped[1:] += raw[0]
+    return unwrapped
+
+
+def sample_times_seconds(sample_time_fine: np.ndarray) -> np.ndarray:
+    """Convert raw ``SampleTimeFine`` microseconds to seconds from the first sample."""
+    if len(sample_time_fine) == 0:
+        return np.empty(0, dtype=np.float64)
+    unwrapped = unwrap_sample_time_fine(sample_time_fine)
+    return (unwrapped - unwrapped[0]) / 1e6
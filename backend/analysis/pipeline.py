@@ -0,0 +1,221 @@
+"""
+End-to-end analysis of an archived recording into ``metrics`` rows.
+
+``ANALYSIS_VERSION`` must be bumped whenever a stage changes its output so
+``reanalyze_recordings.py`` knows stored metrics are stale.
+"""
+
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+from .alignment import align_sensors
+from .calibration import CALIBRATION_EXERCISE_TYPE, apply_calibration, resolve_calibration
+from .com import FREE_ACC_CHANNELS, world_acceleration
+from .gait import GAIT_EXERCISE_TYPE, GYRO_CHANNELS, summarize_gait
+from .hip import hip_abduction_series, hip_flexion_series
+from .kinematics import baseline_subtract, knee_angle_series
+from .metrics import summarize_joint
+from .quality import assess_sensors, check_recording_quality
+from .recordings import load_manifest, load_sensor_header, open_sensor, recording_content_hash
+
+ANALYSIS_VERSION = "10"
+
+# (side, thigh tag, shank tag) per docs/MOVELLA_SENSOR_MAPPING.md
+KNEE_SENSOR_PAIRS = (
+    ("right", 1, 2),
+    ("left", 3, 4),
+)
+# (side, pelvis tag, thigh tag)
+HIP_SENSOR_PAIRS = (
+    ("right", 5, 1),
+    ("left", 5, 3),
+)
+ORIENTATION_CHANNELS = ("SampleTimeFine", "Euler_X", "Euler_Y", "Euler_Z")
+QUALITY_CHANNELS = ("PacketCounter", "Status")
+PELVIS_TAG = 5
+
+
+def _range_summary(angles: np.ndarray) -> dict[str, float]:
+    if len(angles) == 0:
+        return {"min_rom": 0.0, "max_rom": 0.0, "avg_rom": 0.0}
+    return {"min_rom": float(np.min(angles)), "max_rom": float(np.max(angles)), "avg_rom": float(np.mean(angles))}
+
+
+def align_orientations(
+    channels_by_tag: dict[int, dict[str, np.ndarray]],
+    headers: Optional[dict[int, dict[str, Any]]] = None,
+) -> dict[str, Any]:
+    """
+    Resample the sensors that carry orientation channels onto one timebase.
+    Sensors not exported as synced are lined up by ``FreeAcc`` cross-correlation
+    on top of their first sample (see ``alignment.estimate_offsets``).
+    """
+    oriented = {
+        tag: channels
+        for tag, channels in channels_by_tag.items()
+        if all(name in channels for name in ORIENTATION_CHANNELS)
+    }
+    return align_sensors(oriented, headers, refine_offsets=True)
+
+
+def analyze_sensors(
+    channels_by_tag: dict[int, dict[str, np.ndarray]],
+    headers: Optional[dict[int, dict[str, Any]]] = None,
+) -> list[dict[str, Any]]:
+    """
+    Join per-sensor channels into joint metrics rows.
+
+    ``channels_by_tag`` maps DeviceTag to its channel arrays, either memory
+    maps from the archive or shared-memory views from ``ingest``. Sensors are
+    first resampled onto a common timebase (see ``alignment``) so samples of
+    different sensors are compared at the same instant even after packet loss.
+    """
+    return analyze_aligned(align_orientations(channels_by_tag, headers))
+
+
+def analyze_aligned(
+    aligned: dict[str, Any],
+    calibration_offsets: Optional[dict[int, Any]] = None,
+) -> list[dict[str, Any]]:
+    """
+    Joint metrics rows from ``align_sensors`` output, optionally applying
+    sensor-to-segment offsets from ``calibration``.
+    """
+    seconds = aligned["t"]
+    sensors = dict(aligned["sensors"])
+    for tag, offset in (calibration_offsets or {}).items():
+        if tag in sensors:
+            sensors[tag] = {**sensors[tag], "quat": apply_calibration(sensors[tag]["quat"], offset)}
+
+    pelvis = sensors.get(PELVIS_TAG)
+    com_acceleration = world_acceleration(pelvis) if pelvis is not None else None
+
+    metrics = []
+    for side, thigh_tag, shank_tag in KNEE_SENSOR_PAIRS:
+        if thigh_tag not in sensors or shank_tag not in sensors:
+            continue
+        thigh, shank = sensors[thigh_tag], sensors[shank_tag]
+        valid = thigh["valid"] & shank["valid"]
+        angles = baseline_subtract(knee_angle_series(thigh["quat"], shank["quat"]), seconds)
+        com_valid = valid & pelvis["valid"] if com_acceleration is not None else None
+        metrics.append(summarize_joint("knee", side, angles, seconds, valid, com_acceleration, com_valid))
+
+    for side, pelvis_tag, thigh_tag in HIP_SENSOR_PAIRS:
+        if pelvis_tag not in sensors or thigh_tag not in sensors:
+            continue
+        pelvis_sensor, thigh = sensors[pelvis_tag], sensors[thigh_tag]
+        valid = pelvis_sensor["valid"] & thigh["valid"]
+        flexion = hip_flexion_series(pelvis_sensor["quat"], thigh["quat"], seconds)
+        abduction = hip_abduction_series(pelvis_sensor["quat"], thigh["quat"], seconds)
+        row = summarize_joint("hip", side, flexion["angles"], seconds, valid)
+        row["abduction"] = _range_summary(abduction[valid])
+        metrics.append(row)
+    return metrics
+
+
+def analyze_gait(aligned: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """Gait summary from the shank sensors of ``align_sensors`` output."""
+    shanks = {
+        side: aligned["sensors"][shank_tag]
+        for side, _thigh_tag, shank_tag in KNEE_SENSOR_PAIRS
+        if shank_tag in aligned["sensors"]
+    }
+    return summarize_gait(shanks, aligned["t"]) if shanks else None
+
+
+def _load_aligned(recording_id: str, lap) -> tuple[dict[str, Any], dict[int, Any], dict[str, Any]]:
+    """``(manifest, quality, aligned)`` of a recording, for ``analyze_recording`` and ``calibrate_recording``."""
+    manifest = load_manifest(recording_id)
+    if manifest is None:
+        raise FileNotFoundError(f"Recording {recording_id} not found")
+
+    tags = [int(tag) for tag in manifest.get("sensors") or {}]
+    channels_by_tag = {
+        tag: open_sensor(recording_id, tag, ORIENTATION_CHANNELS + QUALITY_CHANNELS + FREE_ACC_CHANNELS + GYRO_CHANNELS)
+        for tag in tags
+    }
+    headers = {tag: load_sensor_header(recording_id, tag) for tag in tags}
+    lap("load")
+
+    quality = assess_sensors(channels_by_tag, headers)
+    check_recording_quality(quality, KNEE_SENSOR_PAIRS + HIP_SENSOR_PAIRS)
+    usable = {tag: channels for tag, channels in channels_by_tag.items() if quality[tag]["usable"]}
+    lap("quality")
+
+    aligned = align_orientations(usable, headers)
+    lap("alignment")
+    return manifest, quality, aligned
+
+
+def _resolve_recording_calibration(
+    recording_id: str, manifest: dict[str, Any], aligned: dict[str, Any], persist: bool
+) -> dict[str, Any]:
+    return resolve_calibration(
+        manifest.get("patient_id"),
+        {tag: sensor["quat"] for tag, sensor in aligned["sensors"].items()},
+        aligned["t"],
+        recorded_at=manifest.get("created_at"),
+        recording_id=recording_id,
+        force=manifest.get("exercise_type") == CALIBRATION_EXERCISE_TYPE,
+        persist=persist,
+    )
+
+
+def calibrate_recording(recording_id: str, persist: bool = True) -> dict[str, Any]:
+    """Resolve (and cache, when ``persist`` is set) the calibration of one recording without computing metrics."""
+    manifest, _quality, aligned = _load_aligned(recording_id, lambda stage: None)
+    calibration = _resolve_recording_calibration(recording_id, manifest, aligned, persist)
+    return {key: value for key, value in calibration.items() if key != "offsets"}
+
+
+def analyze_recording(
+    recording_id: str,
+    timings: Optional[dict[str, float]] = None,
+    persist_calibration: bool = True,
+) -> dict[str, Any]:
+    """
+    Analyze one archived recording.
+
+    Returns ``{"recording_id", "analysis_version", "content_hash", "quality",
+    "calibration", "metrics"}`` where ``quality`` is the per-sensor report
+    from ``quality``, ``calibration`` describes the sensor-to-segment
+    calibration used (cached, recalibrated or none; recordings with
+    exercise type ``calibration`` always recalibrate) and ``metrics`` is a
+    list of rows for ``insert_session_metrics``. ``general_walking``
+    recordings also get a ``gait`` summary (steps, cadence, stride-time
+    variability, see ``gait``). Raises
+    ``RecordingQualityError`` before any kinematics when no sensor pair is
+    usable; unusable sensors are left out of the analysis.
+
+    When ``timings`` is given, the seconds spent in each stage (``load``,
+    ``quality``, ``alignment``, ``calibration``, ``metrics``, ``gait``) are
+    added to it. With ``persist_calibration=False`` the calibration cache is
+    only read, so the result does not depend on which recordings ran first.
+    """
+    clock = [time.perf_counter()]
+
+    def lap(stage: str) -> None:
+        now = time.perf_counter()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + now - clock[0]
+        clock[0] = now
+
+    manifest, quality, aligned = _load_aligned(recording_id, lap)
+    calibration = _resolve_recording_calibration(recording_id, manifest, aligned, persist_calibration)
+    lap("calibration")
+
+    result = {
+        "recording_id": recording_id,
+        "analysis_version": ANALYSIS_VERSION,
+        "content_hash": recording_content_hash(recording_id),
+        "quality": {str(tag): report for tag, report in quality.items()},
+        "calibration": {key: value for key, value in calibration.items() if key != "offsets"},
+        "metrics": analyze_aligned(aligned, calibration["offsets"]),
+    }
+    lap("metrics")
+    if manifest.get("exercise_type") == GAIT_EXERCISE_TYPE:
+        result["gait"] = analyze_gait(aligned)
+        lap("gait")
+    return result
@@ -0,0 +1,148 @@
+"""
+Data-quality checks for DOT sensor streams.
+
+Dropped BLE packets show up as jumps in ``PacketCounter`` and saturated
+sensors set the clipping bits of ``Status``. Both corrupt the velocity
+derivatives, so they are detected before the kinematic stages run: short
+gaps are bridged by the interpolation in ``alignment``, long gaps and clipped
+samples are marked invalid, and recordings with too little usable data are
+rejected outright.
+"""
+
+from typing import Any, Optional
+
+import numpy as np
+
+# Status bits of the DOT export (0x40-0x100 are magnetometer flags, unused here)
+STATUS_CLIP_ACC = 0x0007
+STATUS_CLIP_GYR = 0x0038
+STATUS_CLIP_MASK = STATUS_CLIP_ACC | STATUS_CLIP_GYR
+
+# Gaps up to this length are interpolated, longer ones are invalid segments
+MAX_FILL_GAP_SECONDS = 0.1
+MAX_LOSS_RATIO = 0.2
+MAX_CLIPPED_RATIO = 0.1
+MIN_SAMPLES = 10
+
+
+class RecordingQualityError(ValueError):
+    """Raised when no sensor pair of a recording has enough usable data."""
+
+    def __init__(self, message: str, quality: Optional[dict[int, dict[str, Any]]] = None):
+        super().__init__(message)
+        self.quality = quality or {}
+
+
+def counter_steps(packet_counter: np.ndarray) -> np.ndarray:
+    """
+    Increment between consecutive packets (1 when nothing was lost).
+
+    The counter wraps at 16 bits on older firmware and 32 bits on newer, so
+    the modulus is chosen from the observed range. Backward jumps (device
+    resets) are reported as a step of 1 rather than a huge gap.
+    """
+    counter = np.asarray(packet_counter, dtype=np.int64)
+    if len(counter) < 2:
+        return np.zeros(0, dtype=np.int64)
+    modulus = 2**16 if counter.max() < 2**16 else 2**32
+    steps = np.diff(counter) % modulus
+    return np.where(steps >= modulus // 2, 1, steps)
+
+
+def clipped_mask(status: np.ndarray) -> np.ndarray:
+    """True for samples where the accelerometer or gyroscope saturated."""
+    return (np.asarray(status, dtype=np.uint32) & STATUS_CLIP_MASK) != 0
+
+
+def assess_sensor(
+    channels: dict[str, np.ndarray],
+    rate: Optional[float] = None,
+) -> dict[str, Any]:
+    """Summarise packet loss and clipping of one sensor."""
+    samples = len(channels.get("SampleTimeFine", channels.get("PacketCounter", [])))
+    rate = float(rate or 60)
+
+    dropped = gaps = long_gaps = 0
+    longest_gap = 0.0
+    invalid_seconds = 0.0
+    if "PacketCounter" in channels:
+        steps = counter_steps(channels["PacketCounter"])
+        steps = steps[steps > 1]
+        # Gap length is the time between the samples either side of it,
+        # the same span ``valid_mask`` sees after resampling
+        long_steps = steps[steps / rate > MAX_FILL_GAP_SECONDS]
+        dropped = int((steps - 1).sum())
+        gaps = int(len(steps))
+        long_gaps = int(len(long_steps))
+        longest_gap = float(steps.max()) / rate if gaps else 0.0
+        invalid_seconds = float(long_steps.sum()) / rate
+
+    clipped = int(np.count_nonzero(clipped_mask(channels["Status"]))) if "Status" in channels else 0
+
+    expected = samples + dropped
+    loss_ratio = dropped / expected if expected else 0.0
+    clipped_ratio = clipped / samples if samples else 0.0
+    problems = []
+    if samples < MIN_SAMPLES:
+        problems.append("too few samples")
+    if loss_ratio > MAX_LOSS_RATIO:
+        problems.append(f"{loss_ratio:.0%} of packets lost")
+    if clipped_ratio > MAX_CLIPPED_RATIO:
+        problems.append(f"{clipped_ratio:.0%} of samples clipped")
+
+    return {
+        "samples": samples,
+        "expected_samples": expected,
+        "dropped_packets": dropped,
+        "loss_ratio": round(loss_ratio, 4),
+        "gaps": gaps,
+        "long_gaps": long_gaps,
+        "longest_gap_seconds": round(longest_gap, 4),
+        "invalid_seconds": round(invalid_seconds, 4),
+        "clipped_samples": clipped,
+        "clipped_ratio": round(clipped_ratio, 4),
+        "usable": not problems,
+        "problems": problems,
+    }
+
+
+def assess_sensors(
+    channels_by_tag: dict[int, dict[str, np.ndarray]],
+    headers: Optional[dict[int, dict[str, Any]]] = None,
+) -> dict[int, dict[str, Any]]:
+    headers = headers or {}
+    return {
+        tag: assess_sensor(channels, (headers.get(tag) or {}).get("OutputRate"))
+        for tag, channels in channels_by_tag.items()
+    }
+
+
+def check_recording_quality(
+    quality: dict[int, dict[str, Any]],
+    sensor_pairs: tuple[tuple[str, int, int], ...],
+) -> None:
+    """Raise ``RecordingQualityError`` unless at least one sensor pair is usable."""
+    for _side, first_tag, second_tag in sensor_pairs:
+        if quality.get(first_tag, {}).get("usable") and quality.get(second_tag, {}).get("usable"):
+            return
+    problems = [
+        f"sensor {tag}: {', '.join(report['problems'])}"
+        for tag, report in sorted(quality.items())
+        if report["problems"]
+    ]
+    detail = "; ".join(problems) or "required sensors missing"
+    raise RecordingQualityError(f"Recording rejected: {detail}", quality)
+
+
+def valid_mask(seconds: np.ndarray, left: np.ndarray, right: np.ndarray, status: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Validity of resampled points given their bracketing source samples.
+
+    A point is invalid when it lies inside a gap longer than
+    ``MAX_FILL_GAP_SECONDS`` or either neighbour was clipped.
+    """
+    valid = (seconds[right] - seconds[left]) <= MAX_FILL_GAP_SECONDS
+    if status is not None:
+        clipped = clipped_mask(status)
+        valid &= ~(clipped[left] | clipped[right])
+    return valid
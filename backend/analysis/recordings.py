@@ -0,0 +1,378 @@
+"""
+Compact on-disk archive of raw Movella DOT recordings.
+
+Uploaded ZIPs are converted into one directory per recording:
+
+    <RECORDINGS_DIR>/<recording_id>/manifest.json
+    <RECORDINGS_DIR>/<recording_id>/sensor_<tag>/header.json
+    <RECORDINGS_DIR>/<recording_id>/sensor_<tag>/<Channel>.bin
+    <RECORDINGS_DIR>/patients/<patient_id>/<recording_id>   (empty index entry)
+
+Every channel is a flat little-endian array (float32 for signals, unsigned
+integers for counters/flags) that is opened with ``numpy.memmap``, so the
+analysis and chart endpoints can slice any time range without copying or
+re-parsing CSV text. The local directory stands in for blob storage.
+
+The per-patient index lets ``list_recordings(patient_id)`` open only that
+patient's manifests instead of every manifest in the archive.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Optional
+
+import numpy as np
+
+from .movella_csv import (
+    DEVICE_TAG_MAPPING,
+    MovellaCsvError,
+    channel_dtype,
+    sample_times_seconds,
+)
+from .quality import assess_sensor
+
+ARCHIVE_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+SENSOR_HEADER_FILENAME = "header.json"
+CHANNEL_FILE_SUFFIX = ".bin"
+RECORDING_ID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+CSV_MEMBER_SUFFIXES = (".csv", ".txt")
+PATIENT_INDEX_DIRNAME = "patients"
+# Written once every recording archived before the index existed has been indexed
+PATIENT_INDEX_COMPLETE_FILENAME = ".complete"
+PATIENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def get_recordings_dir() -> Path:
+    configured = (os.getenv("RECORDINGS_DIR") or "").strip()
+    if configured:
+        return Path(configured)
+    return Path(__file__).resolve().parent.parent / "recordings"
+
+
+def is_valid_recording_id(recording_id: Optional[str]) -> bool:
+    return bool(RECORDING_ID_PATTERN.match(str(recording_id or "")))
+
+
+def _recording_path(recording_id: str) -> Path:
+    if not is_valid_recording_id(recording_id):
+        raise ValueError("Invalid recording id")
+    return get_recordings_dir() / recording_id
+
+
+def _sensor_dirname(tag: int) -> str:
+    return f"sensor_{int(tag)}"
+
+
+def _patient_index_dir(patient_id: Optional[str]) -> Optional[Path]:
+    if patient_id is None or not PATIENT_ID_PATTERN.match(str(patient_id)):
+        return None
+    return get_recordings_dir() / PATIENT_INDEX_DIRNAME / str(patient_id)
+
+
+def _index_recording(manifest: dict[str, Any]) -> None:
+    index_dir = _patient_index_dir(manifest.get("patient_id"))
+    if index_dir is None:
+        return
+    index_dir.mkdir(parents=True, exist_ok=True)
+    (index_dir / manifest["recording_id"]).touch()
+
+
+def _write_json(path: Path, payload: dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, indent=2, default=str)
+
+
+def _read_json(path: Path) -> Optional[dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def write_recording(
+    sensors: dict[int, dict[str, Any]],
+    patient_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    exercise_type: Optional[str] = None,
+    source_name: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Persist parsed sensors as a new archived recording and return its manifest.
+
+    The recording is assembled in a temporary directory and moved into place
+    with a single rename so readers never observe a half-written recording.
+    """
+    root = get_recordings_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    recording_id = str(uuid.uuid4())
+    staging = root / f".tmp-{recording_id}"
+    staging.mkdir()
+
+    try:
+        content_hash = hashlib.sha256()
+        sensor_summaries = {}
+        archived_bytes = 0
+        source_bytes = 0
+        for tag in sorted(sensors):
+            header = dict(sensors[tag]["header"])
+            channels = sensors[tag]["channels"]
+            sensor_dir = staging / _sensor_dirname(tag)
+            sensor_dir.mkdir()
+
+            channel_dtypes = {}
+            samples = 0
+            for name, values in channels.items():
+                dtype = np.dtype(channel_dtype(name)).newbyteorder("<")
+                array = np.ascontiguousarray(values, dtype=dtype)
+                array.tofile(sensor_dir / f"{name}{CHANNEL_FILE_SUFFIX}")
+                content_hash.update(f"{tag}/{name}".encode())
+                content_hash.update(array.tobytes())
+                channel_dtypes[name] = dtype.str
+                samples = len(array)
+                archived_bytes += array.nbytes
+
+            sensor_header = {
+                "DeviceTag": int(tag),
+                "OutputRate": header.pop("OutputRate", None),
+                "StartTime": header.pop("StartTime", None),
+                "samples": samples,
+                "channels": channel_dtypes,
+                "metadata": {k: v for k, v in header.items() if k != "DeviceTag"},
+            }
+            _write_json(sensor_dir / SENSOR_HEADER_FILENAME, sensor_header)
+            source_bytes += int(header.get("SourceBytes") or 0)
+            sensor_summaries[str(tag)] = {
+                "DeviceTag": int(tag),
+                "OutputRate": sensor_header["OutputRate"],
+                "StartTime": sensor_header["StartTime"],
+                "samples": samples,
+                "quality": assess_sensor(channels, sensor_header["OutputRate"]),
+                **DEVICE_TAG_MAPPING[int(tag)],
+            }
+
+        manifest = {
+            "format_version": ARCHIVE_FORMAT_VERSION,
+            "recording_id": recording_id,
+            "patient_id": patient_id,
+            "session_id": session_id,
+            "exercise_type": exercise_type,
+            "source_name": source_name,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "source_bytes": source_bytes,
+            "archived_bytes": archived_bytes,
+            "content_hash": content_hash.hexdigest(),
+            "sensors": sensor_summaries,
+        }
+        _write_json(staging / MANIFEST_FILENAME, manifest)
+        os.replace(staging, root / recording_id)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _index_recording(manifest)
+    return manifest
+
+
+def archive_movement_zip(
+    stream: BinaryIO,
+    patient_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    exercise_type: Optional[str] = None,
+    source_name: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> dict[str, Any]:
+    """Convert an uploaded Movella ZIP into an archived recording."""
+    from .ingest import decode_movella_zip
+
+    with decode_movella_zip(stream, workers=workers) as sensors:
+        return write_recording(
+            sensors,
+            patient_id=patient_id,
+            session_id=session_id,
+            exercise_type=exercise_type,
+            source_name=source_name,
+        )
+
+
+def recording_content_hash(recording_id: str) -> str:
+    """SHA-256 over every channel (same digest ``write_recording`` stores)."""
+    manifest = load_manifest(recording_id) or {}
+    if manifest.get("content_hash"):
+        return manifest["content_hash"]
+
+    digest = hashlib.sha256()
+    for tag in sorted(int(tag) for tag in manifest.get("sensors") or {}):
+        for name, values in open_sensor(recording_id, tag).items():
+            digest.update(f"{tag}/{name}".encode())
+            digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def load_manifest(recording_id: str) -> Optional[dict[str, Any]]:
+    if not is_valid_recording_id(recording_id):
+        return None
+    return _read_json(_recording_path(recording_id) / MANIFEST_FILENAME)
+
+
+def update_manifest(recording_id: str, **fields: Any) -> Optional[dict[str, Any]]:
+    """Merge ``fields`` into a recording manifest (e.g. analysis results)."""
+    manifest = load_manifest(recording_id)
+    if manifest is None:
+        return None
+    manifest.update(fields)
+    path = _recording_path(recording_id) / MANIFEST_FILENAME
+    staging = path.with_suffix(".json.tmp")
+    _write_json(staging, manifest)
+    os.replace(staging, path)
+    return manifest
+
+
+def iter_manifests() -> Iterable[dict[str, Any]]:
+    root = get_recordings_dir()
+    if not root.is_dir():
+        return
+    for entry in sorted(root.iterdir()):
+        if not entry.is_dir() or not is_valid_recording_id(entry.name):
+            continue
+        manifest = _read_json(entry / MANIFEST_FILENAME)
+        if manifest:
+            yield manifest
+
+
+def rebuild_patient_index() -> int:
+    """Index every archived recording by patient; returns the number of recordings seen."""
+    index_root = get_recordings_dir() / PATIENT_INDEX_DIRNAME
+    count = 0
+    for manifest in iter_manifests():
+        _index_recording(manifest)
+        count += 1
+    index_root.mkdir(parents=True, exist_ok=True)
+    (index_root / PATIENT_INDEX_COMPLETE_FILENAME).touch()
+    return count
+
+
+def _iter_patient_manifests(patient_id: str, index_dir: Path) -> Iterable[dict[str, Any]]:
+    if not (index_dir.parent / PATIENT_INDEX_COMPLETE_FILENAME).exists():
+        rebuild_patient_index()
+    if not index_dir.is_dir():
+        return
+    for entry in sorted(index_dir.iterdir()):
+        manifest = load_manifest(entry.name)
+        if manifest and str(manifest.get("patient_id")) == str(patient_id):
+            yield manifest
+
+
+def list_recordings(patient_id: Optional[str] = None) -> list[dict[str, Any]]:
+    """Return manifests (newest first), optionally filtered by patient."""
+    index_dir = _patient_index_dir(patient_id)
+    if not get_recordings_dir().is_dir():
+        manifests = []
+    elif index_dir is not None:
+        manifests = list(_iter_patient_manifests(patient_id, index_dir))
+    else:
+        manifests = [
+            manifest
+            for manifest in iter_manifests()
+            if patient_id is None or str(manifest.get("patient_id")) == str(patient_id)
+        ]
+    manifests.sort(key=lambda manifest: manifest.get("created_at") or "", reverse=True)
+    return manifests
+
+
+def load_sensor_header(recording_id: str, tag: int) -> Optional[dict[str, Any]]:
+    return _read_json(_recording_path(recording_id) / _sensor_dirname(tag) / SENSOR_HEADER_FILENAME)
+
+
+def open_sensor(
+    recording_id: str,
+    tag: int,
+    channels: Optional[Iterable[str]] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Open the requested channels of one sensor as read-only memory maps.
+
+    Unknown channel names are ignored. Nothing is read from disk until the
+    returned arrays are indexed.
+    """
+    header = load_sensor_header(recording_id, tag)
+    if header is None:
+        raise FileNotFoundError(f"Sensor {tag} not found in recording {recording_id}")
+
+    sensor_dir = _recording_path(recording_id) / _sensor_dirname(tag)
+    available = header.get("channels") or {}
+    names = list(channels) if channels is not None else list(available)
+    samples = int(header.get("samples") or 0)
+
+    opened = {}
+    for name in names:
+        if name not in available:
+            continue
+        dtype = np.dtype(available[name])
+        if samples == 0:
+            opened[name] = np.empty(0, dtype=dtype)
+            continue
+        opened[name] = np.memmap(
+            sensor_dir / f"{name}{CHANNEL_FILE_SUFFIX}",
+            dtype=dtype,
+            mode="r",
+            shape=(samples,),
+        )
+    return opened
+
+
+def load_sensor_window(
+    recording_id: str,
+    tag: int,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    channels: Optional[Iterable[str]] = None,
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Return ``(seconds, channels)`` for the samples between ``start`` and ``end``.
+
+    ``start``/``end`` are seconds from the first sample. Only the time axis is
+    materialised to locate the window; the channel arrays are zero-copy views
+    on the memory maps.
+    """
+    opened = open_sensor(recording_id, tag, channels)
+    time_axis = open_sensor(recording_id, tag, ["SampleTimeFine"]).get("SampleTimeFine")
+    if time_axis is None:
+        raise MovellaCsvError("Recording has no SampleTimeFine channel")
+
+    seconds = sample_times_seconds(time_axis)
+    i0 = 0 if start is None else int(np.searchsorted(seconds, start, side="left"))
+    i1 = len(seconds) if end is None else int(np.searchsorted(seconds, end, side="right"))
+    i1 = max(i0, i1)
+    return seconds[i0:i1], {name: values[i0:i1] for name, values in opened.items()}
+
+
+def slice_sensor(
+    recording_id: str,
+    tag: int,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    channels: Optional[Iterable[str]] = None,
+) -> dict[str, np.ndarray]:
+    """Zero-copy views of a sensor's channels restricted to a time range."""
+    if start is None and end is None:
+        return open_sensor(recording_id, tag, channels)
+    return load_sensor_window(recording_id, tag, start, end, channels)[1]
+
+
+def delete_recording(recording_id: str) -> bool:
+    path = _recording_path(recording_id)
+    if not path.is_dir():
+        return False
+    index_dir = _patient_index_dir((load_manifest(recording_id) or {}).get("patient_id"))
+    if index_dir is not None:
+        (index_dir / recording_id).unlink(missing_ok=True)
+    shutil.rmtree(path)
+    return True
@@ -0,0 +1,199 @@
+"""
+Vectorized repetition detection for joint angle series.
+
+Replaces the per-sample ``countPeaks`` loop of the app: the series is smoothed
+with a cumulative-sum moving average, candidate maxima are found with array
+comparisons, filtered by height, thinned with a sliding window maximum so
+no two repetitions are closer than ``min_dist``, and filtered by prominence.
+Each repetition is bounded by the lowest points between neighbouring peaks
+and its statistics are computed for all repetitions at once with
+``reduceat``.
+"""
+
+from typing import Any, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+SMOOTHING_WINDOW = 5
+MIN_REP_DISTANCE_SECONDS = 0.6
+AMP_THRESH_ABS = 15.0
+AMP_THRESH_FRAC = 0.35
+REP_FIELDS = ("start_seconds", "end_seconds", "min_rom", "max_rom", "avg_rom", "max_velocity", "avg_velocity")
+
+
+def moving_average(values: np.ndarray, window: int = SMOOTHING_WINDOW) -> np.ndarray:
+    """Centered moving average with edge padding, from a cumulative sum."""
+    values = np.asarray(values, dtype=np.float64)
+    if window <= 1 or len(values) == 0:
+        return values.copy()
+    half = window // 2
+    padded = np.pad(values, (half, window - 1 - half), mode="edge")
+    cumulative = np.concatenate([[0.0], np.cumsum(padded)])
+    return (cumulative[window:] - cumulative[:-window]) / window
+
+
+def local_maxima(values: np.ndarray) -> np.ndarray:
+    """Indices of strict local maxima; a flat top counts once at its first sample."""
+    if len(values) < 3:
+        return np.zeros(0, dtype=np.intp)
+    rising = values[1:] > values[:-1]
+    falling = values[1:] < values[:-1]
+    # Carry the last non-flat direction across plateaus
+    direction = np.where(rising, 1, np.where(falling, -1, 0))
+    changed = np.flatnonzero(direction)
+    if len(changed) < 2:
+        return np.zeros(0, dtype=np.intp)
+    slopes = direction[changed]
+    turns = np.flatnonzero((slopes[:-1] == 1) & (slopes[1:] == -1))
+    return changed[turns] + 1
+
+
+def peak_prominences(values: np.ndarray, peaks: np.ndarray) -> np.ndarray:
+    """
+    Prominence of each peak relative to the lowest points between it and its
+    neighbouring candidates (the higher of the two bases is used).
+    """
+    if len(peaks) == 0:
+        return np.zeros(0, dtype=np.float64)
+    bounds = np.concatenate([[0], peaks, [len(values) - 1]])
+    # ``valley[i]`` is the minimum from bounds[i] up to bounds[i + 1]
+    valley = np.minimum.reduceat(values, bounds[:-1])
+    return values[peaks] - np.maximum(valley[:-1], valley[1:])
+
+
+def suppress_close_peaks(values: np.ndarray, peaks: np.ndarray, min_distance: int) -> np.ndarray:
+    """Keep peaks that are the highest peak within ``min_distance`` on either side."""
+    if len(peaks) == 0 or min_distance <= 1:
+        return peaks
+    radius = min_distance - 1
+    heights = np.full(len(values) + 2 * radius, -np.inf)
+    heights[peaks + radius] = values[peaks]
+    window_max = sliding_window_view(heights, 2 * radius + 1).max(axis=1)
+    kept = peaks[values[peaks] >= window_max[peaks]]
+    if len(kept) < 2:
+        return kept
+    # Equal-height peaks inside one window: keep the first
+    keep = np.ones(len(kept), dtype=bool)
+    keep[1:] = np.diff(kept) >= min_distance
+    return kept[keep]
+
+
+def find_repetition_peaks(
+    smoothed: np.ndarray,
+    seconds: np.ndarray,
+    min_dist: float = MIN_REP_DISTANCE_SECONDS,
+    amp_thresh_abs: float = AMP_THRESH_ABS,
+    amp_thresh_frac: float = AMP_THRESH_FRAC,
+    rom: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Peak indices of a smoothed series that qualify as repetitions.
+
+    Thresholds are relative to ``rom``, the range of the series itself unless
+    given (streaming passes the range seen so far in the whole session).
+    """
+    if len(smoothed) < 3:
+        return np.zeros(0, dtype=np.intp)
+    rom = float(np.ptp(smoothed)) if rom is None else float(rom)
+    threshold = max(amp_thresh_abs, amp_thresh_frac * rom)
+
+    peaks = local_maxima(smoothed)
+    peaks = peaks[smoothed[peaks] >= threshold]
+
+    # Thin out noise maxima first so prominence is measured against the
+    # trough between real repetitions rather than between ripples on one crest
+    step = float(np.median(np.diff(seconds))) if len(seconds) > 1 else 0.0
+    min_distance = int(np.ceil(min_dist / step)) if step > 0 else 1
+    peaks = suppress_close_peaks(smoothed, peaks, min_distance)
+    return peaks[peak_prominences(smoothed, peaks) >= amp_thresh_frac * rom]
+
+
+def repetition_boundaries(smoothed: np.ndarray, peaks: np.ndarray) -> np.ndarray:
+    """
+    Start index of every repetition plus the end of the series.
+
+    Repetitions are split at the lowest sample between consecutive peaks;
+    the first starts at 0 and the last runs to the end.
+    """
+    n = len(smoothed)
+    if len(peaks) < 2:
+        return np.array([0, n], dtype=np.intp)
+
+    starts, ends = peaks[:-1], peaks[1:]
+    segment_min = np.minimum.reduceat(smoothed[: peaks[-1]], starts)
+    # First sample of each inter-peak span that reaches the span's minimum;
+    # the spans are contiguous, so together they cover peaks[0]..peaks[-1]
+    span = np.arange(peaks[0], peaks[-1])
+    segment_of = np.repeat(np.arange(len(starts)), ends - starts)
+    hits = np.flatnonzero(smoothed[span] == segment_min[segment_of])
+    _, first = np.unique(segment_of[hits], return_index=True)
+    valleys = span[hits[first]]
+    return np.concatenate([[0], valleys, [n]]).astype(np.intp)
+
+
+def _masked_reduce(values, valid, starts, counts):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        minimum = np.minimum.reduceat(np.where(valid, values, np.inf), starts)
+        maximum = np.maximum.reduceat(np.where(valid, values, -np.inf), starts)
+        mean = np.add.reduceat(np.where(valid, values, 0.0), starts) / counts
+    empty = counts == 0
+    minimum[empty] = np.nan
+    maximum[empty] = np.nan
+    mean[empty] = np.nan
+    return minimum, maximum, mean
+
+
+def detect_repetitions(
+    angles: np.ndarray,
+    seconds: np.ndarray,
+    valid: Optional[np.ndarray] = None,
+    min_dist: float = MIN_REP_DISTANCE_SECONDS,
+    amp_thresh_abs: float = AMP_THRESH_ABS,
+    amp_thresh_frac: float = AMP_THRESH_FRAC,
+    velocity: Optional[np.ndarray] = None,
+) -> dict[str, Any]:
+    """
+    Find repetitions and their per-rep statistics in one pass.
+
+    Returns ``{"count", "peaks", "boundaries", "reps"}``. ``boundaries`` has
+    ``count + 1`` entries (start of each rep, then the series length) and
+    ``reps`` holds arrays of ``start_seconds``, ``end_seconds``, ``min_rom``,
+    ``max_rom``, ``avg_rom``, ``max_velocity`` and ``avg_velocity`` per
+    repetition, the statistics computed only over ``valid`` samples (NaN when
+    a rep has none). Pass ``velocity`` to reuse an already filtered
+    derivative; otherwise ``np.gradient`` of the angles is used.
+    """
+    angles = np.asarray(angles, dtype=np.float64)
+    seconds = np.asarray(seconds, dtype=np.float64)
+    smoothed = moving_average(angles)
+    peaks = find_repetition_peaks(smoothed, seconds, min_dist, amp_thresh_abs, amp_thresh_frac)
+    empty = {name: np.zeros(0) for name in REP_FIELDS}
+    if len(peaks) == 0:
+        return {"count": 0, "peaks": peaks, "boundaries": np.array([0, len(angles)], dtype=np.intp), "reps": empty}
+
+    boundaries = repetition_boundaries(smoothed, peaks)
+    starts = boundaries[:-1]
+    valid = np.ones(len(angles), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+
+    if velocity is None:
+        velocity = np.gradient(angles, seconds) if len(angles) > 1 else np.zeros(len(angles))
+    speed = np.abs(velocity)
+    min_rom, max_rom, avg_rom = _masked_reduce(angles, valid, starts, counts)
+    _, max_velocity, avg_velocity = _masked_reduce(speed, valid, starts, counts)
+
+    return {
+        "count": int(len(peaks)),
+        "peaks": peaks,
+        "boundaries": boundaries,
+        "reps": {
+            "start_seconds": seconds[starts],
+            "end_seconds": seconds[boundaries[1:] - 1],
+            "min_rom": min_rom,
+            "max_rom": max_rom,
+            "avg_rom": avg_rom,
+            "max_velocity": max_velocity,
+            "avg_velocity": avg_velocity,
+        },
+    }
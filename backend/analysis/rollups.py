@@ -0,0 +1,120 @@
+"""
+Weekly ROM/velocity aggregates per patient and joint/side.
+
+A rollup summarizes every metrics entry of a patient's sessions in one week
+(Monday to Sunday, UTC): entry count, min, max and sum for ROM and velocity,
+plus fixed-bin histograms from which the 95th percentile is estimated.
+Everything except min/max can be updated incrementally as entries arrive;
+removing entries recomputes the week from its remaining entries instead.
+
+Entries use the keys of ``db._build_metrics_params`` (``min_rom``,
+``max_rom``, ``avg_rom``, ``min_v``, ``max_v``, ``avg_v``, ``p95_v``). ROM
+statistics use the entry's min/max/mean ROM for the weekly min/max/mean and
+its max ROM for the percentile; velocity uses the entry's min/max/mean and
+P95 velocity the same way.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, Union
+
+import numpy as np
+
+# Histogram bin edges; values outside are clamped into the first/last bin
+ROM_EDGES = np.linspace(0.0, 180.0, 91)
+VELOCITY_EDGES = np.linspace(0.0, 1200.0, 121)
+HISTOGRAM_DTYPE = "<u4"
+
+
+def week_start(moment: Union[date, datetime]) -> date:
+    """Monday of the week containing ``moment`` (naive datetimes are UTC)."""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    return day - timedelta(days=day.weekday())
+
+
+def empty_rollup() -> dict[str, Any]:
+    return {
+        "count": 0,
+        "rom_min": None, "rom_max": None, "rom_sum": 0.0,
+        "rom_histogram": np.zeros(len(ROM_EDGES) - 1, dtype=HISTOGRAM_DTYPE),
+        "velocity_min": None, "velocity_max": None, "velocity_sum": 0.0,
+        "velocity_histogram": np.zeros(len(VELOCITY_EDGES) - 1, dtype=HISTOGRAM_DTYPE),
+    }
+
+
+def _bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    bins = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+    return np.bincount(bins, minlength=len(edges) - 1).astype(HISTOGRAM_DTYPE)
+
+
+def _lowest(current, values: np.ndarray):
+    return float(values.min()) if current is None else min(current, float(values.min()))
+
+
+def _highest(current, values: np.ndarray):
+    return float(values.max()) if current is None else max(current, float(values.max()))
+
+
+def add_entries(rollup: dict[str, Any], entries: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """Return ``rollup`` updated with ``entries`` (the input is not modified)."""
+    entries = list(entries)
+    if not entries:
+        return rollup
+
+    def column(key: str) -> np.ndarray:
+        return np.array([float(entry.get(key) or 0.0) for entry in entries])
+
+    max_rom, max_velocity = column("max_rom"), column("max_v")
+    return {
+        "count": rollup["count"] + len(entries),
+        "rom_min": _lowest(rollup["rom_min"], column("min_rom")),
+        "rom_max": _highest(rollup["rom_max"], max_rom),
+        "rom_sum": rollup["rom_sum"] + float(column("avg_rom").sum()),
+        "rom_histogram": rollup["rom_histogram"] + _bin_counts(max_rom, ROM_EDGES),
+        "velocity_min": _lowest(rollup["velocity_min"], column("min_v")),
+        "velocity_max": _highest(rollup["velocity_max"], max_velocity),
+        "velocity_sum": rollup["velocity_sum"] + float(column("avg_v").sum()),
+        "velocity_histogram": rollup["velocity_histogram"] + _bin_counts(column("p95_v"), VELOCITY_EDGES),
+    }
+
+
+def histogram_percentile(counts: np.ndarray, edges: np.ndarray, q: float) -> float:
+    """Percentile ``q`` (0-100) of binned data, interpolating inside the bin."""
+    total = int(np.sum(counts))
+    if total == 0:
+        return 0.0
+    cumulative = np.cumsum(counts)
+    target = q / 100.0 * total
+    index = int(np.searchsorted(cumulative, target, side="left"))
+    index = min(index, len(counts) - 1)
+    below = cumulative[index - 1] if index else 0
+    fraction = (target - below) / counts[index] if counts[index] else 0.0
+    return float(edges[index] + fraction * (edges[index + 1] - edges[index]))
+
+
+def pack_histogram(counts: np.ndarray) -> bytes:
+    return np.asarray(counts, dtype=HISTOGRAM_DTYPE).tobytes()
+
+
+def unpack_histogram(blob: bytes, edges: np.ndarray) -> np.ndarray:
+    counts = np.frombuffer(bytes(blob or b""), dtype=HISTOGRAM_DTYPE)
+    if len(counts) != len(edges) - 1:
+        raise ValueError("Rollup histogram does not match the bin edges")
+    return counts.copy()
+
+
+def summarize_rollup(rollup: dict[str, Any]) -> dict[str, Any]:
+    """JSON-ready ``count`` plus ``rom`` / ``velocity`` min, max, mean and P95."""
+    count = rollup["count"]
+
+    def stats(prefix: str, edges: np.ndarray) -> dict[str, float]:
+        highest = rollup[f"{prefix}_max"] or 0.0
+        p95 = histogram_percentile(rollup[f"{prefix}_histogram"], edges, 95.0)
+        return {
+            "min": rollup[f"{prefix}_min"] or 0.0,
+            "max": highest,
+            "mean": rollup[f"{prefix}_sum"] / count if count else 0.0,
+            # Interpolating inside the top bin can overshoot the true maximum
+            "p95": min(p95, highest) if count else 0.0,
+        }
+
+    return {"count": count, "rom": stats("rom", ROM_EDGES), "velocity": stats("velocity", VELOCITY_EDGES)}
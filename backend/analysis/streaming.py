@@ -0,0 +1,523 @@
+"""
+Incremental analysis of live DOT sensor streams.
+
+While the patient exercises, the app forwards batches of decoded BLE packets
+(same channel names as the CSV export). Every session keeps fixed-size ring
+buffers of ``STREAM_WINDOW_SECONDS`` per sensor and per joint, so memory
+does not grow with session length, and folds new samples into running ROM
+and velocity statistics and a repetition count. A batch costs one pass over
+at most one window, which bounds the latency of the running metrics.
+``SessionStream.finish`` turns the running state into rows for
+``db.replace_session_metrics``.
+
+Samples are folded ``VELOCITY_LAG_SECONDS`` behind the newest data so the
+zero-phase velocity filter has enough context, and a repetition is counted
+once no higher peak can follow it within ``MIN_REP_DISTANCE_SECONDS``.
+Knee angles only: hip flexion picks its axis from the whole recording and
+is left to the archived-recording pipeline.
+
+Between requests a stream is pickled to ``<RECORDINGS_DIR>/live_streams/``,
+so any gunicorn worker can take the next batch of a session. A per-session
+file lock serializes the requests of one session across workers.
+"""
+
+import fcntl
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import numpy as np
+
+from .alignment import bracket, slerp
+from .calibration import apply_calibration
+from .filters import smooth_derivative
+from .kinematics import knee_angle_series, quat_from_euler_zyx
+from .movella_csv import SAMPLE_TIME_FINE_MODULUS, unwrap_sample_time_fine
+from .pipeline import KNEE_SENSOR_PAIRS
+from .quality import valid_mask
+from .recordings import get_recordings_dir
+from .repetitions import MIN_REP_DISTANCE_SECONDS, find_repetition_peaks, moving_average
+
+EULER_CHANNELS = ("Euler_X", "Euler_Y", "Euler_Z")
+QUAT_CHANNELS = ("Quat_W", "Quat_X", "Quat_Y", "Quat_Z")
+
+DEFAULT_STREAM_RATE = 60
+MAX_STREAM_RATE = 120
+STREAM_WINDOW_SECONDS = 20.0
+# Longest batch accepted per sensor; well below the window so nothing is
+# evicted before the joints have consumed it
+MAX_BATCH_SECONDS = 5.0
+VELOCITY_LAG_SECONDS = 0.25
+BASELINE_SECONDS = 1.0
+SPEED_BIN = 1.0  # deg/s, resolution of the running p95 velocity
+SPEED_BINS = 3000
+MAX_STREAMS = 64
+STREAM_IDLE_SECONDS = 300.0
+STREAMS_DIRNAME = "live_streams"
+STREAM_STATE_SUFFIX = ".stream"
+STREAM_LOCK_SUFFIX = ".lock"
+SESSION_ID_PATTERN = re.compile(r"^[\w-]{1,64}$")
+
+
+class StreamError(ValueError):
+    """Raised for malformed stream options or packet batches."""
+
+
+class StreamCapacityError(StreamError):
+    """Raised when every live-stream slot of this process is taken."""
+
+
+class RingBuffer:
+    """Fixed-capacity FIFO of samples backed by one preallocated array."""
+
+    def __init__(self, capacity: int, width: Optional[int] = None, dtype=np.float64):
+        self.capacity = int(capacity)
+        self._data = np.zeros((self.capacity,) if width is None else (self.capacity, width), dtype=dtype)
+        self.total = 0  # samples ever written
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    @property
+    def first_index(self) -> int:
+        """Absolute index (counting every sample written) of the oldest sample held."""
+        return self.total - len(self)
+
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=self._data.dtype)
+        n = len(values)
+        if n == 0:
+            return
+        if n > self.capacity:
+            self.total += n - self.capacity
+            values, n = values[-self.capacity :], self.capacity
+        start = self.total % self.capacity
+        head = min(n, self.capacity - start)
+        self._data[start : start + head] = values[:head]
+        self._data[: n - head] = values[head:]
+        self.total += n
+
+    def values(self) -> np.ndarray:
+        """Held samples, oldest first."""
+        if self.total <= self.capacity:
+            return self._data[: self.total].copy()
+        start = self.total % self.capacity
+        return np.concatenate([self._data[start:], self._data[:start]])
+
+    def last(self):
+        return self._data[(self.total - 1) % self.capacity] if self.total else None
+
+
+def decode_batch(channels: dict[str, Any]) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    ``(SampleTimeFine, quats, Status)`` arrays from one sensor's batch.
+
+    Orientation is taken from ``Quat_*`` when present, otherwise from
+    ``Euler_*``; ``Status`` is optional.
+    """
+    if not isinstance(channels, dict) or "SampleTimeFine" not in channels:
+        raise StreamError("Each sensor batch needs SampleTimeFine")
+    if all(name in channels for name in QUAT_CHANNELS):
+        orientation = QUAT_CHANNELS
+    elif all(name in channels for name in EULER_CHANNELS):
+        orientation = EULER_CHANNELS
+    else:
+        raise StreamError("Each sensor batch needs Quat_W..Quat_Z or Euler_X..Euler_Z")
+    try:
+        raw = np.asarray(channels["SampleTimeFine"], dtype=np.int64)
+        columns = [np.asarray(channels[name], dtype=np.float64) for name in orientation]
+        status = np.asarray(channels["Status"], dtype=np.uint32) if "Status" in channels else None
+    except (TypeError, ValueError, OverflowError) as e:
+        raise StreamError("Sensor channels must be numeric arrays") from e
+
+    if raw.ndim != 1 or any(column.shape != raw.shape for column in columns) or (
+        status is not None and status.shape != raw.shape
+    ):
+        raise StreamError("All channels of a sensor batch must have the same length")
+    if orientation is QUAT_CHANNELS:
+        quats = np.column_stack(columns)
+        norms = np.linalg.norm(quats, axis=1, keepdims=True)
+        quats = quats / np.where(norms > 0, norms, 1.0)
+    else:
+        quats = quat_from_euler_zyx(*columns)
+    if not np.all(np.isfinite(quats)):
+        raise StreamError("Orientation channels contain non-finite values")
+    return raw, quats, status
+
+
+class SensorStream:
+    """Most recent window of one sensor's orientation samples."""
+
+    def __init__(self, capacity: int):
+        self.seconds = RingBuffer(capacity)
+        self.quats = RingBuffer(capacity, 4)
+        self.status = RingBuffer(capacity, dtype=np.uint32)
+        self._last_raw: Optional[int] = None
+        self._last_unwrapped: Optional[int] = None
+
+    def unwrap(self, raw: np.ndarray, origin: Optional[int]) -> np.ndarray:
+        """Microseconds continuing this sensor's clock across batches and rollovers."""
+        unwrapped = unwrap_sample_time_fine(raw)
+        reference = origin if self._last_raw is None else self._last_raw
+        if reference is not None:
+            # The first sample lies within half a rollover of the previous one
+            # (or of the session origin), in either direction
+            half = SAMPLE_TIME_FINE_MODULUS // 2
+            step = (int(raw[0]) - reference + half) % SAMPLE_TIME_FINE_MODULUS - half
+            base = origin if self._last_raw is None else self._last_unwrapped
+            unwrapped = unwrapped - unwrapped[0] + base + step
+        self._last_raw, self._last_unwrapped = int(raw[-1]), int(unwrapped[-1])
+        return unwrapped
+
+    def append(self, seconds: np.ndarray, quats: np.ndarray, status: Optional[np.ndarray]) -> int:
+        """Add samples, dropping retransmitted or out-of-order ones; returns how many were kept."""
+        latest = self.seconds.last()
+        previous = np.maximum.accumulate(np.concatenate([[-np.inf if latest is None else latest], seconds]))[:-1]
+        keep = seconds > previous
+        self.seconds.extend(seconds[keep])
+        self.quats.extend(quats[keep])
+        self.status.extend(np.zeros(int(keep.sum()), dtype=np.uint32) if status is None else status[keep])
+        return int(keep.sum())
+
+
+class KneeStream:
+    """Running ROM, velocity and repetition statistics of one knee."""
+
+    def __init__(self, side: str, thigh_tag: int, shank_tag: int, rate: float, capacity: int):
+        self.side = side
+        self.thigh_tag = thigh_tag
+        self.shank_tag = shank_tag
+        self.rate = float(rate)
+        self.seconds = RingBuffer(capacity)
+        self.angles = RingBuffer(capacity)
+        self.valid = RingBuffer(capacity, dtype=bool)
+        self.next_tick: Optional[int] = None
+        self.start_seconds: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.folded = 0  # absolute index of the first sample not yet in the statistics
+        self.last_peak = -(10**12)
+        self.repetitions = 0
+        self.rom_min = np.inf
+        self.rom_max = -np.inf
+        self.rom_sum = 0.0
+        self.rom_count = 0
+        self.speed_min = np.inf
+        self.speed_max = 0.0
+        self.speed_sum = 0.0
+        self.speed_count = 0
+        self.speed_histogram = np.zeros(SPEED_BINS, dtype=np.int64)
+
+    def _resample(self, sensor: SensorStream, grid: np.ndarray, offset) -> tuple[np.ndarray, np.ndarray]:
+        seconds = sensor.seconds.values()
+        quats = sensor.quats.values()
+        left, right, fraction = bracket(seconds, grid)
+        resampled = slerp(quats[left], quats[right], fraction)
+        if offset is not None:
+            resampled = apply_calibration(resampled, offset)
+        return resampled, valid_mask(seconds, left, right, sensor.status.values())
+
+    def update(self, sensors: dict[int, SensorStream], offsets: dict[int, Any], final: bool = False) -> None:
+        thigh, shank = sensors.get(self.thigh_tag), sensors.get(self.shank_tag)
+        if thigh is None or shank is None or len(thigh.seconds) < 2 or len(shank.seconds) < 2:
+            return
+        begin = max(thigh.seconds.values()[0], shank.seconds.values()[0])
+        end = min(thigh.seconds.last(), shank.seconds.last())
+        first_tick = int(np.ceil(begin * self.rate - 1e-9))
+        if self.next_tick is not None:
+            first_tick = max(first_tick, self.next_tick)
+        ticks = np.arange(first_tick, int(np.floor(end * self.rate + 1e-9)) + 1)
+        if len(ticks):
+            grid = ticks / self.rate
+            thigh_q, thigh_valid = self._resample(thigh, grid, offsets.get(self.thigh_tag))
+            shank_q, shank_valid = self._resample(shank, grid, offsets.get(self.shank_tag))
+            self.next_tick = int(ticks[-1]) + 1
+            if self.start_seconds is None:
+                self.start_seconds = float(grid[0])
+            self.seconds.extend(grid)
+            self.angles.extend(knee_angle_series(thigh_q, shank_q))
+            self.valid.extend(thigh_valid & shank_valid)
+        self._fold(final)
+
+    def _fold(self, final: bool) -> None:
+        if self.angles.total == 0:
+            return
+        seconds = self.seconds.values()
+        angles = self.angles.values()
+        valid = self.valid.values()
+        first = self.angles.first_index
+
+        if self.baseline is None:
+            # Same static-pose baseline as ``kinematics.baseline_subtract``
+            in_baseline = seconds < self.start_seconds + BASELINE_SECONDS
+            if not final and in_baseline.all():
+                return
+            self.baseline = float(np.mean(angles[in_baseline]))
+        angles = angles - self.baseline
+
+        lag = 0 if final else int(round(VELOCITY_LAG_SECONDS * self.rate))
+        ready = self.angles.total - lag
+        start = max(self.folded, first)
+        if ready > start:
+            speed = np.abs(np.nan_to_num(smooth_derivative(angles, seconds))) if len(angles) > 1 else np.zeros(len(angles))
+            speed_valid = valid.copy()
+            speed_valid[1:] &= valid[:-1]
+            speed_valid[:-1] &= valid[1:]
+            window = slice(start - first, ready - first)
+            self._add_rom(angles[window][valid[window]])
+            self._add_speed(speed[window][speed_valid[window]])
+            self.folded = ready
+
+        if self.rom_count:
+            self._count_repetitions(angles, seconds, first, final)
+
+    def _add_rom(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        self.rom_min = min(self.rom_min, float(values.min()))
+        self.rom_max = max(self.rom_max, float(values.max()))
+        self.rom_sum += float(values.sum())
+        self.rom_count += len(values)
+
+    def _add_speed(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        self.speed_min = min(self.speed_min, float(values.min()))
+        self.speed_max = max(self.speed_max, float(values.max()))
+        self.speed_sum += float(values.sum())
+        self.speed_count += len(values)
+        bins = np.minimum((values / SPEED_BIN).astype(np.int64), SPEED_BINS - 1)
+        self.speed_histogram += np.bincount(bins, minlength=SPEED_BINS)
+
+    def _count_repetitions(self, angles: np.ndarray, seconds: np.ndarray, first: int, final: bool) -> None:
+        peaks = find_repetition_peaks(moving_average(angles), seconds, rom=self.rom_max - self.rom_min) + first
+        min_distance = int(np.ceil(MIN_REP_DISTANCE_SECONDS * self.rate))
+        confirmed = peaks[peaks >= self.last_peak + min_distance]
+        if not final:
+            # A higher peak arriving within min_distance could still replace it
+            confirmed = confirmed[confirmed < self.angles.total - min_distance]
+        if len(confirmed):
+            self.repetitions += len(confirmed)
+            self.last_peak = int(confirmed[-1])
+
+    def _p95_speed(self) -> float:
+        if not self.speed_count:
+            return 0.0
+        rank = int(np.searchsorted(np.cumsum(self.speed_histogram), 0.95 * self.speed_count))
+        return min((rank + 0.5) * SPEED_BIN, self.speed_max)
+
+    def summary(self) -> Optional[dict[str, Any]]:
+        """Metrics row in ``insert_session_metrics`` format, or None before any data."""
+        if not self.rom_count:
+            return None
+        return {
+            "joint": "knee",
+            "side": self.side,
+            "repetition": self.repetitions,
+            "min_velocity": self.speed_min if self.speed_count else 0.0,
+            "max_velocity": self.speed_max,
+            "avg_velocity": self.speed_sum / self.speed_count if self.speed_count else 0.0,
+            "p95_velocity": self._p95_speed(),
+            "min_rom": self.rom_min,
+            "max_rom": self.rom_max,
+            "avg_rom": self.rom_sum / self.rom_count,
+            "center_mass_displacement": 0.0,
+            "seconds": round(float(self.seconds.last() - self.start_seconds), 3),
+        }
+
+
+class SessionStream:
+    """Ring buffers and running metrics of one live session."""
+
+    def __init__(
+        self,
+        session_id: str,
+        rate: float = DEFAULT_STREAM_RATE,
+        calibration_offsets: Optional[dict[int, Any]] = None,
+    ):
+        try:
+            rate = float(rate or DEFAULT_STREAM_RATE)
+        except (TypeError, ValueError):
+            raise StreamError("rate must be a number") from None
+        if not 0 < rate <= MAX_STREAM_RATE:
+            raise StreamError(f"rate must be between 1 and {MAX_STREAM_RATE} Hz")
+        self.session_id = session_id
+        self.rate = rate
+        self.capacity = int(STREAM_WINDOW_SECONDS * rate)
+        self.offsets = {int(tag): offset for tag, offset in (calibration_offsets or {}).items()}
+        self.sensors: dict[int, SensorStream] = {}
+        self.knees = [KneeStream(side, thigh, shank, rate, self.capacity) for side, thigh, shank in KNEE_SENSOR_PAIRS]
+        self.origin: Optional[int] = None
+        self.samples = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add_batch(self, sensors: dict[str, Any]) -> list[dict[str, Any]]:
+        """
+        Add one batch ``{tag: {channel: [values]}}`` and return the running metrics.
+
+        The whole batch is validated before any of it is applied.
+        """
+        if not isinstance(sensors, dict) or not sensors:
+            raise StreamError("sensors must map DeviceTag to channel arrays")
+        decoded = {}
+        max_samples = int(MAX_BATCH_SECONDS * self.rate)
+        for tag, channels in sensors.items():
+            try:
+                tag = int(tag)
+            except (TypeError, ValueError):
+                raise StreamError(f"Invalid DeviceTag {tag!r}") from None
+            raw, quats, status = decode_batch(channels)
+            if len(raw) > max_samples:
+                raise StreamError(f"Batches are limited to {MAX_BATCH_SECONDS:g} s of data per sensor")
+            if len(raw):
+                decoded[tag] = (raw, quats, status)
+
+        with self.lock:
+            for tag, (raw, quats, status) in decoded.items():
+                sensor = self.sensors.setdefault(tag, SensorStream(self.capacity))
+                unwrapped = sensor.unwrap(raw, self.origin)
+                if self.origin is None:
+                    self.origin = int(unwrapped[0])
+                self.samples += sensor.append((unwrapped - self.origin) / 1e6, quats, status)
+            for knee in self.knees:
+                knee.update(self.sensors, self.offsets)
+            return self._summaries()
+
+    def metrics(self) -> list[dict[str, Any]]:
+        with self.lock:
+            return self._summaries()
+
+    def finish(self) -> list[dict[str, Any]]:
+        """Fold the samples still held back by the velocity lag and return final rows."""
+        with self.lock:
+            for knee in self.knees:
+                knee.update(self.sensors, self.offsets, final=True)
+            return self._summaries()
+
+    def _summaries(self) -> list[dict[str, Any]]:
+        return [row for row in (knee.summary() for knee in self.knees) if row is not None]
+
+
+class StreamRegistry:
+    """
+    Live sessions shared by every worker process, with a cap and idle expiry.
+
+    Each stream is a pickle next to its lock file; ``open`` hands it out
+    under the lock and writes it back when the caller is done.
+    """
+
+    def __init__(
+        self,
+        max_streams: int = MAX_STREAMS,
+        idle_seconds: float = STREAM_IDLE_SECONDS,
+        directory: Optional[Path] = None,
+    ):
+        self.max_streams = max_streams
+        self.idle_seconds = idle_seconds
+        self.directory = directory
+
+    def _root(self) -> Path:
+        root = self.directory if self.directory is not None else get_recordings_dir() / STREAMS_DIRNAME
+        root.mkdir(parents=True, exist_ok=True)
+        return root
+
+    def _paths(self, session_id: str) -> tuple[Path, Path]:
+        if not SESSION_ID_PATTERN.match(str(session_id or "")):
+            raise StreamError("Invalid session id")
+        root = self._root()
+        return root / f"{session_id}{STREAM_STATE_SUFFIX}", root / f"{session_id}{STREAM_LOCK_SUFFIX}"
+
+    def _expired(self, path: Path) -> bool:
+        try:
+            return path.stat().st_mtime < time.time() - self.idle_seconds
+        except FileNotFoundError:
+            return True
+
+    def _purge(self) -> int:
+        """Drop idle streams; returns how many live ones remain."""
+        live = 0
+        for path in self._root().glob(f"*{STREAM_STATE_SUFFIX}"):
+            if self._expired(path):
+                path.unlink(missing_ok=True)
+            else:
+                live += 1
+        return live
+
+    @contextmanager
+    def _locked(self, lock_path: Path) -> Iterator[None]:
+        with open(lock_path, "w") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _save(self, path: Path, stream: SessionStream) -> None:
+        staging = path.with_name(f".{path.name}.tmp-{uuid.uuid4().hex}")
+        with open(staging, "wb") as handle:
+            pickle.dump(stream, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging, path)
+
+    def _load(self, path: Path) -> Optional[SessionStream]:
+        if self._expired(path):
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            with open(path, "rb") as handle:
+                return pickle.load(handle)
+        except FileNotFoundError:
+            return None
+
+    def start(self, session_id: str, **options: Any) -> SessionStream:
+        """Open (or restart) the stream of a session."""
+        stream = SessionStream(session_id, **options)
+        path, lock_path = self._paths(session_id)
+        with self._locked(lock_path):
+            if not path.exists() and self._purge() >= self.max_streams:
+                raise StreamCapacityError("Too many live sessions, try again later")
+            self._save(path, stream)
+        return stream
+
+    def get(self, session_id: str) -> Optional[SessionStream]:
+        """Read-only snapshot of a stream; changes to it are not kept."""
+        path, lock_path = self._paths(session_id)
+        with self._locked(lock_path):
+            return self._load(path)
+
+    @contextmanager
+    def open(self, session_id: str) -> Iterator[Optional[SessionStream]]:
+        """
+        Yield the stream (None when there is none) under the session's lock
+        and write it back afterwards; nothing is written if the block raises.
+        """
+        path, lock_path = self._paths(session_id)
+        with self._locked(lock_path):
+            stream = self._load(path)
+            yield stream
+            if stream is not None and path.exists():
+                self._save(path, stream)
+
+    def pop(self, session_id: str) -> Optional[SessionStream]:
+        path, lock_path = self._paths(session_id)
+        with self._locked(lock_path):
+            stream = self._load(path)
+            path.unlink(missing_ok=True)
+            return stream
+
+    def close(self, session_id: str) -> None:
+        """Remove a stream from inside its ``open`` block (the lock is already held)."""
+        self._paths(session_id)[0].unlink(missing_ok=True)
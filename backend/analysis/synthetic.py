@@ -0,0 +1,205 @@
+"""
+Synthetic five-sensor Movella DOT recordings with known ground truth.
+
+Patient recordings cannot be shared, so tests and benchmarks generate
+squat-like sessions instead: both knees flex ``repetitions`` times between
+still periods, the thighs follow at a fraction of the knee angle and the
+pelvis tilts forward and drops with them. Segment orientations are built
+from those angles (sensor -Y along the bone, DOT world frame Z-up), mounted
+with a small random tilt that the static-pose calibration has to remove,
+and exported in the same CSV layout as the Movella DOT app, optionally with
+measurement noise, bursts of lost packets and sensor clock drift.
+
+``generate_recording`` returns the per-sensor CSV text together with the
+ground truth; ``build_recording_zip`` packs it like an app export.
+"""
+
+import io
+import zipfile
+from typing import Any, Optional
+
+import numpy as np
+
+from .kinematics import quat_from_euler_zyx, quat_multiply, quat_to_euler_zyx
+from .movella_csv import SAMPLE_TIME_FINE_MODULUS
+
+SENSOR_TAGS = (1, 2, 3, 4, 5)
+CSV_COLUMNS = (
+    "PacketCounter", "SampleTimeFine", "Euler_X", "Euler_Y", "Euler_Z",
+    "FreeAcc_X", "FreeAcc_Y", "FreeAcc_Z", "Status",
+)
+CSV_FORMATS = ["%d", "%d"] + ["%.6f"] * 6 + ["%d"]
+
+# Fraction of the knee angle reached by the thigh (hip) and by pelvis tilt
+THIGH_FLEXION_RATIO = 0.8
+PELVIS_TILT_RATIO = 0.2
+
+
+def _axis_angle_x(degrees: np.ndarray) -> np.ndarray:
+    half = np.radians(degrees) / 2.0
+    return np.column_stack([np.cos(half), np.sin(half), np.zeros_like(half), np.zeros_like(half)])
+
+
+def repetition_profile(
+    seconds: np.ndarray,
+    repetitions: int,
+    duration: float,
+    still_seconds: float,
+) -> np.ndarray:
+    """0..1 flexion profile: ``repetitions`` raised-cosine cycles between still periods."""
+    active = max(duration - 2.0 * still_seconds, 1e-9)
+    phase = np.clip((seconds - still_seconds) / active, 0.0, 1.0) * repetitions
+    return (1.0 - np.cos(2.0 * np.pi * phase)) / 2.0
+
+
+def _slow_noise(rng: np.random.Generator, shape: tuple[int, int], std: float, width: int) -> np.ndarray:
+    """
+    Gaussian noise low-passed by two ``width``-sample moving averages.
+
+    Sensor-fusion orientation wanders slowly rather than jittering sample to
+    sample; white noise of the same size would look like constant motion.
+    """
+    noise = rng.normal(0.0, 1.0, (shape[0] + 2 * width, shape[1]))
+    kernel = np.convolve(np.ones(width), np.ones(width)) / width ** 2
+    smoothed = np.column_stack([np.convolve(column, kernel, mode="valid") for column in noise.T])[: shape[0]]
+    return smoothed * (std / np.sqrt(np.sum(kernel ** 2)))
+
+
+def _loss_mask(rng: np.random.Generator, samples: int, loss: float, burst: float) -> np.ndarray:
+    """True for packets that are kept; lost packets come in geometric bursts."""
+    if loss <= 0 or samples == 0:
+        return np.ones(samples, dtype=bool)
+    starts = np.flatnonzero(rng.random(samples) < loss / burst)
+    ends = np.minimum(starts + rng.geometric(1.0 / burst, len(starts)), samples)
+    delta = np.zeros(samples + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    lost = np.cumsum(delta[:-1]) > 0
+    lost[0] = False  # keep the first packet so every sensor has a start time
+    return ~lost
+
+
+def _sensor_csv(tag: int, rate: int, table: np.ndarray, synced: bool) -> str:
+    header = [
+        "sep=,",
+        f"DeviceTag:,{tag}",
+        "FirmwareVersion:,3.0.0",
+        "AppVersion:,2023.6.0",
+        f"SyncStatus:,{'Synced' if synced else 'Unsynced'}",
+        f"OutputRate:,{rate}Hz",
+        "FilterProfile:,General",
+        "Measurement Mode:,Sensor fusion Mode - Extended(Euler)",
+        "StartTime: ,2025-01-01_10:00:00_000 UTC",
+        "",
+        ",".join(CSV_COLUMNS),
+    ]
+    body = io.StringIO()
+    np.savetxt(body, table, delimiter=",", fmt=CSV_FORMATS)
+    return "\n".join(header) + "\n" + body.getvalue()
+
+
+def generate_recording(
+    duration: float = 30.0,
+    rate: int = 60,
+    repetitions: int = 10,
+    knee_amplitude: float = 80.0,
+    asymmetry: float = 0.1,
+    com_drop_cm: float = 25.0,
+    noise_deg: float = 0.2,
+    noise_acc: float = 0.05,
+    packet_loss: float = 0.0,
+    loss_burst: float = 3.0,
+    clock_drift_ppm: float = 0.0,
+    mounting_tilt_deg: float = 5.0,
+    still_seconds: float = 2.0,
+    heading_deg: float = 30.0,
+    start_time_fine: Optional[int] = None,
+    seed: int = 0,
+) -> dict[str, Any]:
+    """
+    Build one recording.
+
+    ``asymmetry`` shrinks the left knee amplitude by that fraction;
+    ``packet_loss`` is the expected fraction of lost packets per sensor;
+    each sensor's clock runs fast or slow by up to ``clock_drift_ppm``
+    (drifting sensors are exported as unsynced). Returns ``{"csv": {tag:
+    text}, "rate", "truth"}`` where ``truth`` holds the true time grid,
+    knee and hip flexion per side (degrees), the repetition count and the
+    pelvis drop per repetition (cm).
+    """
+    rng = np.random.default_rng(seed)
+    samples = int(round(duration * rate))
+    seconds = np.arange(samples) / rate
+    if start_time_fine is None:
+        start_time_fine = int(rng.integers(0, SAMPLE_TIME_FINE_MODULUS))
+
+    amplitudes = {"right": knee_amplitude, "left": knee_amplitude * (1.0 - asymmetry)}
+    neutral = quat_multiply(
+        quat_from_euler_zyx([0.0], [0.0], [heading_deg]),  # heading about world Z
+        _axis_angle_x(np.array([90.0])),  # sensor -Y (bone axis) pointing down
+    )
+
+    def joint_angles(at: np.ndarray) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray], np.ndarray]:
+        profile = repetition_profile(at, repetitions, duration, still_seconds)
+        knee = {side: amplitude * profile for side, amplitude in amplitudes.items()}
+        thigh = {side: THIGH_FLEXION_RATIO * angles for side, angles in knee.items()}
+        tilt = PELVIS_TILT_RATIO * (thigh["right"] + thigh["left"]) / 2.0
+        return knee, thigh, tilt
+
+    def segment_orientations(at: np.ndarray) -> dict[int, np.ndarray]:
+        knee, thigh, tilt = joint_angles(at)
+        # Flexion swings a bone's -Y axis forward, a negative rotation about
+        # the segment's medio-lateral X axis; the knee bends the shank back
+        return {
+            1: quat_multiply(neutral, _axis_angle_x(-thigh["right"])),
+            2: quat_multiply(neutral, _axis_angle_x(knee["right"] - thigh["right"])),
+            3: quat_multiply(neutral, _axis_angle_x(-thigh["left"])),
+            4: quat_multiply(neutral, _axis_angle_x(knee["left"] - thigh["left"])),
+            5: quat_multiply(neutral, _axis_angle_x(tilt)),
+        }
+
+    knee, thigh, tilt = joint_angles(seconds)
+
+    csv = {}
+    for tag in SENSOR_TAGS:
+        drift = float(rng.uniform(-1.0, 1.0)) * clock_drift_ppm * 1e-6 if clock_drift_ppm else 0.0
+        # The sensor samples on its own clock: its k-th sample is taken at
+        # true time k / (rate * (1 + drift)) but stamped k / rate
+        true_time = seconds / (1.0 + drift)
+        segments = segment_orientations(true_time)
+        mount = quat_from_euler_zyx(*rng.uniform(-mounting_tilt_deg, mounting_tilt_deg, (3, 1)))
+        quats = quat_multiply(segments[tag], mount)
+        euler = np.column_stack(quat_to_euler_zyx(quats)) + _slow_noise(rng, (samples, 3), noise_deg, rate)
+
+        acc = rng.normal(0.0, noise_acc, (samples, 3))
+        if tag == 5:
+            height = -com_drop_cm / 100.0 * repetition_profile(true_time, repetitions, duration, still_seconds)
+            acc[:, 2] += np.gradient(np.gradient(height, true_time), true_time)
+
+        stamps = (start_time_fine + np.round(seconds * 1e6).astype(np.int64)) % SAMPLE_TIME_FINE_MODULUS
+        table = np.column_stack([
+            np.arange(1, samples + 1), stamps, euler, acc, np.zeros(samples),
+        ])
+        kept = _loss_mask(rng, samples, packet_loss, loss_burst)
+        csv[tag] = _sensor_csv(tag, rate, table[kept], synced=not clock_drift_ppm)
+
+    return {
+        "csv": csv,
+        "rate": rate,
+        "truth": {
+            "seconds": seconds,
+            "knee": knee,
+            "hip": {side: angles + tilt for side, angles in thigh.items()},
+            "repetitions": repetitions,
+            "com_drop_cm": com_drop_cm,
+        },
+    }
+
+
+def build_recording_zip(recording: dict[str, Any]) -> bytes:
+    """ZIP with one CSV per sensor, named like a Movella DOT app export."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for tag, text in recording["csv"].items():
+            archive.writestr(f"{tag}_20250101_100000_000.csv", text)
+    return buffer.getvalue()
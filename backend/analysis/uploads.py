@@ -0,0 +1,288 @@
+"""
+Resumable chunked uploads of recording archives.
+
+Large ZIPs are sent as numbered chunks that can be retried independently:
+
+    <RECORDINGS_DIR>/uploads/<upload_id>/upload.json       upload metadata
+    <RECORDINGS_DIR>/uploads/<upload_id>/data.part         assembled file
+    <RECORDINGS_DIR>/uploads/<upload_id>/chunks/<n>.json   size and SHA-256 of chunk n
+
+Every chunk is written straight to its offset in ``data.part``, so the
+file is complete as soon as the last chunk lands and committing needs no
+reassembly; the caller streams it from disk. Each chunk has its own marker
+file, so concurrent chunk requests never rewrite shared metadata.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from .recordings import get_recordings_dir
+
+UPLOADS_DIRNAME = "uploads"
+UPLOAD_METADATA_FILENAME = "upload.json"
+UPLOAD_DATA_FILENAME = "data.part"
+CHUNKS_DIRNAME = "chunks"
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+DEFAULT_UPLOAD_TTL_HOURS = 24.0
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """Raised for invalid upload requests (bad sizes, hashes or chunk numbers)."""
+
+
+def _env_number(name: str, default: float) -> float:
+    configured = (os.getenv(name) or "").strip()
+    try:
+        return float(configured) if configured else default
+    except ValueError:
+        return default
+
+
+def get_max_upload_bytes() -> int:
+    return int(_env_number("UPLOAD_MAX_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
+
+
+def get_upload_ttl() -> timedelta:
+    return timedelta(hours=_env_number("UPLOAD_TTL_HOURS", DEFAULT_UPLOAD_TTL_HOURS))
+
+
+def get_uploads_dir() -> Path:
+    return get_recordings_dir() / UPLOADS_DIRNAME
+
+
+def is_valid_upload_id(upload_id: Optional[str]) -> bool:
+    return bool(UPLOAD_ID_PATTERN.match(str(upload_id or "")))
+
+
+def _upload_path(upload_id: str) -> Path:
+    if not is_valid_upload_id(upload_id):
+        raise ValueError("Invalid upload id")
+    return get_uploads_dir() / upload_id
+
+
+def _write_json_atomic(path: Path, payload: dict[str, Any]) -> None:
+    staging = path.with_name(f".{path.name}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    with open(staging, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, indent=2)
+    os.replace(staging, path)
+
+
+def chunk_count(upload: dict[str, Any]) -> int:
+    return max(1, -(-int(upload["size"]) // int(upload["chunk_size"])))
+
+
+def chunk_length(upload: dict[str, Any], index: int) -> int:
+    """Expected byte length of chunk ``index`` (the last one may be short)."""
+    size, chunk_size = int(upload["size"]), int(upload["chunk_size"])
+    return max(0, min(chunk_size, size - index * chunk_size))
+
+
+def create_upload(
+    filename: str,
+    size: int,
+    created_by: str,
+    chunk_size: Optional[int] = None,
+    sha256: Optional[str] = None,
+    **fields: Any,
+) -> dict[str, Any]:
+    """
+    Register a new upload and preallocate its data file.
+
+    Extra ``fields`` (patient, session, exercise type...) are stored with the
+    upload and returned by ``load_upload``.
+    """
+    try:
+        size = int(size)
+        chunk_size = int(chunk_size or DEFAULT_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        raise UploadError("size and chunk_size must be integers") from None
+    if size <= 0:
+        raise UploadError("size must be positive")
+    if size > get_max_upload_bytes():
+        raise UploadError(f"Uploads are limited to {get_max_upload_bytes()} bytes")
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise UploadError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes")
+    if sha256 is not None and not re.fullmatch(r"[0-9a-fA-F]{64}", str(sha256)):
+        raise UploadError("sha256 must be a hex SHA-256 digest")
+
+    purge_expired_uploads()
+    upload_id = uuid.uuid4().hex
+    directory = _upload_path(upload_id)
+    (directory / CHUNKS_DIRNAME).mkdir(parents=True)
+    with open(directory / UPLOAD_DATA_FILENAME, "wb") as handle:
+        handle.truncate(size)  # sparse on most filesystems
+
+    now = datetime.now(timezone.utc)
+    upload = {
+        **fields,
+        "upload_id": upload_id,
+        "filename": filename,
+        "size": size,
+        "chunk_size": chunk_size,
+        "sha256": sha256.lower() if sha256 else None,
+        "created_by": created_by,
+        "created_at": now.isoformat(),
+        "expires_at": (now + get_upload_ttl()).isoformat(),
+    }
+    _write_json_atomic(directory / UPLOAD_METADATA_FILENAME, upload)
+    return upload
+
+
+def load_upload(upload_id: str) -> Optional[dict[str, Any]]:
+    if not is_valid_upload_id(upload_id):
+        return None
+    try:
+        with open(_upload_path(upload_id) / UPLOAD_METADATA_FILENAME, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def write_chunk(
+    upload: dict[str, Any],
+    index: int,
+    stream: BinaryIO,
+    expected_sha256: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Copy one chunk from ``stream`` to its offset in the data file.
+
+    The chunk is hashed while it is copied and only recorded as received
+    when its length matches and, if given, ``expected_sha256`` agrees.
+    Re-sending a chunk overwrites it.
+    """
+    if not 0 <= index < chunk_count(upload):
+        raise UploadError(f"Chunk index must be between 0 and {chunk_count(upload) - 1}")
+    expected_length = chunk_length(upload, index)
+    directory = _upload_path(upload["upload_id"])
+    marker = directory / CHUNKS_DIRNAME / f"{index}.json"
+    marker.unlink(missing_ok=True)
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(directory / UPLOAD_DATA_FILENAME, "r+b") as handle:
+        handle.seek(index * int(upload["chunk_size"]))
+        while True:
+            block = stream.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            written += len(block)
+            if written > expected_length:
+                raise UploadError(f"Chunk {index} must be {expected_length} bytes")
+            digest.update(block)
+            handle.write(block)
+
+    if written != expected_length:
+        raise UploadError(f"Chunk {index} must be {expected_length} bytes, got {written}")
+    chunk = {"index": index, "size": written, "sha256": digest.hexdigest()}
+    if expected_sha256 and chunk["sha256"] != expected_sha256.strip().lower():
+        raise UploadError(f"Chunk {index} does not match its SHA-256")
+    _write_json_atomic(marker, chunk)
+    return chunk
+
+
+def received_chunks(upload: dict[str, Any]) -> list[int]:
+    chunks_dir = _upload_path(upload["upload_id"]) / CHUNKS_DIRNAME
+    indices = []
+    for entry in os.listdir(chunks_dir):
+        stem, _, suffix = entry.partition(".")
+        if suffix == "json" and stem.isdigit():
+            indices.append(int(stem))
+    return sorted(indices)
+
+
+def _ranges(indices: list[int]) -> list[list[int]]:
+    """Collapse sorted indices into inclusive ``[first, last]`` ranges."""
+    ranges: list[list[int]] = []
+    for index in indices:
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ranges
+
+
+def upload_status(upload: dict[str, Any]) -> dict[str, Any]:
+    received = received_chunks(upload)
+    total = chunk_count(upload)
+    return {
+        "uploadId": upload["upload_id"],
+        "filename": upload["filename"],
+        "size": upload["size"],
+        "chunkSize": upload["chunk_size"],
+        "chunkCount": total,
+        "receivedChunks": _ranges(received),
+        "receivedBytes": sum(chunk_length(upload, index) for index in received),
+        "complete": len(received) == total,
+        "expiresAt": upload["expires_at"],
+    }
+
+
+def open_completed_upload(upload: dict[str, Any]) -> BinaryIO:
+    """
+    Open the assembled file for reading once every chunk has arrived.
+
+    When a whole-file ``sha256`` was declared it is verified by streaming
+    the file from disk.
+    """
+    missing = chunk_count(upload) - len(received_chunks(upload))
+    if missing:
+        raise UploadError(f"{missing} chunk(s) still missing")
+    handle = open(_upload_path(upload["upload_id"]) / UPLOAD_DATA_FILENAME, "rb")
+    if upload.get("sha256"):
+        digest = hashlib.sha256()
+        for block in iter(lambda: handle.read(COPY_BLOCK_SIZE), b""):
+            digest.update(block)
+        handle.seek(0)
+        if digest.hexdigest() != upload["sha256"]:
+            handle.close()
+            raise UploadError("Assembled file does not match its SHA-256")
+    return handle
+
+
+def delete_upload(upload_id: str) -> bool:
+    if not is_valid_upload_id(upload_id):
+        return False
+    path = _upload_path(upload_id)
+    if not path.is_dir():
+        return False
+    shutil.rmtree(path, ignore_errors=True)
+    return True
+
+
+def purge_expired_uploads(now: Optional[datetime] = None) -> int:
+    """Delete uploads past their expiry; returns how many were removed."""
+    root = get_uploads_dir()
+    if not root.is_dir():
+        return 0
+    now = now or datetime.now(timezone.utc)
+    removed = 0
+    for entry in root.iterdir():
+        if not is_valid_upload_id(entry.name):
+            continue
+        upload = load_upload(entry.name)
+        try:
+            if upload is None:
+                # Metadata not written yet (or lost): judge by the directory age
+                created = datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc)
+                expired = created + get_upload_ttl() <= now
+            else:
+                expired = datetime.fromisoformat(upload["expires_at"]) <= now
+        except (KeyError, ValueError, OSError):
+            expired = True
+        if expired and delete_upload(entry.name):
+            removed += 1
+    return removed
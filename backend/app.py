@@ -1,16 +1,17 @@
 import os
 import base64
+import hashlib
 import json
 import jwt as PyJWT
-import zipfile
 import io
-import csv
 import re
 
-from flask import Flask, jsonify, request
+import numpy as np
+from flask import Flask, Response, jsonify, make_response, request, send_file, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from werkzeug.datastructures import FileStorage
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import date, datetime, timedelta, timezone
 from email.utils import parsedate_to_datetime
@@ -20,6 +21,16 @@ from db import (
     list_doctor_patients,
     list_unassigned_patients,
     assign_patient_to_doctor,
+    reassign_patients,
+    claim_idempotency_key,
+    store_idempotent_response,
+    release_idempotency_key,
+    get_patient_relation,
+    apply_patient_sync,
+    get_patient_changes_since,
+    get_changes_cursor,
+    get_deleted_records,
+    SyncReferenceError,
     get_doctor_patient_ids,
     get_user_by_id,
     get_user_for_login,
@@ -32,8 +43,16 @@ from db import (
     delete_patient_session,
     create_manual_patient,
     insert_session_metrics,
+    replace_session_metrics,
     get_metrics_by_patient,
     get_metrics_by_session,
+    iter_patient_metric_series,
+    resolve_metric_series_column,
+    get_weekly_rollups,
+    is_rollups_enabled,
+    load_doctor_cohort_rows,
+    get_doctor_metrics_fingerprint,
+    COHORT_METRIC_COLUMNS,
     execute,
     fetch_one,
     get_patient_by_id,
@@ -52,6 +71,36 @@ from db import (
     get_temporary_role_from_access_code,
     normalize_temporary_access_code,
 )
+from analysis import (
+    archive_movement_zip,
+    list_recordings,
+    load_manifest,
+    load_sensor_window,
+    update_manifest,
+)
+from analysis.calibration import find_calibration, sensor_set_key
+from analysis.downsample import lttb_indices
+from analysis.rollups import week_start
+from analysis.cohort import CohortCache, build_cohort, cohort_analytics
+from analysis.uploads import (
+    UploadError,
+    create_upload,
+    delete_upload,
+    load_upload,
+    open_completed_upload,
+    upload_status,
+    write_chunk,
+)
+from analysis.streaming import StreamCapacityError, StreamError, StreamRegistry
+from patient_export import iter_patient_export_zip
+from patient_import import PatientImportError, import_patients, results_csv as patient_import_results_csv
+from study_export import (
+    EXPORT_FORMATS as STUDY_EXPORT_FORMATS,
+    StudyExportBusy,
+    list_snapshots as list_study_export_snapshots,
+    run_study_export,
+    snapshot_file_path as study_export_file_path,
+)
 
 
 def _get_env_value(name):
@@ -351,6 +400,82 @@ def token_required(f):
 
     return decorated
 
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_TTL = timedelta(hours=int(_get_env_value("IDEMPOTENCY_TTL_HOURS") or 24))
+# A first request still unfinished after this long is assumed lost
+IDEMPOTENCY_LEASE = timedelta(minutes=10)
+FORM_MIMETYPES = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+def _request_fingerprint():
+    """SHA-256 of method, path, query and body (form fields and file contents for uploads)."""
+    digest = hashlib.sha256(f"{request.method} {request.full_path}\n".encode("utf-8"))
+    if request.mimetype in FORM_MIMETYPES:
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"{name}={value}\n".encode("utf-8"))
+        for name, storage in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f"{name}:{storage.filename}\n".encode("utf-8"))
+            for block in iter(lambda: storage.stream.read(1024 * 1024), b""):
+                digest.update(block)
+            storage.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.digest()
+
+
+def idempotent(f):
+    """
+    Honour an Idempotency-Key header on a write route (below token_required):
+    the first response is stored and replayed for retries of the same request,
+    so the writes and analysis behind it run once. 5xx responses are not kept.
+    """
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        key = (request.headers.get('Idempotency-Key') or '').strip()
+        if not key or not is_db_enabled():
+            return f(current_user, *args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({"error": f"Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters"}), 400
+
+        key_hash = hashlib.sha256(f"{current_user['id']}\0{key}".encode("utf-8")).digest()
+        request_hash = _request_fingerprint()
+        try:
+            stored = claim_idempotency_key(key_hash, request_hash, IDEMPOTENCY_TTL, IDEMPOTENCY_LEASE)
+        except Exception as e:
+            return _internal_error("Failed to check Idempotency-Key", e)
+        if stored is not None:
+            if stored["RequestHash"] != request_hash:
+                return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+            if stored["StatusCode"] is None:
+                response = jsonify({"error": "A request with this Idempotency-Key is still in progress"})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            response = Response(stored["Body"], status=stored["StatusCode"], content_type=stored["ContentType"])
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(f(current_user, *args, **kwargs))
+        except Exception:
+            release_idempotency_key(key_hash)
+            raise
+        try:
+            if response.status_code >= 500 or response.is_streamed:
+                release_idempotency_key(key_hash)
+            else:
+                store_idempotent_response(key_hash, response.status_code, response.content_type, response.get_data())
+        except Exception as e:
+            # The request itself succeeded; a retry will just run it again
+            _log_server_error("Failed to store idempotent response", e)
+            try:
+                release_idempotency_key(key_hash)
+            except Exception:
+                pass
+        return response
+
+    return decorated
+
 @app.route("/")
 def home():
     return "irhis Backend"
@@ -775,6 +900,71 @@ def assign_doctor(current_user, patient_id):
     assign_patient_to_doctor(patient_id, doctor_id)
     return jsonify({"message": "Patient assigned successfully"})
 
+# Patients one POST /patients/reassign may list explicitly
+REASSIGN_MAX_PATIENTS = 1000
+
+
+def _can_reassign_any_patient(current_user):
+    """Doctors listed in REASSIGN_ADMIN_USERS may move any doctor's patients."""
+    allowed = {user_id.strip() for user_id in (_get_env_value("REASSIGN_ADMIN_USERS") or "").split(",")}
+    return current_user['role'] == 'doctor' and current_user['id'] in allowed - {""}
+
+
+@app.route('/patients/reassign', methods=['POST'])
+@token_required
+def reassign_patients_to_doctor(current_user):
+    """
+    Move patients to another doctor in one transaction.
+    Body: {"toDoctorId": ..., "patientIds": [...]} or {"toDoctorId": ..., "fromDoctorId": ...}
+
+    Doctors can only hand over their own patients (fromDoctorId must be
+    themselves, listed patients must be assigned to them); the admins in
+    REASSIGN_ADMIN_USERS can move anyone's.
+    """
+    if current_user['role'] != 'doctor':
+        return jsonify({"error": "Only doctors can assign patients"}), 403
+    if not is_db_enabled():
+        return jsonify({"error": "Database not configured"}), 500
+
+    data = request.get_json(silent=True) or {}
+    to_doctor_id = str(data.get('toDoctorId') or '').strip()
+    from_doctor_id = str(data.get('fromDoctorId') or '').strip() or None
+    patient_ids = data.get('patientIds')
+    if not to_doctor_id or (patient_ids is None) == (from_doctor_id is None):
+        return jsonify({"error": "toDoctorId and either patientIds or fromDoctorId are required"}), 400
+    if patient_ids is not None and (
+        not isinstance(patient_ids, list) or not patient_ids or len(patient_ids) > REASSIGN_MAX_PATIENTS
+        or not all(isinstance(patient_id, str) and patient_id.strip() for patient_id in patient_ids)
+    ):
+        return jsonify({"error": f"patientIds must list 1 to {REASSIGN_MAX_PATIENTS} patient IDs"}), 400
+
+    if patient_ids is not None:
+        patient_ids = [patient_id.strip() for patient_id in patient_ids]
+    is_admin = _can_reassign_any_patient(current_user)
+    if from_doctor_id is not None and from_doctor_id != current_user['id'] and not is_admin:
+        return jsonify({"error": "Doctors can only reassign their own patients"}), 403
+
+    try:
+        if patient_ids is not None and not is_admin:
+            own_patients = set(get_doctor_patient_ids(current_user['id']))
+            foreign = [patient_id for patient_id in patient_ids if patient_id not in own_patients]
+            if foreign:
+                return jsonify({"error": "Doctors can only reassign their own patients", "patientIds": foreign}), 403
+        doctor = get_user_by_id(to_doctor_id)
+        if not doctor or normalize_role(doctor.get('Role')) != 'doctor':
+            return jsonify({"error": "Target doctor not found"}), 404
+        result = reassign_patients(
+            to_doctor_id,
+            patient_ids=patient_ids,
+            from_doctor_id=from_doctor_id,
+        )
+    except Exception as e:
+        return _internal_error("Failed to reassign patients", e)
+
+    if result["moved"]:
+        cohort_cache.invalidate_many([to_doctor_id, *result["previousDoctorIds"]])
+    return jsonify({"toDoctorId": to_doctor_id, **result}), 200
+
 @app.route('/patients/<patient_id>/recovery-process', methods=['PUT'])
 @token_required
 def update_recovery_process(current_user, patient_id):
@@ -960,6 +1150,101 @@ def get_doctors_me_metrics_summary(current_user):
     metrics_summary.sort(key=lambda x: x.get('date', ''), reverse=True)
     return jsonify(metrics_summary[:5])
 
+# Loaded cohorts of this worker process, per doctor (see analysis/cohort.py)
+cohort_cache = CohortCache()
+
+
+def _load_doctor_cohort(doctor_id):
+    """Cached cohort arrays of a doctor, reloaded once their metrics change."""
+    fingerprint = get_doctor_metrics_fingerprint(doctor_id)
+    cohort = cohort_cache.get(doctor_id, fingerprint)
+    if cohort is None:
+        cohort = build_cohort(load_doctor_cohort_rows(doctor_id), COHORT_METRIC_COLUMNS)
+        cohort_cache.put(doctor_id, fingerprint, cohort)
+    return cohort
+
+
+@app.route('/doctors/me/cohort', methods=['GET'])
+@token_required
+def get_doctors_me_cohort(current_user):
+    """
+    Where each active patient sits in the doctor's caseload for one metric.
+    Query: metric (AvgROM, MaxROM, P95Velocity...), joint, side, week
+    (program week, counted from the patient's first session).
+    """
+    if current_user['role'] != 'doctor':
+        return jsonify({"error": "Unauthorized"}), 403
+    if not is_db_enabled():
+        return jsonify({"error": "Database not configured"}), 500
+
+    column = resolve_metric_series_column(request.args.get('metric', 'AvgROM'))
+    if column not in COHORT_METRIC_COLUMNS:
+        return jsonify({"error": f"metric must be one of {', '.join(COHORT_METRIC_COLUMNS)}"}), 400
+    joint = (request.args.get('joint') or 'knee').strip().lower()
+    side = (request.args.get('side') or '').strip().lower() or None
+    if joint not in ('knee', 'hip') or side not in (None, 'left', 'right'):
+        return jsonify({"error": "joint must be knee or hip and side left or right"}), 400
+    week = request.args.get('week', type=int)
+    if week is not None and week < 1:
+        return jsonify({"error": "week must be 1 or later"}), 400
+
+    try:
+        cohort = _load_doctor_cohort(current_user['id'])
+        return jsonify(cohort_analytics(cohort, column, joint, side, week)), 200
+    except Exception as e:
+        return _internal_error("Failed to compute cohort analytics", e)
+
+def _can_run_study_export(current_user):
+    """Study exports are limited to the user IDs in STUDY_EXPORT_ALLOWED_USERS."""
+    allowed = {user_id.strip() for user_id in (_get_env_value("STUDY_EXPORT_ALLOWED_USERS") or "").split(",")}
+    return current_user['role'] == 'doctor' and current_user['id'] in allowed - {""}
+
+
+@app.route('/study/exports', methods=['POST'])
+@token_required
+def create_study_export(current_user):
+    """
+    Write the next incremental anonymized study snapshot (see study_export.py).
+    Body (optional): {"format": "csv" | "ndjson"}
+    """
+    if not _can_run_study_export(current_user):
+        return jsonify({"error": "Unauthorized"}), 403
+    if not is_db_enabled():
+        return jsonify({"error": "Database not configured"}), 500
+
+    fmt = ((request.get_json(silent=True) or {}).get('format') or 'csv').strip().lower()
+    if fmt not in STUDY_EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(STUDY_EXPORT_FORMATS)}"}), 400
+
+    try:
+        return jsonify(run_study_export(fmt)), 201
+    except StudyExportBusy as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return _internal_error("Failed to export study dataset", e)
+
+
+@app.route('/study/exports', methods=['GET'])
+@token_required
+def get_study_exports(current_user):
+    if not _can_run_study_export(current_user):
+        return jsonify({"error": "Unauthorized"}), 403
+    try:
+        return jsonify({"snapshots": list_study_export_snapshots()}), 200
+    except Exception as e:
+        return _internal_error("Failed to list study exports", e)
+
+
+@app.route('/study/exports/<snapshot>/<filename>', methods=['GET'])
+@token_required
+def download_study_export_file(current_user, snapshot, filename):
+    if not _can_run_study_export(current_user):
+        return jsonify({"error": "Unauthorized"}), 403
+    path = study_export_file_path(snapshot, filename)
+    if path is None:
+        return jsonify({"error": "Export file not found"}), 404
+    return send_file(path, as_attachment=True, download_name=f"{snapshot}-{filename}")
+
 @app.route('/doctors/me/recent-activity', methods=['GET'])
 @token_required
 def get_doctors_me_recent_activity(current_user):
@@ -1121,6 +1406,7 @@ def check_movement_api_health(current_user):
         return jsonify({"status": "error", "message": "Movement API is unavailable"}), 503
 
 UPLOAD_ALLOWED_EXTENSIONS = {".zip"}
+RECORDING_CHART_CHANNELS = ["Euler_X", "Euler_Y", "Euler_Z", "FreeAcc_X", "FreeAcc_Y", "FreeAcc_Z"]
 # ZIP magic bytes: PK\x03\x04
 UPLOAD_ZIP_MAGIC = b"PK\x03\x04"
 
@@ -1148,13 +1434,91 @@ def _safe_filename(filename):
     return sanitized or "upload.zip"
 
 
+def _movement_patient_access_error(current_user, patient_id):
+    """Return an error response unless the user may analyze data for ``patient_id``."""
+    forbidden = ensure_patient_resource_access(
+        current_user,
+        patient_id,
+        message="Patients can only analyze their own data",
+    )
+    if forbidden:
+        return forbidden
+
+    if current_user['role'] == 'doctor' and patient_id:
+        # Check if doctor has access to this patient
+        if not get_patient_doctor_relation(patient_id, current_user['id']):
+            return jsonify({"error": "Patient not associated with this doctor"}), 403
+    return None
+
+
+def _analyze_movement_file(current_user, file, patient_id, exercise_type, session_id=None):
+    """Archive a validated movement ZIP and forward it to the external analysis API."""
+    import requests
+
+    safe_name = _safe_filename(file.filename)
+
+    # Keep the raw recording so it can be re-analyzed without a new upload
+    recording_id = None
+    data_quality = None
+    if patient_id:
+        try:
+            manifest = archive_movement_zip(
+                file.stream,
+                patient_id=patient_id,
+                session_id=session_id,
+                exercise_type=exercise_type,
+                source_name=safe_name,
+            )
+            recording_id = manifest["recording_id"]
+            data_quality = {
+                tag: sensor.get("quality") for tag, sensor in (manifest.get("sensors") or {}).items()
+            }
+        except Exception as e:
+            _log_server_error("Failed to archive movement recording", e)
+        finally:
+            file.stream.seek(0)
+
+    # Forward validated file to external API using the sanitized filename
+    files = {'file': (safe_name, file.stream, "application/zip")}
+    
+    response = requests.post(
+        f"{MOVEMENT_API_BASE_URL}/analyze",
+        files=files,
+        timeout=60  # Longer timeout for analysis
+    )
+    
+    if response.status_code == 200:
+        analysis_result = response.json()
+        
+        # Store analysis result alongside the archived recording
+        if recording_id:
+            update_manifest(
+                recording_id,
+                analysis=analysis_result,
+                analyzed_at=datetime.now(timezone.utc).isoformat(),
+                analyzed_by=current_user['id'],
+            )
+        
+        return jsonify({
+            "success": True,
+            "message": "Analysis completed successfully",
+            "result": analysis_result,
+            "recordingId": recording_id,
+            "dataQuality": data_quality,
+        })
+    else:
+        return jsonify({
+            "success": False,
+            "message": "External API analysis failed",
+        }), 502
+
+
 @app.route('/movement/analyze', methods=['POST'])
 @token_required
+@idempotent
 def analyze_movement_data(current_user):
     """Upload and analyze movement data using external API"""
     try:
-        import requests
-
         # Check if file is present in request
         if 'file' not in request.files:
             return jsonify({"error": "No file provided"}), 400
@@ -1168,65 +1532,148 @@ def analyze_movement_data(current_user):
         if validation_error:
             return jsonify({"error": validation_error}), 400
 
-        safe_name = _safe_filename(file.filename)
-
         # Get additional parameters
         patient_id = request.form.get('patient_id')
         exercise_type = request.form.get('exercise_type', 'general')
 
         # Validate patient access
-        forbidden = ensure_patient_resource_access(
+        forbidden = _movement_patient_access_error(current_user, patient_id)
+        if forbidden:
+            return forbidden
+
+        return _analyze_movement_file(
             current_user,
+            file,
             patient_id,
-            message="Patients can only analyze their own data",
+            exercise_type,
+            session_id=request.form.get('session_id'),
         )
-        if forbidden:
-            return forbidden
+            
+    except Exception as e:
+        _log_server_error("Movement analysis failed", e)
+        return jsonify({
+            "success": False,
+            "message": "Analysis failed",
+        }), 500
 
-        if current_user['role'] == 'doctor' and patient_id:
-            # Check if doctor has access to this patient
-            if patient_id not in patients:
-                return jsonify({"error": "Patient not found"}), 404
+def _load_own_upload(current_user, upload_id):
+    """Return ``(upload, None)`` for an upload created by the current user, else ``(None, response)``."""
+    upload = load_upload(upload_id)
+    if upload is None or upload.get('created_by') != current_user['id']:
+        return None, (jsonify({"error": "Upload not found"}), 404)
+    return upload, None
 
-        # Forward validated file to external API using the sanitized filename
-        files = {'file': (safe_name, file.stream, "application/zip")}
-        
-        response = requests.post(
-            f"{MOVEMENT_API_BASE_URL}/analyze",
-            files=files,
-            timeout=60  # Longer timeout for analysis
+
+@app.route('/uploads', methods=['POST'])
+@token_required
+def create_movement_upload(current_user):
+    """
+    Start a resumable upload of a movement ZIP.
+
+    Body: ``{"filename", "size", "chunkSize"?, "sha256"?, "patient_id",
+    "session_id"?, "exercise_type"?}``. Chunks are then sent with
+    ``PUT /uploads/<id>/chunks/<n>`` and the upload is analyzed by
+    ``POST /uploads/<id>/commit``.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = _safe_filename(data.get('filename'))
+    if os.path.splitext(filename)[1].lower() not in UPLOAD_ALLOWED_EXTENSIONS:
+        return jsonify({"error": "Only ZIP files are accepted."}), 400
+
+    patient_id = data.get('patient_id')
+    forbidden = _movement_patient_access_error(current_user, patient_id)
+    if forbidden:
+        return forbidden
+
+    try:
+        upload = create_upload(
+            filename,
+            data.get('size'),
+            created_by=current_user['id'],
+            chunk_size=data.get('chunkSize') or data.get('chunk_size'),
+            sha256=data.get('sha256'),
+            patient_id=patient_id,
+            session_id=data.get('session_id'),
+            exercise_type=data.get('exercise_type') or 'general',
         )
-        
-        if response.status_code == 200:
-            analysis_result = response.json()
-            
-            # Store analysis result in patient data if patient_id provided
-            if patient_id and patient_id in patients:
-                if 'movement_analyses' not in patients[patient_id]:
-                    patients[patient_id]['movement_analyses'] = []
-                
-                analysis_record = {
-                    'id': f"analysis_{datetime.now().timestamp()}",
-                    'timestamp': datetime.now().isoformat(),
-                    'exercise_type': exercise_type,
-                    'file_name': safe_name,
-                    'result': analysis_result,
-                    'analyzed_by': current_user['id']
-                }
-                
-                patients[patient_id]['movement_analyses'].append(analysis_record)
-            
-            return jsonify({
-                "success": True,
-                "message": "Analysis completed successfully",
-                "result": analysis_result
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "message": "External API analysis failed",
-            }), 502
-            
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return _internal_error("Failed to create upload", e)
+    return jsonify(upload_status(upload)), 201
+
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@token_required
+def put_movement_upload_chunk(current_user, upload_id, index):
+    """Store one chunk (raw request body); ``X-Chunk-SHA256`` is verified when sent."""
+    upload, error = _load_own_upload(current_user, upload_id)
+    if error:
+        return error
+
+    try:
+        chunk = write_chunk(upload, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return _internal_error("Failed to store upload chunk", e)
+    return jsonify(chunk), 200
+
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+@token_required
+def get_movement_upload(current_user, upload_id):
+    """Received chunk ranges, so an interrupted client knows what to resend."""
+    upload, error = _load_own_upload(current_user, upload_id)
+    if error:
+        return error
+    return jsonify(upload_status(upload))
+
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+@token_required
+def delete_movement_upload(current_user, upload_id):
+    _upload, error = _load_own_upload(current_user, upload_id)
+    if error:
+        return error
+    delete_upload(upload_id)
+    return jsonify({"message": "Upload deleted"}), 200
+
+
+@app.route('/uploads/<upload_id>/commit', methods=['POST'])
+@token_required
+def commit_movement_upload(current_user, upload_id):
+    """
+    Validate and analyze a complete upload exactly like ``POST /movement/analyze``.
+    The upload is deleted once the analysis succeeds.
+    """
+    upload, error = _load_own_upload(current_user, upload_id)
+    if error:
+        return error
+
+    patient_id = upload.get('patient_id')
+    forbidden = _movement_patient_access_error(current_user, patient_id)
+    if forbidden:
+        return forbidden
+
+    try:
+        handle = open_completed_upload(upload)
+    except UploadError as e:
+        return jsonify({"error": str(e), "status": upload_status(upload)}), 409
+
+    try:
+        with handle:
+            file = FileStorage(stream=handle, filename=upload['filename'], content_type="application/zip")
+            validation_error = _validate_movement_file(file)
+            if validation_error:
+                return jsonify({"error": validation_error}), 400
+            response = _analyze_movement_file(
+                current_user,
+                file,
+                patient_id,
+                upload.get('exercise_type'),
+                session_id=upload.get('session_id'),
+            )
     except Exception as e:
         _log_server_error("Movement analysis failed", e)
         return jsonify({
@@ -1234,6 +1681,14 @@ def analyze_movement_data(current_user):
             "message": "Analysis failed",
         }), 500
 
+    response = make_response(response)
+    # A failed analysis keeps the upload so the client can retry the commit
+    # without uploading again; unfinished uploads are purged after UPLOAD_TTL_HOURS
+    if 200 <= response.status_code < 300:
+        delete_upload(upload_id)
+    return response
+
+
 @app.route('/patients/<patient_id>/movement-analyses', methods=['GET'])
 @token_required
 def get_patient_movement_analyses(current_user, patient_id):
@@ -1242,12 +1697,94 @@ def get_patient_movement_analyses(current_user, patient_id):
     if forbidden:
         return forbidden
 
-    patient = patients.get(patient_id)
-    if not patient:
-        return jsonify({"error": "Patient not found"}), 404
-    
-    analyses = patient.get('movement_analyses', [])
-    return jsonify({"analyses": analyses})
+    try:
+        analyses = [
+            {
+                'id': manifest['recording_id'],
+                'recordingId': manifest['recording_id'],
+                'timestamp': manifest.get('analyzed_at') or manifest.get('created_at'),
+                'exercise_type': manifest.get('exercise_type'),
+                'file_name': manifest.get('source_name'),
+                'result': manifest.get('analysis'),
+                'analyzed_by': manifest.get('analyzed_by'),
+            }
+            for manifest in list_recordings(patient_id)
+        ]
+        return jsonify({"analyses": analyses})
+    except Exception as e:
+        return _internal_error("Failed to load movement analyses", e)
+
+
+def _ensure_recording_access(current_user, manifest):
+    patient_id = manifest.get('patient_id')
+    forbidden = ensure_patient_resource_access(current_user, patient_id)
+    if forbidden:
+        return forbidden
+    if current_user['role'] == 'doctor':
+        if not patient_id or not get_patient_doctor_relation(patient_id, current_user['id']):
+            return jsonify({"error": "Patient not associated with this doctor"}), 403
+    return None
+
+
+@app.route('/recordings/<recording_id>', methods=['GET'])
+@token_required
+def get_recording(current_user, recording_id):
+    """Get the manifest of an archived raw recording."""
+    manifest = load_manifest(recording_id)
+    if not manifest:
+        return jsonify({"error": "Recording not found"}), 404
+
+    forbidden = _ensure_recording_access(current_user, manifest)
+    if forbidden:
+        return forbidden
+
+    return jsonify(manifest), 200
+
+
+def _chart_values(values):
+    """Samples as a JSON-safe list; dropped samples (NaN/inf) become null."""
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+@app.route('/recordings/<recording_id>/sensors/<int:tag>', methods=['GET'])
+@token_required
+def get_recording_sensor_data(current_user, recording_id, tag):
+    """
+    Get a time range of one sensor's channels for charts.
+    Query: start/end (seconds), channels (comma separated), max_points.
+    """
+    manifest = load_manifest(recording_id)
+    if not manifest:
+        return jsonify({"error": "Recording not found"}), 404
+
+    forbidden = _ensure_recording_access(current_user, manifest)
+    if forbidden:
+        return forbidden
+
+    if str(tag) not in (manifest.get('sensors') or {}):
+        return jsonify({"error": "Sensor not found in recording"}), 404
+
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    max_points = request.args.get('max_points', default=2000, type=int)
+    requested = [c.strip() for c in (request.args.get('channels') or '').split(',') if c.strip()]
+    channels = requested or RECORDING_CHART_CHANNELS
+
+    try:
+        seconds, window = load_sensor_window(recording_id, tag, start=start, end=end, channels=channels)
+        step = max(1, -(-len(seconds) // max(1, max_points)))
+        return jsonify({
+            "recordingId": recording_id,
+            "tag": tag,
+            "samples": len(seconds),
+            "step": step,
+            "t": seconds[::step].round(4).tolist(),
+            "channels": {name: _chart_values(values[::step]) for name, values in window.items()},
+        }), 200
+    except Exception as e:
+        return _internal_error("Failed to load recording data", e)
 
 @app.route('/movement/test-integration', methods=['GET'])
 @token_required
@@ -1327,8 +1864,53 @@ def register_patient_manual(current_user):
     except Exception as e:
         return _internal_error("Failed to register patient", e)
 
+# Rows accepted by one POST /patients/import; larger sheets go through patient_import.py
+PATIENT_IMPORT_MAX_ROWS = 1000
+
+
+@app.route('/patients/import', methods=['POST'])
+@token_required
+def import_patients_csv(current_user):
+    """
+    Bulk /patients/manual-registry from a CSV (multipart "file" or a text/csv
+    body), see patient_import.py. Responds with the result CSV: access code
+    and initial password per created patient, or the errors of each row.
+    Batches commit on their own, so when some of them failed the response is
+    207 and the "created" rows are the patients that exist.
+    """
+    if current_user['role'] != 'doctor':
+        return jsonify({"error": "Acesso negado"}), 403
+    if not is_db_enabled():
+        return jsonify({"error": "Database not configured"}), 500
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        lines = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        results = import_patients(lines, current_user['id'], max_rows=PATIENT_IMPORT_MAX_ROWS, dry_run=dry_run)
+    except (PatientImportError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return _internal_error("Failed to import patients", e)
+
+    statuses = {result["status"] for result in results}
+    if "invalid" in statuses:
+        status_code = 422
+    elif "failed" in statuses:
+        status_code = 207 if "created" in statuses else 500
+    else:
+        status_code = 200 if dry_run else 201
+    return Response(
+        patient_import_results_csv(results),
+        status=status_code,
+        mimetype="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="patient-import-result.csv"', "Cache-Control": "no-store"},
+    )
+
 @app.route('/patients/<patient_id>/sessions', methods=['POST'])
 @token_required
+@idempotent
 def assign_patients_sessions(current_user, patient_id):
     if current_user['role'] == 'doctor':
         doctor_id = current_user['id']
@@ -1384,6 +1966,13 @@ def get_patients_sessions(current_user, patient_id):
         return forbidden
 
     try:
+        changes, since = _changes_since_arg()
+    except ValueError:
+        return jsonify({"error": "Invalid since cursor"}), 400
+
+    try:
+        if changes:
+            return _changes_response(patient_id, 'sessions', since, lambda: get_patient_sessions(patient_id, since))
         sessions = get_patient_sessions(patient_id)
         
         if sessions is None:
@@ -1470,8 +2059,31 @@ def delete_session(current_user, session_id):
     except Exception as e:
         return _internal_error("Failed to delete session", e)
 
+def _adapt_metrics_payload(data):
+    """Adapt the frontend metrics summary format to the insert_session_metrics input."""
+    avg_rom = data.get('avg_rom') or data.get('AvgROM') or 0
+    max_rom = data.get('max_rom') or data.get('MaxFlexion') or data.get('maxFlexion') or avg_rom
+    min_rom = data.get('min_rom') or data.get('MaxExtension') or data.get('maxExtension') or 0
+    repetition = int(data.get('repetition') or data.get('Repetitions') or data.get('repetitions') or 0)
+    joint = str(data.get('joint') or 'knee')
+    side = str(data.get('side') or 'both')
+    min_v = float(data.get('min_velocity') or data.get('minVelocity') or 0)
+    max_v = float(data.get('max_velocity') or data.get('maxVelocity') or 0)
+    avg_v = float(data.get('avg_velocity') or data.get('avgVelocity') or 0)
+    p95_v = float(data.get('p95_velocity') or data.get('p95Velocity') or 0)
+    cmd = float(data.get('center_mass_displacement') or data.get('centerMassDisplacement') or data.get('cmd') or 0)
+
+    return {
+        'joint': joint, 'side': side, 'repetition': repetition,
+        'min_velocity': min_v, 'max_velocity': max_v, 'avg_velocity': avg_v, 'p95_velocity': p95_v,
+        'min_rom': min_rom, 'max_rom': max_rom, 'avg_rom': avg_rom or 0,
+        'center_mass_displacement': cmd
+    }
+
+
 @app.route('/sessions/<session_id>/metrics', methods=['POST'])
 @token_required
+@idempotent
 def post_session_metrics(current_user, session_id):
     session = get_session_by_id(session_id)
     if not session:
@@ -1491,25 +2103,7 @@ def post_session_metrics(current_user, session_id):
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    # Adapt frontend summary format to DB schema
-    avg_rom = data.get('avg_rom') or data.get('AvgROM') or 0
-    max_rom = data.get('max_rom') or data.get('MaxFlexion') or data.get('maxFlexion') or avg_rom
-    min_rom = data.get('min_rom') or data.get('MaxExtension') or data.get('maxExtension') or 0
-    repetition = int(data.get('repetition') or data.get('Repetitions') or data.get('repetitions') or 0)
-    joint = str(data.get('joint') or 'knee')
-    side = str(data.get('side') or 'both')
-    min_v = float(data.get('min_velocity') or data.get('minVelocity') or 0)
-    max_v = float(data.get('max_velocity') or data.get('maxVelocity') or 0)
-    avg_v = float(data.get('avg_velocity') or data.get('avgVelocity') or 0)
-    p95_v = float(data.get('p95_velocity') or data.get('p95Velocity') or 0)
-    cmd = float(data.get('center_mass_displacement') or data.get('centerMassDisplacement') or data.get('cmd') or 0)
-
-    adapted = {
-        'joint': joint, 'side': side, 'repetition': repetition,
-        'min_velocity': min_v, 'max_velocity': max_v, 'avg_velocity': avg_v, 'p95_velocity': p95_v,
-        'min_rom': min_rom, 'max_rom': max_rom, 'avg_rom': avg_rom or 0,
-        'center_mass_displacement': cmd
-    }
+    adapted = _adapt_metrics_payload(data)
 
     try:
         metric_id = insert_session_metrics(session_id, adapted)
@@ -1525,13 +2119,276 @@ def get_patient_metrics(current_user, patient_id):
         return forbidden
 
     limit = min(request.args.get('limit', default=50, type=int), 50)
+    try:
+        changes, since = _changes_since_arg()
+    except ValueError:
+        return jsonify({"error": "Invalid since cursor"}), 400
     
     try:
+        if changes:
+            return _changes_response(
+                patient_id, 'metrics', since, lambda: get_metrics_by_patient(patient_id, limit=None, since=since)
+            )
         metrics = get_metrics_by_patient(patient_id, limit)
         return jsonify(metrics), 200
     except Exception as e:
         return _internal_error("Failed to load patient metrics", e)
 
+
+def parse_changes_cursor(value):
+    """Naive UTC datetime of a cursor returned by a previous request (None for everything)."""
+    if value in (None, ""):
+        return None
+    cursor = datetime.fromisoformat(str(value))
+    return cursor.astimezone(timezone.utc).replace(tzinfo=None) if cursor.tzinfo else cursor
+
+
+def _changes_since_arg():
+    """
+    ``(requested, since)`` for the ``since`` query parameter of the patient
+    list endpoints; an empty value asks for everything plus a cursor.
+    """
+    if 'since' not in request.args:
+        return False, None
+    return True, parse_changes_cursor(request.args.get('since'))
+
+
+def _changes_response(patient_id, key, since, read):
+    """
+    ``{key: rows changed after since, "deleted": IDs deleted after it,
+    "cursor": value for the next request}``; the cursor is taken first.
+    """
+    cursor = get_changes_cursor()
+    rows = read()
+    deleted = get_deleted_records(patient_id, since)[key] if since is not None else []
+    return jsonify({key: rows, "deleted": deleted, "cursor": cursor.isoformat()}), 200
+
+
+SYNC_MAX_RECORDS = 5000
+SYNC_MAX_CLIENT_ID_LENGTH = 128
+
+
+def _sync_records(data, key, needs_session=False):
+    records = data.get(key) or []
+    if not isinstance(records, list):
+        raise ValueError(f"{key} must be a list")
+    parsed = []
+    for record in records:
+        client_id = record.get('clientId') if isinstance(record, dict) else None
+        if not isinstance(client_id, str) or not client_id.strip() or len(client_id) > SYNC_MAX_CLIENT_ID_LENGTH:
+            raise ValueError(f"Every entry of {key} needs a clientId of up to {SYNC_MAX_CLIENT_ID_LENGTH} characters")
+        entry = {"client_id": client_id.strip()}
+        if needs_session:
+            entry["session_id"] = record.get('sessionId')
+            entry["session_client_id"] = record.get('sessionClientId')
+            if not entry["session_id"] and not entry["session_client_id"]:
+                raise ValueError(f"{key} entry {client_id} needs a sessionId or sessionClientId")
+        parsed.append((record, entry))
+    return parsed
+
+
+@app.route('/patients/<patient_id>/sync', methods=['POST'])
+@token_required
+def sync_patient_records(current_user, patient_id):
+    """
+    Offline sync: upload sessions, metrics and feedback recorded on the device
+    and receive everything changed or deleted on the server since ``cursor``.
+
+    Body: {"cursor": <from the last sync or null>,
+           "sessions": [{"clientId", "exerciseType", "exerciseDescription", "repetitions", "duration"}],
+           "metrics": [{"clientId", "sessionId" | "sessionClientId", <POST /sessions/<id>/metrics fields>}],
+           "feedback": [{"clientId", "sessionId" | "sessionClientId", "pain", "fatigue", "difficulty", "comments"}]}
+
+    The batch is applied in one transaction; records are keyed by client ID,
+    so replaying a batch after a lost response changes nothing.
+    """
+    if current_user['role'] != 'patient':
+        return jsonify({"error": "Only patients can sync records"}), 403
+    forbidden = ensure_patient_resource_access(current_user, patient_id)
+    if forbidden:
+        return forbidden
+    if not is_db_enabled():
+        return jsonify({"error": "Database not configured"}), 500
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "No data provided"}), 400
+    try:
+        since = parse_changes_cursor(data.get('cursor'))
+        sessions = [
+            {
+                **entry,
+                "exercise_type": record.get('exercise_type') or record.get('exerciseType') or "",
+                "exercise_description": record.get('exercise_description') or record.get('exerciseDescription') or "",
+                "repetitions": record.get('repetitions'),
+                "duration": record.get('duration'),
+            }
+            for record, entry in _sync_records(data, 'sessions')
+        ]
+        metrics = [{**_adapt_metrics_payload(record), **entry} for record, entry in _sync_records(data, 'metrics', True)]
+        feedback = []
+        for record, entry in _sync_records(data, 'feedback', True):
+            missing = [field for field in ('pain', 'fatigue', 'difficulty') if record.get(field) is None]
+            if missing:
+                raise ValueError(f"feedback entry {entry['client_id']} is missing {', '.join(missing)}")
+            feedback.append({**entry, **{field: record.get(field) for field in ('pain', 'fatigue', 'difficulty', 'comments')}})
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if len(sessions) + len(metrics) + len(feedback) > SYNC_MAX_RECORDS:
+        return jsonify({"error": f"At most {SYNC_MAX_RECORDS} records can be synced at once"}), 413
+
+    try:
+        relation = get_patient_relation(patient_id) if sessions else None
+        applied = apply_patient_sync(patient_id, relation and relation['ID'], sessions, metrics, feedback)
+        cursor = get_changes_cursor()
+        changes = get_patient_changes_since(patient_id, since)
+    except SyncReferenceError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return _internal_error("Failed to sync records", e)
+
+    return jsonify({"applied": applied, "changes": changes, "cursor": cursor.isoformat()}), 200
+
+
+METRIC_SERIES_DEFAULT_POINTS = 200
+METRIC_SERIES_MAX_POINTS = 2000
+
+
+@app.route('/patients/<patient_id>/metrics/series', methods=['GET'])
+@token_required
+def get_patient_metric_series(current_user, patient_id):
+    """
+    One metric over time per joint/side for progress charts.
+    Query: metric (AvgROM, MaxROM, P95Velocity...), joint, side, points.
+    Every series is downsampled with LTTB to at most ``points`` points.
+    """
+    forbidden = ensure_patient_resource_access(current_user, patient_id)
+    if forbidden:
+        return forbidden
+
+    column = resolve_metric_series_column(request.args.get('metric', 'AvgROM'))
+    if column is None:
+        return jsonify({"error": "Unknown metric"}), 400
+    joint = (request.args.get('joint') or '').strip().lower() or None
+    side = (request.args.get('side') or '').strip().lower() or None
+    points = request.args.get('points', default=METRIC_SERIES_DEFAULT_POINTS, type=int)
+    points = min(max(points, 3), METRIC_SERIES_MAX_POINTS)
+
+    try:
+        grouped = {}
+        for row_joint, row_side, created, value, session_id in iter_patient_metric_series(patient_id, column, joint, side):
+            times, values, sessions = grouped.setdefault((row_joint, row_side), ([], [], []))
+            times.append(created.replace(tzinfo=timezone.utc).timestamp())
+            values.append(value)
+            sessions.append(session_id)
+
+        series = []
+        for (row_joint, row_side), (times, values, sessions) in sorted(grouped.items()):
+            kept = lttb_indices(times, values, points)
+            series.append({
+                "joint": row_joint,
+                "side": row_side,
+                "total": len(times),
+                "t": [datetime.fromtimestamp(times[i], timezone.utc).isoformat() for i in kept],
+                "values": [values[i] for i in kept],
+                "sessionIds": [sessions[i] for i in kept],
+            })
+        return jsonify({"patientId": patient_id, "metric": column, "points": points, "series": series}), 200
+    except Exception as e:
+        return _internal_error("Failed to load metric series", e)
+
+PROGRESSION_DEFAULT_WEEKS = 12
+PROGRESSION_MAX_WEEKS = 104
+
+
+@app.route('/patients/<patient_id>/progression', methods=['GET'])
+@token_required
+def get_patient_progression(current_user, patient_id):
+    """
+    Weekly ROM/velocity progression per joint/side, read from the rollups.
+    Query: weeks (including the current one), joint, side.
+    """
+    forbidden = ensure_patient_resource_access(current_user, patient_id)
+    if forbidden:
+        return forbidden
+
+    weeks = request.args.get('weeks', default=PROGRESSION_DEFAULT_WEEKS, type=int)
+    weeks = min(max(weeks, 1), PROGRESSION_MAX_WEEKS)
+    joint = (request.args.get('joint') or '').strip().lower() or None
+    side = (request.args.get('side') or '').strip().lower() or None
+    since = week_start(datetime.now(timezone.utc)) - timedelta(weeks=weeks - 1)
+
+    try:
+        if not is_rollups_enabled():
+            return jsonify({"error": "Weekly rollups are not set up (migrations/005)"}), 501
+        rows = get_weekly_rollups(patient_id, since, joint, side)
+        progression = []
+        for row in rows:
+            count = int(row.get('EntryCount') or 0)
+            progression.append({
+                "weekStart": str(row['WeekStart']),
+                "joint": row['Joint'],
+                "side": row['Side'],
+                "count": count,
+                "rom": {
+                    "min": row['MinROM'], "max": row['MaxROM'],
+                    "mean": row['SumROM'] / count if count else 0.0, "p95": row['P95ROM'],
+                },
+                "velocity": {
+                    "min": row['MinVelocity'], "max": row['MaxVelocity'],
+                    "mean": row['SumVelocity'] / count if count else 0.0, "p95": row['P95Velocity'],
+                },
+            })
+        return jsonify({"patientId": patient_id, "since": since.isoformat(), "weeks": progression}), 200
+    except Exception as e:
+        return _internal_error("Failed to load patient progression", e)
+
+@app.route('/patients/<patient_id>/export', methods=['GET'])
+@token_required
+def export_patient_data(current_user, patient_id):
+    """
+    ZIP of the patient's profile, sessions, metrics and feedback as CSV,
+    streamed while it is generated (see patient_export.py).
+    """
+    forbidden = ensure_patient_resource_access(current_user, patient_id)
+    if forbidden:
+        return forbidden
+    if not is_db_enabled():
+        return jsonify({"error": "Database not configured"}), 500
+
+    try:
+        if current_user['role'] == 'doctor' and not get_patient_doctor_relation(patient_id, current_user['id']):
+            return jsonify({"error": "Patient not associated with this doctor"}), 403
+        patient_data = get_patient_by_id(patient_id)
+    except Exception as e:
+        return _internal_error("Failed to export patient data", e)
+    if not patient_data:
+        return jsonify({"error": "Patient not found"}), 404
+
+    access_code = extract_temporary_access_code(
+        patient_data.get("Email"), patient_data.get("FirstName"), patient_data.get("LastName")
+    )
+    profile = {
+        **patient_data,
+        "Email": "" if access_code else patient_data.get("Email"),
+        "BirthDate": sanitize_birth_date_for_response(patient_data),
+    }
+    # Headers are sent before the first row is read, so a failure further
+    # down can only cut the archive short; it is logged like other errors.
+    def generate():
+        try:
+            yield from iter_patient_export_zip(profile, access_code)
+        except Exception as e:
+            _log_server_error("Patient export aborted", e)
+            raise
+
+    filename = f"patient-{access_code or patient_id}-export.zip"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
 @app.route('/sessions/<session_id>/metrics', methods=['GET'])
 @token_required
 def get_specific_session_metrics(current_user, session_id):
@@ -1554,6 +2411,130 @@ def get_specific_session_metrics(current_user, session_id):
     except Exception as e:
         return _internal_error("Failed to load session metrics", e)
 
+# Live sensor streams, shared by every worker process (see analysis/streaming.py)
+live_streams = StreamRegistry()
+
+
+def _authorize_session_metrics(current_user, session_id):
+    """Return ``(session, None)`` when the user may write metrics for the session, else ``(None, response)``."""
+    session = get_session_by_id(session_id)
+    if not session:
+        return None, (jsonify({"error": "Session not found"}), 404)
+
+    patient_id = session.get('PatientID')
+    if current_user['role'] == 'doctor':
+        if not get_patient_doctor_relation(patient_id, current_user['id']):
+            return None, (jsonify({"error": "Patient not associated with this doctor"}), 403)
+    else:
+        forbidden = ensure_patient_resource_access(current_user, patient_id)
+        if forbidden:
+            return None, forbidden
+    return session, None
+
+
+@app.route('/sessions/<session_id>/stream', methods=['POST'])
+@token_required
+def start_session_stream(current_user, session_id):
+    """
+    Open a live stream for a session.
+
+    Body: ``{"rate": 60, "sensors": [1, 2, 3, 4]}``. When the sensor set has
+    a valid cached calibration for the patient it is applied to the stream.
+    """
+    session, error = _authorize_session_metrics(current_user, session_id)
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    offsets = {}
+    calibration_status = "uncalibrated"
+    tags = data.get('sensors') or []
+    try:
+        if tags:
+            calibration = find_calibration(session.get('PatientID'), sensor_set_key(tags), datetime.now(timezone.utc))
+            if calibration:
+                offsets = {int(tag): sensor["offset"] for tag, sensor in calibration["sensors"].items()}
+                calibration_status = "cached"
+    except (TypeError, ValueError):
+        return jsonify({"error": "sensors must be a list of DeviceTags"}), 400
+    except Exception as e:
+        _log_server_error("Failed to load cached calibration", e)
+
+    try:
+        stream = live_streams.start(session_id, rate=data.get('rate'), calibration_offsets=offsets)
+    except StreamCapacityError as e:
+        return jsonify({"error": str(e)}), 503
+    except StreamError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "sessionId": session_id,
+        "rate": stream.rate,
+        "calibration": calibration_status,
+    }), 201
+
+
+@app.route('/sessions/<session_id>/stream/packets', methods=['POST'])
+@token_required
+def post_session_stream_packets(current_user, session_id):
+    """
+    Add a batch of decoded DOT packets and return the running metrics.
+
+    Body: ``{"sensors": {"<DeviceTag>": {"SampleTimeFine": [...],
+    "Quat_W": [...], ...}}}`` (``Euler_X/Y/Z`` instead of quaternions and an
+    optional ``Status`` are accepted too).
+    """
+    _session, error = _authorize_session_metrics(current_user, session_id)
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    try:
+        with live_streams.open(session_id) as stream:
+            if stream is None:
+                return jsonify({"error": "No live stream for this session"}), 404
+            metrics = stream.add_batch(data.get('sensors'))
+    except StreamError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"metrics": metrics, "samples": stream.samples})
+
+
+@app.route('/sessions/<session_id>/stream', methods=['GET'])
+@token_required
+def get_session_stream(current_user, session_id):
+    _session, error = _authorize_session_metrics(current_user, session_id)
+    if error:
+        return error
+
+    stream = live_streams.get(session_id)
+    if stream is None:
+        return jsonify({"error": "No live stream for this session"}), 404
+    return jsonify({"metrics": stream.metrics(), "samples": stream.samples})
+
+
+@app.route('/sessions/<session_id>/stream/finish', methods=['POST'])
+@token_required
+def finish_session_stream(current_user, session_id):
+    """
+    Store the live stream's final metrics as the session's metrics rows and
+    close it. The stream is only closed once the rows are written, so a
+    failed write can be retried.
+    """
+    _session, error = _authorize_session_metrics(current_user, session_id)
+    if error:
+        return error
+
+    try:
+        with live_streams.open(session_id) as stream:
+            if stream is None:
+                return jsonify({"error": "No live stream for this session"}), 404
+            metrics = stream.finish()
+            ids = replace_session_metrics(session_id, metrics) if metrics else []
+            live_streams.close(session_id)
+    except Exception as e:
+        return _internal_error("Failed to persist session metrics", e)
+    return jsonify({"message": "Stream finished", "metrics": metrics, "ids": ids}), 200
+
+
 @app.route('/admin/fix-user-role', methods=['POST'])
 @token_required
 def fix_user_role(current_user):
@@ -1833,12 +2814,14 @@ def update_patient_exercise(current_user, patient_id, exercise_id):
 
 @app.route('/sessions/<session_id>/feedback', methods=['POST'])
 @token_required
+@idempotent
 def post_session_feedback(current_user, session_id):
 
     if current_user['role'].lower() != 'patient':
         return jsonify({"error": "Only patients can submit feedback"}), 403
 
-    if not check_session_patient(session_id, current_user['id']):
+    session = get_session_by_id(session_id)
+    if not session or str(session.get('PatientID')) != current_user['id']:
         return jsonify({"error": "Session not found or does not belong to this user"}), 404
 
     data = request.json
@@ -1851,33 +2834,42 @@ def post_session_feedback(current_user, session_id):
         return jsonify({"error": f"Missing required fields: {', '.join(missing)}"}), 400
 
     try:
-        feedback_id = insert_patient_feedback(current_user['id'], session_id, data)
+        feedback_id = insert_feedback(current_user['id'], {**data, "sessionId": session_id})
         return jsonify({
             "message": "Feedback submitted successfully", 
             "id": feedback_id
         }), 201
     except Exception as e:
-        return jsonify({"error": "Internal server error while persisting feedback"}), 500
+        return _internal_error("Internal server error while persisting feedback", e)
 
 
 @app.route('/patients/<patient_id>/feedback', methods=['GET'])
 @token_required
 def get_patient_feedback_history(current_user, patient_id):
+    forbidden = ensure_patient_resource_access(current_user, patient_id)
+    if forbidden:
+        return forbidden
     try:
+        changes, since = _changes_since_arg()
+    except ValueError:
+        return jsonify({"error": "Invalid since cursor"}), 400
 
-        if current_user['role'].lower() == 'doctor':
-            doctor_id = current_user['id']
-            patient_id = session['PatientID'] 
+    try:
 
-            relation = get_patient_doctor_relation(patient_id, doctor_id)
+        if current_user['role'].lower() == 'doctor':
+            relation = get_patient_doctor_relation(patient_id, current_user['id'])
         
             if not relation:
                 return jsonify({"error": "Patient not associated with this doctor"}), 403
         
+        if changes:
+            return _changes_response(
+                patient_id, 'feedback', since, lambda: get_feedback_by_patient(patient_id, limit=None, since=since)
+            )
         feedbacks = get_feedback_by_patient(patient_id)
         return jsonify(feedbacks), 200
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return _internal_error("Failed to load patient feedback", e)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Rebuild the weekly metrics rollups from the stored metrics.
+Run this from the backend directory: python backfill_rollups.py [--patient ID]
+
+Requires migrations/005_metrics_weekly_table.sql (run it once the migration is
+applied, since writes skip the rollups until then). Every patient is rebuilt
+in its own transaction, so the tool can be rerun safely at any time (for
+example after restoring metrics or changing the histogram bins).
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import db functions
+sys.path.insert(0, str(Path(__file__).parent))
+
+from db import is_db_enabled, list_patients_with_sessions, rebuild_patient_rollups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patient", action="append", default=None,
+                        help="Only rebuild this patient (repeatable)")
+    args = parser.parse_args(argv)
+
+    if not is_db_enabled():
+        print("ERROR: Database not configured. Check your .env file.")
+        return 1
+
+    patient_ids = args.patient or list_patients_with_sessions()
+    print(f"Rebuilding weekly rollups of {len(patient_ids)} patients")
+
+    started = time.perf_counter()
+    written = 0
+    failed = 0
+    for patient_id in patient_ids:
+        try:
+            written += rebuild_patient_rollups(patient_id)
+        except Exception as e:
+            failed += 1
+            print(f"  FAILED patient {patient_id}: {e}")
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written} weekly rollups for {len(patient_ids) - failed} patients in {elapsed:.1f}s")
+    if failed:
+        print(f"{failed} patients failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
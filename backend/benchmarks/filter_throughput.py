@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Throughput of the analysis.filters stages on hour-long recordings.
+Run this from the backend directory: python benchmarks/filter_throughput.py [--hours 1]
+
+Filters a (samples, channels) block shaped like a five-sensor recording
+(three Euler and three FreeAcc channels per sensor) and reports the median
+time and samples/s of every stage.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analysis.filters import butter_sos, derivative, savgol_filter, smooth_derivative, sosfiltfilt
+
+
+def build_channels(hours, rate, channels, seed=0):
+    samples = int(hours * 3600 * rate)
+    rng = np.random.default_rng(seed)
+    # Slightly jittered timestamps, as produced by the BLE timebase
+    seconds = np.arange(samples) / rate + rng.uniform(-0.1, 0.1, samples) / rate
+    phase = rng.uniform(0, 2 * np.pi, channels)
+    values = 30.0 * np.sin(2 * np.pi * 0.5 * seconds[:, None] + phase) + rng.normal(0, 1.0, (samples, channels))
+    return seconds, values
+
+
+def measure(label, func, samples, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    print(f"{label:<28} {median:>9.3f} {samples / median / 1e6:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=1.0, help="Recording length")
+    parser.add_argument("--rate", type=int, default=60, help="OutputRate in Hz")
+    parser.add_argument("--channels", type=int, default=30, help="Channels filtered together")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    seconds, values = build_channels(args.hours, args.rate, args.channels)
+    samples = values.size
+    sos = butter_sos(4, 6.0, args.rate)
+    print(f"Recording: {len(seconds)} samples x {args.channels} channels ({args.hours:g} h @ {args.rate} Hz)")
+    print(f"{'stage':<28} {'median s':>9} {'Msamples/s':>12}")
+
+    measure("savgol_filter(15, 3)", lambda: savgol_filter(values, 15, 3), samples, args.repeats)
+    measure("savgol_filter deriv=1", lambda: savgol_filter(values, 15, 3, deriv=1, delta=1 / args.rate),
+            samples, args.repeats)
+    measure("sosfiltfilt butter(4, 6 Hz)", lambda: sosfiltfilt(sos, values), samples, args.repeats)
+    measure("derivative (non-uniform)", lambda: derivative(values, seconds), samples, args.repeats)
+    measure("smooth_derivative", lambda: smooth_derivative(values, seconds), samples, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
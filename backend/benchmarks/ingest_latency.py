@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Per-recording ingestion latency against worker count.
+Run this from the backend directory: python benchmarks/ingest_latency.py [--minutes 10]
+
+Builds a five-sensor Movella ZIP in memory, then decodes it with
+analysis.ingest.decode_movella_zip (CSV parsing + preprocessing per sensor)
+and joins the sensors through analysis.pipeline.analyze_sensors.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analysis import analyze_sensors, decode_movella_zip
+
+CSV_HEADER = "PacketCounter,SampleTimeFine,Euler_X,Euler_Y,Euler_Z,FreeAcc_X,FreeAcc_Y,FreeAcc_Z,Status"
+
+
+def build_zip(minutes, rate):
+    samples = int(minutes * 60 * rate)
+    t = np.arange(samples) / rate
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for tag in range(1, 6):
+            angle = 30.0 * np.sin(2 * np.pi * 0.5 * t + tag)
+            table = np.column_stack([
+                np.arange(samples),
+                (t * 1e6).astype(np.int64),
+                angle, 0.5 * angle, np.full(samples, 10.0 * tag),
+                np.sin(t), np.cos(t), np.zeros(samples),
+                np.zeros(samples),
+            ])
+            body = io.StringIO()
+            np.savetxt(body, table, delimiter=",", fmt=["%d", "%d"] + ["%.6f"] * 6 + ["%d"])
+            archive.writestr(
+                f"sensor_{tag}.csv",
+                f"DeviceTag:,{tag}\nOutputRate:,{rate}Hz\nStartTime:,benchmark\n{CSV_HEADER}\n" + body.getvalue(),
+            )
+    return buffer.getvalue()
+
+
+def measure(payload, workers, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        with decode_movella_zip(io.BytesIO(payload), workers=workers) as sensors:
+            analyze_sensors({tag: parsed["channels"] for tag, parsed in sensors.items()})
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10.0, help="Recording length per sensor")
+    parser.add_argument("--rate", type=int, default=60, help="OutputRate in Hz")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    payload = build_zip(args.minutes, args.rate)
+    print(f"Recording: 5 sensors x {args.minutes:g} min @ {args.rate} Hz, ZIP {len(payload) / 1e6:.1f} MB")
+    print(f"{'workers':>8} {'median s':>10} {'best s':>10} {'speedup':>8}")
+
+    baseline = None
+    for workers in range(1, max(1, args.max_workers) + 1):
+        measure(payload, workers, 1)  # warm up the pool
+        timings = measure(payload, workers, args.repeats)
+        median = statistics.median(timings)
+        baseline = baseline or median
+        print(f"{workers:>8} {median:>10.3f} {min(timings):>10.3f} {baseline / median:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline throughput and accuracy on synthetic recordings.
+Run this from the backend directory: python benchmarks/pipeline_throughput.py [--recordings 20] [--json]
+
+Generates five-sensor squat recordings with analysis.synthetic (known
+ground truth, optional noise, packet loss and clock drift), archives each
+ZIP through analysis.recordings.archive_movement_zip into a temporary
+RECORDINGS_DIR and analyzes it with analysis.pipeline.analyze_recording.
+Reports recordings/s, peak RSS, median per-stage timings and the error
+against the ground truth. Needs no database or network, so it also runs
+in CI (``--json`` prints one machine-readable line).
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analysis.pipeline import analyze_recording
+from analysis.recordings import archive_movement_zip
+from analysis.synthetic import build_recording_zip, generate_recording
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(args):
+    stages = {}
+    errors = {"knee_max_rom_deg": [], "repetitions": [], "com_displacement_cm": []}
+    generated_bytes = 0
+    elapsed = 0.0
+    for index in range(args.recordings):
+        recording = generate_recording(
+            duration=args.duration,
+            rate=args.rate,
+            repetitions=args.reps,
+            noise_deg=args.noise,
+            packet_loss=args.packet_loss,
+            clock_drift_ppm=args.clock_drift,
+            seed=args.seed + index,
+        )
+        payload = build_recording_zip(recording)
+        generated_bytes += len(payload)
+
+        timings = {}
+        started = time.perf_counter()
+        manifest = archive_movement_zip(io.BytesIO(payload), exercise_type="squat", workers=args.workers)
+        timings["archive"] = time.perf_counter() - started
+        result = analyze_recording(manifest["recording_id"], timings)
+        elapsed += time.perf_counter() - started
+        for stage, seconds in timings.items():
+            stages.setdefault(stage, []).append(seconds)
+
+        truth = recording["truth"]
+        for row in result["metrics"]:
+            if row["joint"] != "knee":
+                continue
+            errors["knee_max_rom_deg"].append(abs(row["max_rom"] - float(truth["knee"][row["side"]].max())))
+            errors["repetitions"].append(abs(row["repetition"] - truth["repetitions"]))
+            if row.get("center_mass_displacement") is not None:
+                errors["com_displacement_cm"].append(abs(row["center_mass_displacement"] - truth["com_drop_cm"]))
+
+    return {
+        "recordings": args.recordings,
+        "recordings_per_second": args.recordings / elapsed if elapsed else 0.0,
+        "mean_zip_mb": generated_bytes / args.recordings / 1e6,
+        "peak_rss_mb": peak_rss_mb(),
+        "stage_median_ms": {stage: statistics.median(values) * 1000 for stage, values in stages.items()},
+        "max_error": {name: max(values) if values else None for name, values in errors.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recordings", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="Recording length in seconds")
+    parser.add_argument("--rate", type=int, default=60, help="OutputRate in Hz")
+    parser.add_argument("--reps", type=int, default=10, help="Repetitions per recording")
+    parser.add_argument("--noise", type=float, default=0.2, help="Orientation noise in degrees")
+    parser.add_argument("--packet-loss", type=float, default=0.01, help="Fraction of packets lost per sensor")
+    parser.add_argument("--clock-drift", type=float, default=20.0, help="Sensor clock drift bound in ppm")
+    parser.add_argument("--workers", type=int, default=1, help="CSV decode workers per recording")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as one JSON line")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as recordings_dir:
+        os.environ["RECORDINGS_DIR"] = recordings_dir
+        report = measure(args)
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(
+        f"Recordings: {args.recordings} x 5 sensors x {args.duration:g} s @ {args.rate} Hz, "
+        f"ZIP {report['mean_zip_mb']:.2f} MB each"
+    )
+    print(f"Throughput: {report['recordings_per_second']:.2f} recordings/s, peak RSS {report['peak_rss_mb']:.0f} MB")
+    print(f"{'stage':>12} {'median ms':>10}")
+    for stage, median in report["stage_median_ms"].items():
+        print(f"{stage:>12} {median:>10.1f}")
+    print("Max error vs ground truth:")
+    for name, value in report["max_error"].items():
+        print(f"{name:>22} {'n/a' if value is None else f'{value:.2f}'}")
+
+
+if __name__ == "__main__":
+    main()
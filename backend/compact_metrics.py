@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Move existing metrics rows into packed per-session blobs.
+Run this from the backend directory: python compact_metrics.py [--batch-size N] [--idle-minutes N] [--dry-run]
+
+Requires METRICS_STORAGE=packed and migrations/003_metrics_packed_table.sql.
+With packed storage, metrics posted one repetition at a time are buffered
+as rows, so schedule this tool (e.g. hourly with --idle-minutes 30) to pack
+them once their session has stopped receiving entries.
+Every session is compacted in its own transaction (rows are appended to the
+session's joint/side blobs, then deleted), so the tool can be stopped and
+rerun at any time; sessions without metrics rows are left alone.
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add parent directory to path to import db functions
+sys.path.insert(0, str(Path(__file__).parent))
+
+from db import compact_session_metrics, is_db_enabled, is_metrics_packed, list_unpacked_metrics_sessions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="Sessions looked up per query (default: 500)")
+    parser.add_argument("--idle-minutes", type=int, default=0,
+                        help="Skip sessions with metrics rows written in the last N minutes (default: 0)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report how many rows would be packed without changing anything")
+    args = parser.parse_args(argv)
+
+    if not is_db_enabled():
+        print("ERROR: Database not configured. Check your .env file.")
+        return 1
+    if not args.dry_run and not is_metrics_packed():
+        print("ERROR: Set METRICS_STORAGE=packed first, or packed metrics would not be read back.")
+        return 1
+
+    idle_since = None
+    if args.idle_minutes > 0:
+        idle_since = (datetime.now(timezone.utc) - timedelta(minutes=args.idle_minutes)).replace(tzinfo=None)
+
+    started = time.perf_counter()
+    sessions = 0
+    moved = 0
+    blobs = 0
+    failed = set()
+    while True:
+        batch = [
+            entry for entry in list_unpacked_metrics_sessions(max(1, args.batch_size) + len(failed), idle_since)
+            if entry["SessionID"] not in failed
+        ]
+        if not batch:
+            break
+        for entry in batch:
+            if args.dry_run:
+                moved += int(entry["RowCount"])
+            else:
+                try:
+                    moved += compact_session_metrics(entry["SessionID"])
+                except Exception as e:
+                    failed.add(entry["SessionID"])
+                    print(f"  FAILED session {entry['SessionID']}: {e}")
+                    continue
+            sessions += 1
+            blobs += int(entry["GroupCount"])
+        if args.dry_run:
+            # Nothing changes, so the same sessions would come back
+            break
+
+    elapsed = time.perf_counter() - started
+    verb = "Would pack" if args.dry_run else "Packed"
+    ratio = f" ({moved / blobs:.1f}x fewer rows)" if blobs else ""
+    print(f"{verb} {moved} metrics rows of {sessions} sessions into {blobs} blobs{ratio} in {elapsed:.1f}s")
+    if args.dry_run and sessions >= args.batch_size:
+        print(f"  (dry run looked at the first {sessions} sessions only)")
+    if failed:
+        print(f"{len(failed)} sessions failed and were left as rows")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
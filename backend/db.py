@@ -1,16 +1,23 @@
+import heapq
 import os
 import ssl
+import struct
 import uuid
 import re
+import zlib
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
+import numpy as np
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.engine import Engine
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Any
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 
+from analysis import rollups
+
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
@@ -39,12 +46,44 @@ _engine: Optional[Engine] = (
     create_engine(
         DATABASE_URL,
         pool_pre_ping=True,
-        connect_args={"ssl": _build_ssl_context()},  
+        # UTC sessions: TIMESTAMP columns (UpdatedAt, migrations/007) then
+        # compare directly with the naive UTC datetimes used everywhere else
+        connect_args={"ssl": _build_ssl_context(), "init_command": "SET time_zone = '+00:00'"},
     )
     if DATABASE_URL
     else None
 )
 
+# Tables and columns added by optional migrations, looked up once per
+# process: restart the app after applying one of them.
+_schema_cache: dict[tuple[str, Optional[str]], bool] = {}
+
+def _schema_has(table: str, column: Optional[str] = None) -> bool:
+    key = (table, column)
+    if key not in _schema_cache:
+        if column is None:
+            row = fetch_one(
+                "SELECT COUNT(*) AS found FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table",
+                {"table": table},
+            )
+        else:
+            row = fetch_one(
+                "SELECT COUNT(*) AS found FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = :column",
+                {"table": table, "column": column},
+            )
+        _schema_cache[key] = bool(row and row["found"])
+    return _schema_cache[key]
+
+def is_rollups_enabled() -> bool:
+    """Weekly rollups are maintained once migrations/005 is applied."""
+    return _schema_has("metrics_weekly")
+
+def is_change_tracking_enabled() -> bool:
+    """UpdatedAt columns and deletion tombstones exist once migrations/007 is applied."""
+    return _schema_has("deleted_records")
+
 # TEMPORARY clinical-study login compatibility layer.
 # Reuses the existing users columns without changing the schema so patients
 # can authenticate with non-sensitive internal codes until a dedicated
@@ -165,7 +204,18 @@ def extract_temporary_access_code(
             return code
     return None
 
-def generate_next_temporary_access_code(role: str) -> str:
+def _existing_emails(emails: list[str]) -> set[str]:
+    if not emails:
+        return set()
+    placeholders = ", ".join(f":email_{index}" for index in range(len(emails)))
+    rows = fetch_all(
+        f"SELECT Email FROM users WHERE Email IN ({placeholders})",
+        {f"email_{index}": email for index, email in enumerate(emails)},
+    )
+    return {str(row["Email"]).lower() for row in rows}
+
+def generate_temporary_access_codes(role: str, count: int) -> list[str]:
+    """``count`` unused access codes for ``role``, reading the users table once."""
     normalized_role = "Doctor" if str(role).lower() == "doctor" else "Patient"
     rows = fetch_all(
         """
@@ -194,12 +244,20 @@ def generate_next_temporary_access_code(role: str) -> str:
             except (IndexError, ValueError):
                 continue
 
+    codes: list[str] = []
     next_sequence = max_sequence + 1
-    while True:
-        candidate = f"{TEMPORARY_ACCESS_CODE_PREFIXES[normalized_role]}-{next_sequence:06d}"
-        if not user_exists(build_temporary_access_email(candidate)):
-            return candidate
-        next_sequence += 1
+    while len(codes) < count:
+        candidates = [
+            f"{TEMPORARY_ACCESS_CODE_PREFIXES[normalized_role]}-{sequence:06d}"
+            for sequence in range(next_sequence, next_sequence + count - len(codes))
+        ]
+        next_sequence += len(candidates)
+        taken = _existing_emails([build_temporary_access_email(candidate) for candidate in candidates])
+        codes += [candidate for candidate in candidates if build_temporary_access_email(candidate) not in taken]
+    return codes
+
+def generate_next_temporary_access_code(role: str) -> str:
+    return generate_temporary_access_codes(role, 1)[0]
 
 def create_temporary_user(role: str, password_hash: str) -> dict[str, str]:
     normalized_role = "Doctor" if str(role).lower() == "doctor" else "Patient"
@@ -242,40 +300,45 @@ def _execute_patient_insert_with_temporary_birthdate_fallback(
             },
         )
 
+_INSERT_MANUAL_PATIENT_SQL = """
+    INSERT INTO patient (
+        UserID, BirthDate, Sex, Weight, Height, BMI, Occupation, Education,
+        AffectedRightKnee, AffectedLeftKnee, AffectedRightHip, AffectedLeftHip,
+        MedicalHistory, TimeAfterSymptoms, LegDominance, PhysicallyActive
+    )
+    VALUES (
+        :user_id, :birth_date, :sex, :weight, :height, :bmi, :occupation, :education,
+        :ark, :alk, :arh, :alh, :med_hist, :tas, :leg_dom, :active
+    )
+"""
+
+def _manual_patient_params(user_id: str, patient_data: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "birth_date": patient_data.get('birth_date'),
+        "sex": patient_data.get('sex'),
+        "weight": patient_data.get('weight'),
+        "height": patient_data.get('height'),
+        "bmi": patient_data.get('bmi'),
+        "occupation": patient_data.get('occupation'),
+        "education": patient_data.get('education'),
+        "ark": patient_data.get('affected_right_knee'),
+        "alk": patient_data.get('affected_left_knee'),
+        "arh": patient_data.get('affected_right_hip'),
+        "alh": patient_data.get('affected_left_hip'),
+        "med_hist": patient_data.get('medical_history'),
+        "tas": patient_data.get('time_after_symptoms'),
+        "leg_dom": patient_data.get('leg_dominance'),
+        "active": patient_data.get('physically_active', 0)
+    }
+
 def create_manual_patient(patient_data, doctor_id, password_hash):
     temp_user = create_temporary_user("Patient", password_hash)
     user_id = temp_user["user_id"]
 
     _execute_patient_insert_with_temporary_birthdate_fallback(
-        """
-        INSERT INTO patient (
-            UserID, BirthDate, Sex, Weight, Height, BMI, Occupation, Education,
-            AffectedRightKnee, AffectedLeftKnee, AffectedRightHip, AffectedLeftHip,
-            MedicalHistory, TimeAfterSymptoms, LegDominance, PhysicallyActive
-        )
-        VALUES (
-            :user_id, :birth_date, :sex, :weight, :height, :bmi, :occupation, :education,
-            :ark, :alk, :arh, :alh, :med_hist, :tas, :leg_dom, :active
-        )
-        """,
-        {
-            "user_id": user_id,
-            "birth_date": patient_data.get('birth_date'),
-            "sex": patient_data.get('sex'),
-            "weight": patient_data.get('weight'),
-            "height": patient_data.get('height'),
-            "bmi": patient_data.get('bmi'),
-            "occupation": patient_data.get('occupation'),
-            "education": patient_data.get('education'),
-            "ark": patient_data.get('affected_right_knee'),
-            "alk": patient_data.get('affected_left_knee'),
-            "arh": patient_data.get('affected_right_hip'),
-            "alh": patient_data.get('affected_left_hip'),
-            "med_hist": patient_data.get('medical_history'),
-            "tas": patient_data.get('time_after_symptoms'),
-            "leg_dom": patient_data.get('leg_dominance'),
-            "active": patient_data.get('physically_active', 0)
-        }
+        _INSERT_MANUAL_PATIENT_SQL,
+        _manual_patient_params(user_id, patient_data),
     )
 
     assign_patient_to_doctor(patient_id=user_id, doctor_id=doctor_id)
@@ -288,6 +351,80 @@ def create_manual_patient(patient_data, doctor_id, password_hash):
         "email": temp_user["email"],
     }
 
+def create_manual_patients(
+    patients: list[dict[str, Any]],
+    doctor_id: str,
+    access_codes: list[str],
+) -> list[dict[str, str]]:
+    """
+    ``create_manual_patient`` for a batch of patients: users, patient rows and
+    doctor relations are inserted with one ``executemany`` each, in a single
+    transaction, so either every patient of the batch is created or none is.
+    Every patient dict carries its ``password_hash``; ``access_codes`` come from
+    ``generate_temporary_access_codes``. A code taken concurrently since then
+    raises ``IntegrityError`` on the unique Email.
+    """
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    now = datetime.now(timezone.utc)
+    created = [
+        {
+            "user_id": str(uuid.uuid4()),
+            "access_code": access_code,
+            "patient_code": access_code,
+            "label": build_temporary_access_label("Patient", access_code),
+            "email": build_temporary_access_email(access_code),
+        }
+        for access_code in access_codes[:len(patients)]
+    ]
+    if len(created) != len(patients):
+        raise ValueError("Every patient needs an access code")
+
+    users = [
+        {
+            "id": entry["user_id"], "email": entry["email"], "password": patient["password_hash"],
+            "fname": "Patient", "lname": entry["access_code"], "role": "Patient",
+        }
+        for patient, entry in zip(patients, created)
+    ]
+    patient_rows = [_manual_patient_params(entry["user_id"], patient) for patient, entry in zip(patients, created)]
+    relations = [
+        {"id": str(uuid.uuid4()), "patient_id": entry["user_id"], "doctor_id": doctor_id, "now": now}
+        for entry in created
+    ]
+
+    with _engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO users (ID, Email, Password, FirstName, LastName, Role, Active, Deleted)
+                VALUES (:id, :email, :password, :fname, :lname, :role, 1, 0)
+                """
+            ),
+            users,
+        )
+        try:
+            with connection.begin_nested():
+                connection.execute(text(_INSERT_MANUAL_PATIENT_SQL), patient_rows)
+        except Exception:
+            if all(row["birth_date"] is not None for row in patient_rows):
+                raise
+            # Same placeholder fallback as _execute_patient_insert_with_temporary_birthdate_fallback
+            connection.execute(
+                text(_INSERT_MANUAL_PATIENT_SQL),
+                [{**row, "birth_date": row["birth_date"] or TEMPORARY_BIRTH_DATE_PLACEHOLDER} for row in patient_rows],
+            )
+        connection.execute(
+            text(
+                """
+                INSERT INTO patientdoctor (ID, PatientID, DoctorID, Active, TimeCreated, TimeActive)
+                VALUES (:id, :patient_id, :doctor_id, 1, :now, :now)
+                """
+            ),
+            relations,
+        )
+    return created
+
 def get_doctor_patient_ids(doctor_id: str) -> list[str]:
     rows = fetch_all(
         """
@@ -392,6 +529,110 @@ def assign_patient_to_doctor(patient_id: str, doctor_id: str) -> None:
         },
     )
 
+def get_patient_relation(patient_id: str) -> Optional[dict[str, Any]]:
+    """The patient's active doctor relation; None once every relation was closed."""
+    return fetch_one(
+        """
+        SELECT ID, DoctorID, Active
+        FROM patientdoctor
+        WHERE PatientID = :patient_id AND Active = 1
+        ORDER BY TimeActive DESC
+        LIMIT 1
+        """,
+        {"patient_id": patient_id},
+    )
+
+def reassign_patients(
+    to_doctor_id: str,
+    patient_ids: Optional[list[str]] = None,
+    from_doctor_id: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Move ``patient_ids`` (or every active patient of ``from_doctor_id``) to
+    ``to_doctor_id`` in one transaction: their active relations are closed
+    with one UPDATE and the new ones created with one INSERT ... SELECT.
+
+    Returns ``{"moved", "unchanged", "notFound", "previousDoctorIds"}``;
+    patients already with ``to_doctor_id`` are left alone.
+    """
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    now = datetime.now(timezone.utc)
+
+    with _engine.begin() as connection:
+        if from_doctor_id is not None:
+            rows = connection.execute(
+                text(
+                    """
+                    SELECT PatientID, DoctorID
+                    FROM patientdoctor
+                    WHERE DoctorID = :from_doctor_id AND Active = 1
+                    FOR UPDATE
+                    """
+                ),
+                {"from_doctor_id": from_doctor_id},
+            ).fetchall()
+            requested = list(dict.fromkeys(str(row[0]) for row in rows))
+        else:
+            requested = list(dict.fromkeys(str(patient_id) for patient_id in patient_ids or []))
+            if not requested:
+                return {"moved": [], "unchanged": [], "notFound": [], "previousDoctorIds": []}
+            placeholders = ", ".join(f":patient_{index}" for index in range(len(requested)))
+            rows = connection.execute(
+                text(
+                    f"""
+                    SELECT u.ID, pd.DoctorID
+                    FROM users u
+                    LEFT JOIN patientdoctor pd ON pd.PatientID = u.ID AND pd.Active = 1
+                    WHERE u.ID IN ({placeholders})
+                      AND u.Role = 'Patient'
+                      AND COALESCE(u.Deleted, 0) = 0
+                    FOR UPDATE
+                    """
+                ),
+                {f"patient_{index}": patient_id for index, patient_id in enumerate(requested)},
+            ).fetchall()
+
+        doctors_by_patient: dict[str, set[str]] = {}
+        for patient_id, doctor_id in rows:
+            doctors_by_patient.setdefault(str(patient_id), set())
+            if doctor_id is not None:
+                doctors_by_patient[str(patient_id)].add(str(doctor_id))
+        moved = [
+            patient_id for patient_id in requested
+            if patient_id in doctors_by_patient and doctors_by_patient[patient_id] != {str(to_doctor_id)}
+        ]
+        unchanged = [patient_id for patient_id in requested if doctors_by_patient.get(patient_id) == {str(to_doctor_id)}]
+        not_found = [patient_id for patient_id in requested if patient_id not in doctors_by_patient]
+        previous = sorted({doctor for patient_id in moved for doctor in doctors_by_patient[patient_id]})
+
+        if moved:
+            placeholders = ", ".join(f":patient_{index}" for index in range(len(moved)))
+            params = {f"patient_{index}": patient_id for index, patient_id in enumerate(moved)}
+            connection.execute(
+                text(
+                    f"""
+                    UPDATE patientdoctor
+                    SET Active = 0, TimeActive = :now
+                    WHERE Active = 1 AND PatientID IN ({placeholders})
+                    """
+                ),
+                {**params, "now": now},
+            )
+            connection.execute(
+                text(
+                    f"""
+                    INSERT INTO patientdoctor (ID, PatientID, DoctorID, Active, TimeCreated, TimeActive)
+                    SELECT UUID(), u.ID, :doctor_id, 1, :now, :now
+                    FROM users u
+                    WHERE u.ID IN ({placeholders})
+                    """
+                ),
+                {**params, "doctor_id": to_doctor_id, "now": now},
+            )
+
+    return {"moved": moved, "unchanged": unchanged, "notFound": not_found, "previousDoctorIds": previous}
+
 def get_user_for_login(email: str, role: str) -> Optional[dict[str, Any]]:
     return fetch_one(
         """
@@ -530,15 +771,131 @@ def create_patient_record(user_id: str, birth_date: Optional[str] = None) -> Non
         },
     )
 
-def get_patient_sessions(patient_id: str):
-    rows = fetch_all(
+# Changes since a cursor (migrations/007): session, metrics, metrics_packed
+# and PatientFeedback carry an UpdatedAt TIMESTAMP(3) that MySQL sets on every
+# insert and update, and deletions leave a tombstone in deleted_records.
+# Cursors are naive UTC datetimes read from the database clock.
+#
+# A row is stamped when it is written but only visible once its transaction
+# commits, so a cursor reaches back to the start of the oldest open write
+# transaction (information_schema.INNODB_TRX) and at least
+# CHANGES_CURSOR_MIN_LAG. Without the PROCESS privilege that table cannot be
+# read and the cursor falls back to CHANGES_CURSOR_LAG_SECONDS; transactions
+# running longer than that may then be missed.
+CHANGES_CURSOR_MIN_LAG = timedelta(seconds=1)
+DELETED_RECORD_KINDS = ("sessions", "metrics", "feedback")
+
+# trx_started is in the server's system time zone
+_CHANGES_CURSOR_SQL = """
+    SELECT UTC_TIMESTAMP(3) AS now,
+           TIMESTAMPDIFF(MICROSECOND, MIN(trx_started), CONVERT_TZ(UTC_TIMESTAMP(6), '+00:00', 'SYSTEM')) AS oldest
+    FROM information_schema.INNODB_TRX
+    WHERE trx_is_read_only = 0
+"""
+
+_TOMBSTONE_SQL = {
+    "sessions": """
+        SELECT pd.PatientID, 'sessions', s.ID
+        FROM session s JOIN patientdoctor pd ON pd.ID = s.RelationID
+        WHERE s.ID = :sid
+    """,
+    "metrics": """
+        SELECT pd.PatientID, 'metrics', m.ID
+        FROM metrics m
+        JOIN session s ON s.ID = m.SessionID
+        JOIN patientdoctor pd ON pd.ID = s.RelationID
+        WHERE m.SessionID = :sid
+    """,
+    "feedback": "SELECT UserID, 'feedback', ID FROM PatientFeedback WHERE SessionID = :sid",
+}
+
+def _updated_column(table: str) -> str:
+    """UpdatedAt of ``table``, or TimeCreated (new rows only) before migrations 007/008."""
+    tracked = _schema_has(table, "UpdatedAt") if table == "metrics_packed" else is_change_tracking_enabled()
+    return "UpdatedAt" if tracked else "TimeCreated"
+
+def _since_filter(alias: str, since: Optional[datetime], table: str) -> str:
+    """``AND`` clause keeping rows of ``table`` changed after the ``:since`` parameter (empty when None)."""
+    if since is None:
+        return ""
+    return f"AND {alias}.{_updated_column(table)} > :since"
+
+def get_changes_cursor() -> datetime:
+    """
+    Cursor for a changes read, taken before reading: the database clock,
+    moved back to the start of the oldest open write transaction so rows
+    it commits later are returned next time.
+    """
+    try:
+        row = fetch_one(_CHANGES_CURSOR_SQL)
+    except DBAPIError:
+        row = fetch_one("SELECT UTC_TIMESTAMP(3) AS now")
+        lag = timedelta(seconds=int(os.getenv("CHANGES_CURSOR_LAG_SECONDS") or 300))
+        return row["now"] - lag
+    oldest = timedelta(microseconds=int(row["oldest"] or 0))
+    return row["now"] - max(oldest, CHANGES_CURSOR_MIN_LAG)
+
+def _record_deletions(connection, session_id, *kinds, packed: Optional[bool] = None) -> None:
+    """
+    Tombstone the ``kinds`` rows of a session inside ``connection``'s
+    transaction, before they are deleted. Packed metrics entries are included
+    unless ``packed`` is False. Nothing is recorded before migrations/007.
+    """
+    if not is_change_tracking_enabled():
+        return
+    for kind in kinds:
+        connection.execute(
+            text(f"INSERT INTO deleted_records (PatientID, Kind, RecordID) {_TOMBSTONE_SQL[kind]}"),
+            {"sid": session_id},
+        )
+    if "metrics" not in kinds or not (is_metrics_packed() if packed is None else packed):
+        return
+    blobs = connection.execute(
+        text(
+            "SELECT pd.PatientID, p.ID, p.RowCount FROM metrics_packed p "
+            "JOIN session s ON s.ID = p.SessionID JOIN patientdoctor pd ON pd.ID = s.RelationID "
+            "WHERE p.SessionID = :sid"
+        ),
+        {"sid": session_id},
+    ).fetchall()
+    tombstones = [
+        {"patient_id": patient_id, "record_id": f"{packed_id}:{index}"}
+        for patient_id, packed_id, count in blobs
+        for index in range(count)
+    ]
+    if tombstones:
+        connection.execute(
+            text("INSERT INTO deleted_records (PatientID, Kind, RecordID) VALUES (:patient_id, 'metrics', :record_id)"),
+            tombstones,
+        )
+
+def get_deleted_records(patient_id: str, since: datetime) -> dict[str, list[str]]:
+    """IDs of a patient's sessions, metrics and feedback deleted after ``since``, by kind."""
+    deleted: dict[str, list[str]] = {kind: [] for kind in DELETED_RECORD_KINDS}
+    if not is_change_tracking_enabled():
+        return deleted
+    for row in fetch_all(
         """
-        SELECT S.*, pd.PatientID
+        SELECT d.Kind, d.RecordID
+        FROM deleted_records d
+        WHERE d.PatientID = :patient_id AND d.DeletedAt > :since
+        ORDER BY d.DeletedAt, d.ID
+        """,
+        {"patient_id": patient_id, "since": since},
+    ):
+        deleted.setdefault(row["Kind"], []).append(row["RecordID"])
+    return deleted
+
+def get_patient_sessions(patient_id: str, since: Optional[datetime] = None):
+    """Sessions of a patient; only those changed after ``since`` when given."""
+    rows = fetch_all(
+        f"""
+        SELECT s.*, pd.PatientID
         FROM session s
         INNER JOIN patientdoctor pd ON pd.ID = s.RelationID
-        WHERE pd.PatientID = :patientID;
+        WHERE pd.PatientID = :patientID {_since_filter("s", since, "session")}
         """,
-        {"patientID": patient_id}
+        {"patientID": patient_id, "since": since}
     )
     
     for row in rows:
@@ -630,77 +987,603 @@ def update_session_exercise_details(session_id, exercise_description=None, repet
     return True
 
 def delete_patient_session(session_id):
-    """Delete session. Azure schema: remove metrics and feedback first (FKs), then session."""
-    execute("DELETE FROM metrics WHERE SessionID = :sid", {"sid": session_id})
-    execute("DELETE FROM PatientFeedback WHERE SessionID = :sid", {"sid": session_id})
-    execute("DELETE FROM session WHERE ID = :session_id", {"session_id": session_id})
+    """
+    Delete session. Azure schema: remove metrics and feedback first (FKs), then
+    session; the weekly rollups of the session's week are rebuilt without it.
+    """
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    with _engine.begin() as connection:
+        located = _session_patient_week(connection, session_id)
+        _record_deletions(connection, session_id, "metrics", "feedback", "sessions")
+        connection.execute(text("DELETE FROM metrics WHERE SessionID = :sid"), {"sid": session_id})
+        if is_metrics_packed():
+            connection.execute(text("DELETE FROM metrics_packed WHERE SessionID = :sid"), {"sid": session_id})
+        connection.execute(text("DELETE FROM PatientFeedback WHERE SessionID = :sid"), {"sid": session_id})
+        connection.execute(text("DELETE FROM session WHERE ID = :session_id"), {"session_id": session_id})
+        if located:
+            _rebuild_weekly_rollups(connection, *located)
+
+_INSERT_METRICS_SQL = """
+    INSERT INTO metrics (
+        ID, SessionID, Joint, Side, Repetitions,
+        MinVelocity, MaxVelocity, AvgVelocity, P95Velocity,
+        MinROM, MaxROM, AvgROM, CenterMassDisplacement, TimeCreated
+    )
+    VALUES (
+        :id, :session_id, :joint, :side, :repetition,
+        :min_v, :max_v, :avg_v, :p95_v,
+        :min_rom, :max_rom, :avg_rom, :cmd, :now
+    )
+"""
 
-def insert_session_metrics(session_id, data):
+def _build_metrics_params(session_id, data, now) -> Optional[dict[str, Any]]:
     # Deployed Metrics table requires explicit ID (no AUTO_INCREMENT default)
     joint = (data.get('joint') or 'knee').lower()
     if joint not in ('knee', 'hip'):
         return None  # Skip COM and other invalid joints
-    mid = str(uuid.uuid4())
-    now = datetime.now(timezone.utc)
     raw_side = (data.get('side') or 'both').lower()
     side = raw_side if raw_side in ('left', 'right') else 'left'
-    repetition = int(data.get('repetition') or 0)
-    min_v = float(data.get('min_velocity') or 0)
-    max_v = float(data.get('max_velocity') or 0)
-    avg_v = float(data.get('avg_velocity') or 0)
-    p95_v = float(data.get('p95_velocity') or 0)
-    min_rom = float(data.get('min_rom') or 0)
-    max_rom = float(data.get('max_rom') or 0)
-    avg_rom = float(data.get('avg_rom') or 0)
-    cmd = float(data.get('center_mass_displacement') or 0)
+    return {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "joint": joint,
+        "side": side,
+        "repetition": int(data.get('repetition') or 0),
+        "min_v": float(data.get('min_velocity') or 0),
+        "max_v": float(data.get('max_velocity') or 0),
+        "avg_v": float(data.get('avg_velocity') or 0),
+        "p95_v": float(data.get('p95_velocity') or 0),
+        "min_rom": float(data.get('min_rom') or 0),
+        "max_rom": float(data.get('max_rom') or 0),
+        "avg_rom": float(data.get('avg_rom') or 0),
+        "cmd": float(data.get('center_mass_displacement') or 0),
+        "now": now,
+    }
 
-    execute(
-        """
-        INSERT INTO metrics (
-            ID, SessionID, Joint, Side, Repetitions,
-            MinVelocity, MaxVelocity, AvgVelocity, P95Velocity,
-            MinROM, MaxROM, AvgROM, CenterMassDisplacement, TimeCreated
+# Optional packed storage (METRICS_STORAGE=packed, migrations/003): every
+# joint/side of a session is one metrics_packed row whose Data blob holds
+# all of its metrics entries as a column-major float64 array:
+#
+#     header  <4sHHI  magic, format version, column count, row count
+#     body    PACKED_METRICS_COLUMNS x row count float64 (column by column)
+#
+# Reads unpack blobs into the same dicts as ``SELECT * FROM metrics``.
+# Per-repetition inserts are buffered as plain ``metrics`` rows (readers merge
+# both) and packed in one write per session by compact_session_metrics
+# (compact_metrics.py); replace_session_metrics writes blobs directly.
+METRICS_STORAGE_PACKED = "packed"
+PACKED_METRICS_MAGIC = b"IRMB"
+PACKED_METRICS_VERSION = 1
+_PACKED_METRICS_HEADER = struct.Struct("<4sHHI")
+# (column, _build_metrics_params key); TimeCreated is stored as Unix seconds
+PACKED_METRICS_COLUMNS = (
+    ("Repetitions", "repetition"),
+    ("MinVelocity", "min_v"),
+    ("MaxVelocity", "max_v"),
+    ("AvgVelocity", "avg_v"),
+    ("P95Velocity", "p95_v"),
+    ("MinROM", "min_rom"),
+    ("MaxROM", "max_rom"),
+    ("AvgROM", "avg_rom"),
+    ("CenterMassDisplacement", "cmd"),
+    ("TimeCreated", "now"),
+)
+
+def is_metrics_packed() -> bool:
+    return (os.getenv("METRICS_STORAGE") or "").strip().lower() == METRICS_STORAGE_PACKED
+
+def pack_metrics(params_list: list[dict[str, Any]]) -> bytes:
+    """Pack ``_build_metrics_params`` dicts of one joint/side into a blob."""
+    values = np.empty((len(PACKED_METRICS_COLUMNS), len(params_list)), dtype="<f8")
+    for row, params in enumerate(params_list):
+        for column, (_name, key) in enumerate(PACKED_METRICS_COLUMNS):
+            value = params[key]
+            values[column, row] = round(value.timestamp()) if isinstance(value, datetime) else value
+    header = _PACKED_METRICS_HEADER.pack(
+        PACKED_METRICS_MAGIC, PACKED_METRICS_VERSION, len(PACKED_METRICS_COLUMNS), len(params_list)
+    )
+    return header + values.tobytes()
+
+def unpack_metrics(blob: bytes) -> dict[str, np.ndarray]:
+    """Column name -> float64 array for a blob written by ``pack_metrics``."""
+    blob = bytes(blob)
+    if len(blob) < _PACKED_METRICS_HEADER.size:
+        raise ValueError("Packed metrics blob is truncated")
+    magic, version, columns, rows = _PACKED_METRICS_HEADER.unpack_from(blob)
+    if magic != PACKED_METRICS_MAGIC or version != PACKED_METRICS_VERSION:
+        raise ValueError("Unsupported packed metrics blob")
+    if columns != len(PACKED_METRICS_COLUMNS) or len(blob) != _PACKED_METRICS_HEADER.size + 8 * columns * rows:
+        raise ValueError("Packed metrics blob has the wrong size")
+    values = np.frombuffer(blob, dtype="<f8", offset=_PACKED_METRICS_HEADER.size).reshape(columns, rows)
+    return {name: values[column] for column, (name, _key) in enumerate(PACKED_METRICS_COLUMNS)}
+
+def _packed_metrics_params(columns: dict[str, np.ndarray]) -> list[dict[str, Any]]:
+    """Inverse of ``pack_metrics`` (minus row IDs), used to append to a blob."""
+    keys = dict(PACKED_METRICS_COLUMNS)
+    rows = []
+    for index in range(len(columns["Repetitions"])):
+        params = {keys[name]: float(values[index]) for name, values in columns.items()}
+        params["repetition"] = int(params["repetition"])
+        params["now"] = datetime.fromtimestamp(params["now"], timezone.utc)
+        rows.append(params)
+    return rows
+
+def unpack_metrics_rows(packed_row: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Expand a ``metrics_packed`` row into ``metrics``-shaped dicts.
+
+    Entries get the ID ``<packed ID>:<index>``; any other selected columns
+    (e.g. ``ExerciseType``) are copied onto every entry.
+    """
+    columns = unpack_metrics(packed_row["Data"])
+    extra = {key: value for key, value in packed_row.items() if key != "Data"}
+    rows = []
+    for index in range(len(columns["Repetitions"])):
+        row = {**extra, "ID": f"{packed_row['ID']}:{index}"}
+        for name, values in columns.items():
+            row[name] = float(values[index])
+        row["Repetitions"] = int(row["Repetitions"])
+        row["TimeCreated"] = str(datetime.fromtimestamp(row["TimeCreated"], timezone.utc).replace(tzinfo=None))
+        rows.append(row)
+    return rows
+
+def _metrics_row_params(row: dict[str, Any]) -> dict[str, Any]:
+    """``_build_metrics_params``-style dict for a row read from ``metrics``."""
+    created = row.get("TimeCreated") or datetime.now(timezone.utc)
+    return {
+        "joint": row["Joint"],
+        "side": row["Side"],
+        **{
+            key: float(row.get(name) or 0)
+            for name, key in PACKED_METRICS_COLUMNS if name != "TimeCreated"
+        },
+        # DATETIME columns come back naive and hold UTC
+        "now": created if created.tzinfo else created.replace(tzinfo=timezone.utc),
+    }
+
+def _group_metrics_params(params_list: list[dict[str, Any]]) -> dict[tuple[str, str], list[dict[str, Any]]]:
+    groups: dict[tuple[str, str], list[dict[str, Any]]] = {}
+    for params in params_list:
+        groups.setdefault((params["joint"], params["side"]), []).append(params)
+    return groups
+
+def _append_packed_metrics(connection, session_id, joint, side, params_list) -> list[str]:
+    """Append entries to a session's joint/side blob inside ``connection``'s transaction."""
+    existing = connection.execute(
+        text(
+            "SELECT ID, Data FROM metrics_packed "
+            "WHERE SessionID = :sid AND Joint = :joint AND Side = :side FOR UPDATE"
+        ),
+        {"sid": session_id, "joint": joint, "side": side},
+    ).fetchone()
+    if existing is None:
+        packed_id = str(uuid.uuid4())
+        offset = 0
+        connection.execute(
+            text(
+                "INSERT INTO metrics_packed (ID, SessionID, Joint, Side, RowCount, Data, TimeCreated) "
+                "VALUES (:id, :sid, :joint, :side, :count, :data, :now)"
+            ),
+            {
+                "id": packed_id, "sid": session_id, "joint": joint, "side": side,
+                "count": len(params_list), "data": pack_metrics(params_list), "now": params_list[-1]["now"],
+            },
         )
-        VALUES (
-            :id, :session_id, :joint, :side, :repetition,
-            :min_v, :max_v, :avg_v, :p95_v,
-            :min_rom, :max_rom, :avg_rom, :cmd, :now
+    else:
+        packed_id = existing[0]
+        current = _packed_metrics_params(unpack_metrics(existing[1]))
+        offset = len(current)
+        connection.execute(
+            text("UPDATE metrics_packed SET RowCount = :count, Data = :data, TimeCreated = :now WHERE ID = :id"),
+            {
+                "id": packed_id, "count": offset + len(params_list),
+                "data": pack_metrics(current + params_list), "now": params_list[-1]["now"],
+            },
         )
+    return [f"{packed_id}:{offset + index}" for index in range(len(params_list))]
+
+def insert_session_metrics(session_id, data):
+    params = _build_metrics_params(session_id, data, datetime.now(timezone.utc))
+    if params is None:
+        return None
+
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    for attempt in range(2):
+        try:
+            with _engine.begin() as connection:
+                # Also with packed storage: rewriting the blob for every entry
+                # would lock it and write O(n^2) bytes per session
+                connection.execute(text(_INSERT_METRICS_SQL), params)
+                _add_to_weekly_rollups(connection, session_id, [params])
+            return params["id"]
+        except IntegrityError:
+            # A concurrent request created the same rollup row first; retry to update it
+            if attempt:
+                raise
+
+def replace_session_metrics(session_id, metrics_rows) -> list[str]:
+    """Replace every metrics row of a session in a single transaction."""
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    now = datetime.now(timezone.utc)
+    params = [
+        p for p in (_build_metrics_params(session_id, row, now) for row in metrics_rows)
+        if p is not None
+    ]
+    with _engine.begin() as connection:
+        _record_deletions(connection, session_id, "metrics")
+        connection.execute(text("DELETE FROM metrics WHERE SessionID = :sid"), {"sid": session_id})
+        if is_metrics_packed():
+            connection.execute(text("DELETE FROM metrics_packed WHERE SessionID = :sid"), {"sid": session_id})
+            ids = []
+            for (joint, side), group in _group_metrics_params(params).items():
+                ids += _append_packed_metrics(connection, session_id, joint, side, group)
+        else:
+            if params:
+                connection.execute(text(_INSERT_METRICS_SQL), params)
+            ids = [p["id"] for p in params]
+        located = _session_patient_week(connection, session_id)
+        if located:
+            _rebuild_weekly_rollups(connection, *located)
+    return ids
+
+def compact_session_metrics(session_id) -> int:
+    """
+    Move a session's ``metrics`` rows into its packed blobs in one
+    transaction; returns how many rows were moved.
+    """
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    with _engine.begin() as connection:
+        rows = [
+            dict(row._mapping)
+            for row in connection.execute(
+                text("SELECT * FROM metrics WHERE SessionID = :sid ORDER BY TimeCreated, Repetitions FOR UPDATE"),
+                {"sid": session_id},
+            )
+        ]
+        if not rows:
+            return 0
+        # Entries get new IDs in the blobs; the old row IDs become tombstones
+        _record_deletions(connection, session_id, "metrics", packed=False)
+        params = [_metrics_row_params(row) for row in rows]
+        for (joint, side), group in _group_metrics_params(params).items():
+            _append_packed_metrics(connection, session_id, joint, side, group)
+        connection.execute(text("DELETE FROM metrics WHERE SessionID = :sid"), {"sid": session_id})
+    return len(rows)
+
+def list_unpacked_metrics_sessions(limit: int = 500, idle_since: Optional[datetime] = None) -> list[dict[str, Any]]:
+    """
+    Sessions that still have ``metrics`` rows, with their row counts; with
+    ``idle_since``, only those without rows written after it.
+    """
+    return fetch_all(
+        f"""
+        SELECT SessionID, COUNT(*) AS RowCount, COUNT(DISTINCT Joint, Side) AS GroupCount
+        FROM metrics
+        GROUP BY SessionID
+        {"" if idle_since is None else "HAVING MAX(TimeCreated) < :idle_since"}
+        ORDER BY SessionID
+        LIMIT :limit
         """,
-        {
-            "id": mid,
-            "session_id": session_id,
-            "joint": joint,
-            "side": side,
-            "repetition": repetition,
-            "min_v": min_v,
-            "max_v": max_v,
-            "avg_v": avg_v,
-            "p95_v": p95_v,
-            "min_rom": min_rom,
-            "max_rom": max_rom,
-            "avg_rom": avg_rom,
-            "cmd": cmd,
-            "now": now
-        }
+        {"limit": limit, "idle_since": idle_since}
+    )
+
+# Weekly per-patient joint/side aggregates (migrations/005, analysis/rollups.py).
+# Inserts update them incrementally; deletes and replacements rebuild the
+# affected week from its remaining entries; backfill_rollups.py rebuilds all.
+# Until the migration is applied, writes skip them (see is_rollups_enabled).
+_ROLLUP_COLUMNS = (
+    ("EntryCount", "count"),
+    ("MinROM", "rom_min"), ("MaxROM", "rom_max"), ("SumROM", "rom_sum"),
+    ("MinVelocity", "velocity_min"), ("MaxVelocity", "velocity_max"), ("SumVelocity", "velocity_sum"),
+)
+
+_UPSERT_ROLLUP_SQL = """
+    INSERT INTO metrics_weekly (
+        PatientID, Joint, Side, WeekStart, EntryCount,
+        MinROM, MaxROM, SumROM, P95ROM, MinVelocity, MaxVelocity, SumVelocity, P95Velocity,
+        RomHistogram, VelocityHistogram, TimeUpdated
+    )
+    VALUES (
+        :patient_id, :joint, :side, :week, :count,
+        :rom_min, :rom_max, :rom_sum, :rom_p95, :velocity_min, :velocity_max, :velocity_sum, :velocity_p95,
+        :rom_histogram, :velocity_histogram, :now
+    )
+    ON DUPLICATE KEY UPDATE
+        EntryCount = VALUES(EntryCount), MinROM = VALUES(MinROM), MaxROM = VALUES(MaxROM),
+        SumROM = VALUES(SumROM), P95ROM = VALUES(P95ROM), MinVelocity = VALUES(MinVelocity),
+        MaxVelocity = VALUES(MaxVelocity), SumVelocity = VALUES(SumVelocity), P95Velocity = VALUES(P95Velocity),
+        RomHistogram = VALUES(RomHistogram), VelocityHistogram = VALUES(VelocityHistogram),
+        TimeUpdated = VALUES(TimeUpdated)
+"""
+
+def _session_patient_week(connection, session_id) -> Optional[tuple[str, date]]:
+    row = connection.execute(
+        text(
+            "SELECT pd.PatientID, s.TimeCreated FROM session s "
+            "JOIN patientdoctor pd ON s.RelationID = pd.ID WHERE s.ID = :sid"
+        ),
+        {"sid": session_id},
+    ).fetchone()
+    if not row or not row[0] or not row[1]:
+        return None
+    return str(row[0]), rollups.week_start(row[1])
+
+def _rollup_params(patient_id, joint, side, week, rollup) -> dict[str, Any]:
+    summary = rollups.summarize_rollup(rollup)
+    return {
+        "patient_id": patient_id, "joint": joint, "side": side, "week": week,
+        **{key: rollup[key] for _column, key in _ROLLUP_COLUMNS},
+        "rom_p95": summary["rom"]["p95"],
+        "velocity_p95": summary["velocity"]["p95"],
+        "rom_histogram": rollups.pack_histogram(rollup["rom_histogram"]),
+        "velocity_histogram": rollups.pack_histogram(rollup["velocity_histogram"]),
+        "now": datetime.now(timezone.utc),
+    }
+
+def _add_to_weekly_rollups(connection, session_id, params_list) -> None:
+    if not is_rollups_enabled():
+        return
+    located = _session_patient_week(connection, session_id)
+    if not located:
+        return
+    patient_id, week = located
+    for (joint, side), group in _group_metrics_params(params_list).items():
+        existing = connection.execute(
+            text(
+                "SELECT * FROM metrics_weekly WHERE PatientID = :patient_id AND Joint = :joint "
+                "AND Side = :side AND WeekStart = :week FOR UPDATE"
+            ),
+            {"patient_id": patient_id, "joint": joint, "side": side, "week": week},
+        ).fetchone()
+        rollup = rollups.empty_rollup()
+        if existing is not None:
+            row = dict(existing._mapping)
+            rollup.update({key: row[column] for column, key in _ROLLUP_COLUMNS})
+            rollup["rom_histogram"] = rollups.unpack_histogram(row["RomHistogram"], rollups.ROM_EDGES)
+            rollup["velocity_histogram"] = rollups.unpack_histogram(row["VelocityHistogram"], rollups.VELOCITY_EDGES)
+        rollup = rollups.add_entries(rollup, group)
+        connection.execute(text(_UPSERT_ROLLUP_SQL), _rollup_params(patient_id, joint, side, week, rollup))
+
+def _patient_metric_entries(connection, patient_id, week=None) -> list[dict[str, Any]]:
+    """Every metrics entry of a patient (or of one week) with its joint, side and week."""
+    where = "pd.PatientID = :patient_id"
+    params: dict[str, Any] = {"patient_id": patient_id}
+    if week is not None:
+        where += " AND s.TimeCreated >= :start AND s.TimeCreated < :end"
+        params.update({"start": week, "end": week + timedelta(days=7)})
+
+    entries = []
+    for row in connection.execute(
+        text(
+            f"SELECT m.*, s.TimeCreated AS SessionTimeCreated FROM metrics m "
+            f"JOIN session s ON m.SessionID = s.ID JOIN patientdoctor pd ON s.RelationID = pd.ID WHERE {where}"
+        ),
+        params,
+    ):
+        row = dict(row._mapping)
+        entries.append({**_metrics_row_params(row), "week": rollups.week_start(row["SessionTimeCreated"])})
+    if is_metrics_packed():
+        for row in connection.execute(
+            text(
+                f"SELECT m.ID, m.Joint, m.Side, m.Data, s.TimeCreated AS SessionTimeCreated FROM metrics_packed m "
+                f"JOIN session s ON m.SessionID = s.ID JOIN patientdoctor pd ON s.RelationID = pd.ID WHERE {where}"
+            ),
+            params,
+        ):
+            row = dict(row._mapping)
+            week_of_row = rollups.week_start(row.pop("SessionTimeCreated"))
+            entries.extend(
+                {**_metrics_row_params(unpacked), "week": week_of_row} for unpacked in unpack_metrics_rows(row)
+            )
+    return entries
+
+def _write_rollups(connection, patient_id, entries) -> int:
+    groups: dict[tuple[str, str, date], list[dict[str, Any]]] = {}
+    for entry in entries:
+        groups.setdefault((entry["joint"], entry["side"], entry["week"]), []).append(entry)
+    for (joint, side, week), group in groups.items():
+        rollup = rollups.add_entries(rollups.empty_rollup(), group)
+        connection.execute(text(_UPSERT_ROLLUP_SQL), _rollup_params(patient_id, joint, side, week, rollup))
+    return len(groups)
+
+def _rebuild_weekly_rollups(connection, patient_id, week) -> None:
+    if not is_rollups_enabled():
+        return
+    connection.execute(
+        text("DELETE FROM metrics_weekly WHERE PatientID = :patient_id AND WeekStart = :week"),
+        {"patient_id": patient_id, "week": week},
     )
-    return mid
+    _write_rollups(connection, patient_id, _patient_metric_entries(connection, patient_id, week))
 
-def get_metrics_by_patient(patient_id, limit=10):
+def rebuild_patient_rollups(patient_id: str) -> int:
+    """Recompute every weekly rollup of a patient; returns how many rollup rows were written."""
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    with _engine.begin() as connection:
+        connection.execute(text("DELETE FROM metrics_weekly WHERE PatientID = :patient_id"), {"patient_id": patient_id})
+        return _write_rollups(connection, patient_id, _patient_metric_entries(connection, patient_id))
+
+def list_patients_with_sessions() -> list[str]:
     rows = fetch_all(
         """
-        SELECT m.*, s.ExerciseType
+        SELECT DISTINCT pd.PatientID
+        FROM session s
+        JOIN patientdoctor pd ON s.RelationID = pd.ID
+        ORDER BY pd.PatientID
+        """
+    )
+    return [str(row["PatientID"]) for row in rows if row.get("PatientID")]
+
+def get_weekly_rollups(patient_id: str, since: date, joint: Optional[str] = None, side: Optional[str] = None):
+    filters = ""
+    params: dict[str, Any] = {"patient_id": patient_id, "since": since}
+    if joint:
+        filters += " AND Joint = :joint"
+        params["joint"] = joint
+    if side:
+        filters += " AND Side = :side"
+        params["side"] = side
+    return fetch_all(
+        f"""
+        SELECT Joint, Side, WeekStart, EntryCount,
+               MinROM, MaxROM, SumROM, P95ROM, MinVelocity, MaxVelocity, SumVelocity, P95Velocity
+        FROM metrics_weekly
+        WHERE PatientID = :patient_id AND WeekStart >= :since{filters}
+        ORDER BY WeekStart ASC, Joint ASC, Side ASC
+        """,
+        params
+    )
+
+# Columns loaded for cohort analytics (analysis/cohort.py)
+COHORT_METRIC_COLUMNS = ("MinROM", "MaxROM", "AvgROM", "MaxVelocity", "AvgVelocity", "P95Velocity")
+
+# Sessions of the doctor's active patients, over every relation the patient
+# has had: a reassignment starts a new relation but keeps the history
+_COHORT_SESSIONS_SQL = """
+    FROM patientdoctor pd
+    JOIN patientdoctor rel ON rel.PatientID = pd.PatientID
+    JOIN session s ON s.RelationID = rel.ID
+"""
+
+def load_doctor_cohort_rows(doctor_id: str) -> list[tuple]:
+    """
+    ``(patient_id, joint, side, time, *COHORT_METRIC_COLUMNS)`` for every
+    metrics entry of the doctor's active patients, in one query (plus one
+    for packed entries).
+    """
+    selected = ", ".join(f"m.{column}" for column in COHORT_METRIC_COLUMNS)
+    rows = [
+        tuple(row.values())
+        for row in fetch_all(
+            f"""
+            SELECT pd.PatientID, m.Joint, m.Side, m.TimeCreated, {selected}
+            {_COHORT_SESSIONS_SQL}
+            JOIN metrics m ON m.SessionID = s.ID
+            WHERE pd.DoctorID = :doctor_id AND pd.Active = 1
+            """,
+            {"doctor_id": doctor_id}
+        )
+    ]
+    if is_metrics_packed():
+        packed = fetch_all(
+            f"""
+            SELECT pd.PatientID, m.ID, m.SessionID, m.Joint, m.Side, m.Data
+            {_COHORT_SESSIONS_SQL}
+            JOIN metrics_packed m ON m.SessionID = s.ID
+            WHERE pd.DoctorID = :doctor_id AND pd.Active = 1
+            """,
+            {"doctor_id": doctor_id}
+        )
+        for packed_row in packed:
+            patient_id = packed_row.pop("PatientID")
+            for entry in unpack_metrics_rows(packed_row):
+                rows.append((
+                    patient_id, entry["Joint"], entry["Side"], datetime.fromisoformat(entry["TimeCreated"]),
+                    *(entry[column] for column in COHORT_METRIC_COLUMNS),
+                ))
+    return rows
+
+def get_doctor_metrics_fingerprint(doctor_id: str) -> tuple:
+    """
+    Cheap summary that changes whenever the doctor's cohort metrics change:
+    active relations, newest metrics UpdatedAt (so rewrites that keep row
+    counts and times count too) and the patients' metrics tombstones.
+    Before migrations/007 the entry count and newest TimeCreated stand in.
+    """
+    if is_change_tracking_enabled():
+        changes = """
+          (
+            SELECT COUNT(*)
+            FROM patientdoctor pd
+            JOIN deleted_records d ON d.PatientID = pd.PatientID AND d.Kind = 'metrics'
+            WHERE pd.DoctorID = :doctor_id AND pd.Active = 1
+          ) AS deleted
+        """
+    else:
+        changes = f"""
+          (
+            SELECT COUNT(*)
+            {_COHORT_SESSIONS_SQL}
+            JOIN metrics m ON m.SessionID = s.ID
+            WHERE pd.DoctorID = :doctor_id AND pd.Active = 1
+          ) AS deleted
+        """
+    row = fetch_one(
+        f"""
+        SELECT
+          (SELECT COUNT(*) FROM patientdoctor WHERE DoctorID = :doctor_id AND Active = 1) AS relations,
+          (SELECT MAX(TimeCreated) FROM patientdoctor WHERE DoctorID = :doctor_id AND Active = 1) AS joined,
+          (
+            SELECT MAX(m.{_updated_column("metrics")})
+            {_COHORT_SESSIONS_SQL}
+            JOIN metrics m ON m.SessionID = s.ID
+            WHERE pd.DoctorID = :doctor_id AND pd.Active = 1
+          ) AS updated,
+          {changes}
+        """,
+        {"doctor_id": doctor_id}
+    ) or {}
+    fingerprint = (row.get("relations"), str(row.get("joined")), str(row.get("updated")), row.get("deleted"))
+    if is_metrics_packed():
+        packed = fetch_one(
+            f"""
+            SELECT MAX(m.{_updated_column("metrics_packed")}) AS updated, COALESCE(SUM(m.RowCount), 0) AS entries
+            {_COHORT_SESSIONS_SQL}
+            JOIN metrics_packed m ON m.SessionID = s.ID
+            WHERE pd.DoctorID = :doctor_id AND pd.Active = 1
+            """,
+            {"doctor_id": doctor_id}
+        ) or {}
+        fingerprint += (str(packed.get("updated")), int(packed.get("entries") or 0))
+    return fingerprint
+
+def get_metrics_by_patient(patient_id, limit=10, since: Optional[datetime] = None):
+    """
+    Latest metrics of a patient (all of them when ``limit`` is None); with
+    ``since``, only entries changed after it. A packed blob changes as a
+    whole, so every entry of a blob appended to after ``since`` is returned.
+    """
+    limit_clause = "" if limit is None else "LIMIT :limit"
+    params = {"patient_id": patient_id, "limit": limit, "since": since}
+    rows = fetch_all(
+        f"""
+        SELECT m.*, s.ExerciseType, s.TimeCreated AS SessionTimeCreated
         FROM metrics m
         JOIN session s ON m.SessionID = s.ID
         JOIN patientdoctor pd ON s.RelationID = pd.ID
-        WHERE pd.PatientID = :patient_id
+        WHERE pd.PatientID = :patient_id {_since_filter("m", since, "metrics")}
         ORDER BY s.TimeCreated DESC, m.Repetitions ASC -- Ajustado para o plural aqui também
-        LIMIT :limit
+        {limit_clause}
         """,
-        {"patient_id": patient_id, "limit": limit}
+        params
     )
-    
+    if is_metrics_packed():
+        # Every blob holds at least one entry, so ``limit`` blobs are enough
+        packed = fetch_all(
+            f"""
+            SELECT p.ID, p.SessionID, p.Joint, p.Side, p.Data, s.ExerciseType, s.TimeCreated AS SessionTimeCreated
+            FROM metrics_packed p
+            JOIN session s ON p.SessionID = s.ID
+            JOIN patientdoctor pd ON s.RelationID = pd.ID
+            WHERE pd.PatientID = :patient_id {_since_filter("p", since, "metrics_packed")}
+            ORDER BY s.TimeCreated DESC
+            {limit_clause}
+            """,
+            params
+        )
+        for packed_row in packed:
+            rows.extend(unpack_metrics_rows(packed_row))
+        rows.sort(key=lambda row: row.get("Repetitions") or 0)
+        rows.sort(key=lambda row: str(row.get("SessionTimeCreated") or ""), reverse=True)
+        if limit is not None:
+            rows = rows[:limit]
+
     for row in rows:
+        row.pop('SessionTimeCreated', None)
         if row.get('TimeCreated'): row['TimeCreated'] = str(row['TimeCreated'])
         if row.get('SessionDate'): row['SessionDate'] = str(row['SessionDate'])
             
@@ -715,6 +1598,14 @@ def get_metrics_by_session(session_id: str):
         """,
         {"session_id": session_id}
     )
+    if is_metrics_packed():
+        packed = fetch_all(
+            "SELECT ID, SessionID, Joint, Side, Data FROM metrics_packed WHERE SessionID = :session_id",
+            {"session_id": session_id}
+        )
+        for packed_row in packed:
+            rows.extend(unpack_metrics_rows(packed_row))
+        rows.sort(key=lambda row: row.get("Repetitions") or 0)
     
     for row in rows:
         if row.get('TimeCreated'):
@@ -723,6 +1614,229 @@ def get_metrics_by_session(session_id: str):
     return rows
 
 
+# Numeric metrics columns a progress series can be drawn from
+METRIC_SERIES_COLUMNS = (
+    "Repetitions", "MinVelocity", "MaxVelocity", "AvgVelocity", "P95Velocity",
+    "MinROM", "MaxROM", "AvgROM", "CenterMassDisplacement",
+)
+
+def resolve_metric_series_column(name: Optional[str]) -> Optional[str]:
+    """Map ``AvgROM``, ``avg_rom``, ``avgrom``... to the metrics column, or None."""
+    wanted = (name or "").replace("_", "").lower()
+    return next((column for column in METRIC_SERIES_COLUMNS if column.lower() == wanted), None)
+
+def _stream_rows(sql: str, params: dict[str, Any], batch_size: int) -> Iterator[tuple]:
+    """Yield result rows through a server-side cursor, ``batch_size`` at a time."""
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    with _engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(text(sql), params)
+        for partition in result.partitions(batch_size):
+            yield from partition
+
+def stream_all(sql: str, params: Optional[dict[str, Any]] = None, batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+    """Like ``fetch_all`` but yields rows one by one from a server-side cursor."""
+    for row in _stream_rows(sql, params or {}, batch_size):
+        yield dict(row._mapping)
+
+# Identity columns of the patient (and doctor) are selected only so the
+# export can derive their study access codes; they are never written out.
+_STUDY_EXPORT_SQL = {
+    "sessions": """
+        SELECT s.ID AS SessionID,
+               pu.Email AS PatientEmail, pu.FirstName AS PatientFirstName, pu.LastName AS PatientLastName,
+               du.Email AS DoctorEmail, du.FirstName AS DoctorFirstName, du.LastName AS DoctorLastName,
+               s.ExerciseType, s.Repetitions, s.Duration, s.TimeCreated
+        FROM session s
+        JOIN patientdoctor pd ON s.RelationID = pd.ID
+        JOIN users pu ON pu.ID = pd.PatientID
+        LEFT JOIN users du ON du.ID = pd.DoctorID
+        WHERE s.TimeCreated > :since AND s.TimeCreated <= :until
+        ORDER BY s.TimeCreated, s.ID
+    """,
+    "metrics": """
+        SELECT m.ID AS MetricID, m.SessionID,
+               pu.Email AS PatientEmail, pu.FirstName AS PatientFirstName, pu.LastName AS PatientLastName,
+               m.Joint, m.Side, m.Repetitions, m.MinVelocity, m.MaxVelocity, m.AvgVelocity, m.P95Velocity,
+               m.MinROM, m.MaxROM, m.AvgROM, m.CenterMassDisplacement, m.TimeCreated
+        FROM metrics m
+        JOIN session s ON m.SessionID = s.ID
+        JOIN patientdoctor pd ON s.RelationID = pd.ID
+        JOIN users pu ON pu.ID = pd.PatientID
+        WHERE m.TimeCreated > :since AND m.TimeCreated <= :until
+        ORDER BY m.TimeCreated, m.ID
+    """,
+    "feedback": """
+        SELECT f.ID AS FeedbackID, f.SessionID,
+               pu.Email AS PatientEmail, pu.FirstName AS PatientFirstName, pu.LastName AS PatientLastName,
+               f.Pain, f.Fatigue, f.Difficulty, f.Comments, f.TimeCreated
+        FROM PatientFeedback f
+        JOIN users pu ON pu.ID = f.UserID
+        WHERE f.TimeCreated > :since AND f.TimeCreated <= :until
+        ORDER BY f.TimeCreated, f.ID
+    """,
+    # Tombstones from migrations/007, e.g. the metrics rows replace_session_metrics superseded
+    "deleted": """
+        SELECT d.Kind, d.RecordID, d.DeletedAt,
+               pu.Email AS PatientEmail, pu.FirstName AS PatientFirstName, pu.LastName AS PatientLastName
+        FROM deleted_records d
+        JOIN users pu ON pu.ID = d.PatientID
+        WHERE d.DeletedAt > :since AND d.DeletedAt <= :until
+        ORDER BY d.DeletedAt, d.ID
+    """,
+}
+STUDY_EXPORT_TABLES = tuple(_STUDY_EXPORT_SQL)
+
+def iter_study_export_rows(table: str, since: datetime, until: datetime, batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+    """
+    Rows of ``table`` (sessions, metrics, feedback or deleted) created in
+    ``(since, until]``, oldest first, streamed from the database. Packed
+    metrics entries in the window are appended after the metrics rows;
+    ``deleted`` is empty before migrations/007.
+    """
+    if table == "deleted" and not is_change_tracking_enabled():
+        return
+    params = {"since": since, "until": until}
+    yield from stream_all(_STUDY_EXPORT_SQL[table], params, batch_size)
+    if table != "metrics" or not is_metrics_packed():
+        return
+    # A blob's TimeCreated is its last append, so it bounds every entry in it
+    for packed_row in stream_all(
+        """
+        SELECT m.ID, m.SessionID, m.Joint, m.Side, m.Data,
+               pu.Email AS PatientEmail, pu.FirstName AS PatientFirstName, pu.LastName AS PatientLastName
+        FROM metrics_packed m
+        JOIN session s ON m.SessionID = s.ID
+        JOIN patientdoctor pd ON s.RelationID = pd.ID
+        JOIN users pu ON pu.ID = pd.PatientID
+        WHERE m.TimeCreated > :since
+        ORDER BY m.TimeCreated, m.ID
+        """,
+        params,
+        batch_size,
+    ):
+        for entry in unpack_metrics_rows(packed_row):
+            created = datetime.fromisoformat(entry["TimeCreated"])
+            if since < created <= until:
+                yield {"MetricID": entry.pop("ID"), **entry, "TimeCreated": created}
+
+_PATIENT_EXPORT_SQL = {
+    "sessions": """
+        SELECT s.ID, s.ExerciseType, s.ExerciseDescription, s.Repetitions, s.Duration, s.TimeCreated
+        FROM session s
+        JOIN patientdoctor pd ON s.RelationID = pd.ID
+        WHERE pd.PatientID = :patient_id
+        ORDER BY s.TimeCreated, s.ID
+    """,
+    "metrics": """
+        SELECT m.*
+        FROM metrics m
+        JOIN session s ON m.SessionID = s.ID
+        JOIN patientdoctor pd ON s.RelationID = pd.ID
+        WHERE pd.PatientID = :patient_id
+        ORDER BY s.TimeCreated, m.SessionID, m.Repetitions
+    """,
+    "feedback": """
+        SELECT ID, SessionID, TimeCreated, Pain, Fatigue, Difficulty, Comments
+        FROM PatientFeedback
+        WHERE UserID = :patient_id
+        ORDER BY TimeCreated, ID
+    """,
+}
+
+def iter_patient_export_rows(table: str, patient_id: str, batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+    """
+    Every row of ``table`` (sessions, metrics or feedback) belonging to a
+    patient, oldest first, streamed from the database. Packed metrics
+    entries follow the metrics rows.
+    """
+    params = {"patient_id": patient_id}
+    yield from stream_all(_PATIENT_EXPORT_SQL[table], params, batch_size)
+    if table != "metrics" or not is_metrics_packed():
+        return
+    for packed_row in stream_all(
+        """
+        SELECT p.ID, p.SessionID, p.Joint, p.Side, p.Data
+        FROM metrics_packed p
+        JOIN session s ON p.SessionID = s.ID
+        JOIN patientdoctor pd ON s.RelationID = pd.ID
+        WHERE pd.PatientID = :patient_id
+        ORDER BY s.TimeCreated, p.SessionID
+        """,
+        params,
+        batch_size,
+    ):
+        yield from unpack_metrics_rows(packed_row)
+
+def iter_patient_metric_series(
+    patient_id: str,
+    column: str,
+    joint: Optional[str] = None,
+    side: Optional[str] = None,
+    batch_size: int = 1000,
+) -> Iterator[tuple[str, str, datetime, float, str]]:
+    """
+    Yield ``(joint, side, time, value, session_id)`` for one metrics column of
+    a patient, oldest first.
+
+    Rows are streamed (session time, then metric time) instead of loaded at
+    once, so callers can reduce long histories in a single pass. ``time`` is
+    the metric's ``TimeCreated`` (naive UTC). Packed entries are merged in
+    when ``METRICS_STORAGE=packed``.
+    """
+    if column not in METRIC_SERIES_COLUMNS:
+        raise ValueError(f"Unknown metrics column: {column}")
+    filters = ""
+    params: dict[str, Any] = {"patient_id": patient_id}
+    if joint:
+        filters += " AND m.Joint = :joint"
+        params["joint"] = joint
+    if side:
+        filters += " AND m.Side = :side"
+        params["side"] = side
+
+    rows = (
+        (row[0], row[1], row[3], float(row[4] or 0), row[5], row[2])
+        for row in _stream_rows(
+            f"""
+            SELECT m.Joint, m.Side, s.TimeCreated, m.TimeCreated, m.{column}, m.SessionID
+            FROM metrics m
+            JOIN session s ON m.SessionID = s.ID
+            JOIN patientdoctor pd ON s.RelationID = pd.ID
+            WHERE pd.PatientID = :patient_id{filters}
+            ORDER BY s.TimeCreated, m.TimeCreated
+            """,
+            params,
+            batch_size,
+        )
+    )
+    sources = [rows]
+    if is_metrics_packed():
+        def packed_rows():
+            for row in _stream_rows(
+                f"""
+                SELECT m.Joint, m.Side, s.TimeCreated, m.ID, m.Data, m.SessionID
+                FROM metrics_packed m
+                JOIN session s ON m.SessionID = s.ID
+                JOIN patientdoctor pd ON s.RelationID = pd.ID
+                WHERE pd.PatientID = :patient_id{filters}
+                ORDER BY s.TimeCreated
+                """,
+                params,
+                batch_size,
+            ):
+                columns = unpack_metrics(row[4])
+                for index in np.argsort(columns["TimeCreated"], kind="stable"):
+                    created = datetime.fromtimestamp(columns["TimeCreated"][index], timezone.utc).replace(tzinfo=None)
+                    yield row[0], row[1], created, float(columns[column][index]), row[5], row[2]
+        sources.append(packed_rows())
+
+    for joint_name, side_name, created, value, session_id, _session_time in heapq.merge(
+        *sources, key=lambda row: (row[5], row[2])
+    ):
+        yield joint_name, side_name, created, value, session_id
+
+
 def update_patient_details(patient_id: str, details: dict) -> None:
     """Update patient record. patient_id is UserID. Details: weight, height, bmi, sex, medical_history."""
     if not details:
@@ -826,15 +1940,257 @@ def insert_feedback(patient_id: str, feedback: dict) -> str:
     return fid
 
 
-def get_feedback_by_patient(patient_id: str, limit: int = 100):
-    """Get feedback entries for a patient from PatientFeedback."""
+def get_feedback_by_patient(patient_id: str, limit: Optional[int] = 100, since: Optional[datetime] = None):
+    """
+    Get feedback entries for a patient from PatientFeedback (all of them when
+    ``limit`` is None); with ``since``, only those changed after it.
+    """
     return fetch_all(
+        f"""
+        SELECT f.ID, f.UserID AS PatientID, f.SessionID, f.TimeCreated AS FeedbackTime,
+               f.Pain, f.Fatigue, f.Difficulty, f.Comments
+        FROM PatientFeedback f
+        WHERE f.UserID = :patient_id {_since_filter("f", since, "PatientFeedback")}
+        ORDER BY f.TimeCreated DESC
+        {"" if limit is None else "LIMIT :limit"}
+        """,
+        {"patient_id": patient_id, "limit": limit, "since": since},
+    )
+
+
+# Offline sync (POST /patients/<id>/sync): records created on the device carry
+# a client ID, from which the server ID is derived deterministically, so
+# replaying a batch upserts the same rows instead of creating new ones.
+SYNC_ID_NAMESPACE = uuid.UUID("5f0c6a52-3b1e-4d8e-9a57-0d2f4c1e7b93")
+
+class SyncReferenceError(ValueError):
+    """A synced record points at a session the patient does not own."""
+
+def sync_record_id(patient_id: str, kind: str, client_id: str) -> str:
+    """Server ID of the ``kind`` record (session, metrics, feedback) with ``client_id``."""
+    return str(uuid.uuid5(SYNC_ID_NAMESPACE, f"{patient_id}:{kind}:{client_id}"))
+
+_UPSERT_SESSION_SQL = """
+    INSERT INTO session (ID, RelationID, ExerciseType, ExerciseDescription, Repetitions, Duration, TimeCreated)
+    VALUES (:id, :relation_id, :exercise_type, :exercise_description, :repetitions, :duration, :now)
+    ON DUPLICATE KEY UPDATE
+        ExerciseType = VALUES(ExerciseType), ExerciseDescription = VALUES(ExerciseDescription),
+        Repetitions = VALUES(Repetitions), Duration = VALUES(Duration)
+"""
+
+_UPSERT_METRICS_SQL = _INSERT_METRICS_SQL + """
+    ON DUPLICATE KEY UPDATE
+        Joint = VALUES(Joint), Side = VALUES(Side), Repetitions = VALUES(Repetitions),
+        MinVelocity = VALUES(MinVelocity), MaxVelocity = VALUES(MaxVelocity), AvgVelocity = VALUES(AvgVelocity),
+        P95Velocity = VALUES(P95Velocity), MinROM = VALUES(MinROM), MaxROM = VALUES(MaxROM),
+        AvgROM = VALUES(AvgROM), CenterMassDisplacement = VALUES(CenterMassDisplacement)
+"""
+
+_UPSERT_FEEDBACK_SQL = """
+    INSERT INTO PatientFeedback (ID, UserID, SessionID, Pain, Fatigue, Difficulty, Comments, TimeCreated)
+    VALUES (:id, :user_id, :session_id, :pain, :fatigue, :difficulty, :comments, :now)
+    ON DUPLICATE KEY UPDATE
+        SessionID = VALUES(SessionID), Pain = VALUES(Pain), Fatigue = VALUES(Fatigue),
+        Difficulty = VALUES(Difficulty), Comments = VALUES(Comments)
+"""
+
+def _sync_session_id(patient_id: str, record: dict[str, Any]) -> str:
+    if record.get("session_client_id"):
+        return sync_record_id(patient_id, "session", record["session_client_id"])
+    return str(record.get("session_id") or "")
+
+def apply_patient_sync(
+    patient_id: str,
+    relation_id: Optional[str],
+    sessions: list[dict[str, Any]],
+    metrics: list[dict[str, Any]],
+    feedback: list[dict[str, Any]],
+) -> dict[str, dict[str, Optional[str]]]:
+    """
+    Upsert a batch of device records in one transaction.
+
+    Every record has a ``client_id``. Sessions carry the fields of
+    ``assign_session_to_patient`` and are created under ``relation_id``;
+    metrics (the input of ``insert_session_metrics``) and feedback (pain,
+    fatigue, difficulty, comments) name their session by ``session_id`` or by
+    the ``session_client_id`` of a synced session. Metrics are stored as rows
+    even in packed mode (reads merge both). Returns ``{kind: {client_id:
+    server_id}}``; metrics of unsupported joints map to None.
+    """
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    now = datetime.now(timezone.utc)
+    applied: dict[str, dict[str, Optional[str]]] = {"sessions": {}, "metrics": {}, "feedback": {}}
+
+    session_params = []
+    for record in sessions:
+        session_id = sync_record_id(patient_id, "session", record["client_id"])
+        applied["sessions"][record["client_id"]] = session_id
+        session_params.append({
+            "id": session_id,
+            "relation_id": relation_id,
+            "exercise_type": record.get("exercise_type") or "",
+            "exercise_description": record.get("exercise_description") or "",
+            "repetitions": record.get("repetitions"),
+            "duration": record.get("duration"),
+            "now": now,
+        })
+    if session_params and not relation_id:
+        raise SyncReferenceError("Patient has no active doctor relation")
+
+    metrics_params = []
+    for record in metrics:
+        params = _build_metrics_params(_sync_session_id(patient_id, record), record, now)
+        if params is not None:
+            params["id"] = sync_record_id(patient_id, "metrics", record["client_id"])
+            metrics_params.append(params)
+        applied["metrics"][record["client_id"]] = params["id"] if params else None
+
+    feedback_params = []
+    for record in feedback:
+        comments = record.get("comments") or ""
+        feedback_id = sync_record_id(patient_id, "feedback", record["client_id"])
+        applied["feedback"][record["client_id"]] = feedback_id
+        feedback_params.append({
+            "id": feedback_id,
+            "user_id": patient_id,
+            "session_id": _sync_session_id(patient_id, record),
+            "pain": int(record.get("pain") or 0),
+            "fatigue": int(record.get("fatigue") or 0),
+            "difficulty": int(record.get("difficulty") or 0),
+            "comments": comments[:4096] if comments else None,
+            "now": now,
+        })
+
+    new_sessions = {params["id"] for params in session_params}
+    referenced = sorted({params["session_id"] for params in metrics_params + feedback_params} - new_sessions)
+
+    with _engine.begin() as connection:
+        if referenced:
+            placeholders = ", ".join(f":session_{index}" for index in range(len(referenced)))
+            owned = {
+                str(row[0]) for row in connection.execute(
+                    text(
+                        f"""
+                        SELECT s.ID
+                        FROM session s
+                        JOIN patientdoctor pd ON s.RelationID = pd.ID
+                        WHERE pd.PatientID = :patient_id AND s.ID IN ({placeholders})
+                        """
+                    ),
+                    {"patient_id": patient_id, **{f"session_{i}": sid for i, sid in enumerate(referenced)}},
+                )
+            }
+            unknown = [session_id for session_id in referenced if session_id not in owned]
+            if unknown:
+                raise SyncReferenceError(f"Unknown sessions: {', '.join(unknown)}")
+
+        if session_params:
+            connection.execute(text(_UPSERT_SESSION_SQL), session_params)
+        if metrics_params:
+            connection.execute(text(_UPSERT_METRICS_SQL), metrics_params)
+            # Upserts may replace entries, so affected weeks are rebuilt rather than incremented
+            weeks = {
+                located
+                for located in (
+                    _session_patient_week(connection, session_id)
+                    for session_id in {params["session_id"] for params in metrics_params}
+                )
+                if located
+            }
+            for located in sorted(weeks):
+                _rebuild_weekly_rollups(connection, *located)
+        if feedback_params:
+            connection.execute(text(_UPSERT_FEEDBACK_SQL), feedback_params)
+
+    return applied
+
+def get_patient_changes_since(patient_id: str, since: Optional[datetime]) -> dict[str, Any]:
+    """
+    Sessions, metrics and feedback of a patient changed after ``since``
+    (everything when None), shaped like the patient list endpoints, plus the
+    IDs deleted after it under ``deleted``.
+    """
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return {
+        "sessions": get_patient_sessions(patient_id, since),
+        "metrics": get_metrics_by_patient(patient_id, limit=None, since=since),
+        "feedback": get_feedback_by_patient(patient_id, limit=None, since=since),
+        "deleted": get_deleted_records(patient_id, since) if since is not None
+        else {kind: [] for kind in DELETED_RECORD_KINDS},
+    }
+
+
+# Idempotency keys (migrations/006): the first response to a keyed POST is
+# stored zlib-compressed and replayed for retries until it expires.
+IDEMPOTENCY_PURGE_BATCH = 100
+
+def claim_idempotency_key(
+    key_hash: bytes,
+    request_hash: bytes,
+    ttl: timedelta,
+    lease: timedelta,
+) -> Optional[dict[str, Any]]:
+    """
+    Reserve ``key_hash`` for the current request. Returns None when the
+    caller now owns the key, otherwise the stored ``RequestHash``,
+    ``StatusCode`` (None while the first request runs), ``ContentType`` and
+    decompressed ``Body``. Unfinished claims older than ``lease`` are taken over.
+    """
+    if _engine is None:
+        raise RuntimeError("DATABASE_URL not configured")
+    now = datetime.now(timezone.utc)
+    params = {"key": key_hash, "request": request_hash, "now": now, "expires": now + ttl, "stale": now - lease}
+    with _engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                DELETE FROM idempotency_keys
+                WHERE KeyHash = :key AND (ExpiresAt < :now OR (StatusCode IS NULL AND TimeCreated < :stale))
+                """
+            ),
+            params,
+        )
+        connection.execute(
+            text("DELETE FROM idempotency_keys WHERE ExpiresAt < :now ORDER BY ExpiresAt LIMIT :limit"),
+            {"now": now, "limit": IDEMPOTENCY_PURGE_BATCH},
+        )
+        try:
+            with connection.begin_nested():
+                connection.execute(
+                    text(
+                        """
+                        INSERT INTO idempotency_keys (KeyHash, RequestHash, TimeCreated, ExpiresAt)
+                        VALUES (:key, :request, :now, :expires)
+                        """
+                    ),
+                    params,
+                )
+            return None
+        except IntegrityError:
+            row = connection.execute(
+                text("SELECT RequestHash, StatusCode, ContentType, Body FROM idempotency_keys WHERE KeyHash = :key"),
+                params,
+            ).fetchone()
+    if row is None:
+        # Released by the first request between our INSERT and SELECT
+        return {"RequestHash": request_hash, "StatusCode": None, "ContentType": None, "Body": None}
+    stored = dict(row._mapping)
+    stored["RequestHash"] = bytes(stored["RequestHash"])
+    stored["Body"] = zlib.decompress(stored["Body"]) if stored.get("Body") is not None else None
+    return stored
+
+def store_idempotent_response(key_hash: bytes, status_code: int, content_type: Optional[str], body: bytes) -> None:
+    execute(
         """
-        SELECT ID, UserID AS PatientID, SessionID, TimeCreated AS FeedbackTime, Pain, Fatigue, Difficulty, Comments
-        FROM PatientFeedback
-        WHERE UserID = :patient_id
-        ORDER BY TimeCreated DESC
-        LIMIT :limit
+        UPDATE idempotency_keys
+        SET StatusCode = :status, ContentType = :content_type, Body = :body
+        WHERE KeyHash = :key
         """,
-        {"patient_id": patient_id, "limit": limit},
+        {"key": key_hash, "status": status_code, "content_type": content_type, "body": zlib.compress(body)},
     )
+
+def release_idempotency_key(key_hash: bytes) -> None:
+    """Forget an unfinished claim so the request can be retried."""
+    execute("DELETE FROM idempotency_keys WHERE KeyHash = :key AND StatusCode IS NULL", {"key": key_hash})
@@ -0,0 +1,14 @@
+-- Packed per-session metrics (METRICS_STORAGE=packed).
+-- One row per session and joint/side; Data holds every metrics entry of
+-- that joint/side as a column-major float64 array (see db.pack_metrics).
+-- Existing metrics rows are moved here by compact_metrics.py.
+CREATE TABLE IF NOT EXISTS metrics_packed (
+    ID CHAR(36) PRIMARY KEY,
+    SessionID CHAR(36) NOT NULL,
+    Joint VARCHAR(32) NOT NULL DEFAULT 'knee',
+    Side VARCHAR(32) NOT NULL DEFAULT 'both',
+    RowCount INT NOT NULL DEFAULT 0,
+    Data MEDIUMBLOB NOT NULL,
+    TimeCreated DATETIME NOT NULL,
+    UNIQUE KEY uq_metrics_packed_session_joint (SessionID, Joint, Side)
+);
@@ -0,0 +1,4 @@
+-- Indexes for time-ordered per-patient metrics reads
+-- (GET /patients/<id>/metrics/series walks sessions by RelationID and time).
+CREATE INDEX idx_session_relation_time ON session (RelationID, TimeCreated);
+CREATE INDEX idx_metrics_session_time ON metrics (SessionID, TimeCreated);
@@ -0,0 +1,23 @@
+-- Weekly per-patient ROM/velocity rollups (see analysis/rollups.py).
+-- Maintained by insert_session_metrics / replace_session_metrics /
+-- delete_patient_session; fill it for existing data with backfill_rollups.py.
+CREATE TABLE IF NOT EXISTS metrics_weekly (
+    PatientID CHAR(36) NOT NULL,
+    Joint VARCHAR(32) NOT NULL,
+    Side VARCHAR(32) NOT NULL,
+    WeekStart DATE NOT NULL,
+    EntryCount INT NOT NULL DEFAULT 0,
+    MinROM DOUBLE DEFAULT 0,
+    MaxROM DOUBLE DEFAULT 0,
+    SumROM DOUBLE DEFAULT 0,
+    P95ROM DOUBLE DEFAULT 0,
+    MinVelocity DOUBLE DEFAULT 0,
+    MaxVelocity DOUBLE DEFAULT 0,
+    SumVelocity DOUBLE DEFAULT 0,
+    P95Velocity DOUBLE DEFAULT 0,
+    RomHistogram BLOB NOT NULL,
+    VelocityHistogram BLOB NOT NULL,
+    TimeUpdated DATETIME NOT NULL,
+    PRIMARY KEY (PatientID, Joint, Side, WeekStart),
+    INDEX idx_metrics_weekly_patient_week (PatientID, WeekStart)
+);
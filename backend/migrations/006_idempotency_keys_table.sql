@@ -0,0 +1,14 @@
+-- Responses of POST requests sent with an Idempotency-Key header, replayed
+-- when the same request is retried (see idempotent() in app.py).
+-- KeyHash is SHA-256 of user ID and key, RequestHash SHA-256 of the request;
+-- StatusCode stays NULL while the first request is still running.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    KeyHash BINARY(32) PRIMARY KEY,
+    RequestHash BINARY(32) NOT NULL,
+    StatusCode SMALLINT NULL,
+    ContentType VARCHAR(100) NULL,
+    Body MEDIUMBLOB NULL,
+    TimeCreated DATETIME NOT NULL,
+    ExpiresAt DATETIME NOT NULL,
+    INDEX idx_idempotency_keys_expires (ExpiresAt)
+);
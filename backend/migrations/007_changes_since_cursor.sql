@@ -0,0 +1,33 @@
+-- Changes-since cursors for the patient list endpoints (?since=<cursor> on
+-- GET /patients/<id>/sessions, /metrics and /feedback, and offline sync).
+-- UpdatedAt is maintained by MySQL on every insert and update; deletions
+-- leave a tombstone in deleted_records (see _record_deletions() in db.py).
+-- Existing rows are backfilled from TimeCreated, which holds UTC.
+-- With packed metrics storage also run 008_metrics_packed_updated_at.sql.
+SET time_zone = '+00:00';
+
+ALTER TABLE session
+    ADD COLUMN UpdatedAt TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3);
+UPDATE session SET UpdatedAt = TimeCreated WHERE TimeCreated IS NOT NULL;
+CREATE INDEX idx_session_relation_updated ON session (RelationID, UpdatedAt);
+
+ALTER TABLE metrics
+    ADD COLUMN UpdatedAt TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3);
+UPDATE metrics SET UpdatedAt = TimeCreated WHERE TimeCreated IS NOT NULL;
+CREATE INDEX idx_metrics_session_updated ON metrics (SessionID, UpdatedAt);
+
+ALTER TABLE PatientFeedback
+    ADD COLUMN UpdatedAt TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3);
+UPDATE PatientFeedback SET UpdatedAt = TimeCreated WHERE TimeCreated IS NOT NULL;
+CREATE INDEX idx_patient_feedback_user_updated ON PatientFeedback (UserID, UpdatedAt);
+
+-- Kind is sessions, metrics or feedback; RecordID is the deleted row's ID
+-- (<packed ID>:<index> for packed metrics entries)
+CREATE TABLE IF NOT EXISTS deleted_records (
+    ID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    PatientID CHAR(36) NOT NULL,
+    Kind VARCHAR(16) NOT NULL,
+    RecordID VARCHAR(64) NOT NULL,
+    DeletedAt TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    INDEX idx_deleted_records_patient (PatientID, DeletedAt)
+);
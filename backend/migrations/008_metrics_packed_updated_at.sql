@@ -0,0 +1,8 @@
+-- UpdatedAt for packed metrics blobs (see 007_changes_since_cursor.sql).
+-- Only with packed metrics storage (METRICS_STORAGE=packed, migrations/003).
+SET time_zone = '+00:00';
+
+ALTER TABLE metrics_packed
+    ADD COLUMN UpdatedAt TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3);
+UPDATE metrics_packed SET UpdatedAt = TimeCreated WHERE TimeCreated IS NOT NULL;
+CREATE INDEX idx_metrics_packed_session_updated ON metrics_packed (SessionID, UpdatedAt);
@@ -0,0 +1,98 @@
+"""
+Streaming ZIP export of everything stored about one patient.
+
+The archive holds ``profile.csv``, ``sessions.csv``, ``metrics.csv`` and
+``feedback.csv``. It is written to a sink without ``seek``/``tell``, so
+``zipfile`` follows every member with a data descriptor instead of patching
+its header afterwards; the bytes can therefore be handed to the client as
+soon as they are compressed. Rows come from server-side cursors, so memory
+use does not depend on how much data the patient has.
+"""
+
+import csv
+import io
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, Iterator, Optional
+
+from db import iter_patient_export_rows
+
+# Rows written between two flushes of the compressor into the response
+ROWS_PER_CHUNK = 500
+
+PROFILE_COLUMNS = (
+    "ID", "AccessCode", "Email", "FirstName", "LastName", "Role", "BirthDate", "Sex", "Weight", "Height", "BMI",
+    "Occupation", "Education", "MedicalHistory", "TimeAfterSymptoms", "LegDominance", "PhysicallyActive",
+)
+EXPORT_COLUMNS = {
+    "sessions": ("ID", "ExerciseType", "ExerciseDescription", "Repetitions", "Duration", "TimeCreated"),
+    "metrics": (
+        "ID", "SessionID", "Joint", "Side", "Repetitions", "MinVelocity", "MaxVelocity", "AvgVelocity",
+        "P95Velocity", "MinROM", "MaxROM", "AvgROM", "CenterMassDisplacement", "TimeCreated",
+    ),
+    "feedback": ("ID", "SessionID", "TimeCreated", "Pain", "Fatigue", "Difficulty", "Comments"),
+}
+
+
+class _ChunkSink:
+    """Write-only buffer that ``zipfile`` cannot seek in."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return chunk
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    return value
+
+
+def stream_csv_zip(members: Iterable[tuple[str, tuple[str, ...], Iterable[dict[str, Any]]]]) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive chunk by chunk; ``members`` are
+    ``(filename, columns, rows)`` and each becomes one CSV file.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, columns, rows in members:
+            info = zipfile.ZipInfo(filename, date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with io.TextIOWrapper(archive.open(info, "w"), encoding="utf-8", newline="") as handle:
+                writer = csv.writer(handle)
+                writer.writerow(columns)
+                for count, row in enumerate(rows, start=1):
+                    writer.writerow([_cell(row.get(column)) for column in columns])
+                    if count % ROWS_PER_CHUNK == 0:
+                        handle.flush()
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+
+def iter_patient_export_zip(profile: dict[str, Any], access_code: Optional[str] = None) -> Iterator[bytes]:
+    """ZIP chunks for the patient described by ``profile`` (a ``get_patient_by_id`` row)."""
+    patient_id = str(profile["ID"])
+    members = [("profile.csv", PROFILE_COLUMNS, [{**profile, "AccessCode": access_code}])]
+    members += [
+        (f"{table}.csv", columns, iter_patient_export_rows(table, patient_id))
+        for table, columns in EXPORT_COLUMNS.items()
+    ]
+    return stream_csv_zip(members)
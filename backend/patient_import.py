@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Bulk import of study patients from a CSV of baseline data.
+Run this from the backend directory: python patient_import.py --doctor <doctor id> patients.csv [--result result.csv]
+
+The CSV has one patient per row with the fields of /patients/manual-registry
+as headers: sex, weight, height, bmi, affected_right_knee, affected_left_knee,
+affected_right_hip, affected_left_hip and leg_dominance are required;
+birth_date, occupation, education, medical_history, time_after_symptoms,
+physically_active and a free ``reference`` (echoed back, never stored) are
+optional.
+
+Every row is validated before anything is written; if any row is invalid
+nothing is imported. Otherwise an initial password is generated per patient
+and the patients are created in batches of ``--batch-size``, each committed
+on its own: access codes are allocated per batch, and a batch whose codes
+were taken concurrently (another import or a registration) is retried with
+fresh codes. A batch that still fails is reported as failed row by row, and
+the batches already committed stay created. The result CSV lists each row's
+status with its access code and initial password, or its errors.
+"""
+
+import argparse
+import csv
+import io
+import secrets
+import string
+import sys
+from datetime import date
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+# Add parent directory to path to import db functions
+sys.path.insert(0, str(Path(__file__).parent))
+
+from db import create_manual_patients, generate_temporary_access_codes, get_user_by_id, is_db_enabled
+
+BATCH_SIZE = 200
+# Allocations per batch before a clash on the access codes fails the batch
+ACCESS_CODE_ATTEMPTS = 3
+INITIAL_PASSWORD_LENGTH = 12
+
+REQUIRED_COLUMNS = (
+    "sex", "weight", "height", "bmi",
+    "affected_right_knee", "affected_left_knee", "affected_right_hip", "affected_left_hip",
+    "leg_dominance",
+)
+OPTIONAL_COLUMNS = (
+    "birth_date", "occupation", "education", "medical_history", "time_after_symptoms", "physically_active",
+    "reference",
+)
+RESULT_COLUMNS = ("row", "reference", "status", "patient_id", "access_code", "initial_password", "errors")
+SEXES = ("male", "female")
+LEG_DOMINANCE = ("dominant", "non-dominant")
+OCCUPATIONS = ("white", "blue")
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n")
+
+
+class PatientImportError(ValueError):
+    """The CSV as a whole cannot be imported (e.g. missing columns)."""
+
+
+def generate_initial_password() -> str:
+    """Random password that passes the signup rules (upper case letter, digit, length)."""
+    alphabet = string.ascii_letters + string.digits
+    while True:
+        password = "".join(secrets.choice(alphabet) for _ in range(INITIAL_PASSWORD_LENGTH))
+        if any(c.isupper() for c in password) and any(c.isdigit() for c in password) \
+                and any(c.islower() for c in password):
+            return password
+
+
+def _number(value: str, field: str, errors: list[str], integer: bool = False) -> Optional[float]:
+    try:
+        number = int(value) if integer else float(value.replace(",", "."))
+    except ValueError:
+        errors.append(f"{field} must be a{'n integer' if integer else ' number'}")
+        return None
+    if number < 0:
+        errors.append(f"{field} must not be negative")
+    return number
+
+
+def _flag(value: str, field: str, errors: list[str]) -> Optional[int]:
+    lowered = value.lower()
+    if lowered in TRUE_VALUES:
+        return 1
+    if lowered in FALSE_VALUES:
+        return 0
+    errors.append(f"{field} must be 0/1 or yes/no")
+    return None
+
+
+def _choice(value: str, field: str, choices: tuple[str, ...], errors: list[str]) -> Optional[str]:
+    lowered = value.lower()
+    if lowered not in choices:
+        errors.append(f"{field} must be one of {', '.join(choices)}")
+        return None
+    return lowered
+
+
+def validate_row(row: dict[str, Optional[str]]) -> tuple[dict[str, Any], list[str]]:
+    """``create_manual_patient`` data for one CSV row, and its validation errors."""
+    values = {key: (value or "").strip() for key, value in row.items() if key}
+    errors = [f"{field} is required" for field in REQUIRED_COLUMNS if not values.get(field)]
+    if errors:
+        return {}, errors
+
+    data: dict[str, Any] = {
+        "sex": _choice(values["sex"], "sex", SEXES, errors),
+        "weight": _number(values["weight"], "weight", errors),
+        "height": _number(values["height"], "height", errors),
+        "bmi": _number(values["bmi"], "bmi", errors),
+        "leg_dominance": _choice(values["leg_dominance"], "leg_dominance", LEG_DOMINANCE, errors),
+    }
+    for field in ("affected_right_knee", "affected_left_knee", "affected_right_hip", "affected_left_hip"):
+        data[field] = _flag(values[field], field, errors)
+    data["physically_active"] = _flag(values["physically_active"], "physically_active", errors) \
+        if values.get("physically_active") else 0
+    if values.get("birth_date"):
+        try:
+            data["birth_date"] = date.fromisoformat(values["birth_date"]).isoformat()
+        except ValueError:
+            errors.append("birth_date must be YYYY-MM-DD")
+    if values.get("occupation"):
+        data["occupation"] = _choice(values["occupation"], "occupation", OCCUPATIONS, errors)
+    for field in ("education", "time_after_symptoms"):
+        if values.get(field):
+            data[field] = _number(values[field], field, errors, integer=True)
+    if values.get("medical_history"):
+        data["medical_history"] = values["medical_history"]
+    return data, errors
+
+
+def read_patient_rows(lines: Iterable[str]) -> Iterator[tuple[int, str, dict[str, Any], list[str]]]:
+    """
+    Parse and validate the CSV row by row, yielding
+    ``(row number, reference, patient data, errors)``.
+    """
+    reader = csv.DictReader(lines)
+    headers = {(name or "").strip().lower() for name in (reader.fieldnames or [])}
+    missing = [column for column in REQUIRED_COLUMNS if column not in headers]
+    if missing:
+        raise PatientImportError(f"Missing columns: {', '.join(missing)}")
+    for row in reader:
+        row = {(key or "").strip().lower(): value for key, value in row.items()}
+        if not any((value or "").strip() for value in row.values() if isinstance(value, str)):
+            continue
+        data, errors = validate_row(row)
+        yield reader.line_num, (row.get("reference") or "").strip(), data, errors
+
+
+def import_patients(
+    lines: Iterable[str],
+    doctor_id: str,
+    batch_size: int = BATCH_SIZE,
+    max_rows: Optional[int] = None,
+    dry_run: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Validate every row of the CSV, then create the patients for ``doctor_id``
+    ``batch_size`` at a time, one transaction per batch. Returns one result per
+    data row (see ``RESULT_COLUMNS``); after a failed batch the rows of the
+    committed batches still read "created".
+    """
+    rows = []
+    for line, reference, data, errors in read_patient_rows(lines):
+        rows.append((line, reference, data, errors))
+        if max_rows is not None and len(rows) > max_rows:
+            raise PatientImportError(f"At most {max_rows} patients can be imported at once")
+
+    results = [
+        {"row": line, "reference": reference, "status": "invalid" if errors else "valid", "errors": "; ".join(errors)}
+        for line, reference, _, errors in rows
+    ]
+    if dry_run or any(result["status"] == "invalid" for result in results):
+        for result in results:
+            if result["status"] == "valid" and not dry_run:
+                result["status"] = "not_imported"
+        return results
+
+    passwords = [generate_initial_password() for _ in rows]
+    patients = [
+        {**data, "password_hash": generate_password_hash(password)}
+        for (_, _, data, _), password in zip(rows, passwords)
+    ]
+    step = max(1, batch_size)
+    for start in range(0, len(patients), step):
+        batch = slice(start, start + step)
+        try:
+            created = _create_batch(patients[batch], doctor_id)
+        except Exception as e:
+            for result in results[batch]:
+                result.update({"status": "failed", "errors": f"Database error: {e.__class__.__name__}"})
+            continue
+        for result, entry, password in zip(results[batch], created, passwords[batch]):
+            result.update({
+                "status": "created",
+                "patient_id": entry["user_id"],
+                "access_code": entry["access_code"],
+                "initial_password": password,
+            })
+    return results
+
+
+def _create_batch(patients: list[dict[str, Any]], doctor_id: str) -> list[dict[str, str]]:
+    """Commit one batch, with fresh access codes whenever they were taken in the meantime."""
+    for attempt in range(ACCESS_CODE_ATTEMPTS):
+        access_codes = generate_temporary_access_codes("Patient", len(patients))
+        try:
+            return create_manual_patients(patients, doctor_id, access_codes)
+        except IntegrityError:
+            if attempt == ACCESS_CODE_ATTEMPTS - 1:
+                raise
+
+
+def write_results(results: list[dict[str, Any]], handle) -> None:
+    writer = csv.DictWriter(handle, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(results)
+
+
+def results_csv(results: list[dict[str, Any]]) -> str:
+    buffer = io.StringIO()
+    write_results(results, buffer)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("csv_file", help="CSV with one patient per row")
+    parser.add_argument("--doctor", required=True, help="ID of the doctor the patients are assigned to")
+    parser.add_argument("--result", default=None, help="Where to write the result CSV (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the rows")
+    args = parser.parse_args(argv)
+
+    if not is_db_enabled():
+        print("ERROR: Database not configured. Check your .env file.")
+        return 1
+    doctor = get_user_by_id(args.doctor)
+    if not doctor or str(doctor.get("Role") or "").lower() != "doctor":
+        print(f"ERROR: {args.doctor} is not an active doctor")
+        return 1
+
+    try:
+        with open(args.csv_file, "r", encoding="utf-8-sig", newline="") as handle:
+            results = import_patients(handle, args.doctor, batch_size=max(args.batch_size, 1), dry_run=args.dry_run)
+    except PatientImportError as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    if args.result:
+        with open(args.result, "w", encoding="utf-8", newline="") as handle:
+            write_results(results, handle)
+    else:
+        write_results(results, sys.stdout)
+
+    counts: dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "no rows"
+    print(f"Processed {len(results)} rows: {summary}", file=sys.stderr)
+    return 0 if all(result["status"] in ("created", "valid") for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
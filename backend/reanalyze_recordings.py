@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Re-analyze archived recordings and refresh the metrics rows of their sessions.
+Run this from the backend directory: python reanalyze_recordings.py [--workers N]
+
+Calibration recordings are resolved first, one at a time in recording
+order, and are the only writers of the calibration cache during a run. The
+sessions are then analyzed in parallel against that fixed cache, so their
+metrics do not depend on which worker finished first.
+
+Recordings whose analysis version, content hash and patient calibration
+cache are unchanged since the last run are skipped. Progress is
+checkpointed after every session, so an interrupted run resumes where it
+stopped.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add parent directory to path to import db functions
+sys.path.insert(0, str(Path(__file__).parent))
+
+from analysis.calibration import CALIBRATION_EXERCISE_TYPE, calibration_cache_digest
+from analysis.pipeline import ANALYSIS_VERSION, analyze_recording, calibrate_recording
+from analysis.quality import RecordingQualityError
+from analysis.recordings import get_recordings_dir, iter_manifests, recording_content_hash, update_manifest
+from db import is_db_enabled, replace_session_metrics
+
+CHECKPOINT_FILENAME = ".reanalysis_checkpoint.json"
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    staging = Path(f"{path}.tmp")
+    with open(staging, "w", encoding="utf-8") as handle:
+        json.dump(checkpoint, handle, indent=2)
+    os.replace(staging, path)
+
+
+def calibrate_in_order(manifests, persist=True):
+    """
+    Resolve every calibration recording, oldest first, into the calibration
+    cache (only checked when ``persist`` is off). Returns
+    ``(calibrated, rejected)`` counts.
+    """
+    recordings = sorted(
+        (manifest for manifest in manifests
+         if manifest.get("exercise_type") == CALIBRATION_EXERCISE_TYPE and manifest.get("patient_id")),
+        key=lambda manifest: (manifest.get("created_at") or "", manifest["recording_id"]),
+    )
+    calibrated = rejected = 0
+    for manifest in recordings:
+        try:
+            calibration = calibrate_recording(manifest["recording_id"], persist=persist)
+        except RecordingQualityError as e:
+            rejected += 1
+            print(f"  CALIBRATION REJECTED {manifest['recording_id']}: {e}")
+            continue
+        if calibration["status"] == "recalibrated":
+            calibrated += 1
+    return calibrated, rejected
+
+
+def select_recordings(manifests, checkpoint, force=False):
+    """
+    Pick the newest recording of every session and drop the up-to-date ones.
+
+    Returns ``(pending, skipped)`` where ``pending`` is a list of
+    ``(recording_id, session_id, content_hash, calibration_cache)``.
+    """
+    latest_by_session = {}
+    for manifest in manifests:
+        session_id = manifest.get("session_id")
+        if not session_id:
+            continue
+        current = latest_by_session.get(session_id)
+        if current is None or (manifest.get("created_at") or "") > (current.get("created_at") or ""):
+            latest_by_session[session_id] = manifest
+
+    pending = []
+    skipped = 0
+    for session_id, manifest in sorted(latest_by_session.items()):
+        recording_id = manifest["recording_id"]
+        content_hash = manifest.get("content_hash") or recording_content_hash(recording_id)
+        calibration_cache = calibration_cache_digest(manifest.get("patient_id"))
+        done = checkpoint.get(recording_id) or {}
+        if (
+            not force
+            and done.get("analysis_version") == ANALYSIS_VERSION
+            and done.get("content_hash") == content_hash
+            and done.get("calibration_cache") == calibration_cache
+        ):
+            skipped += 1
+            continue
+        pending.append((recording_id, session_id, content_hash, calibration_cache))
+    return pending, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of cores)")
+    parser.add_argument("--checkpoint", default=None,
+                        help=f"Checkpoint file (default: <RECORDINGS_DIR>/{CHECKPOINT_FILENAME})")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-analyze every recording even if it is up to date")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Analyze but do not write metrics, calibrations or the checkpoint")
+    args = parser.parse_args(argv)
+
+    if not args.dry_run and not is_db_enabled():
+        print("ERROR: Database not configured. Check your .env file.")
+        return 1
+
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else get_recordings_dir() / CHECKPOINT_FILENAME
+    checkpoint = load_checkpoint(checkpoint_path)
+    manifests = list(iter_manifests())
+    calibrated, calibration_rejected = calibrate_in_order(manifests, persist=not args.dry_run)
+    print(f"Calibration recordings: {calibrated} resolved, {calibration_rejected} rejected")
+    pending, skipped = select_recordings(manifests, checkpoint, force=args.force)
+
+    print(f"Analysis version {ANALYSIS_VERSION}: {len(pending)} to analyze, {skipped} up to date")
+    if not pending:
+        return 0
+
+    started = time.perf_counter()
+    completed = 0
+    rejected = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(analyze_recording, entry[0], persist_calibration=False): entry
+            for entry in pending
+        }
+        for future in as_completed(futures):
+            recording_id, session_id, content_hash, calibration_cache = futures[future]
+            try:
+                result = future.result()
+                if not args.dry_run:
+                    replace_session_metrics(session_id, result["metrics"])
+                    extra = {"gait": result["gait"]} if "gait" in result else {}
+                    update_manifest(recording_id, quality=result["quality"], **extra)
+                    checkpoint[recording_id] = {
+                        "session_id": session_id,
+                        "analysis_version": ANALYSIS_VERSION,
+                        "content_hash": content_hash,
+                        "calibration_cache": calibration_cache,
+                        "calibration": result["calibration"].get("source_recording_id"),
+                        "metrics": len(result["metrics"]),
+                        "completed_at": datetime.now(timezone.utc).isoformat(),
+                    }
+                    save_checkpoint(checkpoint_path, checkpoint)
+                completed += 1
+            except RecordingQualityError as e:
+                # Unchanged data will fail again, so remember the rejection
+                rejected += 1
+                print(f"  REJECTED {recording_id} (session {session_id}): {e}")
+                if not args.dry_run:
+                    checkpoint[recording_id] = {
+                        "session_id": session_id,
+                        "analysis_version": ANALYSIS_VERSION,
+                        "content_hash": content_hash,
+                        "calibration_cache": calibration_cache,
+                        "rejected": str(e),
+                        "completed_at": datetime.now(timezone.utc).isoformat(),
+                    }
+                    save_checkpoint(checkpoint_path, checkpoint)
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED {recording_id} (session {session_id}): {e}")
+
+            elapsed = time.perf_counter() - started
+            print(
+                f"  [{completed + rejected + failed}/{len(pending)}] {recording_id} "
+                f"{completed / elapsed if elapsed else 0:.2f} recordings/s",
+                flush=True,
+            )
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Done: {completed} analyzed, {rejected} rejected, {failed} failed, {skipped} skipped in {elapsed:.1f}s "
+        f"({completed / elapsed if elapsed else 0:.2f} recordings/s)"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
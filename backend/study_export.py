@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Incremental anonymized study dataset export.
+Run this from the backend directory: python study_export.py [--format csv|ndjson]
+
+Every run writes a snapshot with the sessions, metrics and feedback created
+since the previous snapshot's watermark, and the IDs of rows deleted since
+then (deleted.csv.gz, from migrations/007; re-analysis replaces a session's
+metrics rows with new IDs):
+
+    <STUDY_EXPORT_DIR>/state.json                       last watermark and snapshot number
+    <STUDY_EXPORT_DIR>/snapshot-0003/manifest.json      window, row counts and SHA-256 per file
+    <STUDY_EXPORT_DIR>/snapshot-0003/sessions.csv.gz    (or .ndjson.gz)
+
+Consumers add each snapshot's rows keyed by their ID (a packed metrics
+entry can reappear with the same ID) and then drop the IDs listed in its
+deleted file.
+
+Patients and doctors are identified by their study access codes only;
+accounts without one are left out and counted in the manifest. Emails,
+names, birth dates (see ``app.sanitize_birth_date_for_response``) and free
+text (feedback comments, exercise descriptions) are never written. Rows are streamed from server-side
+cursors straight into gzip files, and a snapshot only becomes visible (and
+advances the watermark) once all its files are complete.
+"""
+
+import argparse
+import csv
+import fcntl
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+# Add parent directory to path to import db functions
+sys.path.insert(0, str(Path(__file__).parent))
+
+from analysis.pipeline import ANALYSIS_VERSION
+from analysis.recordings import get_recordings_dir
+from db import (
+    STUDY_EXPORT_TABLES,
+    extract_temporary_access_code,
+    get_changes_cursor,
+    is_change_tracking_enabled,
+    is_db_enabled,
+    iter_study_export_rows,
+)
+
+EXPORT_FORMAT_VERSION = 1
+EXPORT_FORMATS = ("csv", "ndjson")
+STATE_FILENAME = "state.json"
+LOCK_FILENAME = ".export.lock"
+MANIFEST_FILENAME = "manifest.json"
+SNAPSHOT_PATTERN = re.compile(r"^snapshot-\d{4,}$")
+EXPORT_FILE_PATTERN = re.compile(r"^(sessions|metrics|feedback|deleted)\.(csv|ndjson)\.gz$")
+EPOCH = datetime(1970, 1, 1)
+
+# Columns written per table; PatientCode/DoctorCode replace the identity columns. Free text
+# (ExerciseDescription, feedback Comments) can name people or hold clinical notes and is left out.
+EXPORT_COLUMNS = {
+    "sessions": (
+        "SessionID", "PatientCode", "DoctorCode", "ExerciseType",
+        "Repetitions", "Duration", "TimeCreated",
+    ),
+    "metrics": (
+        "MetricID", "SessionID", "PatientCode", "Joint", "Side", "Repetitions",
+        "MinVelocity", "MaxVelocity", "AvgVelocity", "P95Velocity",
+        "MinROM", "MaxROM", "AvgROM", "CenterMassDisplacement", "TimeCreated",
+    ),
+    "feedback": (
+        "FeedbackID", "SessionID", "PatientCode", "Pain", "Fatigue", "Difficulty", "HasComments", "TimeCreated",
+    ),
+    # Kind is sessions, metrics or feedback; RecordID the SessionID/MetricID/FeedbackID exported earlier
+    "deleted": ("Kind", "RecordID", "PatientCode", "DeletedAt"),
+}
+
+
+class StudyExportBusy(RuntimeError):
+    """Raised when another export is already running."""
+
+
+def get_study_export_dir() -> Path:
+    configured = (os.getenv("STUDY_EXPORT_DIR") or "").strip()
+    return Path(configured) if configured else get_recordings_dir() / "study_exports"
+
+
+def _access_code(row: dict[str, Any], prefix: str) -> Optional[str]:
+    return extract_temporary_access_code(
+        row.get(f"{prefix}Email"), row.get(f"{prefix}FirstName"), row.get(f"{prefix}LastName")
+    )
+
+
+def anonymize_row(table: str, row: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """Export row for ``row``, or None when the patient has no study access code."""
+    patient_code = _access_code(row, "Patient")
+    if not patient_code:
+        return None
+    values = {**row, "PatientCode": patient_code}
+    if table == "sessions":
+        values["DoctorCode"] = _access_code(row, "Doctor")
+    if table == "feedback":
+        values["HasComments"] = bool((row.get("Comments") or "").strip())
+    out = {}
+    for column in EXPORT_COLUMNS[table]:
+        value = values.get(column)
+        out[column] = value.isoformat() if isinstance(value, datetime) else value
+    if out.get("Duration") is not None:
+        out["Duration"] = str(out["Duration"])
+    return out
+
+
+def _write_rows(path: Path, table: str, rows: Iterator[dict[str, Any]], fmt: str) -> dict[str, Any]:
+    """Stream anonymized rows into a gzip file; returns row counts."""
+    written = skipped = 0
+    # mtime=0 keeps the gzip header (and so the file hash) reproducible
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as compressed, \
+         io.TextIOWrapper(compressed, encoding="utf-8", newline="") as handle:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(handle, fieldnames=EXPORT_COLUMNS[table])
+            writer.writeheader()
+        for row in rows:
+            out = anonymize_row(table, row)
+            if out is None:
+                skipped += 1
+                continue
+            if writer is not None:
+                writer.writerow(out)
+            else:
+                handle.write(json.dumps(out, default=str) + "\n")
+            written += 1
+    return {"rows": written, "skipped_without_access_code": skipped}
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_state(export_dir: Optional[Path] = None) -> dict[str, Any]:
+    try:
+        with open((export_dir or get_study_export_dir()) / STATE_FILENAME, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_state(export_dir: Path, state: dict[str, Any]) -> None:
+    staging = export_dir / f".{STATE_FILENAME}.tmp"
+    with open(staging, "w", encoding="utf-8") as handle:
+        json.dump(state, handle, indent=2)
+    os.replace(staging, export_dir / STATE_FILENAME)
+
+
+@contextmanager
+def _export_lock(export_dir: Path):
+    with open(export_dir / LOCK_FILENAME, "w") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise StudyExportBusy("Another study export is running") from None
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def run_study_export(fmt: str = "csv", export_dir: Optional[Path] = None) -> dict[str, Any]:
+    """
+    Write the next snapshot and return its manifest.
+
+    The window is ``(previous watermark, until]`` in UTC, so consecutive
+    snapshots never overlap or leave gaps. ``until`` is
+    ``db.get_changes_cursor()``: the start of the oldest open write
+    transaction, so rows it commits later still fall into the next window.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    export_dir = export_dir or get_study_export_dir()
+    export_dir.mkdir(parents=True, exist_ok=True)
+
+    with _export_lock(export_dir):
+        state = load_state(export_dir)
+        since = datetime.fromisoformat(state["watermark"]) if state.get("watermark") else EPOCH
+        until = max(get_changes_cursor().replace(microsecond=0), since)
+        number = int(state.get("snapshot") or 0) + 1
+        name = f"snapshot-{number:04d}"
+        staging = export_dir / f".{name}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+
+        started = time.perf_counter()
+        files = {}
+        try:
+            for table in STUDY_EXPORT_TABLES:
+                filename = f"{table}.{fmt}.gz"
+                counts = _write_rows(staging / filename, table, iter_study_export_rows(table, since, until), fmt)
+                files[filename] = {
+                    "table": table,
+                    "columns": list(EXPORT_COLUMNS[table]),
+                    **counts,
+                    "bytes": (staging / filename).stat().st_size,
+                    "sha256": _sha256(staging / filename),
+                }
+            manifest = {
+                "snapshot": name,
+                "export_format_version": EXPORT_FORMAT_VERSION,
+                "analysis_version": ANALYSIS_VERSION,
+                "format": fmt,
+                "since": None if since == EPOCH else since.isoformat(),
+                "until": until.isoformat(),
+                "previous_snapshot": state.get("last_snapshot"),
+                "deletions_tracked": is_change_tracking_enabled(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "duration_seconds": round(time.perf_counter() - started, 3),
+                "files": files,
+            }
+            with open(staging / MANIFEST_FILENAME, "w", encoding="utf-8") as handle:
+                json.dump(manifest, handle, indent=2)
+            os.replace(staging, export_dir / name)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        _save_state(export_dir, {"watermark": until.isoformat(), "snapshot": number, "last_snapshot": name})
+    return manifest
+
+
+def list_snapshots(export_dir: Optional[Path] = None) -> list[dict[str, Any]]:
+    """Manifests of the completed snapshots, oldest first."""
+    export_dir = export_dir or get_study_export_dir()
+    if not export_dir.is_dir():
+        return []
+    manifests = []
+    for entry in sorted(export_dir.iterdir()):
+        if SNAPSHOT_PATTERN.match(entry.name) and (entry / MANIFEST_FILENAME).is_file():
+            with open(entry / MANIFEST_FILENAME, "r", encoding="utf-8") as handle:
+                manifests.append(json.load(handle))
+    return manifests
+
+
+def snapshot_file_path(snapshot: str, filename: str, export_dir: Optional[Path] = None) -> Optional[Path]:
+    """Path of one snapshot file, or None for unknown or malformed names."""
+    if not SNAPSHOT_PATTERN.match(snapshot or "") or not (
+        filename == MANIFEST_FILENAME or EXPORT_FILE_PATTERN.match(filename or "")
+    ):
+        return None
+    path = (export_dir or get_study_export_dir()) / snapshot / filename
+    return path if path.is_file() else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--output", default=None,
+                        help="Export directory (default: STUDY_EXPORT_DIR or <RECORDINGS_DIR>/study_exports)")
+    args = parser.parse_args(argv)
+
+    if not is_db_enabled():
+        print("ERROR: Database not configured. Check your .env file.")
+        return 1
+
+    try:
+        manifest = run_study_export(args.format, export_dir=Path(args.output) if args.output else None)
+    except StudyExportBusy as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    print(f"{manifest['snapshot']}: {manifest['since'] or 'start'} -> {manifest['until']}")
+    for filename, entry in manifest["files"].items():
+        skipped = entry["skipped_without_access_code"]
+        print(f"  {filename}: {entry['rows']} rows" + (f" ({skipped} without access code left out)" if skipped else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.calibration import (
+    apply_calibration,
+    bone_tilt,
+    find_static_window,
+    load_calibrations,
+    resolve_calibration,
+    save_calibration,
+)
+from analysis.kinematics import quat_multiply
+
+
+def axis_angle(axis, degrees, n):
+    half = np.radians(np.broadcast_to(np.asarray(degrees, dtype=np.float64), (n,))) / 2
+    axis = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    return np.column_stack([np.cos(half), np.sin(half)[:, None] * axis])
+
+
+def mounted_sensors(tilts, still_seconds=3.0, total_seconds=8.0, rate=60):
+    """Sensors whose bone axis hangs down, rotated by a fixed mounting tilt (deg)."""
+    seconds = np.arange(int(total_seconds * rate)) / rate
+    n = len(seconds)
+    # Sensor -Y pointing down in a Z-up world: +90 deg about world X
+    hanging = axis_angle([1, 0, 0], 90.0, n)
+    swing = np.where(seconds > still_seconds, 40.0 * np.sin(2 * np.pi * 0.5 * (seconds - still_seconds)), 0.0)
+    quats = {}
+    for tag, tilt in tilts.items():
+        mounting = axis_angle([0, 0, 1], tilt, n)  # tilt in the sensor frame
+        quats[tag] = quat_multiply(quat_multiply(axis_angle([1, 0, 0], swing, n), hanging), mounting)
+    return quats, seconds
+
+
+class StaticWindowTests(unittest.TestCase):
+    def test_finds_still_opening_pose(self):
+        quats, seconds = mounted_sensors({1: 10.0})
+
+        window = find_static_window(quats[1], seconds)
+
+        self.assertIsNotNone(window)
+        self.assertLessEqual(seconds[window[1] - 1], 3.0 + 1 / 60)
+
+    def test_no_window_when_always_moving(self):
+        quats, seconds = mounted_sensors({1: 10.0}, still_seconds=0.0)
+
+        self.assertIsNone(find_static_window(quats[1], seconds))
+
+
+class ResolveCalibrationTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"RECORDINGS_DIR": self.tmp.name})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_calibration_brings_bone_axes_to_vertical(self):
+        quats, seconds = mounted_sensors({1: 12.0, 2: -7.0})
+
+        result = resolve_calibration("patient-1", quats, seconds, "2025-01-01T10:00:00+00:00", "rec-a")
+
+        self.assertEqual(result["status"], "recalibrated")
+        for tag, tilt in ((1, 12.0), (2, 7.0)):
+            self.assertAlmostEqual(float(bone_tilt(quats[tag][:1])[0]), tilt, places=6)
+            corrected = apply_calibration(quats[tag][:180], result["offsets"][tag])
+            self.assertLess(float(bone_tilt(corrected).max()), 1e-6)
+
+    def test_reuses_cache_inside_validity_window(self):
+        quats, seconds = mounted_sensors({1: 12.0, 2: -7.0})
+        resolve_calibration("patient-1", quats, seconds, "2025-01-01T10:00:00+00:00", "rec-a")
+
+        later = resolve_calibration("patient-1", quats, seconds, "2025-01-01T14:00:00+00:00", "rec-b")
+        next_day = resolve_calibration("patient-1", quats, seconds, "2025-01-02T10:00:00+00:00", "rec-c")
+
+        self.assertEqual(later["status"], "cached")
+        self.assertEqual(later["source_recording_id"], "rec-a")
+        self.assertEqual(next_day["status"], "recalibrated")
+        self.assertEqual(len(load_calibrations("patient-1", "1-2")), 2)
+
+    def test_drift_triggers_recalibration(self):
+        quats, seconds = mounted_sensors({1: 12.0, 2: -7.0})
+        resolve_calibration("patient-1", quats, seconds, "2025-01-01T10:00:00+00:00", "rec-a")
+
+        remounted, _ = mounted_sensors({1: 25.0, 2: -7.0})
+        result = resolve_calibration("patient-1", remounted, seconds, "2025-01-01T11:00:00+00:00", "rec-b")
+
+        self.assertEqual(result["status"], "recalibrated")
+        self.assertGreater(result["drift_deg"], 10.0)
+
+    def test_concurrent_saves_keep_every_calibration(self):
+        def save(i):
+            save_calibration("patient-1", "1-2", {
+                "sensor_set": "1-2", "source_recording_id": f"rec-{i}",
+                "recorded_at": f"2025-01-01T10:{i:02d}:00+00:00", "sensors": {},
+            })
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(save, range(16)))
+
+        saved = load_calibrations("patient-1", "1-2")
+        self.assertEqual(sorted(entry["source_recording_id"] for entry in saved), sorted(f"rec-{i}" for i in range(16)))
+        self.assertEqual(saved[0]["source_recording_id"], "rec-15")
+
+    def test_uncalibrated_without_static_pose(self):
+        quats, seconds = mounted_sensors({1: 12.0}, still_seconds=0.0)
+
+        result = resolve_calibration("patient-1", quats, seconds, "2025-01-01T10:00:00+00:00", "rec-a")
+
+        self.assertEqual(result["status"], "uncalibrated")
+        self.assertEqual(result["offsets"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.com import displacement_per_rep, world_acceleration
+from analysis.kinematics import quat_from_euler_zyx
+from analysis.metrics import summarize_joint
+
+
+def sit_to_stand(reps=5, period=3.0, rate=60, drop_cm=(30.0, 30.0, 25.0, 30.0, 20.0), bias=0.05):
+    """Pelvis height dipping by ``drop_cm`` per rep, with a constant accelerometer bias."""
+    seconds = np.arange(int(reps * period * rate) + 1) / rate
+    rep = np.minimum((seconds // period).astype(int), reps - 1)
+    phase = (seconds - rep * period) / period
+    depth = np.asarray(drop_cm)[rep] / 100.0
+    # z(t) = -depth * (1 - cos(2 pi phase)) / 2  ->  analytic second derivative
+    omega = 2 * np.pi / period
+    acc_z = -depth * omega**2 * np.cos(2 * np.pi * phase) / 2 + bias
+    acceleration = np.column_stack([np.zeros_like(seconds), np.zeros_like(seconds), acc_z])
+    knee = 90.0 * (1 - np.cos(2 * np.pi * phase)) / 2
+    boundaries = np.concatenate([np.arange(reps) * int(period * rate), [len(seconds)]])
+    return seconds, acceleration, knee, boundaries
+
+
+class DisplacementTests(unittest.TestCase):
+    def test_recovers_per_rep_vertical_displacement_despite_bias(self):
+        seconds, acceleration, _, boundaries = sit_to_stand()
+
+        result = displacement_per_rep(acceleration, seconds, boundaries)
+
+        np.testing.assert_allclose(result, [30.0, 30.0, 25.0, 30.0, 20.0], atol=0.5)
+
+    def test_invalid_samples_blank_their_rep_only(self):
+        seconds, acceleration, _, boundaries = sit_to_stand()
+        valid = np.ones(len(seconds), dtype=bool)
+        valid[boundaries[2] + 10] = False
+
+        result = displacement_per_rep(acceleration, seconds, boundaries, valid)
+
+        self.assertTrue(np.isnan(result[2]))
+        self.assertEqual(int(np.isnan(result).sum()), 1)
+
+    def test_sensor_frame_acceleration_is_rotated(self):
+        quat = quat_from_euler_zyx([90.0], [0.0], [0.0])  # sensor rolled 90 deg about X
+        # At rest the accelerometer reads +g along sensor +Y, which is world +Z here
+        world = world_acceleration({"quat": quat, "Acc_X": [0.0], "Acc_Y": [9.81], "Acc_Z": [0.0]})
+
+        np.testing.assert_allclose(world, [[0.0, 0.0, 0.0]], atol=1e-9)
+
+
+class SummaryTests(unittest.TestCase):
+    def test_knee_row_carries_com_displacement(self):
+        seconds, acceleration, knee, _ = sit_to_stand(drop_cm=(30.0,) * 5)
+
+        row = summarize_joint("knee", "left", knee, seconds, com_acceleration=acceleration)
+
+        self.assertEqual(row["repetition"], 5)
+        self.assertAlmostEqual(row["center_mass_displacement"], 30.0, delta=2.0)
+        self.assertIn("com_displacement_cm", row["reps"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import sys
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import jwt as PyJWT
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import db
+
+CURSOR = datetime(2025, 3, 10, 12, 0)
+# Migrations 005, 007 and 008 applied
+MIGRATED = {("metrics_weekly", None): True, ("deleted_records", None): True, ("metrics_packed", "UpdatedAt"): True}
+
+
+def fake_engine(packed_blobs=()):
+    connection = MagicMock()
+    connection.execute.return_value.fetchall.return_value = list(packed_blobs)
+    connection.execute.return_value.fetchone.return_value = None
+    engine = MagicMock()
+    engine.begin.return_value.__enter__.return_value = connection
+    return engine, connection
+
+
+def statements(connection):
+    return [" ".join(str(call.args[0]).split()) for call in connection.execute.call_args_list]
+
+
+class TombstoneTests(unittest.TestCase):
+    def setUp(self):
+        schema = patch.dict(db._schema_cache, MIGRATED)
+        schema.start()
+        self.addCleanup(schema.stop)
+
+    def test_deleting_a_session_tombstones_its_rows_first(self):
+        engine, connection = fake_engine([("p-1", "blob-1", 2)])
+
+        with patch.object(db, "_engine", engine), patch.dict("os.environ", {"METRICS_STORAGE": "packed"}):
+            db.delete_patient_session("s-1")
+
+        sql = statements(connection)
+        tombstones = [i for i, statement in enumerate(sql) if statement.startswith("INSERT INTO deleted_records")]
+        first_delete = next(i for i, statement in enumerate(sql) if statement.startswith("DELETE"))
+        self.assertEqual(len(tombstones), 4)
+        self.assertLess(max(tombstones), first_delete)
+        self.assertEqual(
+            [kind for kind in ("'metrics'", "'feedback'", "'sessions'") if any(kind in sql[i] for i in tombstones)],
+            ["'metrics'", "'feedback'", "'sessions'"],
+        )
+        packed = connection.execute.call_args_list[tombstones[-1]].args[1]
+        self.assertEqual(
+            packed, [{"patient_id": "p-1", "record_id": "blob-1:0"}, {"patient_id": "p-1", "record_id": "blob-1:1"}]
+        )
+
+    def test_no_tombstones_before_migration_007(self):
+        connection = MagicMock()
+        with patch.dict(db._schema_cache, {("deleted_records", None): False}):
+            db._record_deletions(connection, "s-1", "metrics", "feedback", "sessions")
+
+        connection.execute.assert_not_called()
+
+    def test_compaction_tombstones_only_the_moved_rows(self):
+        engine, connection = fake_engine([("p-1", "blob-1", 5)])
+        row = MagicMock(_mapping={"ID": "m-1", "Joint": "knee", "Side": "left", "TimeCreated": CURSOR})
+        connection.execute.return_value.__iter__.return_value = iter([row])
+
+        with patch.object(db, "_engine", engine), patch.dict("os.environ", {"METRICS_STORAGE": "packed"}), \
+             patch.object(db, "_append_packed_metrics", return_value=["blob-1:5"]):
+            moved = db.compact_session_metrics("s-1")
+
+        self.assertEqual(moved, 1)
+        tombstones = [sql for sql in statements(connection) if sql.startswith("INSERT INTO deleted_records")]
+        self.assertEqual(len(tombstones), 1)
+        self.assertIn("FROM metrics m", tombstones[0])
+
+
+class ChangesQueryTests(unittest.TestCase):
+    def setUp(self):
+        schema = patch.dict(db._schema_cache, MIGRATED)
+        schema.start()
+        self.addCleanup(schema.stop)
+
+    def test_since_filters_on_updated_at(self):
+        with patch.object(db, "fetch_all", return_value=[]) as fetch_all:
+            db.get_patient_sessions("p-1")
+            db.get_patient_sessions("p-1", since=CURSOR)
+            db.get_feedback_by_patient("p-1", limit=None, since=CURSOR)
+
+        plain, changed, feedback = [call.args for call in fetch_all.call_args_list]
+        self.assertNotIn("UpdatedAt", plain[0])
+        self.assertIn("AND s.UpdatedAt > :since", changed[0])
+        self.assertEqual(changed[1]["since"], CURSOR)
+        self.assertIn("AND f.UpdatedAt > :since", feedback[0])
+        self.assertNotIn("LIMIT", feedback[0])
+
+    def test_before_migration_007_only_new_rows_are_returned(self):
+        with patch.dict(db._schema_cache, {("deleted_records", None): False}), \
+             patch.object(db, "fetch_all", return_value=[]) as fetch_all:
+            db.get_patient_sessions("p-1", since=CURSOR)
+            deleted = db.get_deleted_records("p-1", CURSOR)
+
+        self.assertIn("AND s.TimeCreated > :since", fetch_all.call_args.args[0])
+        self.assertEqual(fetch_all.call_count, 1)
+        self.assertEqual(deleted, {"sessions": [], "metrics": [], "feedback": []})
+
+    def test_cursor_reaches_back_to_the_oldest_open_transaction(self):
+        for oldest, expected in ((90_000_000, datetime(2025, 3, 10, 11, 58, 30)), (None, datetime(2025, 3, 10, 11, 59, 59))):
+            with patch.object(db, "fetch_one", return_value={"now": CURSOR, "oldest": oldest}):
+                self.assertEqual(db.get_changes_cursor(), expected)
+
+    def test_cursor_without_process_privilege_uses_the_configured_lag(self):
+        denied = db.DBAPIError("SELECT", {}, Exception("Access denied; you need the PROCESS privilege"))
+        with patch.object(db, "fetch_one", side_effect=[denied, {"now": CURSOR}]), \
+             patch.dict("os.environ", {"CHANGES_CURSOR_LAG_SECONDS": "600"}):
+            self.assertEqual(db.get_changes_cursor(), datetime(2025, 3, 10, 11, 50))
+
+    def test_deleted_records_by_kind(self):
+        rows = [{"Kind": "sessions", "RecordID": "s-1"}, {"Kind": "metrics", "RecordID": "blob-1:0"}]
+        with patch.object(db, "fetch_all", return_value=rows):
+            deleted = db.get_deleted_records("p-1", CURSOR)
+
+        self.assertEqual(deleted, {"sessions": ["s-1"], "metrics": ["blob-1:0"], "feedback": []})
+
+
+class ChangesEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "p-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        user = {"ID": "p-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        patch.object(backend_app, "get_user_by_id", return_value=user).start()
+        self.cursor = patch.object(backend_app, "get_changes_cursor", return_value=CURSOR).start()
+        self.deleted = patch.object(
+            backend_app, "get_deleted_records",
+            return_value={"sessions": ["s-0"], "metrics": ["m-0"], "feedback": []},
+        ).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_sessions_since_cursor(self):
+        with patch.object(backend_app, "get_patient_sessions", return_value=[{"ID": "s-1"}]) as sessions:
+            response = self.client.get("/patients/p-1/sessions?since=2025-03-10T11:00:00%2B01:00", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"sessions": [{"ID": "s-1"}], "deleted": ["s-0"], "cursor": "2025-03-10T12:00:00"})
+        sessions.assert_called_once_with("p-1", datetime(2025, 3, 10, 10, 0))
+        self.deleted.assert_called_once_with("p-1", datetime(2025, 3, 10, 10, 0))
+
+    def test_empty_since_returns_everything_with_a_cursor(self):
+        with patch.object(backend_app, "get_metrics_by_patient", return_value=[{"ID": "m-1"}]) as metrics:
+            response = self.client.get("/patients/p-1/metrics?since=", headers=self.headers)
+
+        self.assertEqual(response.get_json(), {"metrics": [{"ID": "m-1"}], "deleted": [], "cursor": "2025-03-10T12:00:00"})
+        metrics.assert_called_once_with("p-1", limit=None, since=None)
+        self.deleted.assert_not_called()
+
+    def test_without_since_the_list_is_unchanged(self):
+        with patch.object(backend_app, "get_feedback_by_patient", return_value=[{"ID": "f-1"}]) as feedback:
+            response = self.client.get("/patients/p-1/feedback", headers=self.headers)
+
+        self.assertEqual(response.get_json(), [{"ID": "f-1"}])
+        feedback.assert_called_once_with("p-1")
+        self.cursor.assert_not_called()
+
+    def test_malformed_cursor(self):
+        with patch.object(backend_app, "get_feedback_by_patient") as feedback:
+            response = self.client.get("/patients/p-1/feedback?since=yesterday", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+        feedback.assert_not_called()
+
+    def test_other_patients_feedback_is_forbidden(self):
+        with patch.object(backend_app, "get_feedback_by_patient") as feedback:
+            response = self.client.get("/patients/p-2/feedback?since=", headers=self.headers)
+
+        self.assertEqual(response.status_code, 403)
+        feedback.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
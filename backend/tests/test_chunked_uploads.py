@@ -0,0 +1,184 @@
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+from analysis.uploads import (
+    MIN_CHUNK_SIZE,
+    UploadError,
+    create_upload,
+    load_upload,
+    open_completed_upload,
+    purge_expired_uploads,
+    upload_status,
+    write_chunk,
+)
+
+
+def zip_payload(size=MIN_CHUNK_SIZE * 3 + 1234):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("sensor_1.csv", os.urandom(size))
+    return buffer.getvalue()
+
+
+def chunks_of(data, chunk_size=MIN_CHUNK_SIZE):
+    return [data[start : start + chunk_size] for start in range(0, len(data), chunk_size)]
+
+
+class UploadStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"RECORDINGS_DIR": self.tmpdir.name})
+        self.env.start()
+        self.data = zip_payload()
+        self.upload = create_upload(
+            "walk.zip",
+            len(self.data),
+            created_by="patient-1",
+            chunk_size=MIN_CHUNK_SIZE,
+            sha256=hashlib.sha256(self.data).hexdigest(),
+        )
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_out_of_order_chunks_assemble_in_place(self):
+        parts = chunks_of(self.data)
+        for index in (3, 0, 2):
+            write_chunk(self.upload, index, io.BytesIO(parts[index]))
+
+        status = upload_status(self.upload)
+        self.assertEqual(status["chunkCount"], 4)
+        self.assertEqual(status["receivedChunks"], [[0, 0], [2, 3]])
+        self.assertFalse(status["complete"])
+        with self.assertRaises(UploadError):
+            open_completed_upload(self.upload)
+
+        write_chunk(self.upload, 1, io.BytesIO(parts[1]), hashlib.sha256(parts[1]).hexdigest())
+        with open_completed_upload(self.upload) as handle:
+            self.assertEqual(handle.read(), self.data)
+
+    def test_rejects_bad_chunks_without_recording_them(self):
+        parts = chunks_of(self.data)
+        with self.assertRaises(UploadError):
+            write_chunk(self.upload, 0, io.BytesIO(parts[0][:-1]))
+        with self.assertRaises(UploadError):
+            write_chunk(self.upload, 0, io.BytesIO(parts[0]), "0" * 64)
+        with self.assertRaises(UploadError):
+            write_chunk(self.upload, 4, io.BytesIO(b"x"))
+
+        self.assertEqual(upload_status(self.upload)["receivedChunks"], [])
+
+    def test_whole_file_hash_is_checked_on_commit(self):
+        corrupted = bytearray(self.data)
+        corrupted[-1] ^= 0xFF
+        for index, part in enumerate(chunks_of(bytes(corrupted))):
+            write_chunk(self.upload, index, io.BytesIO(part))
+
+        with self.assertRaises(UploadError):
+            open_completed_upload(self.upload)
+
+    def test_expired_uploads_are_purged(self):
+        later = datetime.now(timezone.utc) + timedelta(days=2)
+
+        self.assertEqual(purge_expired_uploads(later), 1)
+        self.assertIsNone(load_upload(self.upload["upload_id"]))
+
+
+class UploadEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"RECORDINGS_DIR": self.tmpdir.name})
+        self.env.start()
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "patient-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        user = {"ID": "patient-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        self.user_patch = patch.object(backend_app, "get_user_by_id", return_value=user)
+        self.user_patch.start()
+
+    def tearDown(self):
+        self.user_patch.stop()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_resumable_upload_feeds_analysis_path(self):
+        data = zip_payload()
+        created = self.client.post(
+            "/uploads",
+            headers=self.headers,
+            json={"filename": "walk.zip", "size": len(data), "chunkSize": MIN_CHUNK_SIZE, "patient_id": "patient-1"},
+        )
+        upload_id = created.get_json()["uploadId"]
+        parts = chunks_of(data)
+        for index in range(len(parts) - 1):
+            response = self.client.put(
+                f"/uploads/{upload_id}/chunks/{index}",
+                headers={**self.headers, "X-Chunk-SHA256": hashlib.sha256(parts[index]).hexdigest()},
+                data=parts[index],
+            )
+            self.assertEqual(response.status_code, 200)
+
+        early = self.client.post(f"/uploads/{upload_id}/commit", headers=self.headers)
+        self.client.put(f"/uploads/{upload_id}/chunks/{len(parts) - 1}", headers=self.headers, data=parts[-1])
+        status = self.client.get(f"/uploads/{upload_id}", headers=self.headers).get_json()
+
+        seen = {}
+
+        def fake_analyze(current_user, file, patient_id, exercise_type, session_id=None):
+            seen["content"] = file.stream.read()
+            seen["filename"] = file.filename
+            return backend_app.jsonify({"success": True})
+
+        def unavailable(*args, **kwargs):
+            return backend_app.jsonify({"success": False}), 502
+
+        with patch.object(backend_app, "_analyze_movement_file", side_effect=unavailable):
+            failed = self.client.post(f"/uploads/{upload_id}/commit", headers=self.headers)
+        self.assertEqual(failed.status_code, 502)
+        self.assertIsNotNone(load_upload(upload_id))
+
+        with patch.object(backend_app, "_analyze_movement_file", side_effect=fake_analyze):
+            committed = self.client.post(f"/uploads/{upload_id}/commit", headers=self.headers)
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(early.status_code, 409)
+        self.assertTrue(status["complete"])
+        self.assertEqual(committed.status_code, 200)
+        self.assertEqual(seen, {"content": data, "filename": "walk.zip"})
+        self.assertIsNone(load_upload(upload_id))
+
+    def test_rejects_non_zip_and_foreign_patients(self):
+        not_zip = self.client.post(
+            "/uploads", headers=self.headers, json={"filename": "walk.csv", "size": 10, "patient_id": "patient-1"}
+        )
+        foreign = self.client.post(
+            "/uploads", headers=self.headers, json={"filename": "walk.zip", "size": 10, "patient_id": "patient-2"}
+        )
+
+        self.assertEqual(not_zip.status_code, 400)
+        self.assertEqual(foreign.status_code, 403)
+
+    def test_uploads_are_private_to_their_creator(self):
+        upload = create_upload("walk.zip", 10, created_by="someone-else", chunk_size=MIN_CHUNK_SIZE)
+
+        response = self.client.get(f"/uploads/{upload['upload_id']}", headers=self.headers)
+
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
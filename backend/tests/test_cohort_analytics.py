@@ -0,0 +1,160 @@
+import sys
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import db
+from analysis.cohort import CohortCache, build_cohort, cohort_analytics, percentile_ranks
+
+COLUMNS = ("AvgROM", "P95Velocity")
+START = datetime(2025, 1, 6, 9, 0)
+
+
+def cohort_rows():
+    """p-1 improves 10 deg a week; p-2 is flat at 50 with a weaker left knee; p-3 only has hip data."""
+    rows = []
+    for week in range(4):
+        at = START + timedelta(days=7 * week)
+        rows += [("p-1", "knee", side, at, 40.0 + 10 * week, 200.0) for side in ("left", "right")]
+        rows += [
+            ("p-2", "knee", "right", at + timedelta(days=1), 60.0, 150.0),
+            ("p-2", "knee", "left", at + timedelta(days=1), 40.0, 150.0),
+            ("p-3", "hip", "right", at, 30.0, 100.0),
+        ]
+    return rows
+
+
+class CohortAnalyticsTests(unittest.TestCase):
+    def setUp(self):
+        self.cohort = build_cohort(cohort_rows(), COLUMNS)
+
+    def test_program_weeks_start_at_first_session(self):
+        weeks = self.cohort["program_week"][self.cohort["patient"] == 1]
+
+        np.testing.assert_array_equal(np.unique(weeks), [1, 2, 3, 4])
+
+    def test_week_percentiles_z_scores_and_asymmetry(self):
+        result = cohort_analytics(self.cohort, "AvgROM", "knee", week=4)
+        by_patient = {row["patientId"]: row for row in result["patients"]}
+
+        self.assertEqual(set(by_patient), {"p-1", "p-2"})
+        self.assertEqual(by_patient["p-1"]["value"], 70.0)
+        self.assertEqual(by_patient["p-2"]["value"], 50.0)
+        self.assertEqual((by_patient["p-1"]["percentile"], by_patient["p-2"]["percentile"]), (75.0, 25.0))
+        self.assertEqual((by_patient["p-1"]["zScore"], by_patient["p-2"]["zScore"]), (1.0, -1.0))
+        self.assertEqual(by_patient["p-1"]["asymmetryIndex"], 0.0)
+        self.assertEqual(by_patient["p-2"]["asymmetryIndex"], 40.0)
+        self.assertEqual(result["cohort"]["patients"], 2)
+        self.assertEqual(result["cohort"]["p50"], 60.0)
+        self.assertEqual(result["patients"][0]["patientId"], "p-1")
+
+    def test_side_filter_keeps_asymmetry(self):
+        result = cohort_analytics(self.cohort, "AvgROM", "knee", side="left")
+        p2 = next(row for row in result["patients"] if row["patientId"] == "p-2")
+
+        self.assertEqual(p2["value"], 40.0)
+        self.assertEqual((p2["left"], p2["right"]), (40.0, 60.0))
+
+    def test_percentile_ranks_count_ties_as_half(self):
+        np.testing.assert_array_equal(percentile_ranks(np.array([1.0, 2.0, 2.0, 3.0])), [12.5, 50.0, 50.0, 87.5])
+
+    def test_empty_cohort(self):
+        result = cohort_analytics(build_cohort([], COLUMNS), "AvgROM")
+
+        self.assertEqual(result["cohort"], {"patients": 0})
+        self.assertEqual(result["patients"], [])
+
+
+class CohortCacheTests(unittest.TestCase):
+    def test_fingerprint_change_misses(self):
+        cache = CohortCache(max_entries=1)
+        cache.put("d-1", (1, 10), {"cohort": 1})
+
+        self.assertEqual(cache.get("d-1", (1, 10)), {"cohort": 1})
+        self.assertIsNone(cache.get("d-1", (1, 11)))
+        cache.put("d-2", (1, 1), {"cohort": 2})
+        self.assertIsNone(cache.get("d-1", (1, 10)))
+
+    def test_invalidate_many(self):
+        cache = CohortCache()
+        for doctor_id in ("d-1", "d-2", "d-3"):
+            cache.put(doctor_id, 1, {"cohort": doctor_id})
+
+        cache.invalidate_many(["d-1", "d-3", "d-4"])
+
+        self.assertEqual([cache.get(d, 1) for d in ("d-1", "d-2", "d-3")], [None, {"cohort": "d-2"}, None])
+
+
+class CohortQueryTests(unittest.TestCase):
+    def test_sessions_of_earlier_relations_are_kept(self):
+        with patch.object(db, "fetch_all", return_value=[]) as fetch_all:
+            db.load_doctor_cohort_rows("d-1")
+
+        sql = " ".join(fetch_all.call_args.args[0].split())
+        self.assertIn("JOIN patientdoctor rel ON rel.PatientID = pd.PatientID JOIN session s ON s.RelationID = rel.ID", sql)
+        self.assertIn("pd.DoctorID = :doctor_id AND pd.Active = 1", sql)
+
+    def test_fingerprint_tracks_rewrites_and_deletions(self):
+        row = {"relations": 2, "joined": None, "updated": datetime(2025, 2, 1, 9, 0), "deleted": 3}
+        with patch.dict(db._schema_cache, {("deleted_records", None): True}), \
+             patch.object(db, "fetch_one", return_value=row) as fetch_one:
+            fingerprint = db.get_doctor_metrics_fingerprint("d-1")
+
+        sql = " ".join(fetch_one.call_args.args[0].split())
+        self.assertIn("MAX(m.UpdatedAt)", sql)
+        self.assertIn("JOIN deleted_records d", sql)
+        self.assertNotIn("COUNT(m.ID)", sql)
+        self.assertEqual(fingerprint, (2, "None", "2025-02-01 09:00:00", 3))
+
+
+class CohortEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        backend_app.cohort_cache.invalidate()
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "doctor-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.doctor = {"ID": "doctor-1", "Role": "Doctor", "Email": "d@example.com", "FirstName": "D", "LastName": "One"}
+
+    def request(self, fingerprint, query="metric=avg_rom&week=4"):
+        # COHORT_METRIC_COLUMNS order: MinROM, MaxROM, AvgROM, MaxVelocity, AvgVelocity, P95Velocity
+        rows = [(p, j, s, t, 0.0, 0.0, rom, 0.0, 0.0, v) for p, j, s, t, rom, v in cohort_rows()]
+        with patch.object(backend_app, "get_user_by_id", return_value=self.doctor), \
+             patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(backend_app, "get_doctor_metrics_fingerprint", return_value=fingerprint), \
+             patch.object(backend_app, "load_doctor_cohort_rows", return_value=rows) as load:
+            response = self.client.get(f"/doctors/me/cohort?{query}", headers=self.headers)
+        return response, load
+
+    def test_cohort_is_loaded_once_until_metrics_change(self):
+        first, load_first = self.request((2, 16, "2025-02-01"))
+        second, load_second = self.request((2, 16, "2025-02-01"))
+        third, load_third = self.request((2, 17, "2025-02-02"))
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.get_json(), second.get_json())
+        self.assertEqual([load_first.call_count, load_second.call_count, load_third.call_count], [1, 0, 1])
+        self.assertEqual(first.get_json()["patients"][0]["value"], 70.0)
+
+    def test_rejects_unsupported_metric(self):
+        response, load = self.request((0, 0, None), query="metric=Repetitions")
+
+        self.assertEqual(response.status_code, 400)
+        load.assert_not_called()
+
+    def test_patients_are_forbidden(self):
+        patient = {"ID": "doctor-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        with patch.object(backend_app, "get_user_by_id", return_value=patient):
+            response = self.client.get("/doctors/me/cohort", headers=self.headers)
+
+        self.assertEqual(response.status_code, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis import RecordingQualityError, align_sensors, assess_sensor
+from analysis.quality import check_recording_quality, counter_steps
+
+
+def channels_with_loss(keep, samples=600, status=None):
+    channels = {
+        "PacketCounter": np.arange(samples, dtype=np.uint32),
+        "SampleTimeFine": (np.arange(samples) * 16_667).astype(np.uint32),
+        "Euler_X": np.zeros(samples, dtype=np.float32),
+        "Euler_Y": np.zeros(samples, dtype=np.float32),
+        "Euler_Z": np.zeros(samples, dtype=np.float32),
+        "Status": np.zeros(samples, dtype=np.uint16) if status is None else np.asarray(status, dtype=np.uint16),
+    }
+    return {name: values[keep] for name, values in channels.items()}
+
+
+class CounterStepTests(unittest.TestCase):
+    def test_handles_16_bit_rollover(self):
+        steps = counter_steps(np.array([65533, 65534, 65535, 0, 3], dtype=np.uint32))
+
+        np.testing.assert_array_equal(steps, [1, 1, 1, 3])
+
+
+class AssessSensorTests(unittest.TestCase):
+    def test_reports_short_and_long_gaps(self):
+        keep = np.r_[0:100, 103:300, 330:600]  # 3 packets lost, then 30 packets lost
+
+        report = assess_sensor(channels_with_loss(keep), rate=60)
+
+        self.assertEqual(report["dropped_packets"], 33)
+        self.assertEqual(report["gaps"], 2)
+        self.assertEqual(report["long_gaps"], 1)
+        self.assertAlmostEqual(report["longest_gap_seconds"], 31 / 60, places=3)
+        self.assertTrue(report["usable"])
+
+    def test_flags_clipping_from_status_bits(self):
+        status = np.zeros(600, dtype=np.uint16)
+        status[:100] = 0x0008  # gyroscope X clipped
+        status[100:200] = 0x0200  # MagIsNew only
+
+        report = assess_sensor(channels_with_loss(np.arange(600), status=status), rate=60)
+
+        self.assertEqual(report["clipped_samples"], 100)
+        self.assertFalse(report["usable"])
+
+    def test_rejects_recording_without_usable_pair(self):
+        good = assess_sensor(channels_with_loss(np.arange(600)), rate=60)
+        lossy = assess_sensor(channels_with_loss(np.arange(0, 600, 2)), rate=60)
+
+        check_recording_quality({1: good, 2: good, 3: lossy}, (("right", 1, 2), ("left", 3, 4)))
+        with self.assertRaises(RecordingQualityError):
+            check_recording_quality({1: good, 2: lossy}, (("right", 1, 2),))
+
+
+class ValidMaskTests(unittest.TestCase):
+    def test_long_gap_is_invalid_after_resampling(self):
+        keep = np.r_[0:100, 103:300, 330:600]
+        channels = channels_with_loss(keep)
+
+        aligned = align_sensors({1: channels, 2: channels}, {1: {"OutputRate": 60}, 2: {"OutputRate": 60}})
+        valid = aligned["sensors"][1]["valid"]
+
+        invalid_times = aligned["t"][~valid]
+        self.assertGreaterEqual(len(invalid_times), 30)
+        self.assertGreaterEqual(invalid_times.min(), 299 * 0.016667 - 1 / 60)
+        self.assertLessEqual(invalid_times.max(), 330 * 0.016667)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.filters import (
+    butter_sos,
+    derivative,
+    savgol_filter,
+    savgol_matrix,
+    smooth_derivative,
+    sos_response,
+    sosfilt,
+    sosfiltfilt,
+)
+
+
+def run_recursion(sos, x):
+    """Reference direct-form implementation of a second-order-section cascade."""
+    y = np.asarray(x, dtype=np.float64)
+    for b0, b1, b2, _a0, a1, a2 in sos:
+        out = np.zeros_like(y)
+        for n in range(len(y)):
+            out[n] = b0 * y[n]
+            if n >= 1:
+                out[n] += b1 * y[n - 1] - a1 * out[n - 1]
+            if n >= 2:
+                out[n] += b2 * y[n - 2] - a2 * out[n - 2]
+        y = out
+    return y
+
+
+class SavitzkyGolayTests(unittest.TestCase):
+    def test_classic_coefficients(self):
+        np.testing.assert_allclose(savgol_matrix(5, 2)[2], np.array([-3, 12, 17, 12, -3]) / 35)
+
+    def test_preserves_polynomials_including_edges(self):
+        x = np.linspace(-1, 1, 40)
+        quadratic = np.column_stack([3 * x**2 - x + 1, -2 * x**2])
+
+        np.testing.assert_allclose(savgol_filter(quadratic, 7, 2), quadratic, atol=1e-10)
+
+    def test_derivative_of_polynomial(self):
+        t = np.arange(50) * 0.01
+        np.testing.assert_allclose(savgol_filter(t**2, 9, 3, deriv=1, delta=0.01), 2 * t, atol=1e-8)
+
+
+class ButterworthTests(unittest.TestCase):
+    def test_lowpass_gain_at_dc_and_cutoff(self):
+        sos = butter_sos(4, 6.0, 60.0)
+        n_fft = 600
+        response = np.abs(sos_response(sos, n_fft))
+        freqs = np.fft.rfftfreq(n_fft, d=1 / 60.0)
+
+        self.assertAlmostEqual(response[0], 1.0, places=10)
+        self.assertAlmostEqual(response[np.argmin(np.abs(freqs - 6.0))], 1 / np.sqrt(2), places=6)
+        self.assertLess(response[-1], 1e-6)
+
+    def test_highpass_blocks_dc(self):
+        response = np.abs(sos_response(butter_sos(3, 1.0, 60.0, btype="high"), 600))
+
+        self.assertLess(response[0], 1e-12)
+        self.assertAlmostEqual(response[-1], 1.0, places=10)
+
+    def test_fft_filtering_matches_recursion(self):
+        sos = butter_sos(5, 4.0, 60.0)
+        x = np.random.default_rng(0).normal(size=300)
+
+        np.testing.assert_allclose(sosfilt(sos, x), run_recursion(sos, x), atol=1e-8)
+
+    def test_filtfilt_has_no_phase_lag(self):
+        t = np.arange(1200) / 60.0
+        slow = np.sin(2 * np.pi * 0.5 * t)
+        noisy = np.column_stack([slow + 0.3 * np.sin(2 * np.pi * 20 * t), 2 * slow])
+
+        filtered = sosfiltfilt(butter_sos(4, 6.0, 60.0), noisy)
+
+        np.testing.assert_allclose(filtered[60:-60, 0], slow[60:-60], atol=1e-3)
+        np.testing.assert_allclose(filtered[60:-60, 1], 2 * slow[60:-60], atol=1e-3)
+
+
+class DerivativeTests(unittest.TestCase):
+    def test_exact_for_quadratic_on_uneven_timestamps(self):
+        t = np.cumsum(np.random.default_rng(2).uniform(0.01, 0.03, 100))
+        np.testing.assert_allclose(derivative(t**2, t)[1:-1], 2 * t[1:-1], atol=1e-9)
+
+    def test_repeated_timestamp_gives_nan(self):
+        t = np.array([0.0, 0.1, 0.1, 0.2])
+        self.assertTrue(np.isnan(derivative(np.arange(4.0), t)).any())
+
+    def test_smoothing_reduces_velocity_noise(self):
+        t = np.arange(600) / 60.0
+        angles = 30 * np.sin(2 * np.pi * 0.5 * t) + np.random.default_rng(4).normal(0, 1.0, len(t))
+        true_velocity = 30 * np.pi * np.cos(np.pi * t)
+
+        raw_error = np.sqrt(np.mean((np.gradient(angles, t) - true_velocity) ** 2))
+        smooth_error = np.sqrt(np.mean((smooth_derivative(angles, t) - true_velocity) ** 2))
+
+        self.assertLess(smooth_error, 0.3 * raw_error)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import sys
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.gait import angular_speed, detect_heel_strikes, stride_times, summarize_gait
+from analysis.kinematics import quat_multiply
+
+
+def axis_angle(axis, degrees):
+    half = np.radians(np.asarray(degrees, dtype=np.float64)) / 2
+    axis = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    return np.column_stack([np.cos(half), np.sin(half)[:, None] * axis])
+
+
+def walking_shank(strides, rate=60, start=0.0, seed=0):
+    """
+    Shank rotating about its medio-lateral axis: a fast forward swing late
+    in each stride, a slow backward roll during stance, and a heel-strike
+    acceleration spike 0.15 s after peak swing.
+    """
+    boundaries = start + np.concatenate([[0.0], np.cumsum(strides)])
+    seconds = np.arange(int(boundaries[-1] * rate) + 1) / rate
+    stride = np.clip(np.searchsorted(boundaries, seconds, side="right") - 1, 0, len(strides) - 1)
+    phase = (seconds - boundaries[stride]) / np.asarray(strides)[stride]
+    phase = np.where(seconds < boundaries[0], -1.0, phase)
+
+    swing = 350.0 * np.exp(-(((phase - 0.75) / 0.07) ** 2))
+    rate_dps = np.where(phase >= 0, swing - 60.0, 0.0)
+    angle = np.cumsum(rate_dps) / rate
+    quats = quat_multiply(axis_angle([0, 0, 1], np.full(len(seconds), 20.0)), axis_angle([1, 0, 0], angle))
+
+    strike_times = boundaries[:-1] + 0.75 * np.asarray(strides) + 0.15
+    acc = np.zeros((len(seconds), 3))
+    acc[:, 2] = 25.0 * np.exp(-(((seconds[:, None] - strike_times[None, :]) / 0.02) ** 2)).sum(axis=1)
+    acc += np.random.default_rng(seed).normal(0.0, 0.3, acc.shape)
+    sensor = {"quat": quats, "FreeAcc_X": acc[:, 0], "FreeAcc_Y": acc[:, 1], "FreeAcc_Z": acc[:, 2]}
+    return seconds, sensor, strike_times
+
+
+class HeelStrikeTests(unittest.TestCase):
+    def test_finds_every_heel_strike(self):
+        strides = np.full(30, 1.1)
+        seconds, sensor, truth = walking_shank(strides)
+
+        strikes = detect_heel_strikes(angular_speed(sensor, seconds), seconds, np.column_stack(
+            [sensor["FreeAcc_X"], sensor["FreeAcc_Y"], sensor["FreeAcc_Z"]]
+        ))
+
+        self.assertEqual(len(strikes), len(truth))
+        np.testing.assert_allclose(seconds[strikes], truth, atol=1.5 / 60)
+
+    def test_falls_back_to_end_of_swing_without_acceleration(self):
+        seconds, sensor, truth = walking_shank(np.full(20, 1.2))
+
+        strikes = detect_heel_strikes(angular_speed(sensor, seconds), seconds)
+
+        self.assertEqual(len(strikes), len(truth))
+        # End of swing comes close to, not exactly at, the impact
+        self.assertLess(np.max(np.abs(seconds[strikes] - truth)), 0.2)
+
+    def test_pauses_are_excluded_from_stride_times(self):
+        strides = stride_times([0.0, 1.1, 2.2, 8.0, 9.1])
+
+        np.testing.assert_allclose(strides, [1.1, 1.1, 1.1])
+
+
+class GaitSummaryTests(unittest.TestCase):
+    def test_cadence_and_variability(self):
+        rng = np.random.default_rng(3)
+        right_strides = 1.1 + rng.normal(0.0, 0.03, 50)
+        left_strides = 1.1 + rng.normal(0.0, 0.03, 50)
+        seconds, right, right_truth = walking_shank(right_strides)
+        _, left, left_truth = walking_shank(left_strides, start=0.55, seed=1)
+        n = min(len(seconds), len(left["quat"]))
+        left = {name: values[:n] for name, values in left.items()}
+        right = {name: values[:n] for name, values in right.items()}
+
+        gait = summarize_gait({"right": right, "left": left}, seconds[:n])
+
+        self.assertGreaterEqual(gait["steps"], 97)
+        self.assertAlmostEqual(gait["cadence"], 120.0 / 1.1, delta=1.5)
+        true_strides = [np.diff(truth[truth < seconds[n - 1]]) for truth in (right_truth, left_truth)]
+        expected_cv = np.mean([np.std(s, ddof=1) / np.mean(s) * 100 for s in true_strides])
+        self.assertAlmostEqual(gait["stride_time_cv"], expected_cv, delta=0.5)
+        self.assertEqual(set(gait["sides"]), {"left", "right"})
+
+    def test_long_recording_is_fast(self):
+        seconds, sensor, truth = walking_shank(np.full(600, 1.1))  # 11 minutes
+        started = time.perf_counter()
+
+        gait = summarize_gait({"right": sensor}, seconds)
+
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(gait["steps"], len(truth))
+
+    def test_no_usable_sensor(self):
+        self.assertIsNone(summarize_gait({"left": {"valid": np.ones(10, dtype=bool)}}, np.arange(10) / 60))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.hip import hip_abduction_series, hip_flexion_series
+from analysis.kinematics import (
+    quat_conjugate,
+    quat_from_euler_zyx,
+    quat_multiply,
+    quat_to_matrix,
+    relative_rotation,
+    rotate_vectors,
+    unwrap_degrees,
+)
+from analysis.pipeline import analyze_sensors
+
+
+def axis_angle(axis, degrees):
+    half = np.radians(np.asarray(degrees, dtype=np.float64)) / 2
+    axis = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    return np.column_stack([np.cos(half), np.sin(half)[:, None] * axis])
+
+
+def hip_motion(reps=5, period=2.0, rate=60, amplitude=40.0, still=1.0):
+    seconds = np.arange(int((reps * period + still) * rate)) / rate
+    moving = np.clip(seconds - still, 0.0, None)
+    flexion = amplitude * (1 - np.cos(2 * np.pi * moving / period)) / 2
+    # Pelvis yawed 30 deg; flexion swings the thigh's -Y bone axis towards
+    # the pelvis +z (forward), a negative rotation about x (right)
+    pelvis = axis_angle([0, 1, 0], np.full(len(seconds), 30.0))
+    thigh = quat_multiply(pelvis, axis_angle([1, 0, 0], -flexion))
+    return seconds, pelvis, thigh, flexion
+
+
+class QuaternionTests(unittest.TestCase):
+    def test_hamilton_product_composes_rotations(self):
+        rng = np.random.default_rng(0)
+        a = rng.normal(size=(20, 4))
+        a /= np.linalg.norm(a, axis=1, keepdims=True)
+        b = rng.normal(size=(20, 4))
+        b /= np.linalg.norm(b, axis=1, keepdims=True)
+        v = np.array([0.3, -1.0, 0.5])
+
+        np.testing.assert_allclose(
+            rotate_vectors(quat_multiply(a, b), v), rotate_vectors(a, rotate_vectors(b, v)), atol=1e-12
+        )
+        np.testing.assert_allclose(quat_to_matrix(a) @ v, rotate_vectors(a, v), atol=1e-12)
+
+    def test_relative_rotation_is_parent_transpose_times_child(self):
+        p = quat_from_euler_zyx([10.0], [20.0], [30.0])
+        c = quat_from_euler_zyx([-5.0], [40.0], [15.0])
+
+        np.testing.assert_allclose(
+            quat_to_matrix(relative_rotation(p, c)),
+            np.swapaxes(quat_to_matrix(p), 1, 2) @ quat_to_matrix(c),
+            atol=1e-12,
+        )
+        np.testing.assert_allclose(quat_multiply(p, quat_conjugate(p)), [[1, 0, 0, 0]], atol=1e-12)
+
+    def test_unwrap_removes_360_jumps(self):
+        np.testing.assert_allclose(unwrap_degrees(np.array([170.0, 179.0, -178.0, -170.0])), [170, 179, 182, 190])
+
+
+class HipSeriesTests(unittest.TestCase):
+    def test_flexion_recovered_in_pelvis_frame(self):
+        seconds, pelvis, thigh, flexion = hip_motion()
+
+        result = hip_flexion_series(pelvis, thigh, seconds)
+
+        self.assertAlmostEqual(result["rom"], 40.0, delta=0.5)
+        np.testing.assert_allclose(result["angles"], flexion, atol=0.5)
+
+    def test_pure_flexion_has_no_abduction(self):
+        seconds, pelvis, thigh, _ = hip_motion()
+
+        np.testing.assert_allclose(hip_abduction_series(pelvis, thigh, seconds), 0.0, atol=1e-6)
+
+    def test_abduction_angle(self):
+        seconds = np.arange(240) / 60
+        angle = np.where(seconds > 1.0, 20.0, 0.0)
+        pelvis = axis_angle([0, 0, 1], np.zeros(len(seconds)))
+        thigh = axis_angle([0, 0, 1], angle)
+
+        abduction = hip_abduction_series(pelvis, thigh, seconds)
+
+        self.assertAlmostEqual(abs(abduction[-1]), 20.0, places=6)
+
+
+class HipPipelineTests(unittest.TestCase):
+    def test_analyze_sensors_emits_hip_rows(self):
+        seconds, pelvis, thigh, _ = hip_motion()
+        ticks = (seconds * 1e6).astype(np.uint32)
+
+        def channels(quats):
+            # Back to Euler ZYX degrees as stored in the CSV export
+            w, x, y, z = quats.T
+            return {
+                "SampleTimeFine": ticks,
+                "Euler_X": np.degrees(np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))),
+                "Euler_Y": np.degrees(np.arcsin(np.clip(2 * (w * y - z * x), -1, 1))),
+                "Euler_Z": np.degrees(np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))),
+            }
+
+        rows = analyze_sensors({5: channels(pelvis), 3: channels(thigh)}, {5: {"OutputRate": 60}, 3: {"OutputRate": 60}})
+
+        self.assertEqual([(r["joint"], r["side"]) for r in rows], [("hip", "left")])
+        self.assertEqual(rows[0]["repetition"], 5)
+        self.assertAlmostEqual(rows[0]["max_rom"] - rows[0]["min_rom"], 40.0, delta=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
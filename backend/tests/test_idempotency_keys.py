@@ -0,0 +1,129 @@
+import io
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+
+
+class IdempotencyKeyTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "patient-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        user = {"ID": "patient-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        self.patches = [
+            patch.object(backend_app, "get_user_by_id", return_value=user),
+            patch.object(backend_app, "is_db_enabled", return_value=True),
+            patch.object(backend_app, "get_session_by_id", return_value={"ID": "s-1", "PatientID": "patient-1"}),
+        ]
+        for p in self.patches:
+            p.start()
+        self.store = patch.object(backend_app, "store_idempotent_response").start()
+        self.release = patch.object(backend_app, "release_idempotency_key").start()
+        self.insert = patch.object(backend_app, "insert_session_metrics", return_value="m-1").start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def post(self, key=None, body=None, claimed=None):
+        headers = dict(self.headers, **({"Idempotency-Key": key} if key else {}))
+        with patch.object(backend_app, "claim_idempotency_key", return_value=claimed) as claim:
+            response = self.client.post("/sessions/s-1/metrics", json=body or {"avg_rom": 40}, headers=headers)
+        return response, claim
+
+    def test_without_key_nothing_is_stored(self):
+        response, claim = self.post()
+
+        self.assertEqual(response.status_code, 201)
+        claim.assert_not_called()
+        self.store.assert_not_called()
+
+    def test_first_response_is_stored_and_replayed(self):
+        response, claim = self.post("retry-1")
+
+        self.assertEqual(response.status_code, 201)
+        key_hash, request_hash, _, _ = claim.call_args.args
+        status, content_type, body = self.store.call_args.args[1:]
+        self.assertEqual((self.store.call_args.args[0], status, content_type), (key_hash, 201, "application/json"))
+
+        stored = {"RequestHash": request_hash, "StatusCode": status, "ContentType": content_type, "Body": body}
+        replay, _ = self.post("retry-1", claimed=stored)
+
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.get_json(), response.get_json())
+        self.assertEqual(replay.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(self.insert.call_count, 1)
+
+    def test_key_reused_for_another_request(self):
+        _, claim = self.post("retry-1")
+        stored = {"RequestHash": claim.call_args.args[1], "StatusCode": 201, "ContentType": "application/json", "Body": b"{}"}
+
+        response, _ = self.post("retry-1", body={"avg_rom": 41}, claimed=stored)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.insert.call_count, 1)
+
+    def test_request_in_progress(self):
+        _, claim = self.post("retry-1")
+        stored = {"RequestHash": claim.call_args.args[1], "StatusCode": None, "ContentType": None, "Body": None}
+
+        response, _ = self.post("retry-1", claimed=stored)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+    def test_server_errors_release_the_key(self):
+        self.insert.side_effect = RuntimeError("db down")
+
+        response, claim = self.post("retry-1")
+
+        self.assertEqual(response.status_code, 500)
+        self.release.assert_called_once_with(claim.call_args.args[0])
+        self.store.assert_not_called()
+
+    def test_keys_are_scoped_per_user(self):
+        _, first = self.post("retry-1")
+        other = {"ID": "patient-2", "Role": "Patient", "Email": "q@example.com", "FirstName": "Q", "LastName": "Two"}
+        token = PyJWT.encode({"user_id": "patient-2"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        with patch.object(backend_app, "get_user_by_id", return_value=other), \
+             patch.object(backend_app, "get_session_by_id", return_value={"ID": "s-1", "PatientID": "patient-2"}), \
+             patch.object(backend_app, "claim_idempotency_key", return_value=None) as second:
+            self.client.post("/sessions/s-1/metrics", json={"avg_rom": 40},
+                             headers={"Authorization": f"Bearer {token}", "Idempotency-Key": "retry-1"})
+
+        self.assertNotEqual(first.call_args.args[0], second.call_args.args[0])
+
+    def test_feedback_route_is_keyed_too(self):
+        with patch.object(backend_app, "insert_feedback", return_value="f-1") as insert, \
+             patch.object(backend_app, "claim_idempotency_key", return_value=None):
+            response = self.client.post(
+                "/sessions/s-1/feedback", json={"pain": 1, "fatigue": 2, "difficulty": 3},
+                headers=dict(self.headers, **{"Idempotency-Key": "fb-1"}),
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(insert.call_args.args, ("patient-1", {"pain": 1, "fatigue": 2, "difficulty": 3, "sessionId": "s-1"}))
+        self.assertEqual(self.store.call_args.args[1], 201)
+
+    def test_upload_fingerprint_covers_file_and_leaves_it_readable(self):
+        def fingerprint(content):
+            data = {"patient_id": "patient-1", "file": (io.BytesIO(content), "recording.zip")}
+            with backend_app.app.test_request_context("/movement/analyze", method="POST", data=data):
+                digest = backend_app._request_fingerprint()
+                return digest, backend_app.request.files["file"].read()
+
+        first, remaining = fingerprint(b"sensor data")
+
+        self.assertEqual(remaining, b"sensor data")
+        self.assertEqual(first, fingerprint(b"sensor data")[0])
+        self.assertNotEqual(first, fingerprint(b"other data")[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import db
+from analysis.downsample import lttb, lttb_indices
+
+
+class LttbTests(unittest.TestCase):
+    def test_keeps_endpoints_and_extremes(self):
+        x = np.arange(1000, dtype=np.float64)
+        y = np.sin(x / 50.0)
+        y[437] = 5.0
+        y[812] = -4.0
+
+        indices = lttb_indices(x, y, 50)
+
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(437, indices)
+        self.assertIn(812, indices)
+
+    def test_short_series_are_returned_whole(self):
+        x, y = lttb([1.0, 2.0, 3.0], [4.0, 5.0, 6.0], 10)
+
+        np.testing.assert_array_equal(x, [1.0, 2.0, 3.0])
+        np.testing.assert_array_equal(y, [4.0, 5.0, 6.0])
+
+    def test_uneven_spacing_uses_real_x(self):
+        x = np.concatenate([np.arange(100.0), 1000.0 + np.arange(100.0)])
+        y = np.ones(200)
+        y[150] = 10.0
+
+        self.assertIn(150, lttb_indices(x, y, 10))
+
+
+class MetricSeriesQueryTests(unittest.TestCase):
+    def test_merges_rows_and_packed_entries_in_time_order(self):
+        day = datetime(2025, 1, 1)
+        packed = db.pack_metrics([
+            {"repetition": 1, "min_v": 0, "max_v": 0, "avg_v": 0, "p95_v": 0, "min_rom": 0, "max_rom": 0,
+             "avg_rom": rom, "cmd": 0, "now": (day + timedelta(days=2, minutes=minute)).replace(tzinfo=timezone.utc)}
+            for rom, minute in ((30.0, 5), (20.0, 1))
+        ])
+
+        def fake_stream(sql, params, batch_size):
+            if "metrics_packed" in sql:
+                return iter([("knee", "right", day + timedelta(days=2), "p-1", packed, "s-2")])
+            return iter([
+                ("knee", "right", day, day, 10.0, "s-1"),
+                ("knee", "right", day + timedelta(days=3), day + timedelta(days=3), 40.0, "s-3"),
+            ])
+
+        with patch.dict(os.environ, {"METRICS_STORAGE": "packed"}), \
+             patch.object(db, "_stream_rows", side_effect=fake_stream):
+            rows = list(db.iter_patient_metric_series("patient-1", "AvgROM", joint="knee"))
+
+        self.assertEqual([(value, session) for _j, _s, _t, value, session in rows],
+                         [(10.0, "s-1"), (20.0, "s-2"), (30.0, "s-2"), (40.0, "s-3")])
+
+    def test_rejects_unknown_columns(self):
+        with self.assertRaises(ValueError):
+            list(db.iter_patient_metric_series("patient-1", "ID; DROP TABLE metrics"))
+
+
+class MetricSeriesEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "patient-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        user = {"ID": "patient-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        self.user_patch = patch.object(backend_app, "get_user_by_id", return_value=user)
+        self.user_patch.start()
+
+    def tearDown(self):
+        self.user_patch.stop()
+
+    def test_downsamples_each_joint_side(self):
+        start = datetime(2025, 1, 1)
+        rows = [
+            ("knee", side, start + timedelta(hours=i), float(i % 7), f"s-{i}")
+            for i in range(500)
+            for side in ("left", "right")
+        ]
+        with patch.object(backend_app, "iter_patient_metric_series", return_value=iter(rows)) as series:
+            response = self.client.get(
+                "/patients/patient-1/metrics/series?metric=avg_rom&points=20", headers=self.headers
+            )
+
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["metric"], "AvgROM")
+        self.assertEqual(series.call_args.args, ("patient-1", "AvgROM", None, None))
+        self.assertEqual([(s["side"], s["total"], len(s["values"])) for s in body["series"]],
+                         [("left", 500, 20), ("right", 500, 20)])
+        self.assertEqual(body["series"][0]["t"][0], "2025-01-01T00:00:00+00:00")
+        self.assertEqual(body["series"][0]["sessionIds"][-1], "s-499")
+
+    def test_rejects_unknown_metric(self):
+        response = self.client.get("/patients/patient-1/metrics/series?metric=Password", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_patients_are_forbidden(self):
+        with patch.object(backend_app, "iter_patient_metric_series") as series:
+            response = self.client.get("/patients/patient-2/metrics/series", headers=self.headers)
+
+        self.assertEqual(response.status_code, 403)
+        series.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
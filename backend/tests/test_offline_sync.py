@@ -0,0 +1,141 @@
+import sys
+import unittest
+from datetime import date, datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import jwt as PyJWT
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import db
+
+
+def fake_engine(owned_sessions=()):
+    connection = MagicMock()
+    connection.execute.return_value = [(session_id,) for session_id in owned_sessions]
+    engine = MagicMock()
+    engine.begin.return_value.__enter__.return_value = connection
+    return engine, connection
+
+
+def statements(connection):
+    return [" ".join(str(call.args[0]).split()) for call in connection.execute.call_args_list]
+
+
+class ApplyPatientSyncTests(unittest.TestCase):
+    def apply(self, sessions=(), metrics=(), feedback=(), owned_sessions=()):
+        engine, connection = fake_engine(owned_sessions)
+        with patch.object(db, "_engine", engine), \
+             patch.object(db, "_session_patient_week", return_value=("p-1", date(2025, 3, 3))), \
+             patch.object(db, "_rebuild_weekly_rollups") as rebuild:
+            applied = db.apply_patient_sync("p-1", "rel-1", list(sessions), list(metrics), list(feedback))
+        return applied, connection, rebuild
+
+    def test_replaying_a_batch_upserts_the_same_rows(self):
+        batch = {
+            "sessions": [{"client_id": "s-a", "exercise_type": "squat", "repetitions": 10}],
+            "metrics": [{"client_id": "m-a", "session_client_id": "s-a", "joint": "knee", "side": "left", "max_rom": 90}],
+            "feedback": [{"client_id": "f-a", "session_client_id": "s-a", "pain": 2, "fatigue": 3, "difficulty": 1}],
+        }
+
+        first, connection, rebuild = self.apply(**batch)
+        second, _, _ = self.apply(**batch)
+
+        self.assertEqual(first, second)
+        session_id = first["sessions"]["s-a"]
+        self.assertEqual(session_id, db.sync_record_id("p-1", "session", "s-a"))
+        self.assertNotEqual(session_id, db.sync_record_id("p-2", "session", "s-a"))
+        upserts = statements(connection)
+        self.assertEqual(len(upserts), 3)
+        self.assertTrue(all("ON DUPLICATE KEY UPDATE" in sql for sql in upserts))
+        metrics_params = connection.execute.call_args_list[1].args[1]
+        self.assertEqual((metrics_params[0]["id"], metrics_params[0]["session_id"]), (first["metrics"]["m-a"], session_id))
+        rebuild.assert_called_once_with(connection, "p-1", date(2025, 3, 3))
+
+    def test_references_to_other_patients_sessions_are_rejected(self):
+        metrics = [{"client_id": "m-a", "session_id": "s-own", "joint": "hip"},
+                   {"client_id": "m-b", "session_id": "s-foreign", "joint": "hip"}]
+
+        with self.assertRaises(db.SyncReferenceError) as raised:
+            self.apply(metrics=metrics, owned_sessions=["s-own"])
+
+        self.assertIn("s-foreign", str(raised.exception))
+
+    def test_unsupported_joints_are_skipped(self):
+        applied, connection, _ = self.apply(
+            metrics=[{"client_id": "m-a", "session_id": "s-own", "joint": "com"}], owned_sessions=["s-own"]
+        )
+
+        self.assertEqual(applied["metrics"], {"m-a": None})
+        connection.execute.assert_not_called()
+
+    def test_new_sessions_need_a_relation(self):
+        with patch.object(db, "_engine", fake_engine()[0]), self.assertRaises(db.SyncReferenceError):
+            db.apply_patient_sync("p-1", None, [{"client_id": "s-a"}], [], [])
+
+    def test_closed_relations_are_not_used(self):
+        with patch.object(db, "fetch_one", return_value=None) as fetch_one:
+            self.assertIsNone(db.get_patient_relation("p-1"))
+
+        self.assertIn("AND Active = 1", fetch_one.call_args.args[0])
+
+
+class SyncEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "p-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.user = {"ID": "p-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+
+    def post(self, body, patient_id="p-1"):
+        changes = {"sessions": [], "metrics": [], "feedback": []}
+        with patch.object(backend_app, "get_user_by_id", return_value=self.user), \
+             patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(backend_app, "get_patient_relation", return_value={"ID": "rel-1"}), \
+             patch.object(backend_app, "apply_patient_sync", return_value={"sessions": {}}) as apply, \
+             patch.object(backend_app, "get_changes_cursor", return_value=datetime(2025, 3, 10, 12, 0)), \
+             patch.object(backend_app, "get_patient_changes_since", return_value=changes) as since:
+            response = self.client.post(f"/patients/{patient_id}/sync", json=body, headers=self.headers)
+        return response, apply, since
+
+    def test_applies_batch_and_returns_changes(self):
+        body = {
+            "cursor": "2025-03-10T11:00:00+01:00",
+            "sessions": [{"clientId": "s-a", "exerciseType": "squat"}],
+            "metrics": [{"clientId": "m-a", "sessionClientId": "s-a", "maxFlexion": 95, "joint": "knee"}],
+            "feedback": [{"clientId": "f-a", "sessionId": "s-old", "pain": 0, "fatigue": 1, "difficulty": 2}],
+        }
+
+        response, apply, since = self.post(body)
+
+        self.assertEqual(response.status_code, 200)
+        patient_id, relation_id, sessions, metrics, feedback = apply.call_args.args
+        self.assertEqual((patient_id, relation_id), ("p-1", "rel-1"))
+        self.assertEqual(sessions[0]["exercise_type"], "squat")
+        self.assertEqual((metrics[0]["client_id"], metrics[0]["session_client_id"], metrics[0]["max_rom"]), ("m-a", "s-a", 95))
+        self.assertEqual((feedback[0]["session_id"], feedback[0]["pain"]), ("s-old", 0))
+        self.assertEqual(since.call_args.args, ("p-1", datetime(2025, 3, 10, 10, 0)))
+        self.assertEqual(response.get_json()["cursor"], "2025-03-10T12:00:00")
+
+    def test_rejects_malformed_records(self):
+        for body in (
+            {"sessions": [{"exerciseType": "squat"}]},
+            {"metrics": [{"clientId": "m-a"}]},
+            {"feedback": [{"clientId": "f-a", "sessionId": "s-1", "pain": 1}]},
+            {"cursor": "yesterday"},
+        ):
+            response, apply, _ = self.post(body)
+            self.assertEqual(response.status_code, 400, body)
+            apply.assert_not_called()
+
+    def test_other_patients_are_forbidden(self):
+        response, apply, _ = self.post({}, patient_id="p-2")
+
+        self.assertEqual(response.status_code, 403)
+        apply.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
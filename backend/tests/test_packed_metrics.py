@@ -0,0 +1,147 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import compact_metrics
+import db
+
+NOW = datetime(2025, 3, 1, 9, 30, 15, 600000, tzinfo=timezone.utc)
+
+
+def metrics_params(repetition, side="right"):
+    return db._build_metrics_params("session-1", {
+        "joint": "knee", "side": side, "repetition": repetition,
+        "min_velocity": 1.5, "max_velocity": 120.25, "avg_velocity": 40.0, "p95_velocity": 100.0,
+        "min_rom": 2.0, "max_rom": 85.5, "avg_rom": 33.3, "center_mass_displacement": 24.1,
+    }, NOW)
+
+
+class PackedMetricsFormatTests(unittest.TestCase):
+    def test_unpacks_to_metrics_table_shape(self):
+        params = [metrics_params(rep) for rep in range(1, 4)]
+        blob = db.pack_metrics(params)
+
+        rows = db.unpack_metrics_rows({"ID": "packed-1", "SessionID": "session-1", "Joint": "knee", "Side": "right", "Data": blob})
+
+        self.assertEqual(len(blob), 12 + 8 * len(db.PACKED_METRICS_COLUMNS) * 3)
+        self.assertEqual([row["ID"] for row in rows], ["packed-1:0", "packed-1:1", "packed-1:2"])
+        self.assertEqual([row["Repetitions"] for row in rows], [1, 2, 3])
+        self.assertEqual(rows[0]["MaxVelocity"], 120.25)
+        self.assertEqual(rows[0]["CenterMassDisplacement"], 24.1)
+        self.assertEqual(rows[0]["TimeCreated"], "2025-03-01 09:30:16")
+        self.assertEqual(
+            set(rows[0]),
+            {"ID", "SessionID", "Joint", "Side"} | {name for name, _key in db.PACKED_METRICS_COLUMNS},
+        )
+
+    def test_appending_round_trips_existing_entries(self):
+        blob = db.pack_metrics([metrics_params(1), metrics_params(2)])
+
+        again = db.pack_metrics(db._packed_metrics_params(db.unpack_metrics(blob)))
+
+        self.assertEqual(again, blob)
+
+    def test_rejects_foreign_or_truncated_blobs(self):
+        blob = db.pack_metrics([metrics_params(1)])
+        for broken in (blob[:8], blob[:-1], b"XXXX" + blob[4:]):
+            with self.assertRaises(ValueError):
+                db.unpack_metrics(broken)
+
+
+class PackedMetricsReadTests(unittest.TestCase):
+    def test_session_read_merges_rows_and_blobs(self):
+        legacy = {"ID": "row-1", "SessionID": "session-1", "Joint": "knee", "Side": "left", "Repetitions": 2,
+                  "TimeCreated": datetime(2025, 1, 1)}
+        packed = {"ID": "packed-1", "SessionID": "session-1", "Joint": "knee", "Side": "right",
+                  "Data": db.pack_metrics([metrics_params(1), metrics_params(3)])}
+
+        def fake_fetch_all(sql, params=None):
+            return [packed] if "metrics_packed" in sql else [dict(legacy)]
+
+        with patch.dict(os.environ, {"METRICS_STORAGE": "packed"}), \
+             patch.object(db, "fetch_all", side_effect=fake_fetch_all):
+            rows = db.get_metrics_by_session("session-1")
+
+        self.assertEqual([(row["ID"], row["Repetitions"]) for row in rows],
+                         [("packed-1:0", 1), ("row-1", 2), ("packed-1:1", 3)])
+        self.assertEqual(rows[1]["TimeCreated"], "2025-01-01 00:00:00")
+
+    def test_row_storage_does_not_touch_packed_table(self):
+        with patch.dict(os.environ, {"METRICS_STORAGE": ""}), \
+             patch.object(db, "fetch_all", return_value=[]) as fetch_all:
+            db.get_metrics_by_session("session-1")
+
+        self.assertEqual(fetch_all.call_count, 1)
+
+
+class PackedMetricsWriteTests(unittest.TestCase):
+    def test_single_entries_are_buffered_as_rows(self):
+        connection = MagicMock()
+        engine = MagicMock()
+        engine.begin.return_value.__enter__.return_value = connection
+
+        with patch.dict(os.environ, {"METRICS_STORAGE": "packed"}), patch.object(db, "_engine", engine), \
+             patch.object(db, "_add_to_weekly_rollups"):
+            metric_id = db.insert_session_metrics("session-1", {"joint": "knee", "side": "left", "avg_rom": 40})
+
+        sql = [str(call.args[0]) for call in connection.execute.call_args_list]
+        self.assertEqual(len(sql), 1)
+        self.assertIn("INSERT INTO metrics (", sql[0])
+        self.assertNotIn("metrics_packed", sql[0])
+        self.assertEqual(connection.execute.call_args.args[1]["id"], metric_id)
+
+
+class CompactMetricsCliTests(unittest.TestCase):
+    def run_cli(self, storage, *extra, sessions=()):
+        batches = [list(sessions), []]
+        with patch.dict(os.environ, {"METRICS_STORAGE": storage}), \
+             patch.object(compact_metrics, "is_db_enabled", return_value=True), \
+             patch.object(compact_metrics, "list_unpacked_metrics_sessions",
+                          side_effect=lambda limit, idle_since: batches.pop(0)) as listed, \
+             patch.object(compact_metrics, "compact_session_metrics", side_effect=lambda sid: 10) as compact, \
+             redirect_stdout(io.StringIO()) as output:
+            exit_code = compact_metrics.main(list(extra))
+        self.listed = listed
+        return exit_code, compact, output.getvalue()
+
+    def test_refuses_unless_packed_storage_is_enabled(self):
+        exit_code, compact, _ = self.run_cli("rows", sessions=[{"SessionID": "s-1", "RowCount": 10, "GroupCount": 2}])
+
+        self.assertEqual(exit_code, 1)
+        compact.assert_not_called()
+
+    def test_compacts_every_session(self):
+        sessions = [{"SessionID": f"s-{i}", "RowCount": 10, "GroupCount": 2} for i in range(3)]
+
+        exit_code, compact, output = self.run_cli("packed", sessions=sessions)
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([call.args[0] for call in compact.call_args_list], ["s-0", "s-1", "s-2"])
+        self.assertIn("Packed 30 metrics rows of 3 sessions into 6 blobs", output)
+
+    def test_idle_minutes_skips_sessions_still_recording(self):
+        self.run_cli("packed", "--idle-minutes", "30", sessions=[])
+
+        limit, idle_since = self.listed.call_args.args
+        self.assertAlmostEqual(
+            (datetime.now(timezone.utc).replace(tzinfo=None) - idle_since).total_seconds(), 1800, delta=60
+        )
+
+    def test_dry_run_changes_nothing(self):
+        sessions = [{"SessionID": "s-1", "RowCount": 40, "GroupCount": 2}]
+
+        exit_code, compact, output = self.run_cli("rows", "--dry-run", sessions=sessions)
+
+        self.assertEqual(exit_code, 0)
+        compact.assert_not_called()
+        self.assertIn("Would pack 40 metrics rows of 1 sessions into 2 blobs (20.0x fewer rows)", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
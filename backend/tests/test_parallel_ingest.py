@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from analysis import analyze_sensors, decode_movella_zip
+from analysis import ingest
+from analysis.ingest import preprocess_channels
+from test_recording_archive import build_movella_zip
+
+
+class ParallelIngestTests(unittest.TestCase):
+    def test_parallel_decode_matches_sequential(self):
+        # workers=1 decodes in process, so its arrays outlive the block
+        with decode_movella_zip(build_movella_zip(samples=400), workers=1) as expected:
+            pass
+
+        with decode_movella_zip(build_movella_zip(samples=400), workers=3) as sensors:
+            self.assertEqual(sorted(sensors), sorted(expected))
+            for tag, parsed in sensors.items():
+                self.assertEqual(parsed["header"]["DeviceTag"], tag)
+                for name, values in expected[tag]["channels"].items():
+                    np.testing.assert_array_equal(parsed["channels"][name], values)
+            metrics = analyze_sensors({tag: parsed["channels"] for tag, parsed in sensors.items()})
+
+        self.assertEqual({row["side"] for row in metrics}, {"left", "right"})
+
+    def test_uploads_use_the_configured_workers(self):
+        with patch.dict(os.environ, {"ANALYSIS_WORKERS": "2"}), \
+             decode_movella_zip(build_movella_zip(samples=50)) as sensors:
+            self.assertEqual(sorted(sensors), [1, 2, 3, 4, 5])
+            self.assertEqual(ingest._pool_workers, 2)
+
+        with patch.dict(os.environ, {"ANALYSIS_WORKERS": "1"}), patch.object(ingest, "_get_pool") as get_pool, \
+             decode_movella_zip(build_movella_zip(samples=50)):
+            pass
+        get_pool.assert_not_called()
+
+    @unittest.skipUnless(os.path.isdir("/dev/shm"), "POSIX shared memory only")
+    def test_shared_memory_is_released(self):
+        with decode_movella_zip(build_movella_zip(), workers=2):
+            pass  # starts the pool, whose own semaphores outlive the call
+        before = set(os.listdir("/dev/shm"))
+        with decode_movella_zip(build_movella_zip(), workers=2):
+            pass
+        self.assertEqual(set(os.listdir("/dev/shm")) - before, set())
+
+    def test_preprocess_drops_repeated_packets_and_sorts(self):
+        channels = {
+            "PacketCounter": np.array([0, 2, 1, 2, 3], dtype=np.uint32),
+            "SampleTimeFine": np.array([0, 200, 100, 200, 300], dtype=np.uint32),
+            "Euler_X": np.array([0.0, 2.0, 1.0, 2.0, 3.0], dtype=np.float32),
+        }
+
+        cleaned = preprocess_channels(channels)
+
+        np.testing.assert_array_equal(cleaned["PacketCounter"], [0, 1, 2, 3])
+        np.testing.assert_array_equal(cleaned["Euler_X"], [0.0, 1.0, 2.0, 3.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import csv
+import io
+import sys
+import unittest
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import patient_export
+from db import build_temporary_access_email
+
+
+def metric_rows(count):
+    at = datetime(2025, 3, 10, 11, 0)
+    for i in range(count):
+        yield {"ID": f"m-{i}", "SessionID": "s-1", "Joint": "knee", "Side": "left", "Repetitions": i,
+               "MaxROM": 90.0 + i % 7, "TimeCreated": at + timedelta(seconds=i)}
+
+
+def export_rows(table, patient_id):
+    rows = {
+        "sessions": [{"ID": "s-1", "ExerciseType": "squat", "Repetitions": 10,
+                      "Duration": timedelta(minutes=5), "TimeCreated": datetime(2025, 3, 10, 11, 0)}],
+        "metrics": metric_rows(3),
+        "feedback": [{"ID": "f-1", "SessionID": "s-1", "Pain": 2, "Comments": "ok, I guess"}],
+    }
+    return iter(rows[table])
+
+
+class StreamCsvZipTests(unittest.TestCase):
+    def test_members_use_data_descriptors_and_stream_in_chunks(self):
+        columns = patient_export.EXPORT_COLUMNS["metrics"]
+        chunks = list(patient_export.stream_csv_zip([("metrics.csv", columns, metric_rows(20000))]))
+
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            info = archive.getinfo("metrics.csv")
+            self.assertTrue(info.flag_bits & 0x08)
+            rows = list(csv.DictReader(io.StringIO(archive.read("metrics.csv").decode("utf-8"))))
+        self.assertEqual(len(rows), 20000)
+        self.assertEqual(rows[-1]["ID"], "m-19999")
+        self.assertEqual(rows[0]["TimeCreated"], "2025-03-10T11:00:00")
+        self.assertEqual(rows[0]["MinROM"], "")
+
+
+class PatientExportEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "patient-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        user = {"ID": "patient-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        self.user_patch = patch.object(backend_app, "get_user_by_id", return_value=user)
+        self.user_patch.start()
+
+    def tearDown(self):
+        self.user_patch.stop()
+
+    def test_streams_zip_with_all_tables(self):
+        profile = {
+            "ID": "patient-1", "Email": build_temporary_access_email("IRHIS-000007"), "FirstName": "Patient",
+            "LastName": "IRHIS-000007", "Role": "Patient", "BirthDate": datetime(1980, 5, 1), "Sex": "female",
+        }
+        with patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(backend_app, "get_patient_by_id", return_value=profile), \
+             patch.object(patient_export, "iter_patient_export_rows", side_effect=export_rows):
+            response = self.client.get("/patients/patient-1/export", headers=self.headers)
+            self.assertTrue(response.is_streamed)
+            body = response.get_data()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/zip")
+        self.assertIn("patient-IRHIS-000007-export.zip", response.headers["Content-Disposition"])
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertEqual(archive.namelist(), ["profile.csv", "sessions.csv", "metrics.csv", "feedback.csv"])
+            profile_row = next(csv.DictReader(io.StringIO(archive.read("profile.csv").decode("utf-8"))))
+            sessions = list(csv.DictReader(io.StringIO(archive.read("sessions.csv").decode("utf-8"))))
+            feedback = list(csv.DictReader(io.StringIO(archive.read("feedback.csv").decode("utf-8"))))
+        self.assertEqual((profile_row["AccessCode"], profile_row["Email"], profile_row["BirthDate"]),
+                         ("IRHIS-000007", "", ""))
+        self.assertEqual(sessions[0]["Duration"], "0:05:00")
+        self.assertEqual(feedback[0]["Comments"], "ok, I guess")
+
+    def test_other_patients_are_forbidden(self):
+        with patch.object(backend_app, "get_patient_by_id") as get_patient:
+            response = self.client.get("/patients/patient-2/export", headers=self.headers)
+
+        self.assertEqual(response.status_code, 403)
+        get_patient.assert_not_called()
+
+    def test_unrelated_doctors_are_forbidden(self):
+        token = PyJWT.encode({"user_id": "doctor-9"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        doctor = {"ID": "doctor-9", "Role": "Doctor", "Email": "d@example.com", "FirstName": "D", "LastName": "Nine"}
+        with patch.object(backend_app, "get_user_by_id", return_value=doctor), \
+             patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(backend_app, "get_patient_doctor_relation", return_value=None) as relation, \
+             patch.object(backend_app, "get_patient_by_id") as get_patient:
+            response = self.client.get("/patients/patient-1/export", headers={"Authorization": f"Bearer {token}"})
+
+        self.assertEqual(response.status_code, 403)
+        relation.assert_called_once_with("patient-1", "doctor-9")
+        get_patient.assert_not_called()
+
+    def test_unknown_patient(self):
+        with patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(backend_app, "get_patient_by_id", return_value=None):
+            response = self.client.get("/patients/patient-1/export", headers=self.headers)
+
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
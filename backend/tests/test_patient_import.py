@@ -0,0 +1,217 @@
+import csv
+import io
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import jwt as PyJWT
+from sqlalchemy.exc import IntegrityError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import db
+import patient_import
+
+HEADER = (
+    "reference,sex,weight,height,bmi,affected_right_knee,affected_left_knee,"
+    "affected_right_hip,affected_left_hip,leg_dominance,birth_date,physically_active\n"
+)
+
+
+def csv_lines(*rows):
+    return io.StringIO(HEADER + "".join(row + "\n" for row in rows))
+
+
+def valid_row(reference):
+    return f"{reference},Female,68.5,170,23.7,1,0,0,0,dominant,1970-04-01,yes"
+
+
+def fake_create(patients, doctor_id, access_codes):
+    return [{"user_id": f"user-{code}", "access_code": code} for code in access_codes]
+
+
+class PatientImportTests(unittest.TestCase):
+    def setUp(self):
+        self.codes_patch = patch.object(
+            patient_import, "generate_temporary_access_codes",
+            side_effect=lambda role, count: [f"IRHIS-{i:06d}" for i in range(1, count + 1)],
+        )
+        self.codes = self.codes_patch.start()
+        # Hashing is not what these tests are about
+        self.hash_patch = patch.object(patient_import, "generate_password_hash", side_effect=lambda p: f"hash:{p}")
+        self.hash_patch.start()
+
+    def tearDown(self):
+        self.codes_patch.stop()
+        self.hash_patch.stop()
+
+    def test_validates_fields(self):
+        data, errors = patient_import.validate_row({
+            "sex": "other", "weight": "heavy", "height": "170", "bmi": "-1", "affected_right_knee": "maybe",
+            "affected_left_knee": "0", "affected_right_hip": "0", "affected_left_hip": "0",
+            "leg_dominance": "Non-Dominant", "birth_date": "01/04/1970",
+        })
+
+        self.assertEqual(data["leg_dominance"], "non-dominant")
+        self.assertEqual(errors, [
+            "sex must be one of male, female", "weight must be a number", "bmi must not be negative",
+            "affected_right_knee must be 0/1 or yes/no", "birth_date must be YYYY-MM-DD",
+        ])
+
+    def test_any_invalid_row_blocks_the_whole_import(self):
+        lines = csv_lines(valid_row("a"), "b,male,80,180,24.7,0,0,1,0,left,,", valid_row("c"))
+
+        with patch.object(patient_import, "create_manual_patients") as create:
+            results = patient_import.import_patients(lines, "doctor-1")
+
+        create.assert_not_called()
+        self.codes.assert_not_called()
+        self.assertEqual([r["status"] for r in results], ["not_imported", "invalid", "not_imported"])
+        self.assertEqual((results[1]["row"], results[1]["reference"]), (3, "b"))
+        self.assertEqual(results[1]["errors"], "leg_dominance must be one of dominant, non-dominant")
+
+    def test_missing_required_value(self):
+        results = patient_import.import_patients(csv_lines("a,male,,180,24.7,0,0,1,0,dominant,,"), "doctor-1")
+
+        self.assertEqual((results[0]["status"], results[0]["errors"]), ("invalid", "weight is required"))
+
+    def test_creates_patients_in_batches(self):
+        lines = csv_lines(*(valid_row(f"r{i}") for i in range(5)), "")
+
+        with patch.object(patient_import, "create_manual_patients", side_effect=fake_create) as create:
+            results = patient_import.import_patients(lines, "doctor-1", batch_size=2)
+
+        self.assertEqual([c.args for c in self.codes.call_args_list], [("Patient", 2), ("Patient", 2), ("Patient", 1)])
+        self.assertEqual([len(c.args[0]) for c in create.call_args_list], [2, 2, 1])
+        first = create.call_args_list[0].args[0][0]
+        self.assertEqual((first["sex"], first["weight"], first["physically_active"]), ("female", 68.5, 1))
+        self.assertEqual([r["status"] for r in results], ["created"] * 5)
+        self.assertEqual([r["access_code"] for r in results][:2], ["IRHIS-000001", "IRHIS-000002"])
+        self.assertEqual(first["password_hash"], f"hash:{results[0]['initial_password']}")
+        self.assertIsNone(backend_app.validate_signup_password(results[0]["initial_password"]))
+
+    def test_failed_batch_keeps_committed_batches(self):
+        def create(patients, doctor_id, access_codes):
+            if create.calls == 1:
+                raise RuntimeError("deadlock")
+            create.calls += 1
+            return fake_create(patients, doctor_id, access_codes)
+        create.calls = 0
+
+        lines = csv_lines(*(valid_row(f"r{i}") for i in range(3)))
+        with patch.object(patient_import, "create_manual_patients", side_effect=create):
+            results = patient_import.import_patients(lines, "doctor-1", batch_size=2)
+
+        self.assertEqual([r["status"] for r in results], ["created", "created", "failed"])
+        self.assertEqual(results[2]["errors"], "Database error: RuntimeError")
+        self.assertNotIn("initial_password", results[2])
+
+    def test_taken_access_codes_are_reallocated(self):
+        def create(patients, doctor_id, access_codes):
+            if access_codes == ["IRHIS-000001"]:
+                raise IntegrityError("INSERT INTO users", {}, Exception("Duplicate entry"))
+            return fake_create(patients, doctor_id, access_codes)
+
+        self.codes.side_effect = [["IRHIS-000001"], ["IRHIS-000002"]]
+        with patch.object(patient_import, "create_manual_patients", side_effect=create) as create_mock:
+            results = patient_import.import_patients(csv_lines(valid_row("a")), "doctor-1")
+
+        self.assertEqual(create_mock.call_count, 2)
+        self.assertEqual((results[0]["status"], results[0]["access_code"]), ("created", "IRHIS-000002"))
+
+    def test_access_code_clashes_give_up(self):
+        clash = IntegrityError("INSERT INTO users", {}, Exception("Duplicate entry"))
+        with patch.object(patient_import, "create_manual_patients", side_effect=clash) as create:
+            results = patient_import.import_patients(csv_lines(valid_row("a")), "doctor-1")
+
+        self.assertEqual(create.call_count, patient_import.ACCESS_CODE_ATTEMPTS)
+        self.assertEqual((results[0]["status"], results[0]["errors"]), ("failed", "Database error: IntegrityError"))
+
+    def test_batch_is_one_transaction(self):
+        connection = MagicMock()
+        engine = MagicMock()
+        engine.begin.return_value.__enter__.return_value = connection
+        patients = [{"password_hash": "h", "sex": "female", "birth_date": "1970-04-01"} for _ in range(3)]
+
+        with patch.object(db, "_engine", engine):
+            created = db.create_manual_patients(patients, "doctor-1", [f"IRHIS-{i:06d}" for i in range(3)])
+
+        engine.begin.assert_called_once()
+        users = [call.args[1] for call in connection.execute.call_args_list if "INSERT INTO users" in str(call.args[0])]
+        self.assertEqual([len(batch) for batch in users], [3])
+        self.assertEqual(len(created), 3)
+
+    def test_missing_columns(self):
+        with self.assertRaises(patient_import.PatientImportError):
+            patient_import.import_patients(io.StringIO("sex,weight\nmale,80\n"), "doctor-1")
+
+    def test_row_limit(self):
+        with self.assertRaises(patient_import.PatientImportError):
+            patient_import.import_patients(csv_lines(valid_row("a"), valid_row("b")), "doctor-1", max_rows=1)
+
+
+class AccessCodeAllocationTests(unittest.TestCase):
+    def test_skips_codes_that_are_taken(self):
+        def fetch_all(sql, params=None):
+            if "IN (" in sql:
+                return [{"Email": "IRHIS-000008@irhis.local"}]
+            return [{"Email": "irhis-000007@irhis.local", "FirstName": "Patient", "LastName": "IRHIS-000007"}]
+
+        with patch.object(db, "fetch_all", side_effect=fetch_all):
+            codes = db.generate_temporary_access_codes("Patient", 3)
+
+        self.assertEqual(codes, ["IRHIS-000009", "IRHIS-000010", "IRHIS-000011"])
+
+
+class PatientImportEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "doctor-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.user = {"ID": "doctor-1", "Role": "Doctor", "Email": "d@example.com", "FirstName": "D", "LastName": "One"}
+
+    def post(self, body):
+        with patch.object(backend_app, "get_user_by_id", return_value=self.user), \
+             patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(patient_import, "generate_temporary_access_codes", return_value=["IRHIS-000001"]), \
+             patch.object(patient_import, "create_manual_patients", side_effect=fake_create) as create:
+            response = self.client.post(
+                "/patients/import", data={"file": (io.BytesIO(body.encode("utf-8")), "patients.csv")},
+                headers=self.headers, content_type="multipart/form-data",
+            )
+        return response, create
+
+    def test_returns_result_csv(self):
+        response, create = self.post(HEADER + valid_row("a") + "\n")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.mimetype, "text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual((rows[0]["reference"], rows[0]["access_code"]), ("a", "IRHIS-000001"))
+        self.assertEqual(create.call_args.args[1], "doctor-1")
+
+    def test_partial_import(self):
+        results = [{"row": 2, "status": "created"}, {"row": 3, "status": "failed"}]
+        with patch.object(backend_app, "import_patients", return_value=results):
+            response, _ = self.post(HEADER + valid_row("a") + "\n" + valid_row("b") + "\n")
+
+        self.assertEqual(response.status_code, 207)
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([row["status"] for row in rows], ["created", "failed"])
+
+    def test_invalid_rows(self):
+        response, create = self.post(HEADER + "a,male,80\n")
+
+        self.assertEqual(response.status_code, 422)
+        create.assert_not_called()
+
+    def test_missing_columns(self):
+        response, _ = self.post("sex\nmale\n")
+
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import jwt as PyJWT
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import db
+
+
+def fake_engine(selected_rows):
+    connection = MagicMock()
+    connection.execute.return_value.fetchall.return_value = selected_rows
+    engine = MagicMock()
+    engine.begin.return_value.__enter__.return_value = connection
+    return engine, connection
+
+
+class ReassignPatientsTests(unittest.TestCase):
+    def statements(self, connection):
+        return [" ".join(str(call.args[0]).split()) for call in connection.execute.call_args_list]
+
+    def test_moves_listed_patients_with_set_based_statements(self):
+        engine, connection = fake_engine([("p-1", "d-1"), ("p-2", None), ("p-3", "d-9"), ("p-4", "d-2")])
+
+        with patch.object(db, "_engine", engine):
+            result = db.reassign_patients("d-9", patient_ids=["p-1", "p-2", "p-3", "p-4", "p-5", "p-1"])
+
+        self.assertEqual(result, {
+            "moved": ["p-1", "p-2", "p-4"], "unchanged": ["p-3"], "notFound": ["p-5"],
+            "previousDoctorIds": ["d-1", "d-2"],
+        })
+        engine.begin.assert_called_once()
+        select, update, insert = self.statements(connection)
+        self.assertIn("FOR UPDATE", select)
+        self.assertTrue(update.startswith("UPDATE patientdoctor SET Active = 0"))
+        self.assertTrue(insert.startswith("INSERT INTO patientdoctor") and "SELECT UUID()" in insert)
+        params = connection.execute.call_args_list[2].args[1]
+        self.assertEqual(
+            sorted(value for key, value in params.items() if key.startswith("patient_")), ["p-1", "p-2", "p-4"]
+        )
+        self.assertEqual(params["doctor_id"], "d-9")
+
+    def test_moves_every_patient_of_a_doctor(self):
+        engine, connection = fake_engine([("p-1", "d-1"), ("p-2", "d-1")])
+
+        with patch.object(db, "_engine", engine):
+            result = db.reassign_patients("d-2", from_doctor_id="d-1")
+
+        self.assertEqual((result["moved"], result["previousDoctorIds"]), (["p-1", "p-2"], ["d-1"]))
+        self.assertEqual(connection.execute.call_args_list[0].args[1], {"from_doctor_id": "d-1"})
+        self.assertEqual(connection.execute.call_count, 3)
+
+    def test_nothing_to_move(self):
+        engine, connection = fake_engine([("p-1", "d-2")])
+
+        with patch.object(db, "_engine", engine):
+            result = db.reassign_patients("d-2", patient_ids=["p-1"])
+
+        self.assertEqual(result["unchanged"], ["p-1"])
+        self.assertEqual(connection.execute.call_count, 1)
+
+
+class ReassignEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "d-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def post(self, body, role="Doctor", result=None, own_patients=("p-1",), caller="d-1"):
+        users = {
+            "d-1": {"ID": "d-1", "Role": role, "Email": "d1@example.com", "FirstName": "D", "LastName": "One"},
+            "d-2": {"ID": "d-2", "Role": "Doctor", "Email": "d2@example.com", "FirstName": "D", "LastName": "Two"},
+            "d-3": {"ID": "d-3", "Role": "Doctor", "Email": "d3@example.com", "FirstName": "D", "LastName": "Three"},
+        }
+        token = PyJWT.encode({"user_id": caller}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        result = result or {"moved": ["p-1"], "unchanged": [], "notFound": [], "previousDoctorIds": ["d-1"]}
+        with patch.object(backend_app, "get_user_by_id", side_effect=users.get), \
+             patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(backend_app, "get_doctor_patient_ids", return_value=list(own_patients)), \
+             patch.object(backend_app, "reassign_patients", return_value=result) as reassign, \
+             patch.object(backend_app.cohort_cache, "invalidate_many") as invalidate:
+            response = self.client.post("/patients/reassign", json=body, headers=self.headers)
+        return response, reassign, invalidate
+
+    def test_reassigns_and_invalidates_cohorts_once(self):
+        response, reassign, invalidate = self.post({"toDoctorId": "d-2", "fromDoctorId": "d-1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["moved"], ["p-1"])
+        reassign.assert_called_once_with("d-2", patient_ids=None, from_doctor_id="d-1")
+        invalidate.assert_called_once_with(["d-2", "d-1"])
+
+    def test_requires_exactly_one_scope(self):
+        both, reassign, _ = self.post({"toDoctorId": "d-2", "fromDoctorId": "d-1", "patientIds": ["p-1"]})
+        neither, _, _ = self.post({"toDoctorId": "d-2"})
+        empty, _, _ = self.post({"toDoctorId": "d-2", "patientIds": []})
+
+        self.assertEqual([both.status_code, neither.status_code, empty.status_code], [400, 400, 400])
+        reassign.assert_not_called()
+
+    def test_unknown_target_doctor(self):
+        response, reassign, _ = self.post({"toDoctorId": "d-9", "patientIds": ["p-1"]})
+
+        self.assertEqual(response.status_code, 404)
+        reassign.assert_not_called()
+
+    def test_other_doctors_patients_are_forbidden(self):
+        listed, reassign, _ = self.post({"toDoctorId": "d-2", "patientIds": ["p-1"]}, own_patients=(), caller="d-3")
+        emptied, _, _ = self.post({"toDoctorId": "d-2", "fromDoctorId": "d-1"}, caller="d-3")
+        taken, _, _ = self.post({"toDoctorId": "d-3", "fromDoctorId": "d-1"}, caller="d-3")
+
+        self.assertEqual([listed.status_code, emptied.status_code, taken.status_code], [403, 403, 403])
+        self.assertEqual(listed.get_json()["patientIds"], ["p-1"])
+        reassign.assert_not_called()
+
+    def test_admins_can_move_any_patient(self):
+        with patch.dict("os.environ", {"REASSIGN_ADMIN_USERS": "d-3"}):
+            response, reassign, _ = self.post({"toDoctorId": "d-2", "patientIds": ["p-1"]}, own_patients=(), caller="d-3")
+
+        self.assertEqual(response.status_code, 200)
+        reassign.assert_called_once_with("d-2", patient_ids=["p-1"], from_doctor_id=None)
+
+    def test_patients_are_forbidden(self):
+        response, reassign, _ = self.post({"toDoctorId": "d-2", "patientIds": ["p-1"]}, role="Patient")
+
+        self.assertEqual(response.status_code, 403)
+        reassign.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
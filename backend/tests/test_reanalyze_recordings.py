@@ -0,0 +1,113 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import reanalyze_recordings
+from analysis import ANALYSIS_VERSION, analyze_recording, archive_movement_zip
+from analysis.calibration import calibration_cache_digest, save_calibration
+from test_recording_archive import build_movella_zip
+
+
+class ReanalyzeRecordingsTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"RECORDINGS_DIR": self.tmpdir.name})
+        self.env.start()
+        self.checkpoint = str(Path(self.tmpdir.name) / "checkpoint.json")
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def run_cli(self, *extra):
+        with patch.object(reanalyze_recordings, "is_db_enabled", return_value=True), \
+             patch.object(reanalyze_recordings, "replace_session_metrics") as replace_metrics, \
+             redirect_stdout(io.StringIO()):
+            exit_code = reanalyze_recordings.main(["--workers", "2", "--checkpoint", self.checkpoint, *extra])
+        return exit_code, replace_metrics
+
+    def test_replaces_metrics_once_per_session_then_skips(self):
+        archive_movement_zip(build_movella_zip(samples=300), patient_id="patient-1", session_id="session-1")
+        archive_movement_zip(build_movella_zip(samples=300), patient_id="patient-1", session_id="session-2")
+        archive_movement_zip(build_movella_zip(samples=300), patient_id="patient-1")
+
+        exit_code, replace_metrics = self.run_cli()
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(sorted(call.args[0] for call in replace_metrics.call_args_list), ["session-1", "session-2"])
+        rows = replace_metrics.call_args_list[0].args[1]
+        self.assertEqual({row["side"] for row in rows}, {"left", "right"})
+
+        _, replace_metrics = self.run_cli()
+        replace_metrics.assert_not_called()
+
+    def test_version_change_invalidates_checkpoint(self):
+        manifest = archive_movement_zip(build_movella_zip(), patient_id="patient-1", session_id="session-1")
+        checkpoint = {
+            manifest["recording_id"]: {
+                "analysis_version": "0",
+                "content_hash": manifest["content_hash"],
+            }
+        }
+
+        pending, skipped = reanalyze_recordings.select_recordings([manifest], checkpoint)
+        self.assertEqual([entry[0] for entry in pending], [manifest["recording_id"]])
+        self.assertEqual(skipped, 0)
+
+        checkpoint[manifest["recording_id"]]["analysis_version"] = ANALYSIS_VERSION
+        pending, skipped = reanalyze_recordings.select_recordings([manifest], checkpoint)
+        self.assertEqual((pending, skipped), ([], 1))
+
+    def test_calibration_change_invalidates_checkpoint(self):
+        manifest = archive_movement_zip(build_movella_zip(), patient_id="patient-1", session_id="session-1")
+        checkpoint = {
+            manifest["recording_id"]: {"analysis_version": ANALYSIS_VERSION, "content_hash": manifest["content_hash"]}
+        }
+        self.assertEqual(reanalyze_recordings.select_recordings([manifest], checkpoint)[1], 1)
+
+        save_calibration("patient-1", "1-2", {"sensor_set": "1-2", "source_recording_id": "rec-a", "sensors": {}})
+        pending, skipped = reanalyze_recordings.select_recordings([manifest], checkpoint)
+
+        self.assertEqual(skipped, 0)
+        self.assertEqual(pending[0][3], calibration_cache_digest("patient-1"))
+
+    def test_calibration_recordings_are_resolved_first_in_recording_order(self):
+        manifests = [
+            {"recording_id": "r-2", "patient_id": "p-1", "exercise_type": "calibration", "created_at": "2025-01-02"},
+            {"recording_id": "r-s", "patient_id": "p-1", "exercise_type": "squat", "created_at": "2025-01-01"},
+            {"recording_id": "r-1", "patient_id": "p-1", "exercise_type": "calibration", "created_at": "2025-01-01"},
+        ]
+        with patch.object(reanalyze_recordings, "calibrate_recording",
+                          return_value={"status": "recalibrated"}) as calibrate:
+            self.assertEqual(reanalyze_recordings.calibrate_in_order(manifests), (2, 0))
+
+        self.assertEqual([call.args[0] for call in calibrate.call_args_list], ["r-1", "r-2"])
+
+    def test_dry_run_leaves_the_calibration_cache_alone(self):
+        archive_movement_zip(build_movella_zip(samples=300), patient_id="patient-1", session_id="session-1")
+        with patch.object(reanalyze_recordings, "calibrate_in_order", return_value=(0, 0)) as calibrate:
+            exit_code, replace_metrics = self.run_cli("--dry-run")
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(calibrate.call_args.kwargs, {"persist": False})
+        replace_metrics.assert_not_called()
+        self.assertFalse(Path(self.checkpoint).exists())
+
+    def test_session_analysis_only_reads_the_calibration_cache(self):
+        archive_movement_zip(build_movella_zip(samples=300), patient_id="patient-1", session_id="session-1")
+        with patch.object(reanalyze_recordings, "ProcessPoolExecutor", ThreadPoolExecutor), \
+             patch.object(reanalyze_recordings, "analyze_recording", wraps=analyze_recording) as analyze:
+            self.run_cli()
+
+        self.assertEqual(analyze.call_args.kwargs, {"persist_calibration": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
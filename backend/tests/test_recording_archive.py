@@ -0,0 +1,162 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+from analysis import (
+    archive_movement_zip,
+    delete_recording,
+    get_recordings_dir,
+    list_recordings,
+    load_manifest,
+    load_sensor_window,
+    open_sensor,
+    parse_movella_csv,
+    slice_sensor,
+)
+from analysis import recordings
+from analysis.recordings import PATIENT_INDEX_COMPLETE_FILENAME, PATIENT_INDEX_DIRNAME
+
+
+def build_movella_csv(tag, samples=120, rate=60, start_time_fine=1_000_000):
+    lines = [
+        f"DeviceTag:,{tag}",
+        "FirmwareVersion:,2.6.0",
+        f"OutputRate:,{rate}Hz",
+        "StartTime:,2024/05/10 10:04:13.000",
+        "PacketCounter,SampleTimeFine,Euler_X,Euler_Y,Euler_Z,FreeAcc_X,FreeAcc_Y,FreeAcc_Z,Status",
+    ]
+    step = int(1e6 / rate)
+    for i in range(samples):
+        lines.append(
+            f"{i},{start_time_fine + i * step},{i * 0.5:.3f},{-i * 0.25:.3f},{tag}.0,0.1,0.2,0.3,0"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def build_movella_zip(tags=(1, 2, 3, 4, 5), samples=120):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for tag in tags:
+            archive.writestr(f"sensor_{tag}.csv", build_movella_csv(tag, samples=samples))
+    buffer.seek(0)
+    return buffer
+
+
+class MovellaCsvParserTests(unittest.TestCase):
+    def test_parses_header_and_channels(self):
+        parsed = parse_movella_csv(build_movella_csv(3, samples=10))
+
+        self.assertEqual(parsed["header"]["DeviceTag"], 3)
+        self.assertEqual(parsed["header"]["OutputRate"], 60)
+        self.assertEqual(parsed["header"]["StartTime"], "2024/05/10 10:04:13.000")
+        self.assertEqual(parsed["channels"]["SampleTimeFine"].dtype, np.uint32)
+        self.assertEqual(parsed["channels"]["Euler_X"].dtype, np.float32)
+        self.assertEqual(len(parsed["channels"]["Euler_X"]), 10)
+
+    def test_skips_malformed_rows(self):
+        content = build_movella_csv(1, samples=5) + "5,not-a-number,1,2,3\n6,7\n"
+        parsed = parse_movella_csv(content)
+
+        self.assertEqual(len(parsed["channels"]["PacketCounter"]), 5)
+
+
+class RecordingArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"RECORDINGS_DIR": self.tmpdir.name})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_archive_round_trip_uses_memory_maps(self):
+        manifest = archive_movement_zip(build_movella_zip(), patient_id="patient-1")
+
+        self.assertEqual(sorted(manifest["sensors"]), ["1", "2", "3", "4", "5"])
+        self.assertLess(manifest["archived_bytes"], manifest["source_bytes"])
+        self.assertEqual(load_manifest(manifest["recording_id"])["patient_id"], "patient-1")
+
+        channels = open_sensor(manifest["recording_id"], 3)
+        self.assertIsInstance(channels["Euler_X"], np.memmap)
+        np.testing.assert_allclose(channels["Euler_X"][:3], [0.0, 0.5, 1.0])
+
+    def test_time_window_slices_without_copying(self):
+        manifest = archive_movement_zip(build_movella_zip(samples=600), patient_id="patient-1")
+        recording_id = manifest["recording_id"]
+
+        full = open_sensor(recording_id, 1, ["Euler_X"])["Euler_X"]
+        window = slice_sensor(recording_id, 1, start=2.0, end=3.0, channels=["Euler_X"])["Euler_X"]
+        seconds, _ = load_sensor_window(recording_id, 1, start=2.0, end=3.0)
+
+        self.assertEqual(len(window), 60)
+        self.assertAlmostEqual(float(seconds[0]), 2.0, delta=1 / 60)
+        self.assertTrue(np.shares_memory(window, full) or isinstance(window, np.memmap))
+
+    def test_list_recordings_filters_by_patient(self):
+        archive_movement_zip(build_movella_zip(tags=(1,)), patient_id="patient-1")
+        archive_movement_zip(build_movella_zip(tags=(2,)), patient_id="patient-2")
+
+        self.assertEqual(len(list_recordings("patient-1")), 1)
+        self.assertEqual(len(list_recordings()), 2)
+
+    def test_patient_listing_reads_only_that_patients_manifests(self):
+        mine = archive_movement_zip(build_movella_zip(tags=(1,)), patient_id="patient-1")
+        archive_movement_zip(build_movella_zip(tags=(2,)), patient_id="patient-2")
+        list_recordings("patient-1")
+
+        with patch.object(recordings, "_read_json", wraps=recordings._read_json) as read:
+            listed = list_recordings("patient-1")
+
+        self.assertEqual([manifest["recording_id"] for manifest in listed], [mine["recording_id"]])
+        self.assertEqual(read.call_count, 1)
+
+    def test_recordings_from_before_the_index_are_indexed_once(self):
+        manifest = archive_movement_zip(build_movella_zip(tags=(1,)), patient_id="patient-1")
+        index_root = get_recordings_dir() / PATIENT_INDEX_DIRNAME
+        for path in sorted(index_root.rglob("*"), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+
+        self.assertEqual(len(list_recordings("patient-1")), 1)
+        self.assertTrue((index_root / PATIENT_INDEX_COMPLETE_FILENAME).exists())
+
+        delete_recording(manifest["recording_id"])
+        self.assertEqual(list_recordings("patient-1"), [])
+        self.assertEqual(list((index_root / "patient-1").iterdir()), [])
+
+    def test_sensor_data_returns_dropped_samples_as_null(self):
+        manifest = archive_movement_zip(build_movella_zip(tags=(1,), samples=5), patient_id="patient-1")
+        euler = np.memmap(get_recordings_dir() / manifest["recording_id"] / "sensor_1" / "Euler_X.bin",
+                          dtype="<f4", mode="r+")
+        euler[2] = np.nan
+        euler.flush()
+        del euler
+
+        backend_app.app.config["TESTING"] = True
+        token = PyJWT.encode({"user_id": "patient-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        user = {"ID": "patient-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        with patch.object(backend_app, "get_user_by_id", return_value=user):
+            response = backend_app.app.test_client().get(
+                f"/recordings/{manifest['recording_id']}/sensors/1?channels=Euler_X,PacketCounter",
+                headers={"Authorization": f"Bearer {token}"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"NaN", response.data)
+        channels = response.get_json()["channels"]
+        self.assertEqual(channels["Euler_X"][:3], [0.0, 0.5, None])
+        self.assertEqual(channels["PacketCounter"], [0, 1, 2, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.metrics import summarize_joint
+from analysis.repetitions import detect_repetitions, local_maxima, moving_average
+
+
+def knee_flexion(reps=10, period=2.0, rate=60, noise=0.0, seed=0):
+    seconds = np.arange(int(reps * period * rate)) / rate
+    angles = 30.0 * (1.0 - np.cos(2 * np.pi * seconds / period))  # 0..60 deg per rep
+    if noise:
+        angles = angles + np.random.default_rng(seed).normal(0.0, noise, len(seconds))
+    return angles, seconds
+
+
+class MovingAverageTests(unittest.TestCase):
+    def test_matches_convolution(self):
+        values = np.random.default_rng(1).normal(size=50)
+        expected = np.convolve(np.pad(values, 2, mode="edge"), np.ones(5) / 5, mode="valid")
+
+        np.testing.assert_allclose(moving_average(values, 5), expected)
+
+    def test_plateau_counts_once(self):
+        values = np.array([0.0, 1.0, 2.0, 2.0, 2.0, 1.0, 0.0, 3.0, 0.0])
+
+        np.testing.assert_array_equal(local_maxima(values), [2, 7])
+
+
+class DetectRepetitionsTests(unittest.TestCase):
+    def test_counts_noisy_repetitions(self):
+        angles, seconds = knee_flexion(reps=10, noise=2.0)
+
+        result = detect_repetitions(angles, seconds)
+
+        self.assertEqual(result["count"], 10)
+        self.assertEqual(len(result["boundaries"]), 11)
+        np.testing.assert_allclose(result["reps"]["max_rom"], 60.0, atol=6.0)
+
+    def test_ignores_small_wobbles_between_reps(self):
+        angles, seconds = knee_flexion(reps=5)
+        angles = angles + 3.0 * np.sin(2 * np.pi * 7 * seconds)
+
+        self.assertEqual(detect_repetitions(angles, seconds)["count"], 5)
+
+    def test_per_rep_stats_match_slicing(self):
+        angles, seconds = knee_flexion(reps=6, noise=1.0, seed=3)
+
+        result = detect_repetitions(angles, seconds)
+        bounds = result["boundaries"]
+        speed = np.abs(np.gradient(angles, seconds))
+
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            self.assertAlmostEqual(result["reps"]["min_rom"][i], angles[start:end].min())
+            self.assertAlmostEqual(result["reps"]["avg_rom"][i], angles[start:end].mean())
+            self.assertAlmostEqual(result["reps"]["max_velocity"][i], speed[start:end].max())
+
+    def test_summary_row_lists_reps(self):
+        angles, seconds = knee_flexion(reps=4)
+
+        row = summarize_joint("knee", "left", angles, seconds)
+
+        self.assertEqual(row["repetition"], 4)
+        self.assertEqual(len(row["reps"]), 4)
+        self.assertLess(row["reps"][0]["start_seconds"], row["reps"][1]["start_seconds"])
+
+    def test_flat_series_has_no_reps(self):
+        result = detect_repetitions(np.zeros(100), np.arange(100) / 60)
+
+        self.assertEqual(result["count"], 0)
+        self.assertEqual(len(result["reps"]["max_rom"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis import align_sensors, estimate_offsets, slerp
+from analysis.pipeline import align_orientations
+from analysis.kinematics import quat_from_euler_zyx
+
+
+def make_channels(sample_time_fine, euler_z, acc=None):
+    n = len(sample_time_fine)
+    acc = np.zeros(n) if acc is None else acc
+    return {
+        "PacketCounter": np.arange(n, dtype=np.uint32),
+        "SampleTimeFine": np.asarray(sample_time_fine, dtype=np.uint32),
+        "Euler_X": np.zeros(n, dtype=np.float32),
+        "Euler_Y": np.zeros(n, dtype=np.float32),
+        "Euler_Z": np.asarray(euler_z, dtype=np.float32),
+        "FreeAcc_X": np.asarray(acc, dtype=np.float32),
+        "FreeAcc_Y": np.zeros(n, dtype=np.float32),
+        "FreeAcc_Z": np.zeros(n, dtype=np.float32),
+        "Status": np.zeros(n, dtype=np.uint16),
+    }
+
+
+class SlerpTests(unittest.TestCase):
+    def test_halfway_between_two_yaw_angles(self):
+        q0 = quat_from_euler_zyx(np.zeros(1), np.zeros(1), np.array([0.0]))
+        q1 = quat_from_euler_zyx(np.zeros(1), np.zeros(1), np.array([90.0]))
+        expected = quat_from_euler_zyx(np.zeros(1), np.zeros(1), np.array([45.0]))
+
+        np.testing.assert_allclose(slerp(q0, q1, np.array([0.5])), expected, atol=1e-9)
+
+    def test_takes_short_arc_for_opposite_sign_quaternions(self):
+        q0 = quat_from_euler_zyx(np.zeros(1), np.zeros(1), np.array([10.0]))
+        q1 = -quat_from_euler_zyx(np.zeros(1), np.zeros(1), np.array([20.0]))
+        expected = quat_from_euler_zyx(np.zeros(1), np.zeros(1), np.array([15.0]))
+
+        np.testing.assert_allclose(slerp(q0, q1, np.array([0.5])), expected, atol=1e-9)
+
+
+class AlignSensorsTests(unittest.TestCase):
+    def test_resamples_across_rollover_and_dropped_packets(self):
+        step = 16_667
+        start = 2**32 - 10 * step
+        ticks = (start + np.arange(120) * step) % 2**32
+        yaw = np.arange(120) * 0.5
+        keep = np.r_[0:40, 45:120]  # five packets lost on the second sensor
+
+        aligned = align_sensors(
+            {1: make_channels(ticks, yaw), 2: make_channels(ticks[keep], yaw[keep])},
+            {1: {"OutputRate": 60, "SyncStatus": "Synced"}, 2: {"OutputRate": 60, "SyncStatus": "Synced"}},
+        )
+
+        self.assertEqual(aligned["rate"], 60.0)
+        self.assertEqual(len(aligned["t"]), len(aligned["sensors"][2]["quat"]))
+        self.assertAlmostEqual(float(aligned["t"][-1]), 119 * step / 1e6, delta=1 / 60)
+        self.assertTrue(np.all(np.diff(aligned["t"]) > 0))
+        # The gap is bridged by slerp, so both sensors agree on the orientation
+        np.testing.assert_allclose(aligned["sensors"][1]["quat"], aligned["sensors"][2]["quat"], atol=1e-3)
+
+    def test_unsynced_sensors_are_aligned_on_first_sample(self):
+        ticks = np.arange(60) * 16_667
+        offsets = estimate_offsets({1: make_channels(ticks, np.zeros(60)), 2: make_channels(ticks + 5_000_000, np.zeros(60))})
+
+        self.assertAlmostEqual(offsets[2] - offsets[1], 5.0)
+
+    def test_refines_offset_with_acceleration_cross_correlation(self):
+        rate = 60
+        ticks = np.arange(600) * int(1e6 / rate)
+        impulse = np.zeros(600)
+        impulse[300] = 10.0
+        delayed = np.roll(impulse, 6)  # second sensor sees the stomp 100 ms later
+
+        offsets = estimate_offsets(
+            {1: make_channels(ticks, np.zeros(600), impulse), 2: make_channels(ticks, np.zeros(600), delayed)},
+            refine=True,
+            rate=rate,
+        )
+
+        self.assertAlmostEqual(offsets[2] - offsets[1], 0.1, delta=1 / rate)
+
+    def test_refinement_never_shifts_synced_sensors(self):
+        rate = 60
+        ticks = np.arange(600) * int(1e6 / rate)
+        impulse = np.zeros(600)
+        impulse[300] = 10.0
+        channels = {
+            1: make_channels(ticks, np.zeros(600), np.roll(impulse, 6)),
+            2: make_channels(ticks, np.zeros(600), np.roll(impulse, 6)),
+            3: make_channels(ticks, np.zeros(600), impulse),
+        }
+
+        offsets = estimate_offsets(
+            channels, {1: {"SyncStatus": "Synced"}, 2: {"SyncStatus": "Synced"}}, refine=True, rate=rate,
+        )
+
+        # Sensor 3 is lined up against the synced sensor 1, which stays put
+        self.assertEqual((offsets[1], offsets[2]), (0.0, 0.0))
+        self.assertAlmostEqual(offsets[3], -0.1, delta=1 / rate)
+
+    def test_pipeline_refines_sensors_of_unknown_sync_status(self):
+        rate = 60
+        ticks = np.arange(600) * int(1e6 / rate)
+        impulse = np.zeros(600)
+        impulse[300] = 10.0
+        channels = {1: make_channels(ticks, np.zeros(600), impulse), 2: make_channels(ticks, np.zeros(600), np.roll(impulse, 6))}
+
+        unknown = align_orientations(channels, {1: {"OutputRate": rate}, 2: {"OutputRate": rate}})
+        synced = align_orientations(
+            channels, {tag: {"OutputRate": rate, "SyncStatus": "Synced"} for tag in (1, 2)},
+        )
+
+        self.assertAlmostEqual(unknown["offsets"][2] - unknown["offsets"][1], 0.1, delta=1 / rate)
+        self.assertEqual(synced["offsets"], {1: 0.0, 2: 0.0})
+
+    def test_empty_input(self):
+        aligned = align_sensors({})
+
+        self.assertEqual(len(aligned["t"]), 0)
+        self.assertEqual(aligned["sensors"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
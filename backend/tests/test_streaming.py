@@ -0,0 +1,234 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+from analysis.kinematics import baseline_subtract, knee_angle_series, quat_multiply
+from analysis.metrics import summarize_joint
+from analysis.streaming import RingBuffer, SessionStream, StreamError, StreamRegistry
+
+
+def axis_angle(axis, degrees):
+    half = np.radians(np.asarray(degrees, dtype=np.float64)) / 2
+    axis = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    return np.column_stack([np.cos(half), np.sin(half)[:, None] * axis])
+
+
+def knee_session(reps=8, period=2.5, rate=60, still=1.0, start_us=4_294_000_000):
+    """Both knees flexing to 70 deg per rep; SampleTimeFine rolls over early on."""
+    n = int((reps * period + still) * rate)
+    seconds = np.arange(n) / rate
+    moving = np.clip(seconds - still, 0.0, None)
+    flexion = 70.0 * (1 - np.cos(2 * np.pi * moving / period)) / 2
+    thigh = axis_angle([0, 0, 1], np.full(n, 15.0))
+    shank = quat_multiply(thigh, axis_angle([1, 0, 0], flexion))
+    sample_time = (start_us + np.round(seconds * 1e6).astype(np.int64)) % 2**32
+    return seconds, sample_time, thigh, shank
+
+
+def batch_payload(sample_time, thigh, shank, index):
+    def channels(quats):
+        return {
+            "SampleTimeFine": sample_time[index].tolist(),
+            **{f"Quat_{axis}": quats[index, i].tolist() for i, axis in enumerate("WXYZ")},
+        }
+
+    return {"1": channels(thigh), "2": channels(shank), "3": channels(thigh), "4": channels(shank)}
+
+
+def stream_session(batch_seconds=0.5, rate=60):
+    seconds, sample_time, thigh, shank = knee_session(rate=rate)
+    stream = SessionStream("session-1", rate=rate)
+    step = int(batch_seconds * rate)
+    running = []
+    for start in range(0, len(seconds), step):
+        running.append(stream.add_batch(batch_payload(sample_time, thigh, shank, slice(start, start + step))))
+    return seconds, thigh, shank, stream, running
+
+
+class RingBufferTests(unittest.TestCase):
+    def test_keeps_last_samples_in_order(self):
+        ring = RingBuffer(5, width=2)
+        ring.extend(np.arange(6).reshape(3, 2))
+        ring.extend(np.arange(6, 14).reshape(4, 2))
+
+        np.testing.assert_array_equal(ring.values()[:, 0], [4, 6, 8, 10, 12])
+        self.assertEqual(ring.total, 7)
+        self.assertEqual(ring.first_index, 2)
+
+    def test_oversized_write_keeps_tail(self):
+        ring = RingBuffer(3)
+        ring.extend(np.arange(10))
+
+        np.testing.assert_array_equal(ring.values(), [7, 8, 9])
+        self.assertEqual(ring.total, 10)
+
+
+class SessionStreamTests(unittest.TestCase):
+    def test_final_metrics_match_batch_analysis(self):
+        seconds, thigh, shank, stream, _ = stream_session()
+        rows = {row["side"]: row for row in stream.finish()}
+
+        angles = baseline_subtract(knee_angle_series(thigh, shank), seconds)
+        expected = summarize_joint("knee", "right", angles, seconds)
+
+        self.assertEqual(set(rows), {"left", "right"})
+        row = rows["right"]
+        self.assertEqual(row["repetition"], expected["repetition"])
+        self.assertEqual(row["repetition"], 8)
+        for key in ("min_rom", "max_rom", "avg_rom"):
+            self.assertAlmostEqual(row[key], expected[key], delta=0.5)
+        for key in ("max_velocity", "avg_velocity", "p95_velocity"):
+            self.assertAlmostEqual(row[key], expected[key], delta=0.03 * expected[key] + 1.0)
+
+    def test_running_metrics_grow_while_streaming(self):
+        _, _, _, _, running = stream_session()
+        counts = [rows[0]["repetition"] for rows in running if rows]
+
+        self.assertEqual(counts, sorted(counts))
+        self.assertGreaterEqual(counts[-1], 7)  # the last rep is only confirmed at finish
+
+    def test_memory_is_bounded(self):
+        _, _, _, stream, _ = stream_session()
+
+        for sensor in stream.sensors.values():
+            self.assertLessEqual(len(sensor.seconds.values()), stream.capacity)
+        self.assertGreater(stream.samples, 4 * stream.capacity)
+
+    def test_retransmitted_packets_are_ignored(self):
+        _, sample_time, thigh, shank = knee_session(reps=2)
+        stream = SessionStream("session-1")
+        payload = batch_payload(sample_time, thigh, shank, slice(0, 60))
+        stream.add_batch(payload)
+        stream.add_batch(payload)
+
+        self.assertEqual(stream.samples, 4 * 60)
+
+    def test_rejects_malformed_batches(self):
+        stream = SessionStream("session-1")
+        with self.assertRaises(StreamError):
+            stream.add_batch({"1": {"SampleTimeFine": [1, 2]}})
+        with self.assertRaises(StreamError):
+            stream.add_batch({"1": {"SampleTimeFine": [1, 2], "Euler_X": [0], "Euler_Y": [0], "Euler_Z": [0]}})
+        with self.assertRaises(StreamError):
+            stream.add_batch({"1": {"SampleTimeFine": list(range(1000)), **{f"Euler_{a}": [0.0] * 1000 for a in "XYZ"}}})
+        self.assertEqual(stream.samples, 0)
+
+
+class StreamRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = Path(self.tmp.name)
+
+    def test_limits_concurrent_streams(self):
+        registry = StreamRegistry(max_streams=1, directory=self.directory)
+        registry.start("a")
+        registry.start("a")  # restarting the same session is fine
+        with self.assertRaises(StreamError):
+            registry.start("b")
+        registry.pop("a")
+        self.assertIsNotNone(registry.start("b"))
+
+    def test_idle_streams_expire(self):
+        registry = StreamRegistry(idle_seconds=0.0, directory=self.directory)
+        registry.start("a")
+
+        self.assertIsNone(registry.get("a"))
+
+    def test_streams_are_shared_between_processes(self):
+        _, sample_time, thigh, shank = knee_session(reps=1)
+        StreamRegistry(directory=self.directory).start("a")
+
+        with StreamRegistry(directory=self.directory).open("a") as stream:
+            stream.add_batch(batch_payload(sample_time, thigh, shank, slice(0, 30)))
+
+        self.assertEqual(StreamRegistry(directory=self.directory).get("a").samples, 4 * 30)
+
+    def test_failed_requests_leave_the_stream_unchanged(self):
+        registry = StreamRegistry(directory=self.directory)
+        registry.start("a")
+        _, sample_time, thigh, shank = knee_session(reps=1)
+
+        with self.assertRaises(RuntimeError), registry.open("a") as stream:
+            stream.add_batch(batch_payload(sample_time, thigh, shank, slice(0, 30)))
+            raise RuntimeError("request failed")
+
+        self.assertEqual(registry.get("a").samples, 0)
+
+
+class StreamEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "patient-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.user = {"ID": "patient-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        env = patch.dict(os.environ, {"RECORDINGS_DIR": self.tmp.name})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_stream_lifecycle_persists_final_metrics(self):
+        _, sample_time, thigh, shank = knee_session(reps=3)
+        with patch.object(backend_app, "get_user_by_id", return_value=self.user), \
+             patch.object(backend_app, "get_session_by_id", return_value={"ID": "s-1", "PatientID": "patient-1"}), \
+             patch.object(backend_app, "find_calibration", return_value=None), \
+             patch.object(backend_app, "replace_session_metrics", return_value=["m-1", "m-2"]) as replace:
+            started = self.client.post("/sessions/s-1/stream", headers=self.headers, json={"sensors": [1, 2, 3, 4]})
+            for start in range(0, len(sample_time), 30):
+                response = self.client.post(
+                    "/sessions/s-1/stream/packets",
+                    headers=self.headers,
+                    json={"sensors": batch_payload(sample_time, thigh, shank, slice(start, start + 30))},
+                )
+                self.assertEqual(response.status_code, 200)
+            finished = self.client.post("/sessions/s-1/stream/finish", headers=self.headers)
+            missing = self.client.get("/sessions/s-1/stream", headers=self.headers)
+
+        self.assertEqual(started.status_code, 201)
+        self.assertEqual(response.get_json()["samples"], 4 * len(sample_time))
+        self.assertEqual(finished.status_code, 200)
+        rows = replace.call_args[0][1]
+        self.assertEqual({row["side"] for row in rows}, {"left", "right"})
+        self.assertTrue(all(row["repetition"] == 3 for row in rows))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_failed_finish_keeps_the_stream(self):
+        _, sample_time, thigh, shank = knee_session(reps=2)
+        with patch.object(backend_app, "get_user_by_id", return_value=self.user), \
+             patch.object(backend_app, "get_session_by_id", return_value={"ID": "s-1", "PatientID": "patient-1"}), \
+             patch.object(backend_app, "find_calibration", return_value=None):
+            self.client.post("/sessions/s-1/stream", headers=self.headers, json={"sensors": [1, 2, 3, 4]})
+            for start in range(0, len(sample_time), 30):
+                self.client.post("/sessions/s-1/stream/packets", headers=self.headers,
+                                 json={"sensors": batch_payload(sample_time, thigh, shank, slice(start, start + 30))})
+            with patch.object(backend_app, "replace_session_metrics", side_effect=RuntimeError("deadlock")):
+                failed = self.client.post("/sessions/s-1/stream/finish", headers=self.headers)
+            with patch.object(backend_app, "replace_session_metrics", return_value=["m-1"]) as replace:
+                retried = self.client.post("/sessions/s-1/stream/finish", headers=self.headers)
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(retried.status_code, 200)
+        self.assertTrue(all(row["repetition"] == 2 for row in replace.call_args[0][1]))
+        self.assertIsNone(backend_app.live_streams.get("s-1"))
+
+    def test_other_patients_session_is_forbidden(self):
+        with patch.object(backend_app, "get_user_by_id", return_value=self.user), \
+             patch.object(backend_app, "get_session_by_id", return_value={"ID": "s-2", "PatientID": "patient-2"}):
+            response = self.client.post("/sessions/s-2/stream", headers=self.headers, json={})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertIsNone(backend_app.live_streams.get("s-2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import jwt as PyJWT
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import db
+import study_export
+from db import build_temporary_access_email
+
+# Changes cursor: two seconds behind the database clock at 12:00 UTC
+CURSOR = datetime(2025, 3, 10, 11, 59, 58)
+PATIENT = {
+    "PatientEmail": build_temporary_access_email("IRHIS-000007"),
+    "PatientFirstName": "Patient",
+    "PatientLastName": "IRHIS-000007",
+}
+NAMED_PATIENT = {"PatientEmail": "jane@example.com", "PatientFirstName": "Jane", "PatientLastName": "Doe"}
+
+
+def fake_rows(table, since, until):
+    """Two rows per table, one an hour before the cursor, plus one from a patient without access code."""
+    at = datetime(2025, 3, 10, 11, 0)
+    rows = {
+        "sessions": [
+            {**PATIENT, "SessionID": "s-1", "DoctorEmail": "d@example.com", "DoctorFirstName": "Doctor",
+             "DoctorLastName": "IRHIS-D-000002", "ExerciseType": "squat",
+             "ExerciseDescription": "Mrs Doe, after her fall at the bakery", "Repetitions": 10, "Duration": timedelta(minutes=5), "TimeCreated": at},
+            {**NAMED_PATIENT, "SessionID": "s-2", "DoctorEmail": None, "DoctorFirstName": None,
+             "DoctorLastName": None, "ExerciseType": "squat", "ExerciseDescription": "",
+             "Repetitions": 5, "Duration": None, "TimeCreated": at},
+        ],
+        "metrics": [
+            {**PATIENT, "MetricID": "m-1", "SessionID": "s-1", "Joint": "knee", "Side": "left", "Repetitions": 10,
+             "MinVelocity": 0.0, "MaxVelocity": 200.0, "AvgVelocity": 80.0, "P95Velocity": 180.0, "MinROM": 2.0,
+             "MaxROM": 95.0, "AvgROM": 40.0, "CenterMassDisplacement": 12.0, "TimeCreated": at},
+        ],
+        "feedback": [
+            {**PATIENT, "FeedbackID": "f-1", "SessionID": "s-1", "Pain": 3, "Fatigue": 4, "Difficulty": 2,
+             "Comments": "My knee hurt near the bakery", "TimeCreated": at},
+        ],
+        "deleted": [
+            {**PATIENT, "Kind": "metrics", "RecordID": "m-0", "DeletedAt": at},
+            {**NAMED_PATIENT, "Kind": "metrics", "RecordID": "m-9", "DeletedAt": at},
+        ],
+    }
+    return iter([row for row in rows[table] if since < (row.get("DeletedAt") or row["TimeCreated"]) <= until])
+
+
+def read_gzip(path):
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as handle:
+        return handle.read()
+
+
+class StudyExportTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.export_dir = Path(self.tmp.name)
+        self.rows_patch = patch.object(study_export, "iter_study_export_rows", side_effect=fake_rows)
+        self.rows = self.rows_patch.start()
+        self.cursor = patch.object(study_export, "get_changes_cursor", return_value=CURSOR).start()
+        patch.object(study_export, "is_change_tracking_enabled", return_value=True).start()
+
+    def tearDown(self):
+        patch.stopall()
+        self.tmp.cleanup()
+
+    def test_snapshot_is_anonymized_and_described_by_its_manifest(self):
+        manifest = study_export.run_study_export("csv", export_dir=self.export_dir)
+
+        snapshot = self.export_dir / "snapshot-0001"
+        self.assertEqual(manifest["snapshot"], "snapshot-0001")
+        self.assertIsNone(manifest["since"])
+        self.assertEqual(manifest["until"], "2025-03-10T11:59:58")
+        sessions = list(csv.DictReader(io.StringIO(read_gzip(snapshot / "sessions.csv.gz"))))
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0]["PatientCode"], "IRHIS-000007")
+        self.assertEqual(sessions[0]["DoctorCode"], "IRHIS-D-000002")
+        self.assertEqual(sessions[0]["Duration"], "0:05:00")
+        self.assertNotIn("ExerciseDescription", sessions[0])
+        self.assertEqual(manifest["files"]["sessions.csv.gz"]["skipped_without_access_code"], 1)
+
+        exported = "".join(read_gzip(path) for path in snapshot.glob("*.gz"))
+        for private in ("jane", "Doe", "example.com", "bakery", "@"):
+            self.assertNotIn(private, exported)
+        feedback = list(csv.DictReader(io.StringIO(read_gzip(snapshot / "feedback.csv.gz"))))
+        self.assertEqual(feedback[0]["HasComments"], "True")
+        deleted = list(csv.DictReader(io.StringIO(read_gzip(snapshot / "deleted.csv.gz"))))
+        self.assertEqual(deleted, [
+            {"Kind": "metrics", "RecordID": "m-0", "PatientCode": "IRHIS-000007", "DeletedAt": "2025-03-10T11:00:00"},
+        ])
+        self.assertTrue(manifest["deletions_tracked"])
+
+        entry = manifest["files"]["metrics.csv.gz"]
+        self.assertEqual(entry["rows"], 1)
+        self.assertEqual(entry["sha256"], hashlib.sha256((snapshot / "metrics.csv.gz").read_bytes()).hexdigest())
+        self.assertEqual(json.loads((snapshot / "manifest.json").read_text()), manifest)
+
+    def test_next_snapshot_starts_at_the_watermark(self):
+        study_export.run_study_export("csv", export_dir=self.export_dir)
+        self.cursor.return_value = CURSOR + timedelta(hours=1)
+        manifest = study_export.run_study_export("ndjson", export_dir=self.export_dir)
+
+        self.assertEqual(manifest["snapshot"], "snapshot-0002")
+        self.assertEqual(manifest["since"], "2025-03-10T11:59:58")
+        self.assertEqual(manifest["previous_snapshot"], "snapshot-0001")
+        self.assertEqual({entry["rows"] for entry in manifest["files"].values()}, {0})
+        since, until = self.rows.call_args.args[1:]
+        self.assertEqual((since, until), (datetime(2025, 3, 10, 11, 59, 58), datetime(2025, 3, 10, 12, 59, 58)))
+        self.assertEqual([m["snapshot"] for m in study_export.list_snapshots(self.export_dir)],
+                         ["snapshot-0001", "snapshot-0002"])
+
+    def test_failed_export_leaves_no_snapshot_and_keeps_the_watermark(self):
+        self.rows.side_effect = RuntimeError("connection lost")
+
+        with self.assertRaises(RuntimeError):
+            study_export.run_study_export("csv", export_dir=self.export_dir)
+
+        self.assertEqual(list(self.export_dir.glob("*snapshot*")), [])
+        self.assertEqual(study_export.load_state(self.export_dir), {})
+
+    def test_ndjson_rows(self):
+        study_export.run_study_export("ndjson", export_dir=self.export_dir)
+
+        lines = read_gzip(self.export_dir / "snapshot-0001" / "metrics.ndjson.gz").splitlines()
+        self.assertEqual(json.loads(lines[0])["MaxROM"], 95.0)
+        self.assertEqual(json.loads(lines[0])["TimeCreated"], "2025-03-10T11:00:00")
+
+    def test_no_deletions_before_migration_007(self):
+        with patch.dict(db._schema_cache, {("deleted_records", None): False}), \
+             patch.object(db, "stream_all") as stream_all:
+            self.assertEqual(list(db.iter_study_export_rows("deleted", study_export.EPOCH, CURSOR)), [])
+
+        stream_all.assert_not_called()
+
+    def test_snapshot_file_names_are_validated(self):
+        study_export.run_study_export("csv", export_dir=self.export_dir)
+
+        self.assertIsNotNone(study_export.snapshot_file_path("snapshot-0001", "metrics.csv.gz", self.export_dir))
+        self.assertIsNone(study_export.snapshot_file_path("snapshot-0001", "../state.json", self.export_dir))
+        self.assertIsNone(study_export.snapshot_file_path("..", "state.json", self.export_dir))
+
+
+class StudyExportEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "doctor-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        doctor = {"ID": "doctor-1", "Role": "Doctor", "Email": "d@example.com", "FirstName": "D", "LastName": "One"}
+        self.user_patch = patch.object(backend_app, "get_user_by_id", return_value=doctor)
+        self.user_patch.start()
+
+    def tearDown(self):
+        self.user_patch.stop()
+
+    def test_requires_allow_listed_user(self):
+        with patch.dict(os.environ, {"STUDY_EXPORT_ALLOWED_USERS": "doctor-2"}), \
+             patch.object(backend_app, "run_study_export") as run:
+            response = self.client.post("/study/exports", headers=self.headers)
+
+        self.assertEqual(response.status_code, 403)
+        run.assert_not_called()
+
+    def test_runs_export(self):
+        with patch.dict(os.environ, {"STUDY_EXPORT_ALLOWED_USERS": "doctor-2, doctor-1"}), \
+             patch.object(backend_app, "is_db_enabled", return_value=True), \
+             patch.object(backend_app, "run_study_export", return_value={"snapshot": "snapshot-0001"}) as run:
+            response = self.client.post("/study/exports", json={"format": "ndjson"}, headers=self.headers)
+            bad_format = self.client.post("/study/exports", json={"format": "xlsx"}, headers=self.headers)
+
+        self.assertEqual(response.status_code, 201)
+        run.assert_called_once_with("ndjson")
+        self.assertEqual(bad_format.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import io
+import sys
+import unittest
+from contextlib import redirect_stdout
+from datetime import date, datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import jwt as PyJWT
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import app as backend_app
+import backfill_rollups
+import db
+from analysis.rollups import (
+    ROM_EDGES,
+    add_entries,
+    empty_rollup,
+    histogram_percentile,
+    pack_histogram,
+    summarize_rollup,
+    unpack_histogram,
+    week_start,
+)
+
+
+def entries(rom, velocity):
+    return [
+        {"min_rom": r - 40, "max_rom": r, "avg_rom": r / 2, "min_v": 0.0, "max_v": v * 1.2, "avg_v": v / 2, "p95_v": v}
+        for r, v in zip(rom, velocity)
+    ]
+
+
+class RollupMathTests(unittest.TestCase):
+    def test_weeks_start_on_monday(self):
+        self.assertEqual(week_start(datetime(2025, 3, 9, 23, 59)), date(2025, 3, 3))
+        self.assertEqual(week_start(date(2025, 3, 10)), date(2025, 3, 10))
+
+    def test_incremental_updates_match_one_batch(self):
+        rng = np.random.default_rng(0)
+        batch = entries(rng.uniform(40, 120, 60), rng.uniform(50, 400, 60))
+
+        incremental = empty_rollup()
+        for entry in batch:
+            incremental = add_entries(incremental, [entry])
+        at_once = add_entries(empty_rollup(), batch)
+
+        self.assertEqual(incremental["count"], 60)
+        for key in ("rom_histogram", "velocity_histogram"):
+            np.testing.assert_array_equal(incremental[key], at_once[key])
+        for key in ("rom_min", "rom_max", "rom_sum", "velocity_min", "velocity_max", "velocity_sum"):
+            self.assertAlmostEqual(incremental[key], at_once[key])
+
+    def test_p95_estimate_is_within_one_bin(self):
+        rom = np.random.default_rng(1).uniform(20, 130, 2000)
+        rollup = add_entries(empty_rollup(), entries(rom, np.full(2000, 100.0)))
+
+        summary = summarize_rollup(rollup)
+
+        self.assertAlmostEqual(summary["rom"]["p95"], float(np.percentile(rom, 95)), delta=ROM_EDGES[1] - ROM_EDGES[0])
+        self.assertAlmostEqual(summary["rom"]["max"], float(rom.max()))
+        self.assertAlmostEqual(summary["rom"]["mean"], float(np.mean(rom / 2)))
+
+    def test_out_of_range_values_are_clamped(self):
+        rollup = add_entries(empty_rollup(), entries([-5.0, 250.0], [0.0, 5000.0]))
+
+        self.assertEqual(int(rollup["rom_histogram"].sum()), 2)
+        self.assertEqual(rollup["rom_histogram"][0], 1)
+        self.assertEqual(rollup["rom_histogram"][-1], 1)
+
+    def test_histograms_round_trip(self):
+        counts = add_entries(empty_rollup(), entries([30.0, 31.0, 90.0], [1.0, 2.0, 3.0]))["rom_histogram"]
+
+        np.testing.assert_array_equal(unpack_histogram(pack_histogram(counts), ROM_EDGES), counts)
+        with self.assertRaises(ValueError):
+            unpack_histogram(pack_histogram(counts[:-1]), ROM_EDGES)
+
+    def test_empty_histogram_percentile_is_zero(self):
+        self.assertEqual(histogram_percentile(np.zeros(3), np.arange(4.0), 95), 0.0)
+
+
+class RollupMaintenanceTests(unittest.TestCase):
+    def test_writes_skip_rollups_until_the_table_exists(self):
+        connection = MagicMock()
+        with patch.dict(db._schema_cache, {("metrics_weekly", None): False}):
+            db._add_to_weekly_rollups(connection, "session-1", [])
+            db._rebuild_weekly_rollups(connection, "patient-1", date(2025, 3, 3))
+
+        connection.execute.assert_not_called()
+
+    def test_table_lookup_is_cached(self):
+        with patch.dict(db._schema_cache, clear=True), \
+             patch.object(db, "fetch_one", return_value={"found": 1}) as fetch_one:
+            self.assertTrue(db.is_rollups_enabled())
+            self.assertTrue(db.is_rollups_enabled())
+
+        fetch_one.assert_called_once()
+
+
+class ProgressionEndpointTests(unittest.TestCase):
+    def setUp(self):
+        backend_app.app.config["TESTING"] = True
+        self.client = backend_app.app.test_client()
+        token = PyJWT.encode({"user_id": "patient-1"}, backend_app.app.config["SECRET_KEY"], algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        user = {"ID": "patient-1", "Role": "Patient", "Email": "p@example.com", "FirstName": "P", "LastName": "One"}
+        self.user_patch = patch.object(backend_app, "get_user_by_id", return_value=user)
+        self.user_patch.start()
+
+    def tearDown(self):
+        self.user_patch.stop()
+
+    def test_reads_only_rollups(self):
+        row = {
+            "Joint": "knee", "Side": "right", "WeekStart": date(2025, 3, 3), "EntryCount": 4,
+            "MinROM": 5.0, "MaxROM": 95.0, "SumROM": 160.0, "P95ROM": 93.0,
+            "MinVelocity": 0.0, "MaxVelocity": 300.0, "SumVelocity": 400.0, "P95Velocity": 250.0,
+        }
+        with patch.object(backend_app, "is_rollups_enabled", return_value=True), \
+             patch.object(backend_app, "get_weekly_rollups", return_value=[row]) as rollups:
+            response = self.client.get("/patients/patient-1/progression?weeks=4&joint=Knee", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        week = response.get_json()["weeks"][0]
+        self.assertEqual(week["weekStart"], "2025-03-03")
+        self.assertEqual(week["rom"], {"min": 5.0, "max": 95.0, "mean": 40.0, "p95": 93.0})
+        self.assertEqual(week["velocity"]["mean"], 100.0)
+        patient_id, since, joint, side = rollups.call_args.args
+        self.assertEqual((patient_id, joint, side), ("patient-1", "knee", None))
+        self.assertEqual(since.weekday(), 0)
+
+    def test_reports_missing_migration(self):
+        with patch.object(backend_app, "is_rollups_enabled", return_value=False), \
+             patch.object(backend_app, "get_weekly_rollups") as rollups:
+            response = self.client.get("/patients/patient-1/progression", headers=self.headers)
+
+        self.assertEqual(response.status_code, 501)
+        rollups.assert_not_called()
+
+    def test_other_patients_are_forbidden(self):
+        with patch.object(backend_app, "get_weekly_rollups") as rollups:
+            response = self.client.get("/patients/patient-2/progression", headers=self.headers)
+
+        self.assertEqual(response.status_code, 403)
+        rollups.assert_not_called()
+
+
+class BackfillRollupsCliTests(unittest.TestCase):
+    def test_rebuilds_every_patient_and_reports_failures(self):
+        def rebuild(patient_id):
+            if patient_id == "p-2":
+                raise RuntimeError("boom")
+            return 3
+
+        with patch.object(backfill_rollups, "is_db_enabled", return_value=True), \
+             patch.object(backfill_rollups, "list_patients_with_sessions", return_value=["p-1", "p-2", "p-3"]), \
+             patch.object(backfill_rollups, "rebuild_patient_rollups", side_effect=rebuild) as rebuilt, \
+             redirect_stdout(io.StringIO()) as output:
+            exit_code = backfill_rollups.main([])
+
+        self.assertEqual(exit_code, 1)
+        self.assertEqual([call.args[0] for call in rebuilt.call_args_list], ["p-1", "p-2", "p-3"])
+        self.assertIn("Wrote 6 weekly rollups for 2 patients", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()